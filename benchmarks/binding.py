@@ -0,0 +1,256 @@
+"""Measures the hot paths of the binding against the simulated backend of ics.simulator, no hardware needed.
+
+usage: python benchmarks/binding.py [--filter TEXT] [--save FILE] [--compare FILE] [--threshold PERCENT]
+
+Every benchmark reports the fastest round in seconds per operation, per message for the batched ones. --save appends
+the results as one JSON line to FILE, together with the commit, version, python and host they were measured on, so
+the file keeps the history of the results. --compare checks the results against the last ones in FILE from the same
+host and python and exits with 1 if a benchmark got slower than --threshold percent, e.g. in CI before a release:
+
+    python benchmarks/binding.py --compare benchmarks.jsonl --save benchmarks.jsonl
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import ics
+from ics import simulator
+
+from import_time import time_import
+
+ROUNDS = 20
+GET_MESSAGES_BATCHES = (1, 100, 1000, 10000)
+TRANSMIT_BATCHES = (1, 100, 1000)
+IMPORT_ROUNDS = 5
+
+
+def _can_message(data=(1, 2, 3, 4, 5, 6, 7, 8)):
+    msg = ics.SpyMessage()
+    msg.NetworkID = ics.NETID_HSCAN
+    msg.ArbIDOrHeader = 0x123
+    msg.Data = data
+    return msg
+
+
+def _canfd_message():
+    msg = _can_message()
+    msg.Protocol = ics.SPY_PROTOCOL_CANFD
+    msg.StatusBitField3 = ics.SPY_STATUS3_CANFD_FDF | ics.SPY_STATUS3_CANFD_BRS
+    msg.ExtraDataPtr = tuple(range(64))
+    return msg
+
+
+def _timed(func, number):
+    """Returns a round calling func number times, in seconds per call."""
+
+    def run():
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        return (time.perf_counter() - start) / number
+
+    return run
+
+
+def _get_messages(device, count):
+    """Returns a round receiving count loopback messages with one get_messages() call, in seconds per message."""
+    messages = tuple(_can_message() for _ in range(count))
+
+    def run():
+        ics.transmit_messages(device, messages)
+        start = time.perf_counter()
+        received, _ = ics.get_messages(device, False, 0)
+        elapsed = time.perf_counter() - start
+        assert len(received) == count, f"expected {count} messages, received {len(received)}"
+        return elapsed / count
+
+    return run
+
+
+def _transmit_messages(device, count):
+    """Returns a round transmitting count messages with one transmit_messages() call, in seconds per message."""
+    messages = tuple(_can_message() for _ in range(count))
+
+    def run():
+        # Only the transmit, without filling the receive queue with the TX echoes
+        simulator.set_loopback(False)
+        start = time.perf_counter()
+        ics.transmit_messages(device, messages)
+        elapsed = time.perf_counter() - start
+        simulator.set_loopback(True)
+        return elapsed / count
+
+    return run
+
+
+def _import(cold):
+    """Returns a round importing ics in a new interpreter, see import_time.py."""
+    warm_cache = tempfile.TemporaryDirectory()
+
+    def run():
+        if cold:
+            with tempfile.TemporaryDirectory() as cache_prefix:
+                return time_import(None, cache_prefix)
+        return time_import(None, warm_cache.name)
+
+    return run
+
+
+def get_benchmarks(device):
+    """Returns {name: (round, rounds)} of every benchmark, a round returns seconds per operation."""
+    received = _can_message()
+    ics.transmit_messages(device, received)
+    (received,) = ics.get_messages(device, False, 0)[0]
+    can = _can_message()
+    canfd = _canfd_message()
+    settings = ics.get_device_settings(device)
+    sector = bytearray(512)
+    ics.write_sdcard(device, 0, bytes(range(256)) * 2)
+
+    benchmarks = {}
+    for count in GET_MESSAGES_BATCHES:
+        benchmarks[f"get_messages[{count}]"] = (_get_messages(device, count), ROUNDS)
+    for count in TRANSMIT_BATCHES:
+        benchmarks[f"transmit_messages[{count}]"] = (_transmit_messages(device, count), ROUNDS)
+    benchmarks.update(
+        {
+            "SpyMessage()": (_timed(ics.SpyMessage, 10000), ROUNDS),
+            "SpyMessage.Data": (_timed(lambda: can.Data, 10000), ROUNDS),
+            "SpyMessage.Data=": (_timed(lambda: setattr(can, "Data", (8, 7, 6, 5, 4, 3, 2, 1)), 10000), ROUNDS),
+            "SpyMessage.ExtraDataPtr": (_timed(lambda: canfd.ExtraDataPtr, 10000), ROUNDS),
+            "SpyMessage.ArbIDOrHeader": (_timed(lambda: can.ArbIDOrHeader, 10000), ROUNDS),
+            "get_timestamp_for_msg": (_timed(lambda: ics.get_timestamp_for_msg(device, received), 10000), ROUNDS),
+            "get_device_settings": (_timed(lambda: ics.get_device_settings(device), 100), ROUNDS),
+            "set_device_settings": (_timed(lambda: ics.set_device_settings(device, settings), 100), ROUNDS),
+            "read_sdcard": (_timed(lambda: ics.read_sdcard(device, 0), 1000), ROUNDS),
+            "read_sdcard_into": (_timed(lambda: ics.read_sdcard_into(device, 0, sector), 1000), ROUNDS),
+            "import ics (cold)": (_import(True), IMPORT_ROUNDS),
+            "import ics (warm)": (_import(False), IMPORT_ROUNDS),
+        }
+    )
+    return benchmarks
+
+
+def run_benchmarks(text=None):
+    """Runs the benchmarks whose name contains text, returns {name: fastest seconds per operation}."""
+    previous_library = simulator.use()
+    simulator.reset()
+    device = ics.open_device()
+    try:
+        results = {}
+        for name, (run, rounds) in get_benchmarks(device).items():
+            if text and text not in name:
+                continue
+            # One round to warm up, it also fills the bytecode cache of the warm import
+            run()
+            results[name] = min(run() for _ in range(rounds))
+            print(f"{name:>28}: {_format(results[name])}", flush=True)
+        return results
+    finally:
+        ics.close_device(device)
+        # The device closes itself again when it's collected, that needs the simulator
+        del device
+        ics.override_library_name(previous_library)
+
+
+def _format(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e3), ("us", 1e6)):
+        if seconds * scale >= 1:
+            return f"{seconds * scale:10.2f} {unit}"
+    return f"{seconds * 1e9:10.2f} ns"
+
+
+def _git_commit():
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+
+def make_record(results):
+    """Returns the JSON record --save appends for results."""
+    return {
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "version": ics.__version__,
+        "python": platform.python_version(),
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def load_baseline(path, record):
+    """Returns the results of the last record in path measured on the same host and python, or None."""
+    baseline = None
+    try:
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                previous = json.loads(line)
+                if (previous["host"], previous["python"]) == (record["host"], record["python"]):
+                    baseline = previous
+    except FileNotFoundError:
+        return None
+    return baseline
+
+
+def compare(baseline, results, threshold):
+    """Prints the change of every benchmark against baseline, returns the names that regressed by threshold %."""
+    print(f"Compared to {baseline['commit'] or 'unknown commit'} from {baseline['date']}:")
+    regressions = []
+    for name, seconds in results.items():
+        before = baseline["results"].get(name)
+        if not before:
+            continue
+        change = (seconds - before) / before * 100
+        regressed = change > threshold
+        if regressed:
+            regressions.append(name)
+        print(f"{name:>28}: {change:+8.1f} %{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the binding against the simulated backend.")
+    parser.add_argument("--filter", help="Only run the benchmarks whose name contains FILTER.")
+    parser.add_argument("--save", metavar="FILE", help="Append the results to FILE.")
+    parser.add_argument("--compare", metavar="FILE", help="Compare against the last results in FILE.")
+    parser.add_argument(
+        "--threshold", type=float, default=25.0, help="Percent a benchmark may get slower, defaults to 25."
+    )
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.filter)
+    record = make_record(results)
+    regressions = []
+    if args.compare:
+        baseline = load_baseline(args.compare, record)
+        if baseline is None:
+            print(f"No earlier results from {record['host']} with python {record['python']} in {args.compare}")
+        else:
+            regressions = compare(baseline, results, args.threshold)
+    if args.save:
+        with open(args.save, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    if regressions:
+        print(f"{len(regressions)} benchmarks regressed by more than {args.threshold} %")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
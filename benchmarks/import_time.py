@@ -0,0 +1,52 @@
+"""Measures how long `import ics` takes in a fresh interpreter, cold and warm.
+
+Cold runs point PYTHONPYCACHEPREFIX at an empty directory so every module is compiled, warm runs reuse the bytecode
+of an earlier run. The interpreter startup itself isn't included.
+
+usage: python benchmarks/import_time.py [gen directory ...]
+
+Every gen directory is put on PYTHONPATH in turn, e.g. to compare the per-module structures against the ones
+generated with `python generate_icsneo40_structs.py --bundle`. Without arguments the installed ics is measured.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RUNS = 20
+STATEMENT = "import time; start = time.perf_counter(); import ics; print(time.perf_counter() - start)"
+
+
+def time_import(path, cache_prefix):
+    """Returns the seconds `import ics` took in a new interpreter."""
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=cache_prefix)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    if path:
+        env["PYTHONPATH"] = path
+    output = subprocess.run([sys.executable, "-c", STATEMENT], env=env, capture_output=True, text=True, check=True)
+    return float(output.stdout.splitlines()[-1])
+
+
+def main():
+    paths = sys.argv[1:] or [None]
+    # The runs of the paths take turns, so a machine getting busier or quieter doesn't favor one of them
+    cold = {path: [] for path in paths}
+    warm = {path: [] for path in paths}
+    with tempfile.TemporaryDirectory() as warm_prefix:
+        warm_prefixes = {}
+        for i, path in enumerate(paths):
+            warm_prefixes[path] = os.path.join(warm_prefix, str(i))
+            time_import(path, warm_prefixes[path])
+        for _ in range(RUNS):
+            for path in paths:
+                with tempfile.TemporaryDirectory() as cache_prefix:
+                    cold[path].append(time_import(path, cache_prefix))
+                warm[path].append(time_import(path, warm_prefixes[path]))
+    for path in paths:
+        print(f"{path or 'installed'}:")
+        for name, seconds in (("cold", cold[path]), ("warm", warm[path])):
+            print(f"{name:>8}: {statistics.median(seconds) * 1e3:8.1f} ms median, {min(seconds) * 1e3:8.1f} ms min")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Compares to_dict()/from_dict() against walking _fields_ with getattr/setattr.
+
+Runs without hardware on a zeroed s_device_settings, usage: python benchmarks/settings_dict.py [DeviceSettingType]
+"""
+import ctypes
+import sys
+import timeit
+
+from ics.structures.e_device_settings_type import e_device_settings_type
+from ics.structures.s_device_settings import s_device_settings
+
+
+def naive_to_dict(obj, prefix="", result=None):
+    """Flattens obj the way to_dict() does, one attribute access per field."""
+    if result is None:
+        result = {}
+    fields = type(obj)._fields_
+    if isinstance(obj, ctypes.Union):
+        fields = [max(fields, key=lambda field: ctypes.sizeof(field[1]))]
+    anonymous_names = getattr(type(obj), "_anonymous_", ())
+    for field in fields:
+        name = field[0]
+        if not name:
+            continue
+        path = prefix if name in anonymous_names else f"{prefix}.{name}" if prefix else name
+        value = getattr(obj, name)
+        if isinstance(value, (ctypes.Structure, ctypes.Union)):
+            naive_to_dict(value, path, result)
+        elif isinstance(value, ctypes.Array):
+            if issubclass(value._type_, (ctypes.Structure, ctypes.Union)):
+                result[path] = [naive_to_dict(element) for element in value]
+            else:
+                result[path] = list(value)
+        else:
+            result[path] = value
+    return result
+
+
+def naive_from_dict(obj, data):
+    """Writes the values of naive_to_dict() back, one attribute lookup per path segment."""
+    for path, value in data.items():
+        *parents, name = path.split(".")
+        target = obj
+        for parent in parents:
+            target = getattr(target, parent)
+        if isinstance(value, list):
+            array = getattr(target, name)
+            for i, element in enumerate(value):
+                if isinstance(element, dict):
+                    naive_from_dict(array[i], element)
+                else:
+                    array[i] = element
+        else:
+            setattr(target, name, value)
+    return obj
+
+
+def main():
+    setting_type = sys.argv[1] if len(sys.argv) > 1 else "DeviceFire3SettingsType"
+    settings = s_device_settings()
+    settings.DeviceSettingType = e_device_settings_type[setting_type]
+    values = settings.to_dict()
+    member = next(path for path in values if path.startswith("Settings.")).split(".")[1]
+    naive_values = naive_to_dict(getattr(settings.Settings, member), f"Settings.{member}")
+    naive_values["DeviceSettingType"] = settings.DeviceSettingType
+    assert naive_values.keys() == values.keys()
+
+    number = 200
+    results = {
+        "naive to_dict": timeit.timeit(lambda: naive_to_dict(getattr(settings.Settings, member)), number=number),
+        "to_dict": timeit.timeit(settings.to_dict, number=number),
+        "naive from_dict": timeit.timeit(lambda: naive_from_dict(s_device_settings(), values), number=number),
+        "from_dict": timeit.timeit(lambda: s_device_settings.from_dict(values), number=number),
+    }
+    print(f"{setting_type}: {len(values)} fields")
+    for name, seconds in results.items():
+        print(f"{name:>16}: {seconds / number * 1e6:10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -145,14 +145,12 @@ def is_line_start_of_object(line):
 NON_CTYPE_OBJ_NAMES = []
 # This contains a list of every object we collected
 ALL_C_OBJECTS = []
+# Every name of the objects in ALL_C_OBJECTS, mapped to the first object that has it
+C_OBJECT_INDEX = {}
 
 
 def get_object_from_name(name):
-    global ALL_C_OBJECTS
-    for obj in ALL_C_OBJECTS:
-        if name == obj.preferred_name or name in obj.names:
-            return obj
-    return None
+    return C_OBJECT_INDEX.get(name)
 
 
 def parse_object(f, pos=-1, pack_size=None, is_embedded=False):
@@ -241,6 +239,8 @@ def parse_object(f, pos=-1, pack_size=None, is_embedded=False):
         # Append the objects to a global list for parsing later
         global ALL_C_OBJECTS
         ALL_C_OBJECTS.append(new_obj)
+        for name in [new_obj.preferred_name] + new_obj.names:
+            C_OBJECT_INDEX.setdefault(name, new_obj)
         return new_obj
     finally:
         if pos != -1:
@@ -606,7 +606,7 @@ def parse_header_file(filename):
         return c_objects, enum_objects
 
 
-def generate(filename="include/ics/icsnVC40.h"):
+def generate(filename="include/ics/icsnVC40.h", bundle=False):
     import shutil
     import json
     import os
@@ -669,9 +669,7 @@ def generate(filename="include/ics/icsnVC40.h"):
         #"neo_device",
         #"NeoDeviceEx",
         #"neo_device_ex",
-        "icsSpyMessage",
         "icsSpyMessageJ1850",
-        "ics_spy_message",
         "ics_spy_message_j1850",
     ]
     file_names = []
@@ -716,7 +714,7 @@ def generate(filename="include/ics/icsnVC40.h"):
         for file_name in file_names:
             fname = re.sub(r"(\.py)", "", file_name)
             r = re.compile(r"(" + fname + ")")
-            if list(filter(r.match, ignore_names)):
+            if list(filter(r.fullmatch, ignore_names)):
                 # print("IGNORING:", fname)
                 continue
             f.write('    "')
@@ -730,27 +728,23 @@ def generate(filename="include/ics/icsnVC40.h"):
         for file_name in file_names:
             fname = re.sub(r"(\.py)", "", file_name)
             r = re.compile(r"(" + fname + ")")
-            if list(filter(r.match, ignore_names)):
+            if list(filter(r.fullmatch, ignore_names)):
                 # print("IGNORING:", fname)
                 continue
             f.write(f'    "ics.structures.{fname}",\n')
+        if bundle:
+            f.write(f'    "ics.structures.{BUNDLE_MODULE_NAME}",\n')
         f.write("]\n\n")
 
-    # Verify We can at least import all of the modules - quick check to make sure parser worked.
-    ics_module_path = GEN_ICS_DIR.parent.resolve()
-    # Add the module to the eval sys.path.
-    eval("""sys.path.insert(0, f"{ics_module_path}")""")
-    for file_name in file_names:
-        if file_name.startswith("__"):
-            continue
-        import_line = "from ics.structures import {}".format(
-            re.sub(r'(\.py)', '', file_name))
-        try:
-            print(f"Importing / Verifying {output_dir / file_name}...")
-            exec(import_line)
-        except Exception as ex:
-            print(f"""ERROR: {ex} IMPORT LINE: '{import_line}'""")
-            raise ex
+    # Import every module in one fresh interpreter to make sure the parser worked, it also appends the layouts
+    # that need the ctypes types. Nothing of the generated package ends up in this process.
+    print(f"Verifying {len(file_names)} modules...")
+    args = [sys.executable, os.path.abspath(__file__), "--verify", str(output_dir)]
+    if bundle:
+        args.append("--bundle")
+    result = run(args)
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to verify the generated modules in {output_dir}")
     print("Done.")
 
 
@@ -837,6 +831,16 @@ def _write_c_object(f, c_object):
     # Finalize the _fields_ attribute and extra names
     if c_object.data_type in (DataType.Struct, DataType.Union):
         f.write(f"    ]\n")
+        # to_dict()/from_dict() use the _dict_layout_ appended by generate_layouts()
+        f.write("\n")
+        f.write("    def to_dict(self):\n")
+        f.write("        from ics.struct_dict import to_dict\n")
+        f.write("        return to_dict(self)\n")
+        f.write("\n")
+        f.write("    @classmethod\n")
+        f.write("    def from_dict(cls, data):\n")
+        f.write("        from ics.struct_dict import from_dict\n")
+        f.write("        return from_dict(cls, data)\n")
     # Extra names here
     f.write("\n\n")
     for name in c_object.names:
@@ -908,22 +912,510 @@ def generate_pyfile(c_object, path):
         _write_c_object(f, c_object)
     return fname, fname_with_path
 
-def generate_all_files():
+# Unions whose active member is picked by another field of the structure they are in. to_dict()/from_dict() only
+# convert the selected member, every other union converts its first largest member which covers all of its bytes.
+# module name: (union field, selector field, selector enum module, {selector enum name: union member})
+DICT_UNION_SELECTORS = {
+    "s_device_settings": (
+        "Settings",
+        "DeviceSettingType",
+        "e_device_settings_type",
+        {
+            "DeviceFireSettingsType": "fire",
+            "DeviceFireVnetSettingsType": "firevnet",
+            "DeviceFire2SettingsType": "cyan",
+            "DeviceVCAN3SettingsType": "vcan3",
+            "DeviceRADGalaxySettingsType": "radgalaxy",
+            "DeviceRADStar2SettingsType": "radstar2",
+            "DeviceVCAN4SettingsType": "vcan4",
+            "DeviceVCAN412SettingsType": "vcan412",
+            "DeviceVividCANSettingsType": "vividcan",
+            "DeviceECU_AVBSettingsType": "neoecu_avb",
+            "DeviceRADSuperMoonSettingsType": "radsupermoon",
+            "DeviceRADMoon2SettingsType": "radmoon2",
+            "DeviceRADPlutoSettingsType": "pluto",
+            "DeviceRADGigalogSettingsType": "radgigalog",
+            "DeviceVCANRFSettingsType": "vcanrf",
+            "DeviceEEVBSettingsType": "eevb",
+            "DeviceVCAN4IndSettingsType": "vcan4_ind",
+            "DeviceNeoECU12SettingsType": "neoecu12",
+            "DeviceFlexVnetzSettingsType": "flexvnetz",
+            "DeviceCANHUBSettingsType": "canhub",
+            "DeviceIEVBSettingsType": "ievb",
+            "DeviceOBD2SimSettingsType": "neoobd2_sim",
+            "DeviceCMProbeSettingsType": "cmprobe",
+            "DeviceOBD2ProSettingsType": "obd2pro",
+            "DeviceRedSettingsType": "red",
+            "DeviceRADPlutoSwitchSettingsType": "plutoswitch",
+            "DeviceRADGigastarSettingsType": "radgigastar",
+            "DeviceRADJupiterSettingsType": "jupiter",
+            "DeviceRed2SettingsType": "red2",
+            "DeviceRadMoonDuoSettingsType": "radmoon_duo",
+            "DeviceEtherBadgeSettingsType": "etherBadge",
+            "DeviceRADA2BSettingsType": "rad_a2b",
+            "DeviceRADEpsilonSettingsType": "epsilon",
+            "DeviceOBD2LCSettingsType": "obd2lc",
+            "DeviceRADBMSSettingsType": "rad_bms",
+            "DeviceRADMoon3SettingsType": "radmoon3",
+            "DeviceFire3SettingsType": "fire3",
+            "DeviceFire3FlexraySettingsType": "fire3Flexray",
+            "DeviceRADCometSettingsType": "radcomet",
+            "DeviceRed2OemSettingsType": "red2",
+        },
+    ),
+}
+
+_DICT_INTEGER_FORMATS = {1: "b", 2: "h", 4: "i", 8: "q"}
+
+
+def _get_dict_format(ctype):
+    "Returns the struct module format of a ctypes primitive, None for structures, unions and arrays"
+    size = ctypes.sizeof(ctype)
+    if issubclass(ctype, ctypes._Pointer):
+        return _DICT_INTEGER_FORMATS[size].upper()
+    code = getattr(ctype, "_type_", None)
+    if not isinstance(code, str):
+        return None
+    if code in "fd?":
+        return code
+    if code in "bhilq":
+        return _DICT_INTEGER_FORMATS[size]
+    if code in "BHILQcuzZP":
+        return _DICT_INTEGER_FORMATS[size].upper()
+    raise ValueError(f"Unsupported ctypes type {ctype.__name__} for dict layouts")
+
+
+def _get_dict_layout_fields(ctype, prefix, base, fields, selector=None):
+    """
+    Flattens the fields of ctype into fields as (path, offset, format, count, extra) tuples.
+    Nested structures and unions are flattened into dotted paths, arrays of structures reference the element type
+    and a union picked by selector references the union type with extra set to (selector field, {value: member}).
+    Bitfields have extra set to (bit offset, bit width).
+    """
+    members = ctype._fields_
+    if issubclass(ctype, ctypes.Union):
+        members = [max(members, key=lambda member: ctypes.sizeof(member[1]))]
+    anonymous_names = getattr(ctype, "_anonymous_", ())
+    for member in members:
+        name, member_type = member[0], member[1]
+        if not name:
+            # Unnamed padding bitfield
+            continue
+        descriptor = getattr(ctype, name)
+        offset = base + descriptor.offset
+        if name in anonymous_names:
+            path = prefix
+        else:
+            path = f"{prefix}.{name}" if prefix else name
+        if selector and name == selector[0]:
+            fields.append((path, offset, member_type, 0, selector[1:]))
+        elif len(member) == 3:
+            bit_size = getattr(descriptor, "bit_size", None)
+            if bit_size is None:
+                bit_offset, bit_size = descriptor.size & 0xFFFF, descriptor.size >> 16
+            else:
+                bit_offset = descriptor.bit_offset
+            fields.append((path, offset, _get_dict_format(member_type), 0, (bit_offset, bit_size)))
+        elif issubclass(member_type, ctypes.Array):
+            count = 1
+            while issubclass(member_type, ctypes.Array):
+                count *= member_type._length_
+                member_type = member_type._type_
+            fields.append((path, offset, _get_dict_format(member_type) or member_type, count, None))
+        elif _get_dict_format(member_type):
+            fields.append((path, offset, _get_dict_format(member_type), 0, None))
+        else:
+            _get_dict_layout_fields(member_type, path, offset, fields)
+    return fields
+
+
+# struct module format to NumPy type string
+_DTYPE_FORMATS = {
+    "b": "i1",
+    "B": "u1",
+    "h": "i2",
+    "H": "u2",
+    "i": "i4",
+    "I": "u4",
+    "q": "i8",
+    "Q": "u8",
+    "f": "f4",
+    "d": "f8",
+    "?": "?",
+}
+
+
+def _get_dtype_layout_fields(ctype, base=0, fields=None):
+    """
+    Returns the fields of ctype as (name, offset, NumPy type or ctypes type, shape) tuples.
+    The fields of anonymous members are added in their place like ctypes does, union members all start at the
+    same offset. Bitfields have no NumPy equivalent and are left out, ics.struct_dtype.bitfields() extracts them
+    from the _dict_layout_ instead.
+    """
+    if fields is None:
+        fields = []
+    anonymous_names = getattr(ctype, "_anonymous_", ())
+    for member in ctype._fields_:
+        name, member_type = member[0], member[1]
+        if not name or len(member) == 3:
+            continue
+        offset = base + getattr(ctype, name).offset
+        if name in anonymous_names:
+            _get_dtype_layout_fields(member_type, offset, fields)
+            continue
+        shape = []
+        while issubclass(member_type, ctypes.Array):
+            shape.append(member_type._length_)
+            member_type = member_type._type_
+        fmt = _get_dict_format(member_type)
+        fields.append((name, offset, _DTYPE_FORMATS[fmt] if fmt else member_type, tuple(shape)))
+    return fields
+
+
+def _format_layout_type(module, fmt, imports):
+    "Returns fmt as source, ctypes types are referenced by name and imported if the module doesn't see them"
+    if isinstance(fmt, str):
+        return repr(fmt)
+    if getattr(module, fmt.__name__, None) is not fmt:
+        imports.add(f"from {fmt.__module__} import {fmt.__name__}\n")
+    return fmt.__name__
+
+
+def generate_layouts(output_dir, file_names):
+    """
+    Appends the _dict_layout_ (see ics.struct_dict) and _dtype_layout_ (see ics.struct_dtype) of every structure
+    and union to the generated modules.
+    """
+    import importlib
+
+    print("Generating layouts...")
+    for file_name in file_names:
+        if file_name.startswith("__"):
+            continue
+        module_name = re.sub(r"(\.py)", "", file_name)
+        module = importlib.import_module(f"ics.structures.{module_name}")
+        selector = None
+        if module_name in DICT_UNION_SELECTORS:
+            union_name, selector_name, enum_module_name, members = DICT_UNION_SELECTORS[module_name]
+            enum_module = importlib.import_module(f"ics.structures.{enum_module_name}")
+            enum_type = getattr(enum_module, enum_module_name)
+            selector = (union_name, selector_name, {int(enum_type[key]): value for key, value in members.items()})
+        lines = []
+        imports = set()
+        for name, ctype in vars(module).items():
+            if not isinstance(ctype, type) or not issubclass(ctype, (ctypes.Structure, ctypes.Union)):
+                continue
+            # Skip the aliases and the types star imported from other modules
+            if ctype.__name__ != name or ctype.__module__ != module.__name__:
+                continue
+            fields = _get_dict_layout_fields(ctype, "", 0, [], selector if name == module_name else None)
+            lines.append(f"{name}._dict_layout_ = ({ctypes.sizeof(ctype)}, (\n")
+            for path, offset, fmt, count, extra in fields:
+                fmt = _format_layout_type(module, fmt, imports)
+                lines.append(f"    ({path!r}, {offset}, {fmt}, {count}, {extra!r}),\n")
+            lines.append("))\n")
+            lines.append(f"{name}._dtype_layout_ = ({ctypes.sizeof(ctype)}, (\n")
+            for field_name, offset, fmt, shape in _get_dtype_layout_fields(ctype):
+                fmt = _format_layout_type(module, fmt, imports)
+                lines.append(f"    ({field_name!r}, {offset}, {fmt}, {shape!r}),\n")
+            lines.append("))\n")
+        if not lines:
+            continue
+        with open(output_dir / file_name, "a") as f:
+            f.write("# Precompiled field layouts for to_dict()/from_dict() and NumPy dtypes\n")
+            f.writelines(sorted(imports))
+            f.writelines(lines)
+
+
+# Module of ics.structures that holds every structure when generating with bundle=True
+BUNDLE_MODULE_NAME = "_bundle"
+
+
+def _get_source_names(source):
+    "Returns the tokens of the identifiers in source, without attributes, strings and comments"
+    import io
+    import tokenize
+
+    tokens = []
+    previous = None
+    for token in tokenize.generate_tokens(io.StringIO(source).readline):
+        if token.type == tokenize.NAME and previous != ".":
+            tokens.append(token)
+        previous = token.string
+    return tokens
+
+
+def _rename_source_names(source, names):
+    "Renames the identifiers {old: new} in source"
+    lines = source.splitlines(keepends=True)
+    renames = [token for token in _get_source_names(source) if token.string in names]
+    # Replace from the end so the columns of the earlier tokens on the same line stay valid
+    for token in reversed(renames):
+        row, column = token.start
+        line = lines[row - 1]
+        lines[row - 1] = line[:column] + names[token.string] + line[token.end[1] :]
+    return "".join(lines)
+
+
+def generate_bundle(output_dir, file_names):
+    """
+    Moves every generated module into the single module ics.structures._bundle, in dependency order, and replaces
+    the modules with shims that import the names they used to have from it. ics.structures creates the modules
+    from the bundle instead of importing the shims, importing one module instead of hundreds that star import each
+    other is a lot faster. The shims stay for importing a module by path and for tools like PyInstaller.
+
+    Inner types with the same name in different modules (every settings structure has its own "flags") are renamed
+    in the bundle, their __name__ and the __module__ of every type stay what they were so reprs and pickles don't
+    change.
+    """
+    print("Generating bundle...")
+    module_names = [re.sub(r"(\.py)", "", file_name) for file_name in file_names if not file_name.startswith("__")]
+    sources = {}
+    star_imports = {}
+    type_imports = {}
+    definitions = {}
+    for module_name in module_names:
+        source = (output_dir / f"{module_name}.py").read_text()
+        star_imports[module_name] = re.findall(r"^from ics\.structures\.(\w+) import \*$", source, re.MULTILINE)
+        # The layouts import the types a module doesn't see by name
+        type_imports[module_name] = re.findall(r"^from ics\.structures\.(\w+) import (\w+)$", source, re.MULTILINE)
+        definitions[module_name] = [
+            "".join(match) for match in re.findall(r"^class (\w+)\(|^(\w+) = ", source, re.MULTILINE)
+        ]
+        # Everything but the imports, the bundle has them once or doesn't need them
+        sources[module_name] = re.sub(
+            r"^(# This file was auto generated.*|import ctypes|import enum|from ics\.structures\.\w+ import .*)\n",
+            "",
+            source,
+            flags=re.MULTILINE,
+        ).strip("\n")
+    # Names defined by more than one module get the module as prefix in the bundle
+    defined_by = {}
+    for module_name in module_names:
+        for name in definitions[module_name]:
+            defined_by.setdefault(name, []).append(module_name)
+    bundle_names = {}
+    for module_name in module_names:
+        bundle_names[module_name] = {
+            name: f"_{module_name}__{name}" if len(defined_by[name]) > 1 else name
+            for name in definitions[module_name]
+        }
+    for module_name in module_names:
+        for token in _get_source_names(sources[module_name]):
+            name = token.string
+            if len(defined_by.get(name, ())) > 1 and name not in bundle_names[module_name]:
+                raise RuntimeError(f"{module_name} uses '{name}' which isn't unique across the modules")
+    # Sort the modules so every module comes after the modules it imports
+    ordered = []
+    states = {}
+
+    def _visit(module_name):
+        if states.get(module_name) == "done":
+            return
+        if states.get(module_name) == "visiting":
+            raise RuntimeError(f"Import cycle in ics.structures.{module_name}")
+        states[module_name] = "visiting"
+        dependencies = star_imports[module_name] + [dependency for dependency, _ in type_imports[module_name]]
+        for dependency in sorted(set(dependencies)):
+            _visit(dependency)
+        states[module_name] = "done"
+        ordered.append(module_name)
+
+    for module_name in module_names:
+        _visit(module_name)
+    # Write the bundle, one section per module
+    with open(output_dir / f"{BUNDLE_MODULE_NAME}.py", "w+") as f:
+        f.write("# This file was auto generated; Do not modify, if you value your sanity!\n")
+        f.write("# Every module of ics.structures, the modules themselves only import from here.\n")
+        f.write("import ctypes\n")
+        f.write("import enum\n")
+        for module_name in ordered:
+            renames = {name: new for name, new in bundle_names[module_name].items() if name != new}
+            classes = [
+                bundle_names[module_name][name]
+                for name in re.findall(r"^class (\w+)\(", sources[module_name], re.MULTILINE)
+            ]
+            f.write(f"\n\n# ics.structures.{module_name}\n")
+            f.write(_rename_source_names(sources[module_name], renames))
+            f.write("\n")
+            for name, new in renames.items():
+                if new in classes:
+                    f.write(f'{new}.__name__ = {new}.__qualname__ = "{name}"\n')
+            if classes:
+                f.write(f"for _type in ({', '.join(classes)}{',' if len(classes) == 1 else ''}):\n")
+                f.write(f'    _type.__module__ = "ics.structures.{module_name}"\n')
+        f.write("\ndel _type\n")
+    # Replace the modules with shims that have the same names: their star imports, their own names and the types
+    # imported for the layouts. The star imports only pass on the public names.
+    visible_names = {}
+    for module_name in ordered:
+        names = {}
+        for dependency in star_imports[module_name]:
+            names.update((name, new) for name, new in visible_names[dependency].items() if not name.startswith("_"))
+        names.update(bundle_names[module_name])
+        for dependency, name in type_imports[module_name]:
+            names[name] = visible_names[dependency][name]
+        visible_names[module_name] = names
+        with open(output_dir / f"{module_name}.py", "w+") as f:
+            f.write("# This file was auto generated; Do not modify, if you value your sanity!\n")
+            f.write("import ctypes\n")
+            f.write("import enum\n")
+            if names:
+                f.write("\n")
+                f.write(f"from ics.structures.{BUNDLE_MODULE_NAME} import (\n")
+                for name, new in sorted(names.items()):
+                    f.write(f"    {new} as {name},\n" if name != new else f"    {name},\n")
+                f.write(")\n")
+    # The same names for ics.structures to create the modules with
+    with open(output_dir / f"{BUNDLE_MODULE_NAME}.py", "a") as f:
+        f.write("\n# The names of every module of ics.structures, the package creates the modules from them\n")
+        f.write("_MODULES = {\n")
+        for module_name in ordered:
+            f.write(f'    "{module_name}": (\n')
+            for name, new in sorted(visible_names[module_name].items()):
+                f.write(f'        ("{name}", {new}),\n')
+            f.write("    ),\n")
+        f.write("}\n")
+    with open(output_dir / "__init__.py", "a") as f:
+        f.write(
+            f"""
+# Generated with the bundle: the modules are created from ics.structures.{BUNDLE_MODULE_NAME} instead of importing
+# their shims one by one
+import ctypes as _ctypes
+import enum as _enum
+import importlib.util as _util
+import sys as _sys
+
+from ics.structures import {BUNDLE_MODULE_NAME}
+
+for _module_name, _names in {BUNDLE_MODULE_NAME}._MODULES.items():
+    _spec = _util.spec_from_file_location(f"{{__name__}}.{{_module_name}}", f"{{__path__[0]}}/{{_module_name}}.py")
+    _module = _util.module_from_spec(_spec)
+    _module.ctypes = _ctypes
+    _module.enum = _enum
+    _module.__dict__.update(_names)
+    _sys.modules[_spec.name] = _module
+    globals()[_module_name] = _module
+del {BUNDLE_MODULE_NAME}._MODULES, _module_name, _names, _spec, _module
+"""
+        )
+
+
+def _describe_module_names(module):
+    "Returns something comparable for every name in module, used to check that the bundle changes nothing"
+    result = {}
+    for name, value in vars(module).items():
+        if name.startswith("__"):
+            continue
+        description = repr(value)
+        if isinstance(value, type) and issubclass(value, (ctypes.Structure, ctypes.Union)):
+            description += repr((ctypes.sizeof(value), value.__dict__.get("_dict_layout_")))
+            description += repr(value.__dict__.get("_dtype_layout_"))
+        elif isinstance(value, type) and issubclass(value, Enum):
+            description += repr([(member.name, member.value) for member in value])
+        result[name] = description
+    return result
+
+
+def verify_generated_files(output_dir, bundle=False):
+    """
+    Imports every generated module in output_dir and appends their layouts, generate() runs this in a subprocess.
+    With bundle, generates the bundle afterwards and checks that the shims have the same names as the modules.
+    """
+    import importlib
+
+    output_dir = Path(output_dir)
+    sys.path.insert(0, str(GEN_ICS_DIR.parent.resolve()))
+    file_names = sorted(path.name for path in output_dir.glob("*.py") if not path.name.startswith("__"))
+    for file_name in file_names:
+        module_name = f"ics.structures.{file_name[:-3]}"
+        try:
+            importlib.import_module(module_name)
+        except Exception as ex:
+            print(f"""ERROR: {ex} MODULE: '{module_name}'""")
+            raise ex
+    generate_layouts(output_dir, file_names)
+    if not bundle:
+        return
+
+    def _import_again():
+        # The package too, with the bundle it creates the modules
+        for module_name in [module_name for module_name in sys.modules if module_name.startswith("ics.structures")]:
+            del sys.modules[module_name]
+        importlib.invalidate_caches()
+        modules = [importlib.import_module(f"ics.structures.{file_name[:-3]}") for file_name in file_names]
+        return {module.__name__: _describe_module_names(module) for module in modules}
+
+    # The modules were imported before their layouts were appended
+    expected = _import_again()
+    generate_bundle(output_dir, file_names)
+    for module_name, names in _import_again().items():
+        if names != expected[module_name]:
+            raise RuntimeError(f"{module_name} changed in the bundle")
+
+
+# Written to the structures directory after a successful generation, holds the hash of the inputs
+GENERATED_STAMP_NAME = ".generated"
+
+
+def get_generation_hash(paths, bundle=False):
+    """
+    Returns a hash of everything the generated modules depend on: the headers, this script, the ctypes sizes and
+    the bundle option
+    """
+    import hashlib
+
+    digest = hashlib.sha256()
+    for path in (*paths, Path(__file__)):
+        digest.update(Path(path).read_bytes())
+    digest.update(f"{ctypes.sizeof(ctypes.c_void_p)} {ctypes.sizeof(ctypes.c_long)} {bundle}".encode())
+    return digest.hexdigest()
+
+
+def generate_all_files(force=False, bundle=None):
+    """
+    Generates ics.structures from the headers unless they didn't change since the last time. bundle puts every
+    structure in a single module, see generate_bundle(), it defaults to whether PYTHON_ICS_BUNDLE_STRUCTURES is set.
+    """
     import sys
     import os
     import pathlib
 
+    if bundle is None:
+        bundle = os.getenv("PYTHON_ICS_BUNDLE_STRUCTURES") is not None
     print(f"Creating directory '{GEN_ICS_DIR}'...")
     GEN_ICS_DIR.mkdir(parents=True, exist_ok=True)
     filenames = ("icsnVC40.h", "icsnVC40Internal.h")
-    for filename in filenames:
-        path = pathlib.Path("include/ics/")
-        path = path.joinpath(filename)
-        if path.exists():
-            if "Internal" in str(filename):
-                print("WARNING: Generating internal header!")
-            print(f"Parsing {str(path)}...")
-            generate(str(path))
+    paths = [pathlib.Path("include/ics/").joinpath(filename) for filename in filenames]
+    paths = [path for path in paths if path.exists()]
+    # Skip everything, including clang, when the headers didn't change since the last generation
+    stamp_path = GEN_ICS_DIR / "structures" / GENERATED_STAMP_NAME
+    generation_hash = get_generation_hash(paths, bundle)
+    if not force and stamp_path.exists() and stamp_path.read_text() == generation_hash:
+        if (GEN_ICS_DIR / "hiddenimports.py").exists():
+            print(f"{stamp_path.parent} is up to date.")
+            return
+    for path in paths:
+        if "Internal" in str(path):
+            print("WARNING: Generating internal header!")
+        print(f"Parsing {str(path)}...")
+        generate(str(path), bundle)
+    stamp_path.write_text(generation_hash)
 
 if __name__ == "__main__":
-    generate_all_files()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generates the ics.structures modules from the icsnVC40 headers.")
+    parser.add_argument("--force", action="store_true", help="Regenerate even if the headers didn't change.")
+    parser.add_argument(
+        "--bundle",
+        action="store_true",
+        default=None,
+        help="Put every structure in a single module, the other modules only import from it.",
+    )
+    parser.add_argument("--verify", metavar="DIR", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.verify:
+        verify_generated_files(args.verify, bool(args.bundle))
+    else:
+        generate_all_files(args.force, args.bundle)
@@ -55,6 +55,8 @@ from ics.structures.neo_device import NeoDevice, neo_device
 from ics.hiddenimports import hidden_imports
 try:
     from ics.py_neo_device_ex import PyNeoDeviceEx
+    from ics.watcher import DeviceWatcher
+    from ics.pool import DevicePool
 except ModuleNotFoundError as ex:
     print(f"Warning: {ex}")
 
@@ -0,0 +1,35 @@
+#ifndef _DECODE_H_
+#define _DECODE_H_
+
+#include <cstddef>
+#include <cstdint>
+#include <vector>
+
+// Size in bytes of one packed signal table entry, see ics/decode.py
+#define DECODE_TABLE_ENTRY_SIZE 32
+
+#define DECODE_FLAG_LITTLE_ENDIAN 0x01
+#define DECODE_FLAG_SIGNED 0x02
+
+struct SignalDefinition
+{
+    uint32_t arbid;
+    // -1 matches any network
+    int32_t network_id;
+    uint16_t start_bit;
+    uint16_t length;
+    uint8_t flags;
+    double factor;
+    double offset;
+};
+
+// Parses a packed signal table. Entries must be sorted by arbid. Returns false if the table is malformed.
+bool decode_parse_table(const uint8_t* table, size_t size, std::vector<SignalDefinition>& signals);
+
+// Returns the index of the first signal for arbid or signals.size() if there are none.
+size_t decode_find_first(const std::vector<SignalDefinition>& signals, uint32_t arbid);
+
+// Extracts and scales the signal from payload. Returns false if the payload is too short.
+bool decode_signal(const SignalDefinition& signal, const uint8_t* payload, size_t length, double* value);
+
+#endif // _DECODE_H_
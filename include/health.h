@@ -0,0 +1,258 @@
+#ifndef _HEALTH_H_
+#define _HEALTH_H_
+
+#if (defined(_WIN32) || defined(__WIN32__))
+#ifndef USING_STUDIO_8
+#define USING_STUDIO_8 1
+#endif
+#include <icsnVC40.h>
+#else
+#include <icsnVC40.h>
+#endif
+
+#include <chrono>
+#include <condition_variable>
+#include <cstdint>
+#include <deque>
+#include <functional>
+#include <map>
+#include <memory>
+#include <mutex>
+#include <string>
+#include <thread>
+#include <vector>
+
+// What the health monitor polls, combined as a bit mask
+enum HealthItem
+{
+    HEALTH_STATUS = 0x01,
+    HEALTH_BUS_VOLTAGE = 0x02,
+    HEALTH_PERFORMANCE = 0x04,
+    HEALTH_GPTP = 0x08,
+    HEALTH_ERRORS = 0x10,
+};
+
+// Values the threshold callbacks can watch
+enum HealthField
+{
+    HEALTH_FIELD_BUS_VOLTAGE,
+    HEALTH_FIELD_BUFFER_COUNT,
+    HEALTH_FIELD_BUFFER_MAX,
+    HEALTH_FIELD_OVERFLOW_COUNT,
+    HEALTH_FIELD_ERROR_COUNT,
+};
+
+// Returns false if name isn't a HealthField.
+bool health_field_from_name(const char* name, HealthField* field);
+const char* health_field_name(HealthField field);
+
+// Description of an error code, see icsneoGetErrorInfo
+struct HealthError
+{
+    int code;
+    std::string description_short;
+    std::string description_long;
+    int severity;
+    int restart_needed;
+};
+
+// Latest results of the health monitor, the *_valid flags are false until the item was read successfully.
+struct HealthReading
+{
+    uint64_t polls;
+    // Time of the last poll, in seconds since the epoch
+    double timestamp;
+
+    bool status_valid;
+    icsDeviceStatus status;
+    bool bus_voltage_valid;
+    // Millivolts
+    unsigned long bus_voltage;
+    bool performance_valid;
+    // Same order as get_performance_parameters(): buffer count, buffer max, overflow count, reserved...
+    int performance[8];
+    bool gptp_valid;
+    GPTPStatus gptp;
+    // Most recent errors, and the number of errors seen since the monitor started
+    std::deque<HealthError> errors;
+    uint64_t error_count;
+};
+
+// Polls the device status on a native thread so readers never wait on the driver or the GIL.
+class HealthMonitor : public std::enable_shared_from_this<HealthMonitor>
+{
+  public:
+    // Driver calls, each returns false on failure
+    struct Functions
+    {
+        std::function<bool(icsDeviceStatus*)> status;
+        std::function<bool(unsigned long*)> bus_voltage;
+        std::function<bool(int*)> performance;
+        std::function<bool(GPTPStatus*)> gptp;
+        // Drains the driver's error queue into errors
+        std::function<bool(std::vector<HealthError>&)> errors;
+    };
+    // Threshold callback: (field, value, previous value)
+    typedef std::function<void(HealthField, double, double)> Callback;
+
+    HealthMonitor(Functions functions, unsigned int items, double period);
+    ~HealthMonitor();
+
+    HealthMonitor(const HealthMonitor&) = delete;
+    HealthMonitor& operator=(const HealthMonitor&) = delete;
+
+    void start();
+    void stop();
+
+    HealthReading reading();
+
+    // Without a threshold the callback runs every time the value increases. With a threshold it runs when the
+    // value crosses above it, or below it when below is set. Returns the id of the callback.
+    int add_callback(HealthField field, bool has_threshold, double threshold, bool below, Callback callback);
+    bool remove_callback(int id);
+
+  private:
+    struct Watch
+    {
+        int id;
+        HealthField field;
+        bool has_threshold;
+        double threshold;
+        bool below;
+        Callback callback;
+        // Whether the value was past the threshold on the last check
+        bool triggered;
+    };
+
+    void run();
+    void poll();
+    bool field_value(const HealthReading& reading, HealthField field, double* value);
+
+    Functions m_functions;
+    unsigned int m_items;
+    std::chrono::duration<double> m_period;
+
+    std::thread m_thread;
+    std::mutex m_mutex;
+    std::condition_variable m_cv;
+    bool m_stop;
+
+    HealthReading m_reading;
+    int m_next_id;
+    std::vector<std::shared_ptr<Watch>> m_watches;
+};
+
+// Shares the error queue of a device between its readers. Reading the driver's queue empties it, so the codes one
+// reader drains are kept for every other reader until it reads them, up to the size of the driver's queue.
+// Reader 0 always exists, it is get_error_messages()'s.
+class ErrorQueue
+{
+  public:
+    // Drains the driver's error queue into codes, returns false on failure
+    typedef std::function<bool(std::vector<int>&)> PollFunction;
+
+    explicit ErrorQueue(PollFunction poll);
+
+    ErrorQueue(const ErrorQueue&) = delete;
+    ErrorQueue& operator=(const ErrorQueue&) = delete;
+
+    // Returns the id of a new reader, it sees the codes drained from now on.
+    int add_reader();
+    void remove_reader(int id);
+    // Drains the driver and appends the codes reader id hasn't read yet to codes. Returns false if the driver call
+    // failed, the codes other readers drained before are appended either way.
+    bool read(int id, std::vector<int>& codes);
+
+  private:
+    PollFunction m_poll;
+    std::mutex m_mutex;
+    int m_next_id;
+    std::map<int, std::deque<int>> m_pending;
+};
+
+// Reads an ErrorQueue for as long as it exists.
+class ErrorQueueReader
+{
+  public:
+    explicit ErrorQueueReader(std::shared_ptr<ErrorQueue> queue);
+    ~ErrorQueueReader();
+
+    ErrorQueueReader(const ErrorQueueReader&) = delete;
+    ErrorQueueReader& operator=(const ErrorQueueReader&) = delete;
+
+    bool read(std::vector<int>& codes) { return m_queue->read(m_id, codes); }
+
+  private:
+    std::shared_ptr<ErrorQueue> m_queue;
+    int m_id;
+};
+
+// Per device handle registry of error queues.
+std::shared_ptr<ErrorQueue> error_queue_get(void* handle);
+void error_queue_set(void* handle, std::shared_ptr<ErrorQueue> queue);
+std::shared_ptr<ErrorQueue> error_queue_remove(void* handle);
+
+// Looks up the description of an error code with lookup, once per code. Descriptions never change so they are
+// kept for the lifetime of the process, failed lookups aren't kept.
+typedef std::function<bool(int, HealthError&)> ErrorInfoFunction;
+bool error_info_lookup(int code, HealthError& info, const ErrorInfoFunction& lookup);
+
+// Drains the device error queue on a native thread and reports the number of errors per code to each subscription
+// once per its interval. Callbacks run on the reporter's own thread.
+class ErrorReporter : public std::enable_shared_from_this<ErrorReporter>
+{
+  public:
+    // Drains the driver's error queue into codes, returns false on failure
+    typedef std::function<bool(std::vector<int>&)> PollFunction;
+    // (code, count) in the order the codes first occurred
+    typedef std::vector<std::pair<int, uint64_t>> Counts;
+    typedef std::function<void(const Counts&)> Callback;
+
+    explicit ErrorReporter(PollFunction poll);
+    ~ErrorReporter();
+
+    ErrorReporter(const ErrorReporter&) = delete;
+    ErrorReporter& operator=(const ErrorReporter&) = delete;
+
+    void start();
+    void stop();
+
+    // Callback runs every interval seconds in which errors occurred. Returns the id of the subscription.
+    int subscribe(double interval, Callback callback);
+    bool unsubscribe(int id);
+    bool empty();
+
+  private:
+    struct Subscription
+    {
+        int id;
+        std::chrono::duration<double> interval;
+        std::chrono::steady_clock::time_point due;
+        Counts counts;
+        Callback callback;
+    };
+
+    void run();
+
+    PollFunction m_poll;
+    std::thread m_thread;
+    std::mutex m_mutex;
+    std::condition_variable m_cv;
+    bool m_stop;
+    int m_next_id;
+    std::vector<std::shared_ptr<Subscription>> m_subscriptions;
+};
+
+// Per device handle registry of error reporters.
+std::shared_ptr<ErrorReporter> error_reporter_get(void* handle);
+void error_reporter_set(void* handle, std::shared_ptr<ErrorReporter> reporter);
+// Stops and removes the reporter for handle, if any.
+std::shared_ptr<ErrorReporter> error_reporter_remove(void* handle);
+
+// Per device handle registry of health monitors.
+std::shared_ptr<HealthMonitor> health_get(void* handle);
+void health_set(void* handle, std::shared_ptr<HealthMonitor> monitor);
+// Stops and removes the monitor for handle, if any.
+std::shared_ptr<HealthMonitor> health_remove(void* handle);
+
+#endif // _HEALTH_H_
@@ -0,0 +1,219 @@
+#ifndef _ISOTP_H_
+#define _ISOTP_H_
+
+#if (defined(_WIN32) || defined(__WIN32__))
+#ifndef USING_STUDIO_8
+#define USING_STUDIO_8 1
+#endif
+#include <icsnVC40.h>
+#else
+#include <icsnVC40.h>
+#endif
+
+#include "receive.h"
+
+#include <chrono>
+#include <condition_variable>
+#include <cstdint>
+#include <deque>
+#include <functional>
+#include <memory>
+#include <mutex>
+#include <string>
+#include <thread>
+#include <unordered_map>
+#include <vector>
+
+struct IsoTpConfig
+{
+    int network_id;
+    uint32_t tx_id;
+    uint32_t rx_id;
+    // 29 bit identifiers for tx_id and rx_id
+    bool extended_id;
+    // CAN FD frames of up to tx_dl bytes, classic CAN always uses 8
+    bool fd;
+    bool brs;
+    int tx_dl;
+    // Byte the frames are padded with, -1 sends frames only as long as needed
+    int padding;
+    // Extended addressing byte in front of every transmitted / received frame, -1 for normal addressing
+    int tx_address;
+    int rx_address;
+    // Block size and raw STmin byte asked for in the flow control frames we send
+    uint8_t block_size;
+    uint8_t st_min;
+    // N_Bs and N_Cr: longest wait for a flow control frame and between consecutive frames, in seconds
+    double timeout;
+    // Flow control WAIT frames accepted in a row before a transmit fails
+    int max_wait_frames;
+    // Longest message accepted, longer first frames are answered with an overflow flow control frame
+    uint32_t max_length;
+};
+
+enum IsoTpEvent
+{
+    ISOTP_RECEIVED,
+    ISOTP_SENT,
+    ISOTP_SEND_ERROR,
+    ISOTP_RECEIVE_ERROR,
+    // The session was closed along with the device, nothing follows
+    ISOTP_CLOSED,
+};
+
+// Returns true if length is a valid CAN FD data length (8, 12, 16, 20, 24, 32, 48 or 64) for TX_DL.
+bool isotp_valid_tx_dl(int length);
+// Returns true if value is a valid STmin byte: 0x00-0x7F milliseconds or 0xF1-0xF9 hundreds of microseconds.
+bool isotp_valid_st_min(int value);
+
+// ISO 15765-2 transport sessions on top of the raw CAN / CAN FD transmit and receive paths. Every session has its
+// own pair of identifiers and state; one engine thread per device paces consecutive frames and watches the
+// timeouts of all of them, received frames are fed in by the message dispatcher. Many sessions run concurrently
+// without a thread each.
+class IsoTpEngine : public std::enable_shared_from_this<IsoTpEngine>
+{
+  public:
+    // Transmit callback: (message, network id) -> success
+    typedef std::function<bool(icsSpyMessage*, int)> TxFunction;
+    // (event, reassembled message of ISOTP_RECEIVED, description of the errors)
+    typedef std::function<void(IsoTpEvent, std::vector<uint8_t>&, const std::string&)> Callback;
+
+    explicit IsoTpEngine(TxFunction tx);
+    ~IsoTpEngine();
+
+    IsoTpEngine(const IsoTpEngine&) = delete;
+    IsoTpEngine& operator=(const IsoTpEngine&) = delete;
+
+    void start();
+    void stop();
+
+    // Returns the id of the new session. Callbacks run on the engine or dispatcher thread, never with a lock held;
+    // ISOTP_SENT and ISOTP_SEND_ERROR always come from the engine thread, in the order of the transmits.
+    int open(const IsoTpConfig& config, Callback callback);
+    // Remembers the dispatcher subscription feeding the session, close() hands it back.
+    void set_subscription(int id, int subscription);
+    // Returns the subscription of the closed session, -1 if there is no session id.
+    int close(int id);
+    bool empty();
+    // Closes every session and reports ISOTP_CLOSED to it, after stop().
+    void close_all();
+
+    // Queues payload for transmission after the transmits queued before it. Returns false if there is no session id.
+    bool send(int id, std::vector<uint8_t> payload);
+    // Feeds frames received for session id, dropped frames abort a reception in progress.
+    void process(int id, std::vector<OwnedMessage>& frames, size_t dropped);
+
+  private:
+    typedef std::chrono::steady_clock clock;
+
+    enum TxState
+    {
+        TX_IDLE,
+        TX_WAIT_FLOW_CONTROL,
+        TX_SENDING,
+        // Refused by the receiver, reported by the engine thread like every other transmit event
+        TX_FAILED,
+    };
+
+    struct Session
+    {
+        int id;
+        int subscription;
+        IsoTpConfig config;
+        Callback callback;
+
+        std::deque<std::vector<uint8_t>> tx_queue;
+        TxState tx_state;
+        std::vector<uint8_t> tx_payload;
+        size_t tx_offset;
+        uint8_t tx_sequence;
+        // Consecutive frames left in the block, 0 sends all of them without waiting for flow control
+        int tx_block_remaining;
+        clock::duration tx_st_min;
+        int tx_wait_frames;
+        // Flow control timeout while waiting for one, time the next consecutive frame is due while sending
+        clock::time_point tx_deadline;
+        std::string tx_error;
+
+        bool rx_active;
+        std::vector<uint8_t> rx_payload;
+        size_t rx_length;
+        uint8_t rx_sequence;
+        int rx_block_remaining;
+        clock::time_point rx_deadline;
+    };
+
+    struct Event
+    {
+        std::shared_ptr<Session> session;
+        IsoTpEvent event;
+        std::vector<uint8_t> payload;
+        std::string error;
+    };
+
+    // A frame built with the lock held and transmitted after releasing it, the driver call can block
+    struct Transmit
+    {
+        std::shared_ptr<Session> session;
+        // Protocol bytes, see transmit()
+        std::vector<uint8_t> frame;
+        // Failing aborts the reception instead of the transmit, flow control frames
+        bool receive;
+        // Reported on failure, an empty error ignores the failure
+        std::string error;
+        // The last frame of the transmit, ISOTP_SENT is reported once it went out
+        bool last;
+        // tx_deadline set with the frame, moved to wait after the actual transmit if nothing changed it since
+        clock::time_point deadline;
+        clock::duration wait;
+        bool sent;
+        clock::time_point time;
+    };
+
+    void run();
+    // Expires timeouts, queues due consecutive frames and starts the next queued transmit. Returns when the session
+    // needs servicing again.
+    clock::time_point service(std::shared_ptr<Session>& session,
+                              clock::time_point now,
+                              std::vector<Transmit>& transmits,
+                              std::vector<Event>& events);
+    void start_transmit(std::shared_ptr<Session>& session, clock::time_point now, std::vector<Transmit>& transmits);
+    void send_consecutive_frames(std::shared_ptr<Session>& session, std::vector<Transmit>& transmits);
+    void receive_frame(std::shared_ptr<Session>& session,
+                       const uint8_t* data,
+                       size_t length,
+                       std::vector<Transmit>& transmits,
+                       std::vector<Event>& events);
+    void flow_control(Session& session, const uint8_t* data, size_t length);
+    void fail_transmit(std::shared_ptr<Session>& session, const std::string& error, std::vector<Event>& events);
+    void abort_receive(std::shared_ptr<Session>& session, const std::string& error, std::vector<Event>& events);
+    void queue_flow_control(std::shared_ptr<Session>& session,
+                            uint8_t status,
+                            const std::string& error,
+                            std::vector<Transmit>& transmits);
+    // Transmits the frames without the lock, then takes it to apply the outcome. Frames of a session after one
+    // that failed are dropped.
+    void flush(std::vector<Transmit>& transmits, std::vector<Event>& events);
+    // Transmits the protocol bytes in frame with the addressing byte and padding, returns false on failure. Only
+    // reads the configuration of the session, called without the lock.
+    bool transmit(const Session& session, const std::vector<uint8_t>& frame);
+    // Bytes of a frame after the addressing byte
+    size_t frame_capacity(const Session& session) const;
+    void dispatch(std::vector<Event>& events);
+
+    TxFunction m_tx;
+    std::thread m_thread;
+    std::mutex m_mutex;
+    std::condition_variable m_cv;
+    bool m_stop;
+    int m_next_id;
+    std::unordered_map<int, std::shared_ptr<Session>> m_sessions;
+};
+
+// Per device handle registry of ISO-TP engines.
+std::shared_ptr<IsoTpEngine> isotp_get(void* handle);
+void isotp_set(void* handle, std::shared_ptr<IsoTpEngine> engine);
+// Stops and removes the engine for handle, if any.
+std::shared_ptr<IsoTpEngine> isotp_remove(void* handle);
+
+#endif // _ISOTP_H_
@@ -14,7 +14,7 @@ extern "C"
     PyObject* meth_close_device(PyObject* self, PyObject* args);
     PyObject* meth_get_rtc(PyObject* self, PyObject* args);
     PyObject* meth_set_rtc(PyObject* self, PyObject* args);
-    PyObject* meth_coremini_load(PyObject* self, PyObject* args);
+    PyObject* meth_coremini_load(PyObject* self, PyObject* args, PyObject* keywords);
     PyObject* meth_coremini_start(PyObject* self, PyObject* args);
     PyObject* meth_coremini_stop(PyObject* self, PyObject* args);
     PyObject* meth_coremini_clear(PyObject* self, PyObject* args);
@@ -22,13 +22,13 @@ extern "C"
     PyObject* meth_transmit_messages(PyObject* self, PyObject* args);
     PyObject* meth_get_messages(PyObject* self, PyObject* args);
     PyObject* meth_get_script_status(PyObject* self, PyObject* args);
-    PyObject* meth_get_error_messages(PyObject* self, PyObject* args);
+    PyObject* meth_get_error_messages(PyObject* self, PyObject* args, PyObject* keywords);
 #ifdef _USE_INTERNAL_HEADER_
     PyObject* meth_flash_devices(PyObject* self, PyObject* args);
 #endif // _USE_INTERNAL_HEADER_
     PyObject* meth_set_reflash_callback(PyObject* self, PyObject* args);
-    PyObject* meth_get_device_settings(PyObject* self, PyObject* args);
-    PyObject* meth_set_device_settings(PyObject* self, PyObject* args);
+    PyObject* meth_get_device_settings(PyObject* self, PyObject* args, PyObject* keywords);
+    PyObject* meth_set_device_settings(PyObject* self, PyObject* args, PyObject* keywords);
     PyObject* meth_load_default_settings(PyObject* self, PyObject* args); // icsneoLoadDefaultSettings
     // PyObject* meth_spy_message_to_j1850(PyObject* self, PyObject* args);
     PyObject* meth_read_sdcard(PyObject* self, PyObject* args);
@@ -101,6 +101,41 @@ extern "C"
     PyObject* meth_flash_accessory_firmware(PyObject* self, PyObject* args);
     PyObject* meth_get_accessory_firmware_version(PyObject* self, PyObject* args);
     PyObject* meth_set_safe_boot_mode(PyObject* self, PyObject* args);
+    PyObject* meth_replay(PyObject* self, PyObject* args, PyObject* keywords);
+    PyObject* meth_replay_status(PyObject* self, PyObject* args);
+    PyObject* meth_replay_stop(PyObject* self, PyObject* args);
+    PyObject* meth_decode_signals(PyObject* self, PyObject* args);
+    PyObject* meth_enable_last_value_cache(PyObject* self, PyObject* args, PyObject* keywords);
+    PyObject* meth_disable_last_value_cache(PyObject* self, PyObject* args);
+    PyObject* meth_last_value(PyObject* self, PyObject* args);
+    PyObject* meth_last_value_snapshot(PyObject* self, PyObject* args);
+    PyObject* meth_on_message(PyObject* self, PyObject* args, PyObject* keywords);
+    PyObject* meth_remove_message_callback(PyObject* self, PyObject* args);
+    PyObject* meth_read_sdcard_into(PyObject* self, PyObject* args);
+    PyObject* meth_write_sdcard_from(PyObject* self, PyObject* args, PyObject* keywords);
+    PyObject* meth_coremini_read_app_signals(PyObject* self, PyObject* args);
+    PyObject* meth_coremini_write_app_signals(PyObject* self, PyObject* args);
+    PyObject* meth_coremini_read_tx_messages(PyObject* self, PyObject* args, PyObject* keywords);
+    PyObject* meth_coremini_read_rx_messages(PyObject* self, PyObject* args, PyObject* keywords);
+    PyObject* meth_coremini_write_tx_messages(PyObject* self, PyObject* args, PyObject* keywords);
+    PyObject* meth_coremini_write_rx_messages(PyObject* self, PyObject* args, PyObject* keywords);
+    PyObject* meth_start_health_monitor(PyObject* self, PyObject* args, PyObject* keywords);
+    PyObject* meth_stop_health_monitor(PyObject* self, PyObject* args);
+    PyObject* meth_health(PyObject* self, PyObject* args);
+    PyObject* meth_on_health(PyObject* self, PyObject* args, PyObject* keywords);
+    PyObject* meth_remove_health_callback(PyObject* self, PyObject* args);
+    PyObject* meth_enable_adaptive_receive(PyObject* self, PyObject* args, PyObject* keywords);
+    PyObject* meth_disable_adaptive_receive(PyObject* self, PyObject* args);
+    PyObject* meth_receive_stats(PyObject* self, PyObject* args);
+    PyObject* meth_on_error(PyObject* self, PyObject* args, PyObject* keywords);
+    PyObject* meth_remove_error_callback(PyObject* self, PyObject* args);
+    PyObject* meth_start_device_watcher(PyObject* self, PyObject* args, PyObject* keywords);
+    PyObject* meth_stop_device_watcher(PyObject* self, PyObject* args);
+    PyObject* meth_device_watcher_devices(PyObject* self, PyObject* args);
+    PyObject* meth_device_settings_stats(PyObject* self, PyObject* args);
+    PyObject* meth_isotp_open(PyObject* self, PyObject* args, PyObject* keywords);
+    PyObject* meth_isotp_send(PyObject* self, PyObject* args);
+    PyObject* meth_isotp_close(PyObject* self, PyObject* args);
 
 #ifdef _cplusplus
 }
@@ -142,6 +177,9 @@ extern "C"
                 "\t*New in 3.0 (803):*\n\n"                                                                            \
                 "\tdevice_types (List/Tuple): Accepts a Container of " MODULE_NAME ".NEODEVICE_* Macros\n\n"           \
                 "\tnetwork_id (int): OptionsFindNeoEx.CANOptions.iNetworkID. Usually ics.NETID_CAN, if needed\n\n"     \
+                "\tcached (bool): Return the devices found by the last scan of a running\n"                            \
+                "\t:class:`" MODULE_NAME ".DeviceWatcher` instead of searching, filtered by device_types.\n"           \
+                "\tSearches as usual when no watcher has completed a scan or network_id is given.\n\n"                 \
                 "\n"                                                                                                   \
                 "Raises:\n"                                                                                            \
                 "\t:class:`" MODULE_NAME ".RuntimeError`\n"                                                            \
@@ -263,16 +301,22 @@ extern "C"
                 "\t>>> ics.set_rtc(device)\n"
 
 #define _DOC_COREMINI_LOAD                                                                                             \
-    MODULE_NAME ".coremini_load(device, coremini, location)\n"                                                         \
+    MODULE_NAME ".coremini_load(device, coremini, location, skip_if_unchanged=False)\n"                                \
                 "\n"                                                                                                   \
                 "Loads the CoreMini into the device.\n"                                                                \
                 "\n"                                                                                                   \
+                "The hash of every script loaded is remembered per device and location, with skip_if_unchanged the\n"  \
+                "transfer is skipped when the same script was already loaded there. The record is dropped by\n"        \
+                MODULE_NAME ".coremini_clear(), reopening the device, firmware updates and SD card writes.\n"          \
+                "\n"                                                                                                   \
                 "Args:\n"                                                                                              \
                 "\tdevice (:class:` PyNeoDeviceEx" "`): :class:`" MODULE_NAME                 \
                 ".PyNeoDeviceEx`\n\n"                                                                     \
-                "\tcoremini (str/tuple): Use string to load from file, Use Tuple if file data.\n\n"                    \
+                "\tcoremini (str/bytes/tuple): Path of the file to load, memory mapped instead of copied. A\n"         \
+                "\tbytes-like object (bytes, bytearray, memoryview, mmap) or tuple of ints is file data.\n\n"          \
                 "\tlocation (int): Accepts :class:`" MODULE_NAME ".SCRIPT_LOCATION_FLASH_MEM`, :class:`" MODULE_NAME   \
                 ".SCRIPT_LOCATION_SDCARD`, or :class:`" MODULE_NAME ".SCRIPT_LOCATION_VCAN3_MEM`\n\n"                  \
+                "\tskip_if_unchanged (bool): Don't load the script if it is already loaded at location.\n\n"           \
                 "\n"                                                                                                   \
                 "Raises:\n"                                                                                            \
                 "\t:class:`" MODULE_NAME ".RuntimeError`\n"                                                            \
@@ -418,13 +462,15 @@ extern "C"
 
 //"Accepts a  PyNeoDeviceEx" ", exception on error. Returns a list of (error #, string)"
 #define _DOC_GET_ERROR_MESSAGES                                                                                        \
-    MODULE_NAME ".get_error_messages(device[, j1850, timeout])\n"                                                      \
+    MODULE_NAME ".get_error_messages(device, compact=False)\n"                                                         \
                 "\n"                                                                                                   \
-                "Gets the error message(s) on the device.\n"                                                           \
+                "Gets the error message(s) on the device. The descriptions of each error code are looked up\n"         \
+                "once and remembered.\n"                                                                               \
                 "\n"                                                                                                   \
                 "Args:\n"                                                                                              \
                 "\tdevice (:class:` PyNeoDeviceEx" "`): :class:`" MODULE_NAME                 \
                 ".PyNeoDeviceEx`\n\n"                                                                     \
+                "\tcompact (bool): Return the number of times each error occurred instead.\n\n"                        \
                 "\n"                                                                                                   \
                 "Raises:\n"                                                                                            \
                 "\t:class:`" MODULE_NAME ".RuntimeError`\n"                                                            \
@@ -432,6 +478,8 @@ extern "C"
                 "Returns:\n"                                                                                           \
                 "\t:class:`list` of :class:`tuple`s. :class:`tuple` contents: (error_number, description_short, "      \
                 "description_long, severity, restart_needed)\n"                                                        \
+                "\tWith compact, :class:`list` of (error_number, count) in the order the errors first\n"               \
+                "\toccurred.\n"                                                                                        \
                 "\n"                                                                                                   \
                 "\t>>> device = ics.open_device()\n"                                                                   \
                 "\t>>> errors = ics.get_error_messages(device)\n"
@@ -460,7 +508,7 @@ extern "C"
 
 #define _DOC_GET_DEVICE_SETTINGS                                                                                       \
     MODULE_NAME                                                                                                        \
-    ".get_device_settings(device, device_type, vnet_slot)\n"                                                           \
+    ".get_device_settings(device, device_type, vnet_slot, cached=False)\n"                                             \
     "\n"                                                                                                               \
     "Gets the settings in the device. vnet_slot defaults to " MODULE_NAME ".PlasmaIonVnetChannelMain\n"                \
     "\n"                                                                                                               \
@@ -470,6 +518,12 @@ extern "C"
     "\tdevice_type (EDeviceSettingsType): Optional: Overrides default device setings type. Defaults to '-1'\n\n"       \
     "\tvnet_slot (PlasmaIonVnetChannelMain): Optional: Defaults to PlasmaIonVnetChannelMain, Used only for "           \
     "PLASMA/ION Devices.\n\n"                                                                                          \
+    "\tcached (bool): Optional: Returns the snapshot of an earlier cached=True call instead of reading the "           \
+    "device again.\n"                                                                                                  \
+    "\tSnapshots are kept per serial number, firmware version and vnet_slot and are dropped by\n"                      \
+    "\t" MODULE_NAME ".set_device_settings(), " MODULE_NAME ".load_default_settings(), firmware updates and "          \
+    "reopening the device.\n"                                                                                          \
+    "\tEvery call returns its own full copy of the snapshot. Defaults to False.\n\n"                                   \
     "\n"                                                                                                               \
     "Raises:\n"                                                                                                        \
     "\t:class:`" MODULE_NAME ".RuntimeError`\n"                                                                        \
@@ -500,10 +554,15 @@ extern "C"
     "\t4\n"
 
 #define _DOC_SET_DEVICE_SETTINGS                                                                                       \
-    MODULE_NAME ".set_device_settings(device, settings, save_to_eeprom, vnet_slot)\n"                                  \
+    MODULE_NAME ".set_device_settings(device, settings, save_to_eeprom, vnet_slot, force=False)\n"                     \
                 "\n"                                                                                                   \
                 "Sets the settings in the device. vnet_slot defaults to " MODULE_NAME ".PlasmaIonVnetChannelMain\n"    \
                 "\n"                                                                                                   \
+                "The settings last read or written are remembered per device and vnet_slot. The write is skipped\n"    \
+                "when nothing changed, and settings already saved to EEPROM are applied without saving them again.\n"  \
+                "Reading the settings doesn't tell what is saved, so the first save after opening the device always\n" \
+                "writes EEPROM. Skipped writes are counted by " MODULE_NAME ".device_settings_stats().\n"              \
+                "\n"                                                                                                   \
                 "Args:\n"                                                                                              \
                 "\tdevice (:class:` PyNeoDeviceEx" "`): :class:`" MODULE_NAME                 \
                 ".PyNeoDeviceEx`\n\n"                                                                     \
@@ -512,6 +571,9 @@ extern "C"
                 "`): :class:`" MODULE_NAME "."                                                                         \
                 "device_settings"                                                                                      \
                 "`\n\n"                                                                                                \
+                "\tsave_to_eeprom (bool): Save the settings so they survive a power cycle.\n\n"                        \
+                "\tvnet_slot (int): " MODULE_NAME ".PlasmaIonVnetChannel* Macros\n\n"                                  \
+                "\tforce (bool): Always write, and save if save_to_eeprom is set.\n\n"                                 \
                 "\n"                                                                                                   \
                 "Raises:\n"                                                                                            \
                 "\t:class:`" MODULE_NAME ".RuntimeError`\n"                                                            \
@@ -1933,6 +1995,722 @@ extern "C"
                 "\tNone\n"                                                                                             \
                 "\n"
 
+#define _DOC_REPLAY                                                                                                    \
+    MODULE_NAME                                                                                                        \
+    ".replay(device, source, speed=1.0, loop=False, network_map=None, quantum=0.001, block=True)\n"                    \
+    "\n"                                                                                                               \
+    "Replays recorded messages on a native thread using their hardware timestamp deltas.\n"                            \
+    "Messages on the same network that are due within the same scheduling quantum are transmitted\n"                   \
+    "together in a single icsneoTxMessages() call.\n"                                                                  \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\tsource: A sequence of :class:`" MODULE_NAME "." SPY_MESSAGE_OBJECT_NAME "`, a buffer of packed icsSpyMessage\n" \
+    "\trecords or a path to a file of packed icsSpyMessage records. Packed records only carry the inline\n"            \
+    "\tData bytes, ExtraDataPtr is ignored.\n\n"                                                                       \
+    "\tspeed (:class:`float`): Playback rate multiplier, 2.0 replays twice as fast.\n\n"                               \
+    "\tloop (:class:`bool`): Replay the source continuously until " MODULE_NAME ".replay_stop() is called.\n\n"        \
+    "\tnetwork_map (:class:`dict`): Maps recorded network ids to transmit network ids. Mapping to None drops\n"        \
+    "\tthe network.\n\n"                                                                                               \
+    "\tquantum (:class:`float`): Scheduling quantum in seconds.\n\n"                                                   \
+    "\tblock (:class:`bool`): Wait for the replay to finish. If False, returns immediately and the replay can be\n"    \
+    "\tmonitored with " MODULE_NAME ".replay_status().\n\n"                                                            \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".ArgumentError`\n"                                                                       \
+    "\t:class:`" MODULE_NAME ".RuntimeError`\n"                                                                        \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\t:class:`dict` of replay statistics if block is True, otherwise None. mean_error and max_error are the\n"        \
+    "\tdifference between the scheduled and actual transmit time in seconds.\n"                                        \
+    "\n"                                                                                                               \
+    "\t>>> device = ics.open_device()\n"                                                                               \
+    "\t>>> ics.replay(device, \"capture.bin\", network_map={ics.NETID_HSCAN: ics.NETID_HSCAN2})\n"                     \
+    "\t{'running': False, 'frames': 51234, 'batches': 48002, 'loops': 1, 'tx_failures': 0, "                           \
+    "'mean_error': 4.1e-05, 'max_error': 0.00061}\n"
+
+#define _DOC_REPLAY_STATUS                                                                                             \
+    MODULE_NAME                                                                                                        \
+    ".replay_status(device)\n"                                                                                         \
+    "\n"                                                                                                               \
+    "Returns the statistics of the replay started with " MODULE_NAME ".replay(block=False).\n"                         \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".RuntimeError`\n"                                                                        \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\t:class:`dict` of replay statistics or None if there is no replay for the device.\n"
+
+#define _DOC_REPLAY_STOP                                                                                               \
+    MODULE_NAME                                                                                                        \
+    ".replay_stop(device)\n"                                                                                           \
+    "\n"                                                                                                               \
+    "Stops the replay running on the device. Closing the device also stops the replay.\n"                              \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".RuntimeError`\n"                                                                        \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tFinal :class:`dict` of replay statistics or None if there is no replay for the device.\n"
+
+#define _DOC_DECODE_SIGNALS                                                                                            \
+    MODULE_NAME                                                                                                        \
+    ".decode_signals(messages, table)\n"                                                                               \
+    "\n"                                                                                                               \
+    "Decodes every signal in a packed signal table over a batch of messages in a single pass.\n"                       \
+    "This is the native hot path behind :mod:`ics.decode`, use :class:`ics.decode.SignalDatabase` to build tables.\n"  \
+    "ExtraDataPtr payloads are read in place, decode before calling " MODULE_NAME ".get_messages() again.\n"           \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tmessages: Sequence of :class:`" MODULE_NAME "." SPY_MESSAGE_OBJECT_NAME "`\n\n"                                 \
+    "\ttable (:class:`bytes`): Packed signal table sorted by arbitration id.\n\n"                                      \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".ArgumentError`\n"                                                                       \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\t:class:`tuple` with a (rows, values) pair of :class:`bytearray` per table entry. rows holds uint32 message\n"   \
+    "\tindices and values holds float64 scaled signal values.\n"
+
+#define _DOC_ENABLE_LAST_VALUE_CACHE                                                                                   \
+    MODULE_NAME                                                                                                        \
+    ".enable_last_value_cache(device, ids=None)\n"                                                                     \
+    "\n"                                                                                                               \
+    "Keeps the most recent frame of every (network id, arbitration id) pair received by the device. Frames are\n"      \
+    "received on a native thread so the cache stays current without calling " MODULE_NAME ".get_messages().\n"         \
+    "While the cache is enabled " MODULE_NAME ".get_messages() keeps returning every received frame.\n"                \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\tids: Optional list of (network id, arbitration id) tuples to track. Every frame is tracked if None.\n\n"        \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".RuntimeError`\n"                                                                        \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tNone.\n"                                                                                                        \
+    "\n"                                                                                                               \
+    "\t>>> device.enable_last_value_cache([(ics.NETID_HSCAN, 0x100)])\n"                                               \
+    "\t>>> msg, count, timestamp, rate = device.last_value(ics.NETID_HSCAN, 0x100)\n"
+
+#define _DOC_DISABLE_LAST_VALUE_CACHE                                                                                  \
+    MODULE_NAME                                                                                                        \
+    ".disable_last_value_cache(device)\n"                                                                              \
+    "\n"                                                                                                               \
+    "Stops tracking frames enabled by " MODULE_NAME ".enable_last_value_cache().\n"                                    \
+    "Closing the device also disables it.\n"                                                                           \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".RuntimeError`\n"                                                                        \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tNone.\n"
+
+#define _DOC_LAST_VALUE                                                                                                \
+    MODULE_NAME                                                                                                        \
+    ".last_value(device, netid, arbid)\n"                                                                              \
+    "\n"                                                                                                               \
+    "Returns the most recent frame received for an arbitration id, see " MODULE_NAME ".enable_last_value_cache().\n"   \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\tnetid (int): Network id of the frame.\n\n"                                                                      \
+    "\tarbid (int): Arbitration id of the frame.\n\n"                                                                  \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".RuntimeError`\n"                                                                        \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\t(:class:`" MODULE_NAME "." SPY_MESSAGE_OBJECT_NAME "`, count, timestamp, rate) or None if the frame\n"          \
+    "\thasn't been received yet. count is the number of frames received, timestamp is the hardware timestamp of\n"     \
+    "\tthe last frame in seconds and rate is the smoothed receive rate in frames per second.\n"
+
+#define _DOC_LAST_VALUE_SNAPSHOT                                                                                       \
+    MODULE_NAME                                                                                                        \
+    ".last_value_snapshot(device)\n"                                                                                   \
+    "\n"                                                                                                               \
+    "Returns every frame in the last value cache at once, see " MODULE_NAME ".last_value().\n"                         \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".RuntimeError`\n"                                                                        \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\t:class:`dict` mapping (netid, arbid) to (:class:`" MODULE_NAME "." SPY_MESSAGE_OBJECT_NAME "`, count,\n"        \
+    "\ttimestamp, rate).\n"
+
+#define _DOC_ON_MESSAGE                                                                                                \
+    MODULE_NAME                                                                                                        \
+    ".on_message(device, callback, netid=None, arbid=None, mask=None)\n"                                               \
+    "\n"                                                                                                               \
+    "Registers a callback for received frames. Frames are matched natively as they are received and the callback\n"    \
+    "is called once per receive batch with a :class:`list` of the matching frames, from a dispatch thread.\n"          \
+    "Every received frame, matched or not, is still returned by " MODULE_NAME ".get_messages().\n"                     \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\tcallback: Callable taking a :class:`list` of :class:`" MODULE_NAME "." SPY_MESSAGE_OBJECT_NAME "`.\n\n"         \
+    "\tnetid (int): Network id to match, every network if None.\n\n"                                                   \
+    "\tarbid (int): Arbitration id to match, every arbitration id if None.\n\n"                                       \
+    "\tmask (int): Only compare the arbitration id bits set in mask. Defaults to every bit when arbid is given.\n\n"   \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".RuntimeError`\n"                                                                        \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tSubscription id (int) for " MODULE_NAME ".remove_message_callback().\n"                                         \
+    "\n"                                                                                                               \
+    "\t>>> def on_speed(messages):\n"                                                                                  \
+    "\t...     print(messages[-1].Data)\n"                                                                             \
+    "\t...\n"                                                                                                          \
+    "\t>>> device.on_message(on_speed, ics.NETID_HSCAN, 0x100)\n"
+
+#define _DOC_REMOVE_MESSAGE_CALLBACK                                                                                   \
+    MODULE_NAME                                                                                                        \
+    ".remove_message_callback(device, id)\n"                                                                           \
+    "\n"                                                                                                               \
+    "Removes a callback registered with " MODULE_NAME ".on_message(). Closing the device removes every callback.\n"    \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\tid (int): Subscription id returned by " MODULE_NAME ".on_message().\n\n"                                        \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".RuntimeError`\n"                                                                        \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tTrue if the callback was removed, False if it wasn't registered.\n"
+
+#define _DOC_READ_SDCARD_INTO                                                                                          \
+    MODULE_NAME                                                                                                        \
+    ".read_sdcard_into(device, start_sector, buffer)\n"                                                                \
+    "\n"                                                                                                               \
+    "Reads consecutive SD card sectors straight into a writable buffer such as a :class:`bytearray`,\n"                \
+    ":class:`mmap.mmap` or numpy array. The whole transfer runs without the GIL. See\n"                                \
+    ":class:`ics.sdcard.SDCardReader` for a file-like object.\n"                                                       \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\tstart_sector (int): Index of the first sector to read.\n\n"                                                     \
+    "\tbuffer: Writable contiguous buffer, filled from the start. A partial last sector is truncated to fit.\n\n"      \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".RuntimeError`\n"                                                                        \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tNumber of bytes read into buffer.\n"                                                                            \
+    "\n"                                                                                                               \
+    "\t>>> data = bytearray(512 * 2048)\n"                                                                             \
+    "\t>>> ics.read_sdcard_into(device, 0, data)\n"                                                                    \
+    "\t1048576\n"
+
+#define _DOC_WRITE_SDCARD_FROM                                                                                         \
+    MODULE_NAME                                                                                                        \
+    ".write_sdcard_from(device, start_sector, buffer, progress=None, granularity=1048576, verify=False)\n"             \
+    "\n"                                                                                                               \
+    "Writes any contiguous buffer (bytes, :class:`mmap.mmap`, memoryview, numpy array) to consecutive SD card\n"       \
+    "sectors. The transfer runs without the GIL, only progress callbacks take it. A partial last sector keeps the\n"   \
+    "rest of its existing contents.\n"                                                                                 \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\tstart_sector (int): Index of the first sector to write.\n\n"                                                    \
+    "\tbuffer: Contiguous buffer to write.\n\n"                                                                        \
+    "\tprogress: Optional callable taking (bytes_written, total_bytes). Raising from it aborts the write.\n\n"         \
+    "\tgranularity (int): Bytes written between progress calls, at least one sector.\n\n"                              \
+    "\tverify (bool): Read back every sector after writing it and compare.\n\n"                                        \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".RuntimeError`\n"                                                                        \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tNumber of bytes written.\n"                                                                                     \
+    "\n"                                                                                                               \
+    "\t>>> with open(\"logger.img\", \"rb\") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as image:\n"      \
+    "\t...     ics.write_sdcard_from(device, 0, image, progress=lambda done, total: print(done, total))\n"
+
+#define _DOC_COREMINI_READ_APP_SIGNALS                                                                                 \
+    MODULE_NAME                                                                                                        \
+    ".coremini_read_app_signals(device, indices)\n"                                                                    \
+    "\n"                                                                                                               \
+    "Gets the values of many Coremini application signals in a single call. Unlike\n"                                  \
+    MODULE_NAME ".coremini_read_app_signal() a failed read doesn't raise, check the success flags instead.\n"          \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\tindices: Sequence of application signal indices.\n\n"                                                           \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".RuntimeError`\n"                                                                        \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tTuple of (values, success) lists in the order of indices. Failed reads have a value of NaN.\n"                  \
+    "\n"                                                                                                               \
+    "\t>>> values, success = ics.coremini_read_app_signals(device, range(200))\n"
+
+#define _DOC_COREMINI_WRITE_APP_SIGNALS                                                                                \
+    MODULE_NAME                                                                                                        \
+    ".coremini_write_app_signals(device, mapping)\n"                                                                   \
+    "\n"                                                                                                               \
+    "Sets the values of many Coremini application signals in a single call. Unlike\n"                                  \
+    MODULE_NAME ".coremini_write_app_signal() a failed write doesn't raise, check the success flags instead.\n"        \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\tmapping: :class:`dict` of index: value or a sequence of (index, value) pairs.\n\n"                              \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".RuntimeError`\n"                                                                        \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\t:class:`dict` of index: success.\n"                                                                             \
+    "\n"                                                                                                               \
+    "\t>>> ics.coremini_write_app_signals(device, {1: 5.0, 2: 10.5})\n"                                                \
+    "\t{1: True, 2: True}\n"
+
+#define _DOC_COREMINI_READ_TX_MESSAGES                                                                                 \
+    MODULE_NAME                                                                                                        \
+    ".coremini_read_tx_messages(device, start, count, j1850=False)\n"                                                  \
+    "\n"                                                                                                               \
+    "Gets the Coremini transmit messages at indices `start` to `start + count - 1` in a single call.\n"                \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\tstart (int): Index of the first message.\n\n"                                                                   \
+    "\tcount (int): Number of messages.\n\n"                                                                           \
+    "\tj1850 (bool): Use :class:`" MODULE_NAME "." SPY_MESSAGE_J1850_OBJECT_NAME "` instead.\n\n"                      \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".RuntimeError` Naming the index that failed.\n"                                          \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tList of :class:`" MODULE_NAME "." SPY_MESSAGE_OBJECT_NAME "`.\n"                                                \
+    "\n"                                                                                                               \
+    "\t>>> messages = ics.coremini_read_tx_messages(device, 0, 64)\n"
+
+#define _DOC_COREMINI_READ_RX_MESSAGES                                                                                 \
+    MODULE_NAME                                                                                                        \
+    ".coremini_read_rx_messages(device, start, count, j1850=False)\n"                                                  \
+    "\n"                                                                                                               \
+    "Gets the Coremini receive messages and their masks at indices `start` to `start + count - 1` in a single call.\n" \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\tstart (int): Index of the first message.\n\n"                                                                   \
+    "\tcount (int): Number of messages.\n\n"                                                                           \
+    "\tj1850 (bool): Use :class:`" MODULE_NAME "." SPY_MESSAGE_J1850_OBJECT_NAME "` instead.\n\n"                      \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".RuntimeError` Naming the index that failed.\n"                                          \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tList of (message, mask) tuples of :class:`" MODULE_NAME "." SPY_MESSAGE_OBJECT_NAME "`.\n"                      \
+    "\n"                                                                                                               \
+    "\t>>> for msg, mask in ics.coremini_read_rx_messages(device, 0, 64):\n"                                           \
+    "\t...     print(hex(msg.ArbIDOrHeader), hex(mask.ArbIDOrHeader))\n"
+
+#define _DOC_COREMINI_WRITE_TX_MESSAGES                                                                                \
+    MODULE_NAME                                                                                                        \
+    ".coremini_write_tx_messages(device, start, messages, j1850=False, diff=False)\n"                                  \
+    "\n"                                                                                                               \
+    "Sets the Coremini transmit messages starting at index `start` in a single call.\n"                                \
+    "\n"                                                                                                               \
+    "With diff, entries whose content is known to be unchanged are skipped. The content is known after\n"              \
+    "reading or writing the entries with the bulk functions, and forgotten when the script changes.\n"                 \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\tstart (int): Index of the first message.\n\n"                                                                   \
+    "\tmessages: Sequence of :class:`" MODULE_NAME "." SPY_MESSAGE_OBJECT_NAME "`.\n\n"                                \
+    "\tj1850 (bool): Use :class:`" MODULE_NAME "." SPY_MESSAGE_J1850_OBJECT_NAME "` instead.\n\n"                      \
+    "\tdiff (bool): Only write the entries that changed.\n\n"                                                          \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".RuntimeError` Naming the index that failed.\n"                                          \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tNumber of messages written.\n"                                                                                  \
+    "\n"                                                                                                               \
+    "\t>>> messages = ics.coremini_read_tx_messages(device, 0, 64)\n"                                                  \
+    "\t>>> messages[3].Data = (1, 2, 3)\n"                                                                             \
+    "\t>>> ics.coremini_write_tx_messages(device, 0, messages, diff=True)\n"                                           \
+    "\t1\n"
+
+#define _DOC_COREMINI_WRITE_RX_MESSAGES                                                                                \
+    MODULE_NAME                                                                                                        \
+    ".coremini_write_rx_messages(device, start, messages, j1850=False, diff=False)\n"                                  \
+    "\n"                                                                                                               \
+    "Sets the Coremini receive messages starting at index `start` in a single call. See\n"                             \
+    MODULE_NAME ".coremini_write_tx_messages() for diff.\n"                                                            \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\tstart (int): Index of the first message.\n\n"                                                                   \
+    "\tmessages: Sequence of (message, mask) tuples or messages without a mask.\n\n"                                   \
+    "\tj1850 (bool): Use :class:`" MODULE_NAME "." SPY_MESSAGE_J1850_OBJECT_NAME "` instead.\n\n"                      \
+    "\tdiff (bool): Only write the entries that changed.\n\n"                                                          \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".RuntimeError` Naming the index that failed.\n"                                          \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tNumber of messages written.\n"                                                                                  \
+    "\n"                                                                                                               \
+    "\t>>> ics.coremini_write_rx_messages(device, 0, ics.coremini_read_rx_messages(other_device, 0, 64))\n"            \
+    "\t64\n"
+
+#define _DOC_START_HEALTH_MONITOR                                                                                      \
+    MODULE_NAME                                                                                                        \
+    ".start_health_monitor(device, period=1.0, "                                                                       \
+    "items=(\"status\", \"bus_voltage\", \"performance\", \"gptp\", \"errors\"))\n"                                    \
+    "\n"                                                                                                               \
+    "Starts polling the health of the device on a background thread, without the GIL. The latest results are\n"        \
+    "returned instantly by " MODULE_NAME ".health(). Starting the monitor again replaces the running one.\n"           \
+    "\n"                                                                                                               \
+    "Polled errors are still returned by " MODULE_NAME ".get_error_messages(), the error queue of the driver is\n"     \
+    "shared with it and with " MODULE_NAME ".on_error().\n"                                                            \
+    "Polling \"bus_voltage\" requires " MODULE_NAME ".enable_bus_voltage_monitor().\n"                                 \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\tperiod (float): Seconds between polls.\n\n"                                                                     \
+    "\titems: Sequence of \"status\", \"bus_voltage\", \"performance\", \"gptp\" and \"errors\".\n\n"                  \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".RuntimeError`\n"                                                                        \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tNone.\n"                                                                                                        \
+    "\n"                                                                                                               \
+    "\t>>> ics.start_health_monitor(device, 0.5, items=(\"performance\", \"errors\"))\n"
+
+#define _DOC_STOP_HEALTH_MONITOR                                                                                       \
+    MODULE_NAME                                                                                                        \
+    ".stop_health_monitor(device)\n"                                                                                   \
+    "\n"                                                                                                               \
+    "Stops the health monitor of the device and removes its callbacks.\n"                                              \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tTrue if a monitor was running.\n"
+
+#define _DOC_HEALTH                                                                                                    \
+    MODULE_NAME                                                                                                        \
+    ".health(device)\n"                                                                                                \
+    "\n"                                                                                                               \
+    "Gets the latest results of the health monitor, see " MODULE_NAME ".start_health_monitor().\n"                     \
+    "Items that aren't monitored or failed to read on the last poll are None.\n"                                       \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tNone if the monitor isn't running, otherwise a :class:`dict` of:\n\n"                                           \
+    "\t\tpolls (int): Number of polls so far.\n\n"                                                                     \
+    "\t\ttimestamp (float): Time of the last poll, comparable to :func:`time.time`.\n\n"                               \
+    "\t\tstatus: :class:`" MODULE_NAME ".structures.ics_device_status.ics_device_status`.\n\n"                         \
+    "\t\tbus_voltage (int): Millivolts.\n\n"                                                                           \
+    "\t\tperformance (tuple): Same as " MODULE_NAME ".get_performance_parameters().\n\n"                               \
+    "\t\tgptp: :class:`" MODULE_NAME ".structures.gptp_status.gptp_status`.\n\n"                                       \
+    "\t\terrors (list): The most recent errors, same as " MODULE_NAME ".get_error_messages().\n\n"                     \
+    "\t\terror_count (int): Number of errors since the monitor started.\n"                                             \
+    "\n"                                                                                                               \
+    "\t>>> buffer_count, buffer_max, overflow_count, *_ = ics.health(device)[\"performance\"]\n"
+
+#define _DOC_ON_HEALTH                                                                                                 \
+    MODULE_NAME                                                                                                        \
+    ".on_health(device, field, callback, threshold=None, below=False)\n"                                               \
+    "\n"                                                                                                               \
+    "Calls callback(field, value, previous) on the health monitor thread when a monitored value changes.\n"            \
+    "Without a threshold the callback runs every time the value increases. With a threshold it runs once each\n"       \
+    "time the value crosses above it, or below it when below is True.\n"                                               \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\tfield (str): \"bus_voltage\", \"buffer_count\", \"buffer_max\", \"overflow_count\" or \"error_count\".\n\n"     \
+    "\tcallback: Callable taking the field name, the new value and the previous value.\n\n"                            \
+    "\tthreshold (float): Value to watch for, None for every increase.\n\n"                                            \
+    "\tbelow (bool): Watch for the value dropping below threshold instead.\n\n"                                        \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".RuntimeError` If the health monitor isn't running.\n"                                   \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tId of the callback, for " MODULE_NAME ".remove_health_callback().\n"                                            \
+    "\n"                                                                                                               \
+    "\t>>> ics.on_health(device, \"overflow_count\", lambda field, value, previous: print(\"Overflow!\"))\n"           \
+    "\t>>> ics.on_health(device, \"bus_voltage\", lambda *args: print(args), threshold=11000, below=True)\n"
+
+#define _DOC_REMOVE_HEALTH_CALLBACK                                                                                    \
+    MODULE_NAME                                                                                                        \
+    ".remove_health_callback(device, id)\n"                                                                            \
+    "\n"                                                                                                               \
+    "Removes a callback added by " MODULE_NAME ".on_health().\n"                                                       \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\tid (int): Id returned by " MODULE_NAME ".on_health().\n\n"                                                      \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tTrue if the callback was removed.\n"
+
+#define _DOC_ENABLE_ADAPTIVE_RECEIVE                                                                                   \
+    MODULE_NAME                                                                                                        \
+    ".enable_adaptive_receive(device, target_latency=0.01, cpu_budget=None, on_overflow=None)\n"                       \
+    "\n"                                                                                                               \
+    "Receives on a background thread that sizes its batches and the time between drains from the occupancy of\n"       \
+    "the driver buffer, " MODULE_NAME ".get_messages() then returns the frames it received. Frames are left to\n"      \
+    "accumulate in the driver for up to target_latency, or long enough to stay within cpu_budget, and the buffer\n"    \
+    "is drained right away when it fills up. An idle bus doesn't use any CPU.\n"                                       \
+    "\n"                                                                                                               \
+    "Overflows of the driver buffer are passed to on_overflow(lost, total) in the main thread as they are\n"           \
+    "detected. Without a callback " MODULE_NAME ".get_messages() issues a :class:`RuntimeWarning` instead.\n"          \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\ttarget_latency (float): Longest time in seconds a frame may wait in the driver.\n\n"                            \
+    "\tcpu_budget (float): Fraction of a core to spend draining, replaces target_latency.\n\n"                         \
+    "\ton_overflow: Callable taking the frames lost in the overflow and in total.\n\n"                                 \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".RuntimeError`\n"                                                                        \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tNone.\n"                                                                                                        \
+    "\n"                                                                                                               \
+    "\t>>> ics.enable_adaptive_receive(device, target_latency=0.005, on_overflow=lambda lost, total: print(lost))\n"   \
+    "\t>>> messages, errors = ics.get_messages(device)\n"
+
+#define _DOC_DISABLE_ADAPTIVE_RECEIVE                                                                                  \
+    MODULE_NAME                                                                                                        \
+    ".disable_adaptive_receive(device)\n"                                                                              \
+    "\n"                                                                                                               \
+    "Goes back to draining the driver as soon as frames arrive, see " MODULE_NAME ".enable_adaptive_receive().\n"      \
+    "The background thread stops unless another consumer such as " MODULE_NAME ".on_message() still needs it.\n"      \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tNone.\n"
+
+#define _DOC_RECEIVE_STATS                                                                                             \
+    MODULE_NAME                                                                                                        \
+    ".receive_stats(device)\n"                                                                                         \
+    "\n"                                                                                                               \
+    "Gets the statistics of the background receive thread, see " MODULE_NAME ".enable_adaptive_receive().\n"           \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tNone if nothing is receiving in the background, otherwise a :class:`dict` of:\n\n"                              \
+    "\t\tadaptive (bool): Whether adaptive receive is enabled.\n\n"                                                    \
+    "\t\tdrains (int): Number of times frames were drained from the driver.\n\n"                                       \
+    "\t\tframes (int): Number of frames received.\n\n"                                                                 \
+    "\t\tpeak_occupancy (float): Largest fraction of the driver buffer drained at once.\n\n"                           \
+    "\t\tinterval (float): Current wait between drains in seconds.\n\n"                                                \
+    "\t\toverflows (int): Frames the driver lost to overflows.\n\n"                                                    \
+    "\t\toverflow_events (int): Number of separate overflows.\n"
+
+#define _DOC_ON_ERROR                                                                                                  \
+    MODULE_NAME                                                                                                        \
+    ".on_error(device, callback, interval=1.0)\n"                                                                      \
+    "\n"                                                                                                               \
+    "Calls callback(counts) on a background thread once per interval in which errors occurred. counts is\n"            \
+    "the same as " MODULE_NAME ".get_error_messages(device, compact=True), the descriptions of an error code\n"        \
+    "are returned by " MODULE_NAME ".get_error_messages().\n"                                                          \
+    "\n"                                                                                                               \
+    "The errors reported are still returned by " MODULE_NAME ".get_error_messages(), the error queue of the\n"         \
+    "device is shared with it and with " MODULE_NAME ".start_health_monitor().\n"                                      \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\tcallback: Callable taking a :class:`list` of (error_number, count).\n\n"                                        \
+    "\tinterval (float): Seconds between reports.\n\n"                                                                 \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".RuntimeError`\n"                                                                        \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tId of the callback, for " MODULE_NAME ".remove_error_callback().\n"                                             \
+    "\n"                                                                                                               \
+    "\t>>> ics.on_error(device, lambda counts: print(counts), interval=5)\n"
+
+#define _DOC_REMOVE_ERROR_CALLBACK                                                                                     \
+    MODULE_NAME                                                                                                        \
+    ".remove_error_callback(device, id)\n"                                                                             \
+    "\n"                                                                                                               \
+    "Removes a callback added by " MODULE_NAME ".on_error().\n"                                                        \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\tid (int): Id returned by " MODULE_NAME ".on_error().\n\n"                                                       \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tTrue if the callback was removed.\n"
+
+#define _DOC_START_DEVICE_WATCHER                                                                                      \
+    MODULE_NAME                                                                                                        \
+    ".start_device_watcher(interval=1.0, callback=None)\n"                                                             \
+    "\n"                                                                                                               \
+    "Starts enumerating devices every interval seconds on a background thread. The devices found are kept\n"           \
+    "by serial number for " MODULE_NAME ".find_devices(cached=True) and " MODULE_NAME ".device_watcher_devices().\n"   \
+    "Usually used through :class:`" MODULE_NAME ".DeviceWatcher`.\n"                                                   \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tinterval (float): Seconds between scans.\n\n"                                                                   \
+    "\tcallback: Callable taking (added, removed), tuples of :class:`" MODULE_NAME ".PyNeoDeviceEx`. Runs on\n"        \
+    "\tthe background thread after every scan that changed the devices, the first scan reports every\n"                \
+    "\tconnected device as added.\n\n"                                                                                 \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".RuntimeError`\n"                                                                        \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tId of the watcher, for " MODULE_NAME ".stop_device_watcher().\n"
+
+#define _DOC_STOP_DEVICE_WATCHER                                                                                       \
+    MODULE_NAME                                                                                                        \
+    ".stop_device_watcher(id)\n"                                                                                       \
+    "\n"                                                                                                               \
+    "Stops a watcher started by " MODULE_NAME ".start_device_watcher(), waiting for a scan in progress.\n"             \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tid (int): Id returned by " MODULE_NAME ".start_device_watcher().\n\n"                                           \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tTrue if the watcher was stopped.\n"
+
+#define _DOC_DEVICE_WATCHER_DEVICES                                                                                    \
+    MODULE_NAME                                                                                                        \
+    ".device_watcher_devices(id)\n"                                                                                    \
+    "\n"                                                                                                               \
+    "Returns the devices found by the last scan of a watcher without searching.\n"                                     \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tid (int): Id returned by " MODULE_NAME ".start_device_watcher().\n\n"                                           \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".ArgumentError`\n"                                                                       \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tTuple of :class:`" MODULE_NAME ".PyNeoDeviceEx`, None before the first scan completed.\n"
+
+#define _DOC_DEVICE_SETTINGS_STATS                                                                                     \
+    MODULE_NAME                                                                                                        \
+    ".device_settings_stats(device)\n"                                                                                 \
+    "\n"                                                                                                               \
+    "Counts the calls to " MODULE_NAME ".set_device_settings() and " MODULE_NAME ".get_device_settings(cached=True) "  \
+    "since the device was opened.\n"                                                                                   \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tDict of writes (calls that reached the device), skipped (calls that changed nothing), eeprom_writes,\n"         \
+    "\teeprom_skipped (saves requested but not needed), cache_hits and cache_misses (cached reads that did or "        \
+    "didn't find a snapshot).\n"                                                                                       \
+    "\n"                                                                                                               \
+    "\t>>> ics.device_settings_stats(device)\n"                                                                        \
+    "\t{'writes': 1, 'skipped': 3, 'eeprom_writes': 1, 'eeprom_skipped': 3, 'cache_hits': 12, 'cache_misses': 1}\n"
+
+#define _DOC_ISOTP_OPEN                                                                                                \
+    MODULE_NAME                                                                                                        \
+    ".isotp_open(device, callback, netid, tx_id, rx_id, extended_id=None, fd=False, brs=True, tx_dl=None,\n"           \
+    "           padding=None, tx_address=None, rx_address=None, block_size=0, st_min=0, timeout=1.0,\n"                \
+    "           max_wait_frames=10, max_length=0xFFFFFFFF)\n"                                                          \
+    "\n"                                                                                                               \
+    "Opens an ISO 15765-2 (ISO-TP) session on top of the raw CAN / CAN FD frames. Segmentation, flow control,\n"      \
+    "STmin, block size and padding are handled natively on background threads, one for every device however many\n"   \
+    "sessions are open. Messages are reassembled natively and handed to callback whole, from a background thread.\n"  \
+    ":class:`" MODULE_NAME ".isotp.IsoTpSession` wraps a session for asyncio.\n"                                       \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\tcallback: Callable taking (event, value): ('received', bytes), ('sent', None), ('send_error', str),\n"          \
+    "\t('receive_error', str), and ('closed', None) to every session of a device that is closed. Every\n"              \
+    "\t" MODULE_NAME ".isotp_send() ends with either sent or send_error, in order, unless the session is closed.\n\n"  \
+    "\tnetid (int): Network id of the session.\n\n"                                                                    \
+    "\ttx_id (int): Arbitration id of the frames we transmit.\n\n"                                                     \
+    "\trx_id (int): Arbitration id of the frames we receive.\n\n"                                                      \
+    "\textended_id (bool): 29 bit identifiers, defaults to True if tx_id or rx_id doesn't fit in 11 bits.\n\n"         \
+    "\tfd (bool): Transmit CAN FD frames.\n\n"                                                                         \
+    "\tbrs (bool): Switch the bit rate of the CAN FD frames.\n\n"                                                      \
+    "\ttx_dl (int): Longest frame transmitted, 8 to 64. Defaults to 64 for CAN FD and 8 for classic CAN.\n\n"          \
+    "\tpadding (int): Byte to pad every frame to 8 bytes (or the next CAN FD length) with, None to not pad.\n\n"       \
+    "\ttx_address (int): Extended addressing byte of the frames we transmit, None for normal addressing.\n\n"          \
+    "\trx_address (int): Extended addressing byte of the frames we receive, None for normal addressing.\n\n"           \
+    "\tblock_size (int): Consecutive frames the sender may send before waiting for our next flow control frame,\n"     \
+    "\t0 for all of them.\n\n"                                                                                         \
+    "\tst_min (int): STmin byte of our flow control frames, 0x00-0x7F ms or 0xF1-0xF9 for 100-900 us.\n\n"             \
+    "\ttimeout (float): Seconds to wait for a flow control frame or the next consecutive frame.\n\n"                   \
+    "\tmax_wait_frames (int): Flow control WAIT frames accepted in a row before a transmit fails.\n\n"                 \
+    "\tmax_length (int): Longest message accepted, longer ones are refused with an overflow flow control frame.\n\n"   \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".ArgumentError`\n"                                                                       \
+    "\t:class:`" MODULE_NAME ".RuntimeError`\n"                                                                        \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tSession id (int) for " MODULE_NAME ".isotp_send() and " MODULE_NAME ".isotp_close().\n"                         \
+    "\n"                                                                                                               \
+    "\t>>> def on_event(event, value):\n"                                                                              \
+    "\t...     print(event, value)\n"                                                                                  \
+    "\t...\n"                                                                                                          \
+    "\t>>> session = ics.isotp_open(device, on_event, ics.NETID_HSCAN, 0x7E0, 0x7E8, padding=0xCC)\n"                  \
+    "\t>>> ics.isotp_send(device, session, bytes((0x22, 0xF1, 0x90)))\n"                                               \
+    "\tTrue\n"                                                                                                         \
+    "\tsent None\n"                                                                                                    \
+    "\treceived b'b\\xf1\\x90...'\n"
+
+#define _DOC_ISOTP_SEND                                                                                                \
+    MODULE_NAME                                                                                                        \
+    ".isotp_send(device, session, payload)\n"                                                                          \
+    "\n"                                                                                                               \
+    "Queues payload for transmission on an ISO-TP session, after the messages queued before it. The callback of\n"     \
+    "the session is told when the transmit finished or failed.\n"                                                      \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\tsession (int): Session id returned by " MODULE_NAME ".isotp_open().\n\n"                                        \
+    "\tpayload (bytes): Message to transmit, any object supporting the buffer protocol.\n\n"                           \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".ArgumentError`\n"                                                                       \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tTrue if the message was queued, False if the session isn't open.\n"
+
+#define _DOC_ISOTP_CLOSE                                                                                               \
+    MODULE_NAME                                                                                                        \
+    ".isotp_close(device, session)\n"                                                                                  \
+    "\n"                                                                                                               \
+    "Closes an ISO-TP session, messages still queued are discarded. Closing the device closes every session.\n"        \
+    "\n"                                                                                                               \
+    "Args:\n"                                                                                                          \
+    "\tdevice (:class:`" MODULE_NAME ".PyNeoDeviceEx`): :class:`" MODULE_NAME ".PyNeoDeviceEx`\n\n"                    \
+    "\tsession (int): Session id returned by " MODULE_NAME ".isotp_open().\n\n"                                        \
+    "\n"                                                                                                               \
+    "Raises:\n"                                                                                                        \
+    "\t:class:`" MODULE_NAME ".RuntimeError`\n"                                                                        \
+    "\n"                                                                                                               \
+    "Returns:\n"                                                                                                       \
+    "\tTrue if the session was closed, False if it wasn't open.\n"
+
 static PyMethodDef IcsMethods[] = {
     _EZ_ICS_STRUCT_METHOD("find_devices",
                           "icsneoFindNeoDevices",
@@ -1958,7 +2736,7 @@ static PyMethodDef IcsMethods[] = {
                           "icsneoScriptLoad",
                           "ScriptLoad",
                           meth_coremini_load,
-                          METH_VARARGS,
+                          METH_VARARGS | METH_KEYWORDS,
                           _DOC_COREMINI_LOAD),
     _EZ_ICS_STRUCT_METHOD("coremini_start",
                           "icsneoScriptStart",
@@ -2006,8 +2784,8 @@ static PyMethodDef IcsMethods[] = {
     _EZ_ICS_STRUCT_METHOD("get_error_messages",
                           "icsneoGetErrorMessages",
                           "GetErrorMessages",
-                          meth_get_error_messages,
-                          METH_VARARGS,
+                          (PyCFunction)meth_get_error_messages,
+                          METH_VARARGS | METH_KEYWORDS,
                           _DOC_GET_ERROR_MESSAGES),
 #ifdef _USE_INTERNAL_HEADER_
     _EZ_ICS_STRUCT_METHOD("flash_devices",
@@ -2026,14 +2804,14 @@ static PyMethodDef IcsMethods[] = {
     _EZ_ICS_STRUCT_METHOD("get_device_settings",
                           "icsneoGetDeviceSettings",
                           "GetDeviceSettings",
-                          meth_get_device_settings,
-                          METH_VARARGS,
+                          (PyCFunction)meth_get_device_settings,
+                          METH_VARARGS | METH_KEYWORDS,
                           _DOC_GET_DEVICE_SETTINGS),
     _EZ_ICS_STRUCT_METHOD("set_device_settings",
                           "icsneoSetDeviceSettings",
                           "SetDeviceSettings",
-                          meth_set_device_settings,
-                          METH_VARARGS,
+                          (PyCFunction)meth_set_device_settings,
+                          METH_VARARGS | METH_KEYWORDS,
                           _DOC_SET_DEVICE_SETTINGS),
     _EZ_ICS_STRUCT_METHOD("load_default_settings",
                           "icsneoLoadDefaultSettings",
@@ -2058,8 +2836,8 @@ static PyMethodDef IcsMethods[] = {
                           "WriteSDCard",
                           meth_write_sdcard,
                           METH_VARARGS,
-                          "icsneoReadSDCard(), Accepts a  PyNeoDeviceEx"
-                          ", sector index, and a bytearray of 512 bytes. Exception on error."),
+                          "icsneoWriteSDCard(), Accepts a  PyNeoDeviceEx"
+                          ", sector index, and a bytes-like object of 512 bytes. Exception on error."),
     { "create_neovi_radio_message",
       (PyCFunction)meth_create_neovi_radio_message,
       METH_VARARGS | METH_KEYWORDS,
@@ -2452,6 +3230,84 @@ static PyMethodDef IcsMethods[] = {
     { "override_library_name", (PyCFunction)meth_override_library_name, METH_VARARGS, _DOC_OVERRIDE_LIBRARY_NAME },
     { "get_library_path", (PyCFunction)meth_get_library_path, METH_NOARGS, "" },
 
+    { "replay", (PyCFunction)meth_replay, METH_VARARGS | METH_KEYWORDS, _DOC_REPLAY },
+    { "replay_status", (PyCFunction)meth_replay_status, METH_VARARGS, _DOC_REPLAY_STATUS },
+    { "replay_stop", (PyCFunction)meth_replay_stop, METH_VARARGS, _DOC_REPLAY_STOP },
+    { "decode_signals", (PyCFunction)meth_decode_signals, METH_VARARGS, _DOC_DECODE_SIGNALS },
+    { "enable_last_value_cache",
+      (PyCFunction)meth_enable_last_value_cache,
+      METH_VARARGS | METH_KEYWORDS,
+      _DOC_ENABLE_LAST_VALUE_CACHE },
+    { "disable_last_value_cache",
+      (PyCFunction)meth_disable_last_value_cache,
+      METH_VARARGS,
+      _DOC_DISABLE_LAST_VALUE_CACHE },
+    { "last_value", (PyCFunction)meth_last_value, METH_VARARGS, _DOC_LAST_VALUE },
+    { "last_value_snapshot", (PyCFunction)meth_last_value_snapshot, METH_VARARGS, _DOC_LAST_VALUE_SNAPSHOT },
+    { "on_message", (PyCFunction)meth_on_message, METH_VARARGS | METH_KEYWORDS, _DOC_ON_MESSAGE },
+    { "remove_message_callback",
+      (PyCFunction)meth_remove_message_callback,
+      METH_VARARGS,
+      _DOC_REMOVE_MESSAGE_CALLBACK },
+    { "read_sdcard_into", (PyCFunction)meth_read_sdcard_into, METH_VARARGS, _DOC_READ_SDCARD_INTO },
+    { "write_sdcard_from", (PyCFunction)meth_write_sdcard_from, METH_VARARGS | METH_KEYWORDS, _DOC_WRITE_SDCARD_FROM },
+    { "coremini_read_app_signals",
+      (PyCFunction)meth_coremini_read_app_signals,
+      METH_VARARGS,
+      _DOC_COREMINI_READ_APP_SIGNALS },
+    { "coremini_write_app_signals",
+      (PyCFunction)meth_coremini_write_app_signals,
+      METH_VARARGS,
+      _DOC_COREMINI_WRITE_APP_SIGNALS },
+    { "coremini_read_tx_messages",
+      (PyCFunction)meth_coremini_read_tx_messages,
+      METH_VARARGS | METH_KEYWORDS,
+      _DOC_COREMINI_READ_TX_MESSAGES },
+    { "coremini_read_rx_messages",
+      (PyCFunction)meth_coremini_read_rx_messages,
+      METH_VARARGS | METH_KEYWORDS,
+      _DOC_COREMINI_READ_RX_MESSAGES },
+    { "coremini_write_tx_messages",
+      (PyCFunction)meth_coremini_write_tx_messages,
+      METH_VARARGS | METH_KEYWORDS,
+      _DOC_COREMINI_WRITE_TX_MESSAGES },
+    { "coremini_write_rx_messages",
+      (PyCFunction)meth_coremini_write_rx_messages,
+      METH_VARARGS | METH_KEYWORDS,
+      _DOC_COREMINI_WRITE_RX_MESSAGES },
+    { "start_health_monitor",
+      (PyCFunction)meth_start_health_monitor,
+      METH_VARARGS | METH_KEYWORDS,
+      _DOC_START_HEALTH_MONITOR },
+    { "stop_health_monitor", (PyCFunction)meth_stop_health_monitor, METH_VARARGS, _DOC_STOP_HEALTH_MONITOR },
+    { "health", (PyCFunction)meth_health, METH_VARARGS, _DOC_HEALTH },
+    { "on_health", (PyCFunction)meth_on_health, METH_VARARGS | METH_KEYWORDS, _DOC_ON_HEALTH },
+    { "remove_health_callback",
+      (PyCFunction)meth_remove_health_callback,
+      METH_VARARGS,
+      _DOC_REMOVE_HEALTH_CALLBACK },
+    { "enable_adaptive_receive",
+      (PyCFunction)meth_enable_adaptive_receive,
+      METH_VARARGS | METH_KEYWORDS,
+      _DOC_ENABLE_ADAPTIVE_RECEIVE },
+    { "disable_adaptive_receive",
+      (PyCFunction)meth_disable_adaptive_receive,
+      METH_VARARGS,
+      _DOC_DISABLE_ADAPTIVE_RECEIVE },
+    { "receive_stats", (PyCFunction)meth_receive_stats, METH_VARARGS, _DOC_RECEIVE_STATS },
+    { "on_error", (PyCFunction)meth_on_error, METH_VARARGS | METH_KEYWORDS, _DOC_ON_ERROR },
+    { "remove_error_callback", (PyCFunction)meth_remove_error_callback, METH_VARARGS, _DOC_REMOVE_ERROR_CALLBACK },
+    { "start_device_watcher",
+      (PyCFunction)meth_start_device_watcher,
+      METH_VARARGS | METH_KEYWORDS,
+      _DOC_START_DEVICE_WATCHER },
+    { "stop_device_watcher", (PyCFunction)meth_stop_device_watcher, METH_VARARGS, _DOC_STOP_DEVICE_WATCHER },
+    { "device_watcher_devices", (PyCFunction)meth_device_watcher_devices, METH_VARARGS, _DOC_DEVICE_WATCHER_DEVICES },
+    { "device_settings_stats", (PyCFunction)meth_device_settings_stats, METH_VARARGS, _DOC_DEVICE_SETTINGS_STATS },
+    { "isotp_open", (PyCFunction)meth_isotp_open, METH_VARARGS | METH_KEYWORDS, _DOC_ISOTP_OPEN },
+    { "isotp_send", (PyCFunction)meth_isotp_send, METH_VARARGS, _DOC_ISOTP_SEND },
+    { "isotp_close", (PyCFunction)meth_isotp_close, METH_VARARGS, _DOC_ISOTP_CLOSE },
+
     { NULL, NULL, 0, NULL }
 };
 
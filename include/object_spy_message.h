@@ -216,10 +216,12 @@ static int spy_message_object_alloc(spy_message_object* self, PyObject* args, Py
 static void spy_message_object_dealloc(spy_message_object* self)
 {
     if ((!self->noExtraDataPtrCleanup && self->msg.ExtraDataPtrEnabled && self->msg.ExtraDataPtr != NULL) ||
-        (!self->noExtraDataPtrCleanup && self->msg.Protocol == SPY_PROTOCOL_ETHERNET &&
+        (!self->noExtraDataPtrCleanup &&
+         (self->msg.Protocol == SPY_PROTOCOL_ETHERNET || self->msg.Protocol == SPY_PROTOCOL_SPI ||
+          self->msg.Protocol == SPY_PROTOCOL_WBMS) &&
          self->msg.ExtraDataPtr != NULL)) {
         // Clean up the ExtraDataPtr if we can
-        // Ethernet protocol uses the ExtraDataPtrEnabled reversed internally so do a double check here
+        // Ethernet, SPI and wBMS use the ExtraDataPtrEnabled reversed internally so do a double check here
         delete[] (unsigned char*)self->msg.ExtraDataPtr;
         self->msg.ExtraDataPtr = NULL;
         self->msg.ExtraDataPtrEnabled = 0;
@@ -227,6 +229,52 @@ static void spy_message_object_dealloc(spy_message_object* self)
     Py_TYPE(self)->tp_free((PyObject*)self);
 }
 
+// Returns the number of bytes ExtraDataPtr points to or 0 if ExtraDataPtr isn't in use.
+static inline int spy_message_extra_data_length(const icsSpyMessage* msg)
+{
+    bool extra_data_ptr_enabled = msg->ExtraDataPtrEnabled != 0;
+    // Ethernet protocol uses the ExtraDataPtrEnabled reversed internally
+    if ((msg->Protocol == SPY_PROTOCOL_ETHERNET || msg->Protocol == SPY_PROTOCOL_SPI ||
+         msg->Protocol == SPY_PROTOCOL_WBMS) &&
+        msg->ExtraDataPtr != NULL) {
+        extra_data_ptr_enabled = true;
+    }
+    if (!extra_data_ptr_enabled || !msg->ExtraDataPtr) {
+        return 0;
+    }
+    // Some newer protocols are packing the length into NumberBytesHeader also so lets handle it here...
+    if (msg->Protocol == SPY_PROTOCOL_A2B || msg->Protocol == SPY_PROTOCOL_ETHERNET ||
+        msg->Protocol == SPY_PROTOCOL_SPI || msg->Protocol == SPY_PROTOCOL_WBMS) {
+        return (msg->NumberBytesHeader << 8) | msg->NumberBytesData;
+    }
+    return msg->NumberBytesData;
+}
+
+// Converts the hardware timestamp into seconds using TimeStampHardwareID.
+static inline double spy_message_hardware_timestamp(const icsSpyMessage* msg)
+{
+    const double th = (double)msg->TimeHardware;
+    const double th2 = (double)msg->TimeHardware2;
+    switch (msg->TimeStampHardwareID & ~HADRWARE_TIMESTAMP_ID_FIXED) {
+        case HARDWARE_TIMESTAMP_ID_NEOv6_VCAN:
+            return th2 * NEOVI6_VCAN_TIMESTAMP_2 + th * NEOVI6_VCAN_TIMESTAMP_1;
+        case HARDWARE_TIMESTAMP_ID_DOUBLE_SEC: {
+            double value = 0;
+            memcpy(&value, &msg->TimeHardware, sizeof(value));
+            return value;
+        }
+        case HARDWARE_TIMESTAMP_ID_NEORED_10US:
+            return (th2 * 4294967296.0 + th) * 0.00001;
+        case HARDWARE_TIMESTAMP_ID_NEORED_25NS:
+            return th2 * NEOVI_RED_TIMESTAMP_2_25NS + th * NEOVI_RED_TIMESTAMP_1_25NS;
+        case HARDWARE_TIMESTAMP_ID_NEORED_10NS:
+            return th2 * NEOVI_RED_TIMESTAMP_2_10NS + th * NEOVI_RED_TIMESTAMP_1_10NS;
+        case HARDWARE_TIMESTAMP_ID_NEOVI:
+        default:
+            return th2 * NEOVI_TIMESTAMP_2 + th * NEOVI_TIMESTAMP_1;
+    }
+}
+
 static PyObject* spy_message_object_getattr(PyObject* o, PyObject* attr_name)
 {
 #if PY_MAJOR_VERSION >= 3
@@ -278,30 +326,15 @@ static PyObject* spy_message_object_getattr(PyObject* o, PyObject* attr_name)
         Py_DECREF(attr_name);
         spy_message_j1850_object* obj = (spy_message_j1850_object*)o;
         unsigned char* ExtraDataPtr = (unsigned char*)obj->msg.ExtraDataPtr;
-        bool extra_data_ptr_enabled = obj->msg.ExtraDataPtrEnabled != 0;
-        // Ethernet protocol uses the ExtraDataPtrEnabled reversed internally
-        if ((obj->msg.Protocol == SPY_PROTOCOL_ETHERNET || 
-             obj->msg.Protocol == SPY_PROTOCOL_SPI || 
-             obj->msg.Protocol == SPY_PROTOCOL_WBMS) 
-            && obj->msg.ExtraDataPtr != NULL) {
-            extra_data_ptr_enabled = true;
-        }
-        int actual_size = 0;
-        // Some newer protocols are packing the length into NumberBytesHeader also so lets handle it here...
-        if (obj->msg.Protocol == SPY_PROTOCOL_A2B || obj->msg.Protocol == SPY_PROTOCOL_ETHERNET || 
-            obj->msg.Protocol == SPY_PROTOCOL_SPI || obj->msg.Protocol == SPY_PROTOCOL_WBMS) {
-            actual_size = (obj->msg.NumberBytesHeader << 8) | obj->msg.NumberBytesData;
-        } else {
-            actual_size = obj->msg.NumberBytesData;
-        }
-        if (extra_data_ptr_enabled && actual_size && obj->msg.ExtraDataPtr) {
+        int actual_size = spy_message_extra_data_length((const icsSpyMessage*)&obj->msg);
+        if (actual_size) {
             PyObject* tuple = PyTuple_New(actual_size);
             for (int i = 0; i < actual_size; ++i) {
                 PyTuple_SET_ITEM(tuple, i, PyLong_FromLong(ExtraDataPtr[i]));
             }
             return tuple;
         } else {
-            return Py_None;
+            Py_RETURN_NONE;
         }
     } else {
         return PyObject_GenericGetAttr(o, attr_name);
@@ -386,9 +419,14 @@ static int spy_message_object_setattr(PyObject* o, PyObject* name, PyObject* val
         }
         // Get tuple items and place them in array, set as 0 if error.
         Py_ssize_t length = PyObject_Length(value);
-        if (obj->msg.ExtraDataPtr != NULL)
-            delete[] (unsigned char*)obj->msg.ExtraDataPtr;
-        obj->msg.ExtraDataPtr = new unsigned char[length];
+        // The driver owns the ExtraDataPtr of received messages, only our own buffer can be reused or freed
+        if (obj->noExtraDataPtrCleanup || obj->msg.ExtraDataPtr == NULL ||
+            spy_message_extra_data_length(&obj->msg) != length) {
+            if (!obj->noExtraDataPtrCleanup && obj->msg.ExtraDataPtr != NULL)
+                delete[] (unsigned char*)obj->msg.ExtraDataPtr;
+            obj->msg.ExtraDataPtr = new unsigned char[length];
+            obj->noExtraDataPtrCleanup = false;
+        }
         // Some newer protocols are packing the length into NumberBytesHeader also so lets handle it here...
         if (obj->msg.Protocol == SPY_PROTOCOL_A2B || obj->msg.Protocol == SPY_PROTOCOL_ETHERNET || 
             obj->msg.Protocol == SPY_PROTOCOL_SPI || obj->msg.Protocol == SPY_PROTOCOL_WBMS) {
@@ -413,6 +451,7 @@ static int spy_message_object_setattr(PyObject* o, PyObject* name, PyObject* val
             (!obj->noExtraDataPtrCleanup && PyLong_AsLong(value) != 1 && obj->msg.Protocol == SPY_PROTOCOL_ETHERNET)) {
             if (obj->msg.ExtraDataPtr != NULL)
                 delete[] (unsigned char*)obj->msg.ExtraDataPtr;
+            obj->msg.ExtraDataPtr = NULL;
         } else if (PyLong_AsLong(value) != 0 && obj->msg.Protocol == SPY_PROTOCOL_ETHERNET) {
             // Ethernet always needs to be set to 0
             return 0;
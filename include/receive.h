@@ -0,0 +1,245 @@
+#ifndef _RECEIVE_H_
+#define _RECEIVE_H_
+
+#if (defined(_WIN32) || defined(__WIN32__))
+#ifndef USING_STUDIO_8
+#define USING_STUDIO_8 1
+#endif
+#include <icsnVC40.h>
+#else
+#include <icsnVC40.h>
+#endif
+
+#include <condition_variable>
+#include <cstdint>
+#include <deque>
+#include <functional>
+#include <memory>
+#include <mutex>
+#include <thread>
+#include <unordered_map>
+#include <unordered_set>
+#include <utility>
+#include <vector>
+
+// A received message that owns its ExtraDataPtr payload. msg.ExtraDataPtr is not valid, use payload instead.
+struct OwnedMessage
+{
+    icsSpyMessage msg;
+    std::vector<uint8_t> payload;
+};
+
+void receive_copy_message(const icsSpyMessage& msg, OwnedMessage& owned);
+
+// Key of a frame in the receive tables: network id in the upper 32 bits, arbitration id in the lower 32 bits.
+inline uint64_t receive_key(int network_id, uint32_t arbid)
+{
+    return ((uint64_t)(uint32_t)network_id << 32) | arbid;
+}
+
+inline uint64_t receive_key(const icsSpyMessage& msg)
+{
+    return receive_key((msg.NetworkID2 << 8) | msg.NetworkID, msg.ArbIDOrHeader);
+}
+
+struct LastValue
+{
+    OwnedMessage frame;
+    uint64_t count;
+    // Hardware timestamp of the last frame, in seconds
+    double timestamp;
+    // Smoothed interval between frames, in seconds
+    double interval;
+};
+
+// Most recent frame per (network, arbid), updated by the receive pump on every frame.
+class LastValueCache
+{
+  public:
+    // ids is a list of receive_key()s to track, empty tracks everything.
+    explicit LastValueCache(const std::vector<uint64_t>& ids);
+
+    void process(const icsSpyMessage* msgs, int count);
+    bool get(uint64_t key, LastValue& value);
+    std::vector<std::pair<uint64_t, LastValue>> snapshot();
+
+  private:
+    std::mutex m_mutex;
+    std::unordered_set<uint64_t> m_ids;
+    std::unordered_map<uint64_t, LastValue> m_values;
+};
+
+// Routes received frames to subscriptions by (network, arbid), one callback per subscription per receive batch.
+// Callbacks run on the dispatcher's own thread so a slow callback never stalls the receive pump.
+class MessageDispatcher : public std::enable_shared_from_this<MessageDispatcher>
+{
+  public:
+    // Callback: (matching frames, frames dropped since the last call because the callback fell behind)
+    typedef std::function<void(std::vector<OwnedMessage>&, size_t)> Callback;
+
+    MessageDispatcher();
+    ~MessageDispatcher();
+
+    MessageDispatcher(const MessageDispatcher&) = delete;
+    MessageDispatcher& operator=(const MessageDispatcher&) = delete;
+
+    void start();
+    void stop();
+
+    // network_id of -1 matches every network. A frame matches when (ArbIDOrHeader & mask) == (arbid & mask),
+    // a mask of 0 matches every arbid. Returns the id of the subscription.
+    int subscribe(int network_id, uint32_t arbid, uint32_t mask, Callback callback);
+    bool unsubscribe(int id);
+    bool empty();
+
+    void process(const icsSpyMessage* msgs, int count);
+
+  private:
+    struct Subscription
+    {
+        int id;
+        int network_id;
+        uint32_t arbid;
+        uint32_t mask;
+        Callback callback;
+        size_t dropped;
+    };
+
+    void run();
+    void match(const icsSpyMessage& msg, std::vector<int>& ids);
+
+    std::thread m_thread;
+    std::mutex m_mutex;
+    std::condition_variable m_cv;
+    bool m_stop;
+    int m_next_id;
+
+    std::unordered_map<int, std::shared_ptr<Subscription>> m_subscriptions;
+    // Full mask subscriptions, keyed by receive_key() and by arbid alone for every network
+    std::unordered_map<uint64_t, std::vector<int>> m_exact;
+    std::unordered_map<uint32_t, std::vector<int>> m_exact_any_network;
+    // Everything else is checked linearly
+    std::vector<std::shared_ptr<Subscription>> m_masked;
+
+    std::deque<std::pair<int, std::vector<OwnedMessage>>> m_pending;
+    size_t m_pending_frames;
+};
+
+// Chooses how long the receive pump lets frames accumulate in the driver between drains. Sleeping between drains
+// turns a trickle of wake ups into fewer, larger batches; the sleep shrinks as the driver buffer fills so bursts are
+// drained right away. An idle bus costs nothing either way, the pump blocks in the driver until frames arrive.
+class AdaptiveReceivePolicy
+{
+  public:
+    // target_latency: longest time a frame may wait in the driver, in seconds.
+    // cpu_budget: fraction of a core the pump may spend draining, 0 to only use target_latency.
+    AdaptiveReceivePolicy(double target_latency, double cpu_budget);
+
+    // frames: frames returned by the last drain. buffer_max: capacity of the driver buffer, 0 if unknown.
+    // drain_time: seconds spent on the last drain. Returns the seconds to wait before the next drain.
+    double next_interval(int frames, int buffer_max, double drain_time);
+
+    double target_latency() const { return m_target_latency; }
+    double cpu_budget() const { return m_cpu_budget; }
+
+  private:
+    double m_target_latency;
+    double m_cpu_budget;
+    // Interval used before the last drain, to estimate the frame rate
+    double m_interval;
+};
+
+struct ReceiveStats
+{
+    bool adaptive;
+    uint64_t drains;
+    uint64_t frames;
+    // Largest fraction of the driver buffer seen in a single drain
+    double peak_occupancy;
+    // Current wait between drains, in seconds
+    double interval;
+    // Frames the driver lost to overflows, and the number of separate overflow events
+    uint64_t overflows;
+    uint64_t overflow_events;
+};
+
+// Drains the device receive queue on a native thread and feeds the native consumers. While a pump is
+// running for a device, get_messages() reads the frames the pump received instead of the driver, every frame is
+// queued for it from the moment the pump starts.
+class RxPump
+{
+  public:
+    // Receive callback: (messages, in: capacity out: count, errors, timeout in ms) -> success
+    typedef std::function<bool(icsSpyMessage*, int*, int*, unsigned int)> RxFunction;
+    // Performance parameters callback: (buffer count, buffer max, overflow count) -> success
+    typedef std::function<bool(int*, int*, int*)> PerformanceFunction;
+    // Overflow callback: (frames lost in this event, frames lost since adaptive mode was enabled)
+    typedef std::function<void(uint64_t, uint64_t)> OverflowCallback;
+
+    explicit RxPump(RxFunction rx);
+    ~RxPump();
+
+    RxPump(const RxPump&) = delete;
+    RxPump& operator=(const RxPump&) = delete;
+
+    void start();
+    void stop();
+
+    void set_last_value_cache(std::shared_ptr<LastValueCache> cache);
+    std::shared_ptr<LastValueCache> last_value_cache();
+    // Returns the dispatcher of the pump, creating and starting it on first use.
+    std::shared_ptr<MessageDispatcher> dispatcher(bool create = true);
+    // True when there are no consumers left and the pump can be stopped.
+    bool idle();
+    // True once the pump was stopped and take() returned every frame and error it queued.
+    bool drained();
+
+    // Sizes batches and the time between drains from the driver buffer occupancy, a null policy restores the
+    // default of draining as soon as frames arrive. Overflows are passed to on_overflow, or counted for
+    // take_overflows() when it is empty.
+    void set_adaptive(std::shared_ptr<AdaptiveReceivePolicy> policy,
+                      PerformanceFunction performance,
+                      OverflowCallback on_overflow);
+    ReceiveStats stats();
+    // Returns and resets the frames lost to overflows that no callback was told about.
+    uint64_t take_overflows();
+
+    // Moves up to max queued frames into messages, waiting up to timeout seconds for the first one.
+    void take(std::vector<OwnedMessage>& messages, size_t max, int* errors, double timeout);
+
+  private:
+    void run();
+    // Checks the driver for overflows after a drain, returns the buffer capacity or 0 if unknown.
+    int check_overflows();
+
+    RxFunction m_rx;
+    std::thread m_thread;
+    std::mutex m_mutex;
+    std::condition_variable m_cv;
+    bool m_stop;
+
+    std::shared_ptr<LastValueCache> m_last_value_cache;
+    std::shared_ptr<MessageDispatcher> m_dispatcher;
+
+    std::deque<OwnedMessage> m_queue;
+    int m_errors;
+
+    std::shared_ptr<AdaptiveReceivePolicy> m_policy;
+    PerformanceFunction m_performance;
+    OverflowCallback m_on_overflow;
+    ReceiveStats m_stats;
+    // Driver overflow count at the last check, -1 before the first check
+    int m_last_overflow_count;
+    uint64_t m_unreported_overflows;
+};
+
+// Per device handle registry of receive pumps.
+std::shared_ptr<RxPump> rx_pump_get(void* handle);
+void rx_pump_set(void* handle, std::shared_ptr<RxPump> pump);
+// Stops and removes the pump for handle, if any.
+std::shared_ptr<RxPump> rx_pump_remove(void* handle);
+// Stops the pump for handle once it has no consumers left. It stays registered until get_messages() took the frames
+// it queued, acquiring it again before that restarts it. Returns true if the pump was stopped.
+bool rx_pump_release(void* handle);
+
+#endif // _RECEIVE_H_
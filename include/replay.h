@@ -0,0 +1,90 @@
+#ifndef _REPLAY_H_
+#define _REPLAY_H_
+
+#if (defined(_WIN32) || defined(__WIN32__))
+#ifndef USING_STUDIO_8
+#define USING_STUDIO_8 1
+#endif
+#include <icsnVC40.h>
+#else
+#include <icsnVC40.h>
+#endif
+
+#include <chrono>
+#include <condition_variable>
+#include <cstdint>
+#include <functional>
+#include <memory>
+#include <mutex>
+#include <thread>
+#include <vector>
+
+struct ReplayStats
+{
+    bool running;
+    uint64_t frames;
+    uint64_t batches;
+    uint64_t loops;
+    uint64_t tx_failures;
+    // Difference between scheduled and actual transmit time, in seconds.
+    double mean_error;
+    double max_error;
+};
+
+// Transmits frames on a native thread using the recorded hardware timestamp deltas.
+// Frames sharing a network that are due within the same scheduling quantum are sent
+// with a single transmit call.
+class ReplayEngine
+{
+  public:
+    // Transmit callback: (messages, network id, count) -> success
+    typedef std::function<bool(icsSpyMessage*, int, int)> TxFunction;
+
+    // extra_data is either empty or has one entry per message. Non-empty entries are owned
+    // by the engine and ExtraDataPtr is pointed at them.
+    ReplayEngine(std::vector<icsSpyMessage> messages,
+                 std::vector<std::vector<uint8_t>> extra_data,
+                 double speed,
+                 bool loop,
+                 double quantum,
+                 TxFunction tx);
+    ~ReplayEngine();
+
+    ReplayEngine(const ReplayEngine&) = delete;
+    ReplayEngine& operator=(const ReplayEngine&) = delete;
+
+    void start();
+    void stop();
+    // Returns true if the replay finished within timeout seconds.
+    bool wait(double timeout);
+    ReplayStats stats();
+
+  private:
+    void run();
+    bool sleep_until(std::chrono::steady_clock::time_point when);
+
+    std::vector<icsSpyMessage> m_messages;
+    std::vector<std::vector<uint8_t>> m_extra_data;
+    // Offset of each message from the start of the capture, in seconds.
+    std::vector<double> m_offsets;
+    double m_speed;
+    bool m_loop;
+    double m_quantum;
+    TxFunction m_tx;
+
+    std::thread m_thread;
+    std::mutex m_mutex;
+    std::condition_variable m_cv;
+    bool m_stop;
+    bool m_running;
+    ReplayStats m_stats;
+    double m_error_sum;
+};
+
+// Per device handle registry of active replays.
+std::shared_ptr<ReplayEngine> replay_get(void* handle);
+void replay_set(void* handle, std::shared_ptr<ReplayEngine> engine);
+// Stops and removes the replay for handle, if any. Returns the removed engine.
+std::shared_ptr<ReplayEngine> replay_remove(void* handle);
+
+#endif // _REPLAY_H_
@@ -0,0 +1,78 @@
+#ifndef _WATCHER_H_
+#define _WATCHER_H_
+
+#if (defined(_WIN32) || defined(__WIN32__))
+#ifndef USING_STUDIO_8
+#define USING_STUDIO_8 1
+#endif
+#include <icsnVC40.h>
+#else
+#include <icsnVC40.h>
+#endif
+
+#include <chrono>
+#include <condition_variable>
+#include <cstdint>
+#include <functional>
+#include <map>
+#include <memory>
+#include <mutex>
+#include <thread>
+#include <vector>
+
+// Enumerates devices on a native thread and keeps a table of the connected devices keyed by serial number, so
+// callers can read the device list without waiting on the driver.
+class DeviceWatcher : public std::enable_shared_from_this<DeviceWatcher>
+{
+  public:
+    // Enumerates the connected devices, returns false on failure
+    typedef std::function<bool(std::vector<NeoDeviceEx>&)> FindFunction;
+    // (devices added, devices removed) since the previous scan
+    typedef std::function<void(const std::vector<NeoDeviceEx>&, const std::vector<NeoDeviceEx>&)> Callback;
+
+    // callback may be empty. The first scan reports every connected device as added.
+    DeviceWatcher(FindFunction find, double interval, Callback callback);
+    ~DeviceWatcher();
+
+    DeviceWatcher(const DeviceWatcher&) = delete;
+    DeviceWatcher& operator=(const DeviceWatcher&) = delete;
+
+    void start();
+    void stop();
+
+    // Copies the devices of the last successful scan, in the order the driver returned them. Returns false
+    // before the first scan completed.
+    bool devices(std::vector<NeoDeviceEx>& devices);
+    // Time of the last successful scan, steady_clock::time_point() before the first one.
+    std::chrono::steady_clock::time_point last_scan();
+    uint64_t scans();
+
+  private:
+    void run();
+    void scan();
+
+    FindFunction m_find;
+    std::chrono::duration<double> m_interval;
+    Callback m_callback;
+
+    std::thread m_thread;
+    std::mutex m_mutex;
+    std::condition_variable m_cv;
+    bool m_stop;
+
+    bool m_ready;
+    uint64_t m_scans;
+    std::chrono::steady_clock::time_point m_last_scan;
+    std::vector<NeoDeviceEx> m_devices;
+    std::map<int, NeoDeviceEx> m_table;
+};
+
+// Registry of running watchers. Returns the id of the watcher.
+int device_watcher_add(std::shared_ptr<DeviceWatcher> watcher);
+std::shared_ptr<DeviceWatcher> device_watcher_get(int id);
+// Stops and removes the watcher, if any.
+std::shared_ptr<DeviceWatcher> device_watcher_remove(int id);
+// Devices of the most recent scan of any running watcher, returns false when none has completed a scan.
+bool device_watcher_cached(std::vector<NeoDeviceEx>& devices);
+
+#endif // _WATCHER_H_
@@ -0,0 +1,44 @@
+#ifndef _WORKER_H_
+#define _WORKER_H_
+
+#include <Python.h>
+
+#include <condition_variable>
+#include <memory>
+#include <mutex>
+#include <thread>
+
+// Helpers shared by the background threads of a device (message dispatcher, health monitor, error reporter, ISO-TP
+// engine and device watcher) and by the Python callbacks they call.
+
+// Sets stop, wakes the thread and waits for it to finish. Called from the thread itself, from inside a callback,
+// the thread is detached instead; run() returns as soon as the callback does.
+inline void worker_stop(std::mutex& mutex, bool& stop, std::condition_variable& cv, std::thread& thread)
+{
+    {
+        std::lock_guard<std::mutex> lock(mutex);
+        stop = true;
+    }
+    cv.notify_all();
+    if (thread.joinable()) {
+        if (thread.get_id() == std::this_thread::get_id()) {
+            thread.detach();
+        } else {
+            thread.join();
+        }
+    }
+}
+
+// Returns a new reference to object for a background thread. Released from whichever thread drops the last
+// reference, the GIL is taken to do it.
+inline std::shared_ptr<PyObject> worker_reference(PyObject* object)
+{
+    Py_INCREF(object);
+    return std::shared_ptr<PyObject>(object, [](PyObject* object) {
+        PyGILState_STATE state = PyGILState_Ensure();
+        Py_DECREF(object);
+        PyGILState_Release(state);
+    });
+}
+
+#endif // _WORKER_H_
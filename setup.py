@@ -105,6 +105,12 @@ ics_extension = Extension(
         "src/setup_module_auto_defines.cpp",
         "src/main.cpp",
         "src/methods.cpp",
+        "src/replay.cpp",
+        "src/decode.cpp",
+        "src/receive.cpp",
+        "src/health.cpp",
+        "src/watcher.cpp",
+        "src/isotp.cpp",
         "src/ice/src/ice_library_manager.cpp",
         "src/ice/src/ice_library_name.cpp",
         "src/ice/src/ice_library.cpp",
@@ -112,6 +118,15 @@ ics_extension = Extension(
     extra_compile_args=get_ics_extension_compiler_arguments(),
 )
 
+# Simulated icsneolegacy backend for running without hardware, see ics/simulator.py. It's a plain shared library,
+# building it as an extension module gets it compiled and installed next to the ics extension.
+simulator_extension = Extension(
+    "ics.icsneosim",
+    include_dirs=["include/ics"],
+    sources=["src/simulator/icsneosim.cpp"],
+    extra_compile_args=get_ics_extension_compiler_arguments(),
+)
+
 package_data = {}
 if "DARWIN" in platform.system().upper():
     package_data["ics"] = ["*.dylib"]
@@ -130,5 +145,5 @@ setup(
     package_dir={"ics": "gen/ics", "ics.structures": "gen/ics/structures"},
     package_data=package_data,
     include_package_data=True,
-    ext_modules=[ics_extension],
+    ext_modules=[ics_extension, simulator_extension],
 )
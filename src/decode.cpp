@@ -0,0 +1,103 @@
+#include "decode.h"
+
+#include <cstring>
+
+bool decode_parse_table(const uint8_t* table, size_t size, std::vector<SignalDefinition>& signals)
+{
+    if (size % DECODE_TABLE_ENTRY_SIZE != 0) {
+        return false;
+    }
+    signals.clear();
+    signals.reserve(size / DECODE_TABLE_ENTRY_SIZE);
+    for (size_t pos = 0; pos < size; pos += DECODE_TABLE_ENTRY_SIZE) {
+        // Layout matches struct "<IiHHBxxxdd" in ics/decode.py
+        const uint8_t* entry = table + pos;
+        SignalDefinition signal;
+        memcpy(&signal.arbid, entry, 4);
+        memcpy(&signal.network_id, entry + 4, 4);
+        memcpy(&signal.start_bit, entry + 8, 2);
+        memcpy(&signal.length, entry + 10, 2);
+        signal.flags = entry[12];
+        memcpy(&signal.factor, entry + 16, 8);
+        memcpy(&signal.offset, entry + 24, 8);
+        if (signal.length == 0 || signal.length > 64) {
+            return false;
+        }
+        if (!signals.empty() && signals.back().arbid > signal.arbid) {
+            return false;
+        }
+        signals.push_back(signal);
+    }
+    return true;
+}
+
+size_t decode_find_first(const std::vector<SignalDefinition>& signals, uint32_t arbid)
+{
+    size_t low = 0;
+    size_t high = signals.size();
+    while (low < high) {
+        size_t mid = low + (high - low) / 2;
+        if (signals[mid].arbid < arbid) {
+            low = mid + 1;
+        } else {
+            high = mid;
+        }
+    }
+    if (low < signals.size() && signals[low].arbid == arbid) {
+        return low;
+    }
+    return signals.size();
+}
+
+bool decode_signal(const SignalDefinition& signal, const uint8_t* payload, size_t length, double* value)
+{
+    uint64_t raw = 0;
+    if (signal.flags & DECODE_FLAG_LITTLE_ENDIAN) {
+        // Intel: start_bit is the least significant bit
+        const size_t first = signal.start_bit / 8;
+        const size_t last = (signal.start_bit + signal.length - 1) / 8;
+        const unsigned shift = signal.start_bit % 8;
+        if (last >= length) {
+            return false;
+        }
+        const size_t span = last - first + 1;
+        for (size_t i = 0; i < span && i < 8; ++i) {
+            raw |= (uint64_t)payload[first + i] << (8 * i);
+        }
+        raw >>= shift;
+        if (span > 8) {
+            raw |= (uint64_t)payload[last] << (64 - shift);
+        }
+    } else {
+        // Motorola: start_bit is the most significant bit in the DBC sawtooth numbering
+        const size_t msb = (signal.start_bit / 8) * 8 + (7 - signal.start_bit % 8);
+        const size_t lsb = msb + signal.length - 1;
+        const size_t first = msb / 8;
+        const size_t last = lsb / 8;
+        const unsigned shift = 7 - lsb % 8;
+        if (last >= length) {
+            return false;
+        }
+        const size_t span = last - first + 1;
+        for (size_t i = 0; i < span && i < 8; ++i) {
+            raw = (raw << 8) | payload[first + i];
+        }
+        if (span > 8) {
+            raw = (raw << (8 - shift)) | (payload[last] >> shift);
+        } else {
+            raw >>= shift;
+        }
+    }
+    const uint64_t mask = signal.length == 64 ? ~(uint64_t)0 : (((uint64_t)1 << signal.length) - 1);
+    raw &= mask;
+    if (signal.flags & DECODE_FLAG_SIGNED) {
+        int64_t signed_raw = (int64_t)raw;
+        if (signal.length < 64 && (raw >> (signal.length - 1)) & 1) {
+            signed_raw = (int64_t)(raw | ~mask);
+        }
+        *value = (double)signed_raw * signal.factor + signal.offset;
+    } else {
+        *value = (double)raw * signal.factor + signal.offset;
+    }
+    return true;
+}
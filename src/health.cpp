@@ -0,0 +1,519 @@
+#include "health.h"
+#include "worker.h"
+
+#include <algorithm>
+#include <cstring>
+#include <map>
+#include <unordered_map>
+
+// Errors kept in the reading and for every error queue reader, the same as the driver's error queue
+static const size_t HEALTH_MAX_ERRORS = 600;
+
+static const struct
+{
+    HealthField field;
+    const char* name;
+} health_fields[] = {
+    { HEALTH_FIELD_BUS_VOLTAGE, "bus_voltage" },
+    { HEALTH_FIELD_BUFFER_COUNT, "buffer_count" },
+    { HEALTH_FIELD_BUFFER_MAX, "buffer_max" },
+    { HEALTH_FIELD_OVERFLOW_COUNT, "overflow_count" },
+    { HEALTH_FIELD_ERROR_COUNT, "error_count" },
+};
+
+bool health_field_from_name(const char* name, HealthField* field)
+{
+    for (const auto& entry : health_fields) {
+        if (strcmp(entry.name, name) == 0) {
+            *field = entry.field;
+            return true;
+        }
+    }
+    return false;
+}
+
+const char* health_field_name(HealthField field)
+{
+    for (const auto& entry : health_fields) {
+        if (entry.field == field) {
+            return entry.name;
+        }
+    }
+    return "";
+}
+
+HealthMonitor::HealthMonitor(Functions functions, unsigned int items, double period)
+  : m_functions(functions)
+  , m_items(items)
+  , m_period(period)
+  , m_stop(false)
+  , m_reading()
+  , m_next_id(1)
+{
+}
+
+HealthMonitor::~HealthMonitor()
+{
+    stop();
+}
+
+void HealthMonitor::start()
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    if (m_thread.joinable()) {
+        return;
+    }
+    m_stop = false;
+    // The thread keeps the monitor alive, a callback may drop the last reference by closing the device.
+    auto self = shared_from_this();
+    m_thread = std::thread([self] { self->run(); });
+}
+
+void HealthMonitor::stop()
+{
+    worker_stop(m_mutex, m_stop, m_cv, m_thread);
+}
+
+HealthReading HealthMonitor::reading()
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    return m_reading;
+}
+
+int HealthMonitor::add_callback(HealthField field, bool has_threshold, double threshold, bool below, Callback callback)
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    auto watch = std::make_shared<Watch>();
+    watch->id = m_next_id++;
+    watch->field = field;
+    watch->has_threshold = has_threshold;
+    watch->threshold = threshold;
+    watch->below = below;
+    watch->callback = callback;
+    watch->triggered = false;
+    m_watches.push_back(watch);
+    return watch->id;
+}
+
+bool HealthMonitor::remove_callback(int id)
+{
+    std::shared_ptr<Watch> removed;
+    {
+        std::lock_guard<std::mutex> lock(m_mutex);
+        auto it = std::find_if(
+            m_watches.begin(), m_watches.end(), [id](const std::shared_ptr<Watch>& watch) { return watch->id == id; });
+        if (it == m_watches.end()) {
+            return false;
+        }
+        removed = *it;
+        m_watches.erase(it);
+    }
+    // Releasing the callback may need the GIL, never do it while holding the lock.
+    removed.reset();
+    return true;
+}
+
+bool HealthMonitor::field_value(const HealthReading& reading, HealthField field, double* value)
+{
+    switch (field) {
+    case HEALTH_FIELD_BUS_VOLTAGE:
+        *value = (double)reading.bus_voltage;
+        return reading.bus_voltage_valid;
+    case HEALTH_FIELD_BUFFER_COUNT:
+        *value = reading.performance[0];
+        return reading.performance_valid;
+    case HEALTH_FIELD_BUFFER_MAX:
+        *value = reading.performance[1];
+        return reading.performance_valid;
+    case HEALTH_FIELD_OVERFLOW_COUNT:
+        *value = reading.performance[2];
+        return reading.performance_valid;
+    case HEALTH_FIELD_ERROR_COUNT:
+        *value = (double)reading.error_count;
+        return (m_items & HEALTH_ERRORS) != 0 && reading.polls > 0;
+    }
+    return false;
+}
+
+void HealthMonitor::poll()
+{
+    // Talk to the driver without holding the lock so readers are never blocked on it.
+    HealthReading fresh = {};
+    if (m_items & HEALTH_STATUS) {
+        fresh.status_valid = m_functions.status(&fresh.status);
+    }
+    if (m_items & HEALTH_BUS_VOLTAGE) {
+        fresh.bus_voltage_valid = m_functions.bus_voltage(&fresh.bus_voltage);
+    }
+    if (m_items & HEALTH_PERFORMANCE) {
+        fresh.performance_valid = m_functions.performance(fresh.performance);
+    }
+    if (m_items & HEALTH_GPTP) {
+        fresh.gptp_valid = m_functions.gptp(&fresh.gptp);
+    }
+    std::vector<HealthError> errors;
+    if (m_items & HEALTH_ERRORS) {
+        m_functions.errors(errors);
+    }
+    const double now =
+        std::chrono::duration<double>(std::chrono::system_clock::now().time_since_epoch()).count();
+
+    std::vector<std::pair<std::shared_ptr<Watch>, std::pair<double, double>>> triggered;
+    {
+        std::lock_guard<std::mutex> lock(m_mutex);
+        HealthReading previous = m_reading;
+        fresh.polls = previous.polls + 1;
+        fresh.timestamp = now;
+        fresh.errors = std::move(previous.errors);
+        fresh.error_count = previous.error_count + errors.size();
+        for (auto& error : errors) {
+            fresh.errors.push_back(std::move(error));
+        }
+        while (fresh.errors.size() > HEALTH_MAX_ERRORS) {
+            fresh.errors.pop_front();
+        }
+        for (auto& watch : m_watches) {
+            double value = 0;
+            double last = 0;
+            if (!field_value(fresh, watch->field, &value)) {
+                continue;
+            }
+            const bool has_last = field_value(previous, watch->field, &last);
+            if (!watch->has_threshold) {
+                if (has_last && value > last) {
+                    triggered.push_back(std::make_pair(watch, std::make_pair(value, last)));
+                }
+                continue;
+            }
+            const bool past = watch->below ? value < watch->threshold : value > watch->threshold;
+            if (past && !watch->triggered) {
+                triggered.push_back(std::make_pair(watch, std::make_pair(value, has_last ? last : value)));
+            }
+            watch->triggered = past;
+        }
+        m_reading = std::move(fresh);
+    }
+    for (auto& entry : triggered) {
+        entry.first->callback(entry.first->field, entry.second.first, entry.second.second);
+    }
+}
+
+void HealthMonitor::run()
+{
+    auto next = std::chrono::steady_clock::now();
+    while (true) {
+        poll();
+        next += std::chrono::duration_cast<std::chrono::steady_clock::duration>(m_period);
+        // Don't try to catch up on polls missed by a slow driver or callback
+        next = (std::max)(next, std::chrono::steady_clock::now());
+        std::unique_lock<std::mutex> lock(m_mutex);
+        if (m_cv.wait_until(lock, next, [this] { return m_stop; })) {
+            break;
+        }
+    }
+}
+
+ErrorQueue::ErrorQueue(PollFunction poll)
+  : m_poll(poll)
+  , m_next_id(1)
+{
+    m_pending[0];
+}
+
+int ErrorQueue::add_reader()
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    const int id = m_next_id++;
+    m_pending[id];
+    return id;
+}
+
+void ErrorQueue::remove_reader(int id)
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    m_pending.erase(id);
+}
+
+bool ErrorQueue::read(int id, std::vector<int>& codes)
+{
+    // One drain at a time, so every reader sees the codes in the order the driver returned them.
+    std::lock_guard<std::mutex> lock(m_mutex);
+    std::vector<int> drained;
+    const bool success = m_poll(drained);
+    for (auto& entry : m_pending) {
+        auto& pending = entry.second;
+        pending.insert(pending.end(), drained.begin(), drained.end());
+        while (pending.size() > HEALTH_MAX_ERRORS) {
+            // A reader that never reads loses the oldest codes, like the driver's queue
+            pending.pop_front();
+        }
+    }
+    auto it = m_pending.find(id);
+    if (it != m_pending.end()) {
+        codes.insert(codes.end(), it->second.begin(), it->second.end());
+        it->second.clear();
+    }
+    return success;
+}
+
+ErrorQueueReader::ErrorQueueReader(std::shared_ptr<ErrorQueue> queue)
+  : m_queue(queue)
+  , m_id(queue->add_reader())
+{
+}
+
+ErrorQueueReader::~ErrorQueueReader()
+{
+    m_queue->remove_reader(m_id);
+}
+
+static std::mutex error_queue_registry_mutex;
+static std::map<void*, std::shared_ptr<ErrorQueue>> error_queue_registry;
+
+std::shared_ptr<ErrorQueue> error_queue_get(void* handle)
+{
+    std::lock_guard<std::mutex> lock(error_queue_registry_mutex);
+    auto it = error_queue_registry.find(handle);
+    if (it == error_queue_registry.end()) {
+        return nullptr;
+    }
+    return it->second;
+}
+
+void error_queue_set(void* handle, std::shared_ptr<ErrorQueue> queue)
+{
+    std::lock_guard<std::mutex> lock(error_queue_registry_mutex);
+    error_queue_registry[handle] = queue;
+}
+
+std::shared_ptr<ErrorQueue> error_queue_remove(void* handle)
+{
+    std::lock_guard<std::mutex> lock(error_queue_registry_mutex);
+    auto it = error_queue_registry.find(handle);
+    if (it == error_queue_registry.end()) {
+        return nullptr;
+    }
+    auto queue = it->second;
+    error_queue_registry.erase(it);
+    return queue;
+}
+
+static std::mutex error_info_mutex;
+static std::unordered_map<int, HealthError> error_info_cache;
+
+bool error_info_lookup(int code, HealthError& info, const ErrorInfoFunction& lookup)
+{
+    {
+        std::lock_guard<std::mutex> lock(error_info_mutex);
+        auto it = error_info_cache.find(code);
+        if (it != error_info_cache.end()) {
+            info = it->second;
+            return true;
+        }
+    }
+    // Looked up without the lock, at worst two threads look up the same code once each.
+    if (!lookup(code, info)) {
+        return false;
+    }
+    std::lock_guard<std::mutex> lock(error_info_mutex);
+    error_info_cache[code] = info;
+    return true;
+}
+
+ErrorReporter::ErrorReporter(PollFunction poll)
+  : m_poll(poll)
+  , m_stop(false)
+  , m_next_id(1)
+{
+}
+
+ErrorReporter::~ErrorReporter()
+{
+    stop();
+}
+
+void ErrorReporter::start()
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    if (m_thread.joinable()) {
+        return;
+    }
+    m_stop = false;
+    // The thread keeps the reporter alive, a callback may drop the last reference by closing the device.
+    auto self = shared_from_this();
+    m_thread = std::thread([self] { self->run(); });
+}
+
+void ErrorReporter::stop()
+{
+    worker_stop(m_mutex, m_stop, m_cv, m_thread);
+}
+
+int ErrorReporter::subscribe(double interval, Callback callback)
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    auto subscription = std::make_shared<Subscription>();
+    subscription->id = m_next_id++;
+    subscription->interval = std::chrono::duration<double>(interval);
+    subscription->due =
+        std::chrono::steady_clock::now() +
+        std::chrono::duration_cast<std::chrono::steady_clock::duration>(subscription->interval);
+    subscription->callback = callback;
+    m_subscriptions.push_back(subscription);
+    // The new subscription may be due before the current wait ends
+    m_cv.notify_all();
+    return subscription->id;
+}
+
+bool ErrorReporter::unsubscribe(int id)
+{
+    std::shared_ptr<Subscription> removed;
+    {
+        std::lock_guard<std::mutex> lock(m_mutex);
+        auto it = std::find_if(m_subscriptions.begin(),
+                               m_subscriptions.end(),
+                               [id](const std::shared_ptr<Subscription>& subscription) { return subscription->id == id; });
+        if (it == m_subscriptions.end()) {
+            return false;
+        }
+        removed = *it;
+        m_subscriptions.erase(it);
+    }
+    // Releasing the callback may need the GIL, never do it while holding the lock.
+    removed.reset();
+    return true;
+}
+
+bool ErrorReporter::empty()
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    return m_subscriptions.empty();
+}
+
+void ErrorReporter::run()
+{
+    using clock = std::chrono::steady_clock;
+    std::unique_lock<std::mutex> lock(m_mutex);
+    while (true) {
+        // Poll when the earliest subscription is due
+        auto next = clock::now() + std::chrono::seconds(1);
+        for (const auto& subscription : m_subscriptions) {
+            next = (std::min)(next, subscription->due);
+        }
+        if (m_cv.wait_until(lock, next, [this] { return m_stop; })) {
+            break;
+        }
+        const auto now = clock::now();
+        if (m_subscriptions.empty() || now < next) {
+            continue;
+        }
+        lock.unlock();
+        std::vector<int> codes;
+        m_poll(codes);
+        lock.lock();
+
+        std::vector<std::pair<std::shared_ptr<Subscription>, Counts>> reports;
+        for (auto& subscription : m_subscriptions) {
+            for (int code : codes) {
+                auto it = std::find_if(subscription->counts.begin(),
+                                       subscription->counts.end(),
+                                       [code](const std::pair<int, uint64_t>& count) { return count.first == code; });
+                if (it == subscription->counts.end()) {
+                    subscription->counts.push_back(std::make_pair(code, 1));
+                } else {
+                    it->second += 1;
+                }
+            }
+            if (now < subscription->due) {
+                continue;
+            }
+            subscription->due += std::chrono::duration_cast<clock::duration>(subscription->interval);
+            // Don't try to catch up on intervals missed by a slow driver or callback
+            subscription->due = (std::max)(subscription->due, now);
+            if (!subscription->counts.empty()) {
+                reports.push_back(std::make_pair(subscription, std::move(subscription->counts)));
+                subscription->counts.clear();
+            }
+        }
+        if (reports.empty()) {
+            continue;
+        }
+        lock.unlock();
+        for (auto& report : reports) {
+            report.first->callback(report.second);
+        }
+        // Release the callbacks before locking again, releasing them may need the GIL.
+        reports.clear();
+        lock.lock();
+    }
+}
+
+static std::mutex error_reporter_registry_mutex;
+static std::map<void*, std::shared_ptr<ErrorReporter>> error_reporter_registry;
+
+std::shared_ptr<ErrorReporter> error_reporter_get(void* handle)
+{
+    std::lock_guard<std::mutex> lock(error_reporter_registry_mutex);
+    auto it = error_reporter_registry.find(handle);
+    if (it == error_reporter_registry.end()) {
+        return nullptr;
+    }
+    return it->second;
+}
+
+void error_reporter_set(void* handle, std::shared_ptr<ErrorReporter> reporter)
+{
+    std::lock_guard<std::mutex> lock(error_reporter_registry_mutex);
+    error_reporter_registry[handle] = reporter;
+}
+
+std::shared_ptr<ErrorReporter> error_reporter_remove(void* handle)
+{
+    std::shared_ptr<ErrorReporter> reporter;
+    {
+        std::lock_guard<std::mutex> lock(error_reporter_registry_mutex);
+        auto it = error_reporter_registry.find(handle);
+        if (it == error_reporter_registry.end()) {
+            return nullptr;
+        }
+        reporter = it->second;
+        error_reporter_registry.erase(it);
+    }
+    reporter->stop();
+    return reporter;
+}
+
+static std::mutex health_registry_mutex;
+static std::map<void*, std::shared_ptr<HealthMonitor>> health_registry;
+
+std::shared_ptr<HealthMonitor> health_get(void* handle)
+{
+    std::lock_guard<std::mutex> lock(health_registry_mutex);
+    auto it = health_registry.find(handle);
+    if (it == health_registry.end()) {
+        return nullptr;
+    }
+    return it->second;
+}
+
+void health_set(void* handle, std::shared_ptr<HealthMonitor> monitor)
+{
+    std::lock_guard<std::mutex> lock(health_registry_mutex);
+    health_registry[handle] = monitor;
+}
+
+std::shared_ptr<HealthMonitor> health_remove(void* handle)
+{
+    std::shared_ptr<HealthMonitor> monitor;
+    {
+        std::lock_guard<std::mutex> lock(health_registry_mutex);
+        auto it = health_registry.find(handle);
+        if (it == health_registry.end()) {
+            return nullptr;
+        }
+        monitor = it->second;
+        health_registry.erase(it);
+    }
+    monitor->stop();
+    return monitor;
+}
@@ -0,0 +1,159 @@
+"""ISO 15765-2 (ISO-TP) sessions for asyncio, on top of the native engine of :func:`ics.isotp_open`.
+
+Segmentation, flow control, STmin, block size, padding and the CAN FD data length are handled natively and messages
+are reassembled natively, Python only sees whole messages. Every session of a device shares one native thread, so
+diagnostic channels to many ECUs run side by side in one event loop:
+
+    >>> async def read_vin(device, tx_id):
+    ...     async with IsoTpSession(device, tx_id, tx_id + 8, padding=0xCC) as session:
+    ...         return await session.request(b"\\x22\\xf1\\x90", timeout=1.0)
+    ...
+    >>> async def read_vins(device):
+    ...     return await asyncio.gather(*(read_vin(device, 0x700 + i) for i in range(40)))
+"""
+import asyncio
+import collections
+from typing import Deque, Optional, Union
+
+import ics
+
+
+class IsoTpError(ics.RuntimeError):
+    """A message couldn't be sent or received: a timeout, a refused or interrupted transfer, or a closed session."""
+
+
+class IsoTpSession:
+    """One ISO-TP channel, a pair of arbitration ids on a network.
+
+    Received messages are queued until :meth:`receive` takes them; reception errors are queued with them and raised
+    in their place. One :meth:`request` runs at a time, later ones wait for it.
+    """
+
+    def __init__(
+        self,
+        device: ics.PyNeoDeviceEx,
+        tx_id: int,
+        rx_id: int,
+        netid: int = ics.NETID_HSCAN,
+        **options,
+    ):
+        """Opens the session, from a coroutine or callback of the event loop that will use it.
+
+        options are passed on to :func:`ics.isotp_open`: extended_id, fd, brs, tx_dl, padding, tx_address,
+        rx_address, block_size, st_min, timeout, max_wait_frames and max_length.
+        """
+        self._device = device
+        self._loop = asyncio.get_running_loop()
+        self._received: asyncio.Queue = asyncio.Queue()
+        # Futures of the sends, resolved in order by the native transmit events
+        self._pending: Deque[asyncio.Future] = collections.deque()
+        self._lock = asyncio.Lock()
+        self._id: Optional[int] = ics.isotp_open(device, self._on_event, netid, tx_id, rx_id, **options)
+
+    @property
+    def closed(self) -> bool:
+        return self._id is None
+
+    def _on_event(self, event: str, value: Union[bytes, str, None]) -> None:
+        # Runs on a native thread
+        try:
+            self._loop.call_soon_threadsafe(self._dispatch, event, value)
+        except RuntimeError:
+            # The event loop is closed, nobody is waiting anymore
+            pass
+
+    def _dispatch(self, event: str, value: Union[bytes, str, None]) -> None:
+        if event == "closed":
+            # The device was closed
+            if self._id is not None:
+                self._id = None
+                self._fail_waiters()
+        elif event == "received":
+            self._received.put_nowait(value)
+        elif event == "receive_error":
+            self._received.put_nowait(IsoTpError(value))
+        elif self._pending:
+            future = self._pending.popleft()
+            if future.done():
+                # Cancelled by the caller, the transmit went ahead anyway
+                return
+            if event == "sent":
+                future.set_result(None)
+            else:
+                future.set_exception(IsoTpError(value))
+
+    async def send(self, payload: bytes) -> None:
+        """Transmits payload, returns once the last frame was sent. Raises IsoTpError if the transmit failed."""
+        if self._id is None:
+            raise IsoTpError("The ISO-TP session is closed")
+        future = self._loop.create_future()
+        self._pending.append(future)
+        try:
+            queued = ics.isotp_send(self._device, self._id, payload)
+        except BaseException:
+            self._pending.remove(future)
+            raise
+        if not queued:
+            self._pending.remove(future)
+            raise IsoTpError("The ISO-TP session is closed")
+        await future
+
+    async def receive(self, timeout: Optional[float] = None) -> bytes:
+        """Returns the next received message, waiting up to timeout seconds (forever if None).
+
+        Raises asyncio.TimeoutError if nothing arrived in time and IsoTpError if the reception failed.
+        """
+        if self._id is None and self._received.empty():
+            raise IsoTpError("The ISO-TP session is closed")
+        item = await asyncio.wait_for(self._received.get(), timeout)
+        if isinstance(item, IsoTpError):
+            if self._id is None and self._received.empty():
+                # Put back for the next receiver, every receive after close() fails
+                self._received.put_nowait(item)
+            raise item
+        return item
+
+    async def request(self, payload: bytes, timeout: Optional[float] = None) -> bytes:
+        """Sends payload and returns the response, waiting up to timeout seconds for it after the send finished.
+
+        Messages received before the request are discarded, they can't be its response. UDS response pending
+        negative responses (0x7F xx 0x78) are returned like any other response.
+        """
+        async with self._lock:
+            while not self._received.empty():
+                self._received.get_nowait()
+            await self.send(payload)
+            return await self.receive(timeout)
+
+    def close(self) -> None:
+        """Closes the session, sends that didn't finish and receives waiting for a message fail.
+
+        Closing the device closes every session the same way.
+        """
+        if self._id is None:
+            return
+        session, self._id = self._id, None
+        try:
+            ics.isotp_close(self._device, session)
+        finally:
+            self._fail_waiters()
+
+    def _fail_waiters(self) -> None:
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(IsoTpError("The ISO-TP session was closed"))
+        # Wakes the receivers, messages received before are still returned first
+        self._received.put_nowait(IsoTpError("The ISO-TP session was closed"))
+
+    def __enter__(self) -> "IsoTpSession":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    async def __aenter__(self) -> "IsoTpSession":
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
@@ -0,0 +1,109 @@
+"""Runs the same operation on many devices at once.
+
+Opening a device blocks on the USB or Ethernet handshake, so bringing up a rack one device at a time adds up.
+The native calls release the GIL, :class:`DevicePool` runs them on a thread pool instead.
+
+    >>> import ics
+    >>> pool = ics.DevicePool(ics.find_devices())
+    >>> for result in pool.open_all():
+    ...     if not result.ok:
+    ...         print(result.device, result.error)
+    >>> pool.load_default_settings_all()
+    >>> pool.close_all()
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, NamedTuple, Optional, Sequence, Union
+
+import ics
+
+
+class DeviceResult(NamedTuple):
+    """Outcome of an operation on one device, error is the exception it raised or None."""
+
+    device: "ics.PyNeoDeviceEx"
+    value: Any = None
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class DevicePool:
+    """A group of devices that are opened, configured and closed together.
+
+    Every ``*_all()`` method runs on all devices concurrently and returns a list of :class:`DeviceResult`
+    in the order of :attr:`devices`. A failure on one device never stops the others, check
+    :attr:`DeviceResult.ok` of each result.
+    """
+
+    def __init__(self, devices: Optional[Iterable["ics.PyNeoDeviceEx"]] = None, max_workers: Optional[int] = None):
+        """devices defaults to ics.find_devices(). max_workers defaults to one thread per device."""
+        if devices is None:
+            devices = ics.find_devices()
+        self.devices: List["ics.PyNeoDeviceEx"] = list(devices)
+        self.max_workers = max_workers
+
+    def __len__(self) -> int:
+        return len(self.devices)
+
+    def __iter__(self):
+        return iter(self.devices)
+
+    def __enter__(self) -> "DevicePool":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close_all()
+
+    def map(
+        self, function: Callable[..., Any], *args, max_workers: Optional[int] = None, **kwargs
+    ) -> List[DeviceResult]:
+        """Calls function(device, *args, **kwargs) for every device concurrently."""
+        return self._run(lambda device: function(device, *args, **kwargs), max_workers=max_workers)
+
+    def _run(self, function: Callable[..., Any], *iterables, max_workers: Optional[int] = None) -> List[DeviceResult]:
+        """Calls function(device, *items) for every device and the items of iterables next to it, concurrently."""
+        if not self.devices:
+            return []
+        workers = max_workers or self.max_workers or len(self.devices)
+
+        def call(device, *items):
+            try:
+                return DeviceResult(device, function(device, *items))
+            except Exception as ex:
+                return DeviceResult(device, error=ex)
+
+        with ThreadPoolExecutor(max_workers=min(workers, len(self.devices))) as executor:
+            return list(executor.map(call, self.devices, *iterables))
+
+    def open_all(self, max_workers: Optional[int] = None, **kwargs) -> List[DeviceResult]:
+        """Opens every device, kwargs are passed to ics.open_device()."""
+        return self.map(ics.open_device, max_workers=max_workers, **kwargs)
+
+    def load_default_settings_all(self, max_workers: Optional[int] = None) -> List[DeviceResult]:
+        """Loads the default settings on every device, see ics.load_default_settings()."""
+        return self.map(ics.load_default_settings, max_workers=max_workers)
+
+    def set_device_settings_all(
+        self, settings: Union[Any, Sequence[Any]], *args, max_workers: Optional[int] = None
+    ) -> List[DeviceResult]:
+        """Applies settings to every device, see ics.set_device_settings() for args.
+
+        settings is either one settings structure for every device, or a sequence with one per device in the
+        order of :attr:`devices`.
+        """
+        if isinstance(settings, (list, tuple)):
+            if len(settings) != len(self.devices):
+                raise ValueError(f"Expected settings for {len(self.devices)} devices, got {len(settings)}")
+            return self._run(
+                lambda device, device_settings: ics.set_device_settings(device, device_settings, *args),
+                settings,
+                max_workers=max_workers,
+            )
+        return self.map(ics.set_device_settings, settings, *args, max_workers=max_workers)
+
+    def close_all(self, max_workers: Optional[int] = None) -> List[DeviceResult]:
+        """Closes every device, the values are the error counts from ics.close_device()."""
+        return self.map(ics.close_device, max_workers=max_workers)
+
@@ -136,16 +136,31 @@ class PyNeoDeviceEx(ics.neo_device_ex.neo_device_ex):
         return ics.coremini_read_app_signal(self, *args, **kwargs)
 
 
+    def coremini_read_app_signals(self, *args, **kwargs):
+        "See ics.coremini_read_app_signals for details on arguments."
+        return ics.coremini_read_app_signals(self, *args, **kwargs)
+
+
     def coremini_read_rx_message(self, *args, **kwargs):
         "See ics.coremini_read_rx_message for details on arguments."
         return ics.coremini_read_rx_message(self, *args, **kwargs)
 
 
+    def coremini_read_rx_messages(self, *args, **kwargs):
+        "See ics.coremini_read_rx_messages for details on arguments."
+        return ics.coremini_read_rx_messages(self, *args, **kwargs)
+
+
     def coremini_read_tx_message(self, *args, **kwargs):
         "See ics.coremini_read_tx_message for details on arguments."
         return ics.coremini_read_tx_message(self, *args, **kwargs)
 
 
+    def coremini_read_tx_messages(self, *args, **kwargs):
+        "See ics.coremini_read_tx_messages for details on arguments."
+        return ics.coremini_read_tx_messages(self, *args, **kwargs)
+
+
     def coremini_start(self, *args, **kwargs):
         "See ics.coremini_start for details on arguments."
         return ics.coremini_start(self, *args, **kwargs)
@@ -171,16 +186,31 @@ class PyNeoDeviceEx(ics.neo_device_ex.neo_device_ex):
         return ics.coremini_write_app_signal(self, *args, **kwargs)
 
 
+    def coremini_write_app_signals(self, *args, **kwargs):
+        "See ics.coremini_write_app_signals for details on arguments."
+        return ics.coremini_write_app_signals(self, *args, **kwargs)
+
+
     def coremini_write_rx_message(self, *args, **kwargs):
         "See ics.coremini_write_rx_message for details on arguments."
         return ics.coremini_write_rx_message(self, *args, **kwargs)
 
 
+    def coremini_write_rx_messages(self, *args, **kwargs):
+        "See ics.coremini_write_rx_messages for details on arguments."
+        return ics.coremini_write_rx_messages(self, *args, **kwargs)
+
+
     def coremini_write_tx_message(self, *args, **kwargs):
         "See ics.coremini_write_tx_message for details on arguments."
         return ics.coremini_write_tx_message(self, *args, **kwargs)
 
 
+    def coremini_write_tx_messages(self, *args, **kwargs):
+        "See ics.coremini_write_tx_messages for details on arguments."
+        return ics.coremini_write_tx_messages(self, *args, **kwargs)
+
+
     def create_neovi_radio_message(self, *args, **kwargs):
         "See ics.create_neovi_radio_message for details on arguments."
         return ics.create_neovi_radio_message(self, *args, **kwargs)
@@ -325,6 +355,11 @@ class PyNeoDeviceEx(ics.neo_device_ex.neo_device_ex):
         return ics.get_performance_parameters(self, *args, **kwargs)
 
 
+    def health(self, *args, **kwargs):
+        "See ics.health for details on arguments."
+        return ics.health(self, *args, **kwargs)
+
+
     def get_rtc(self, *args, **kwargs):
         "See ics.get_rtc for details on arguments."
         return ics.get_rtc(self, *args, **kwargs)
@@ -370,6 +405,28 @@ class PyNeoDeviceEx(ics.neo_device_ex.neo_device_ex):
         return ics.iso15765_transmit_message(self, *args, **kwargs)
 
 
+    def isotp_open(self, *args, **kwargs):
+        "See ics.isotp_open for details on arguments."
+        return ics.isotp_open(self, *args, **kwargs)
+
+
+    def isotp_send(self, *args, **kwargs):
+        "See ics.isotp_send for details on arguments."
+        return ics.isotp_send(self, *args, **kwargs)
+
+
+    def isotp_close(self, *args, **kwargs):
+        "See ics.isotp_close for details on arguments."
+        return ics.isotp_close(self, *args, **kwargs)
+
+
+    def isotp_session(self, *args, **kwargs):
+        "See ics.isotp.IsoTpSession for details on arguments."
+        from ics.isotp import IsoTpSession
+
+        return IsoTpSession(self, *args, **kwargs)
+
+
     def read_jupiter_firmware(self, *args, **kwargs):
         "See ics.read_jupiter_firmware for details on arguments."
         return ics.read_jupiter_firmware(self, *args, **kwargs)
@@ -380,6 +437,113 @@ class PyNeoDeviceEx(ics.neo_device_ex.neo_device_ex):
         return ics.read_sdcard(self, *args, **kwargs)
 
 
+    def read_sdcard_into(self, *args, **kwargs):
+        "See ics.read_sdcard_into for details on arguments."
+        return ics.read_sdcard_into(self, *args, **kwargs)
+
+
+    def open_sdcard(self, *args, **kwargs):
+        "See ics.sdcard.open_sdcard for details on arguments."
+        from ics.sdcard import open_sdcard
+
+        return open_sdcard(self, *args, **kwargs)
+
+
+    def replay(self, *args, **kwargs):
+        "See ics.replay for details on arguments."
+        return ics.replay(self, *args, **kwargs)
+
+
+    def replay_status(self, *args, **kwargs):
+        "See ics.replay_status for details on arguments."
+        return ics.replay_status(self, *args, **kwargs)
+
+
+    def replay_stop(self, *args, **kwargs):
+        "See ics.replay_stop for details on arguments."
+        return ics.replay_stop(self, *args, **kwargs)
+
+
+    def enable_last_value_cache(self, *args, **kwargs):
+        "See ics.enable_last_value_cache for details on arguments."
+        return ics.enable_last_value_cache(self, *args, **kwargs)
+
+
+    def disable_last_value_cache(self, *args, **kwargs):
+        "See ics.disable_last_value_cache for details on arguments."
+        return ics.disable_last_value_cache(self, *args, **kwargs)
+
+
+    def last_value(self, *args, **kwargs):
+        "See ics.last_value for details on arguments."
+        return ics.last_value(self, *args, **kwargs)
+
+
+    def last_value_snapshot(self, *args, **kwargs):
+        "See ics.last_value_snapshot for details on arguments."
+        return ics.last_value_snapshot(self, *args, **kwargs)
+
+
+    def snapshot(self, *args, **kwargs):
+        "Alias of last_value_snapshot(), see ics.last_value_snapshot for details on arguments."
+        return ics.last_value_snapshot(self, *args, **kwargs)
+
+
+    def on_message(self, *args, **kwargs):
+        "See ics.on_message for details on arguments."
+        return ics.on_message(self, *args, **kwargs)
+
+
+    def remove_message_callback(self, *args, **kwargs):
+        "See ics.remove_message_callback for details on arguments."
+        return ics.remove_message_callback(self, *args, **kwargs)
+
+
+    def enable_adaptive_receive(self, *args, **kwargs):
+        "See ics.enable_adaptive_receive for details on arguments."
+        return ics.enable_adaptive_receive(self, *args, **kwargs)
+
+
+    def disable_adaptive_receive(self, *args, **kwargs):
+        "See ics.disable_adaptive_receive for details on arguments."
+        return ics.disable_adaptive_receive(self, *args, **kwargs)
+
+
+    def receive_stats(self, *args, **kwargs):
+        "See ics.receive_stats for details on arguments."
+        return ics.receive_stats(self, *args, **kwargs)
+
+
+    def on_health(self, *args, **kwargs):
+        "See ics.on_health for details on arguments."
+        return ics.on_health(self, *args, **kwargs)
+
+
+    def remove_health_callback(self, *args, **kwargs):
+        "See ics.remove_health_callback for details on arguments."
+        return ics.remove_health_callback(self, *args, **kwargs)
+
+
+    def on_error(self, *args, **kwargs):
+        "See ics.on_error for details on arguments."
+        return ics.on_error(self, *args, **kwargs)
+
+
+    def remove_error_callback(self, *args, **kwargs):
+        "See ics.remove_error_callback for details on arguments."
+        return ics.remove_error_callback(self, *args, **kwargs)
+
+
+    def start_health_monitor(self, *args, **kwargs):
+        "See ics.start_health_monitor for details on arguments."
+        return ics.start_health_monitor(self, *args, **kwargs)
+
+
+    def stop_health_monitor(self, *args, **kwargs):
+        "See ics.stop_health_monitor for details on arguments."
+        return ics.stop_health_monitor(self, *args, **kwargs)
+
+
     def request_enter_sleep_mode(self, *args, **kwargs):
         "See ics.request_enter_sleep_mode for details on arguments."
         return ics.request_enter_sleep_mode(self, *args, **kwargs)
@@ -410,6 +574,11 @@ class PyNeoDeviceEx(ics.neo_device_ex.neo_device_ex):
         return ics.set_device_settings(self, *args, **kwargs)
 
 
+    def device_settings_stats(self, *args, **kwargs):
+        "See ics.device_settings_stats for details on arguments."
+        return ics.device_settings_stats(self, *args, **kwargs)
+
+
     def set_fd_bit_rate(self, *args, **kwargs):
         "See ics.set_fd_bit_rate for details on arguments."
         return ics.set_fd_bit_rate(self, *args, **kwargs)
@@ -478,6 +647,11 @@ class PyNeoDeviceEx(ics.neo_device_ex.neo_device_ex):
         "See ics.write_sdcard for details on arguments."
         return ics.write_sdcard(self, *args, **kwargs)
 
+
+    def write_sdcard_from(self, *args, **kwargs):
+        "See ics.write_sdcard_from for details on arguments."
+        return ics.write_sdcard_from(self, *args, **kwargs)
+
     def set_safe_boot_mode(self, *args, **kwargs):
         "See ics.set_safe_boot_mode for details on arguments."
         return ics.set_safe_boot_mode(self, *args, **kwargs)
\ No newline at end of file
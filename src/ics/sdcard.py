@@ -0,0 +1,84 @@
+"""File-like access to the SD card of a device.
+
+    >>> import shutil
+    >>> with device.open_sdcard() as card, open("sdcard.img", "wb") as f:
+    ...     card.seek(2048 * ics.sdcard.SECTOR_SIZE)
+    ...     shutil.copyfileobj(card, f, 1024 * 1024)
+"""
+import io
+from typing import Optional
+
+import ics
+
+SECTOR_SIZE = 512
+# Default read-ahead of open_sdcard(), in bytes
+READ_AHEAD = 128 * SECTOR_SIZE
+
+
+class SDCardReader(io.RawIOBase):
+    """Unbuffered reader of the SD card, see :func:`open_sdcard` for the buffered version.
+
+    Reads that start on a sector boundary go straight into the caller's buffer through
+    :func:`ics.read_sdcard_into`, everything else is read a sector at a time.
+    """
+
+    def __init__(self, device: ics.PyNeoDeviceEx, size: Optional[int] = None):
+        """size is the size of the card in bytes, reads stop there. Seeking from the end requires it."""
+        super().__init__()
+        self._device = device
+        self._size = size
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            if self._size is None:
+                raise io.UnsupportedOperation("Seeking from the end requires the size of the card")
+            position = self._size + offset
+        else:
+            raise ValueError(f"Invalid whence ({whence})")
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}")
+        self._position = position
+        return position
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast("B")
+        length = len(view)
+        if self._size is not None:
+            length = max(min(length, self._size - self._position), 0)
+        if not length:
+            return 0
+        sector, offset = divmod(self._position, SECTOR_SIZE)
+        if offset or length < SECTOR_SIZE:
+            # Unaligned, only hand back what is left of the current sector
+            data = ics.read_sdcard(self._device, sector)
+            count = max(min(length, len(data) - offset), 0)
+            view[:count] = data[offset : offset + count]
+        else:
+            count = ics.read_sdcard_into(self._device, sector, view[: length - length % SECTOR_SIZE])
+        self._position += count
+        return count
+
+
+def open_sdcard(
+    device: ics.PyNeoDeviceEx, size: Optional[int] = None, read_ahead: int = READ_AHEAD
+) -> io.BufferedReader:
+    """Returns a buffered, seekable binary file reading the SD card of device.
+
+    read_ahead is the size of the buffer in bytes, rounded up to whole sectors. Larger reads bypass it.
+    """
+    read_ahead = max(-(-read_ahead // SECTOR_SIZE), 1) * SECTOR_SIZE
+    return io.BufferedReader(SDCardReader(device, size), buffer_size=read_ahead)
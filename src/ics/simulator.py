@@ -0,0 +1,175 @@
+"""Simulated icsneolegacy backend for running without hardware.
+
+The ``ics.icsneosim`` library is built next to the extension and implements the driver API against in-memory virtual
+devices: finding and opening them, receiving and transmitting messages, settings, CoreMini scripts, SD card sectors,
+ISO15765 transmits, the device status, the performance parameters of the receive queue and the error queue. Received
+traffic is generated from the configured rate and protocol mix, transmitted messages come back as TX echoes and, with
+a shared bus, are received by the other open devices. Pipelines and the binding itself can be benchmarked and soak
+tested on machines without Intrepid hardware.
+
+    >>> import ics
+    >>> from ics import simulator
+    >>> previous = simulator.use()
+    >>> simulator.set_devices(2)
+    >>> simulator.set_traffic(rate=5000, protocols={"can": 3, "canfd": 1}, payload_sizes=(8, 64))
+    >>> device = ics.open_device()
+    >>> messages, errors = ics.get_messages(device, False, 0.1)
+    >>> simulator.counters()["generated"]
+    >>> ics.close_device(device)
+    >>> ics.override_library_name(previous)
+
+The simulation is global to the process, every device handle of the library shares it.
+"""
+import ctypes
+import importlib.util
+from typing import Dict, Mapping, Optional, Sequence, Tuple
+
+import ics
+
+# Keep in sync with the Counter enum in src/simulator/icsneosim.cpp
+COUNTERS = (
+    "tx_messages",
+    "rx_messages",
+    "generated",
+    "dropped",
+    "settings_reads",
+    "settings_writes",
+    "eeprom_writes",
+    "script_loads",
+    "sd_reads",
+    "sd_writes",
+    "iso15765_tx",
+)
+# Keep in sync with the Protocol enum in src/simulator/icsneosim.cpp
+PROTOCOLS = ("can", "canfd", "lin", "ethernet")
+DEFAULT_SERIAL_BASE = 500000
+
+_library = None
+
+
+def library_path() -> str:
+    """Returns the path of the simulator library, raises RuntimeError if it wasn't built."""
+    spec = importlib.util.find_spec("ics.icsneosim")
+    if spec is None or not spec.origin:
+        raise RuntimeError("The ics.icsneosim simulator library isn't installed")
+    return spec.origin
+
+
+def _get_library() -> ctypes.CDLL:
+    global _library
+    if _library is None:
+        library = ctypes.CDLL(library_path())
+        library.icsneosim_reset.argtypes = []
+        library.icsneosim_reset.restype = None
+        library.icsneosim_set_devices.argtypes = [ctypes.c_int, ctypes.c_uint, ctypes.c_int]
+        library.icsneosim_set_devices.restype = None
+        library.icsneosim_set_traffic.argtypes = [
+            ctypes.c_double,
+            ctypes.POINTER(ctypes.c_int),
+            ctypes.c_int,
+            ctypes.c_int,
+            ctypes.c_uint64,
+        ]
+        library.icsneosim_set_traffic.restype = ctypes.c_int
+        library.icsneosim_set_loopback.argtypes = [ctypes.c_int]
+        library.icsneosim_set_loopback.restype = None
+        library.icsneosim_set_shared_bus.argtypes = [ctypes.c_int]
+        library.icsneosim_set_shared_bus.restype = None
+        library.icsneosim_get_counters.argtypes = [ctypes.POINTER(ctypes.c_uint64), ctypes.c_int]
+        library.icsneosim_get_counters.restype = ctypes.c_int
+        library.icsneosim_add_errors.argtypes = [ctypes.POINTER(ctypes.c_int), ctypes.c_int]
+        library.icsneosim_add_errors.restype = None
+        library.icsneosim_get_script.argtypes = [ctypes.c_int, ctypes.POINTER(ctypes.c_ubyte), ctypes.c_int]
+        library.icsneosim_get_script.restype = ctypes.c_int
+        _library = library
+    return _library
+
+
+def use() -> str:
+    """Makes the ics module use the simulator instead of the driver, returns the library path it used before.
+
+    Pass the returned path to :func:`ics.override_library_name` to switch back.
+    """
+    previous = ics.get_library_path()
+    ics.override_library_name(library_path())
+    return previous
+
+
+def reset() -> None:
+    """Restores the default configuration: one closed FIRE3, no generated traffic, loopback enabled and no shared bus.
+
+    The counters are cleared and handles of open devices become invalid.
+    """
+    _get_library().icsneosim_reset()
+
+
+def set_devices(count: int = 1, device_type: Optional[int] = None, serial_base: int = DEFAULT_SERIAL_BASE) -> None:
+    """Replaces the virtual devices with count devices of device_type, numbered from serial_base.
+
+    device_type defaults to ics.NEODEVICE_FIRE3. Handles of open devices become invalid.
+    """
+    if device_type is None:
+        device_type = ics.NEODEVICE_FIRE3
+    _get_library().icsneosim_set_devices(count, device_type, serial_base)
+
+
+def set_traffic(
+    rate: float = 0.0,
+    protocols: Optional[Mapping[str, int]] = None,
+    payload_sizes: Tuple[int, int] = (8, 8),
+    seed: int = 1,
+) -> None:
+    """Configures the traffic every open device receives.
+
+    rate is messages per second and device, 0 turns the generated traffic off. protocols weighs the protocols of
+    the messages against each other, {"can": 3, "canfd": 1} makes a quarter of them CAN FD, the default is only
+    CAN. Payload lengths are uniformly distributed over payload_sizes (inclusive) and clamped to what the protocol
+    allows. The same seed generates the same traffic.
+    """
+    if protocols is None:
+        protocols = {"can": 1}
+    unknown = set(protocols) - set(PROTOCOLS)
+    if unknown:
+        raise ValueError(f"Unknown protocols {sorted(unknown)}, expected some of {PROTOCOLS}")
+    weights = (ctypes.c_int * len(PROTOCOLS))(*(protocols.get(name, 0) for name in PROTOCOLS))
+    if not _get_library().icsneosim_set_traffic(rate, weights, payload_sizes[0], payload_sizes[1], seed):
+        raise ValueError(f"Invalid traffic rate={rate}, protocols={dict(protocols)}, payload_sizes={payload_sizes}")
+
+
+def set_loopback(enabled: bool = True) -> None:
+    """Enables or disables the TX echoes of transmitted messages and ISO15765 frames."""
+    _get_library().icsneosim_set_loopback(int(enabled))
+
+
+def set_shared_bus(enabled: bool = True) -> None:
+    """Enables or disables delivering transmitted messages to every other open device, without the TX flag.
+
+    Two open devices can then talk to each other, e.g. a tester and a simulated ECU.
+    """
+    _get_library().icsneosim_set_shared_bus(int(enabled))
+
+
+def add_errors(codes: Sequence[int]) -> None:
+    """Queues the error codes on every open device, ics.get_error_messages() returns them once.
+
+    Like the driver's, the error queue of a device holds the latest 600 errors.
+    """
+    values = (ctypes.c_int * len(codes))(*codes)
+    _get_library().icsneosim_add_errors(values, len(values))
+
+
+def script(serial_number: int = DEFAULT_SERIAL_BASE) -> bytes:
+    """Returns the CoreMini script loaded on the device with serial_number, raises ValueError if there is none."""
+    length = _get_library().icsneosim_get_script(serial_number, None, 0)
+    if length < 0:
+        raise ValueError(f"There is no simulated device {serial_number}")
+    data = (ctypes.c_ubyte * length)()
+    _get_library().icsneosim_get_script(serial_number, data, length)
+    return bytes(data)
+
+
+def counters() -> Dict[str, int]:
+    """Returns what the simulator did since the last reset, see COUNTERS."""
+    values = (ctypes.c_uint64 * len(COUNTERS))()
+    _get_library().icsneosim_get_counters(values, len(values))
+    return dict(zip(COUNTERS, values))
@@ -0,0 +1,215 @@
+"""Fast conversion between the ics.structures types and flat, JSON friendly dicts.
+
+Every generated structure carries a ``_dict_layout_`` with the offset and struct format of each of its fields,
+flattened to dotted paths. On first use it is compiled into one :class:`struct.Struct` per structure so a whole
+settings block is read or written with a single unpack/pack instead of walking ``_fields_`` attribute by attribute.
+
+    >>> import json, ics
+    >>> settings = ics.get_device_settings(device)
+    >>> values = settings.to_dict()
+    >>> values["Settings.fire3.can1.Baudrate"]
+    >>> text = json.dumps(values)
+    >>> settings = type(settings).from_dict(json.loads(text))
+
+Arrays are lists, arrays of structures are lists of dicts. Unions serialize the member that covers all of their
+bytes, except for the ``Settings`` union of ``s_device_settings`` which serializes the member selected by
+``DeviceSettingType``.
+"""
+import ctypes
+import struct
+from operator import itemgetter
+from typing import Any, Dict, Type, TypeVar, Union
+
+T = TypeVar("T")
+
+
+def to_dict(obj: Any) -> Dict[str, Any]:
+    """Returns the fields of a generated ctypes structure as a flat dict of dotted paths."""
+    return _compile(type(obj)).to_dict(obj, 0)
+
+
+def from_dict(target: Union[Type[T], T], data: Dict[str, Any]) -> T:
+    """Writes the fields in data into target and returns it.
+
+    target is either a generated structure type, in which case a zeroed instance is created, or an instance which
+    is updated in place. data may contain any subset of the paths returned by :func:`to_dict`, fields that are
+    not in data keep their value. Raises KeyError for paths that don't exist.
+    """
+    obj = target() if isinstance(target, type) else target
+    _compile(type(obj)).update(obj, 0, data)
+    return obj
+
+
+def _compile(ctype, prefix=""):
+    cache = ctype.__dict__.get("_dict_compiled_")
+    if cache is None:
+        cache = {}
+        ctype._dict_compiled_ = cache
+    compiled = cache.get(prefix)
+    if compiled is None:
+        compiled = _CompiledLayout(ctype, prefix)
+        cache[prefix] = compiled
+    return compiled
+
+
+class _CompiledLayout:
+    """A _dict_layout_ compiled for one path prefix."""
+
+    def __init__(self, ctype, prefix):
+        layout = ctype.__dict__.get("_dict_layout_")
+        if layout is None:
+            raise TypeError(f"{ctype.__name__} has no generated dict layout")
+        size, fields = layout
+        if ctypes.sizeof(ctype) != size:
+            raise RuntimeError(f"{ctype.__name__} dict layout is out of date, regenerate ics.structures")
+        self.size = size
+        # Storage units of the primitive fields in offset order, bitfields share the unit they live in.
+        units = {(offset, fmt, count or 1) for path, offset, fmt, count, extra in fields if isinstance(fmt, str)}
+        parts = []
+        position = 0
+        index = 0
+        unit_index = {}
+        for offset, fmt, count in sorted(units):
+            if offset < position:
+                raise RuntimeError(f"{ctype.__name__} dict layout has overlapping fields at offset {offset}")
+            if offset > position:
+                # Padding and the bytes of nested unions are kept as raw bytes so packing writes them back unchanged
+                parts.append(f"{offset - position}s")
+                index += 1
+            unit_index[offset, fmt, count] = index
+            parts.append(f"{count}{fmt}")
+            index += count
+            position = offset + struct.calcsize(f"={count}{fmt}")
+        if position < size:
+            parts.append(f"{size - position}s")
+        self.struct = struct.Struct("=" + "".join(parts))
+
+        scalar_paths = []
+        scalar_indexes = []
+        self.arrays = []
+        self.bitfields = []
+        self.structures = []
+        self.unions = []
+        self.fields = {}
+        for path, offset, fmt, count, extra in fields:
+            path = prefix + path
+            if isinstance(fmt, str):
+                index = unit_index[offset, fmt, count or 1]
+                if extra:
+                    shift, width = extra
+                    mask = (1 << width) - 1
+                    sign = 1 << (width - 1) if fmt.islower() else 0
+                    field = ("bits", index, shift, mask, sign)
+                    self.bitfields.append((path, index, shift, mask, sign))
+                elif count:
+                    field = ("array", index, index + count)
+                    self.arrays.append((path, index, index + count))
+                else:
+                    field = ("scalar", index)
+                    scalar_paths.append(path)
+                    scalar_indexes.append(index)
+                self.fields[path] = field
+            elif count:
+                element_size = ctypes.sizeof(fmt)
+                self.structures.append((path, offset, fmt, count, element_size))
+                self.fields[path] = ("structures", len(self.structures) - 1)
+            else:
+                selector, names = extra
+                members = {member[0]: member[1] for member in fmt._fields_}
+                variants = {value: (members[name], f"{path}.{name}.") for value, name in names.items()}
+                self.unions.append((offset, fmt, f"{path}.", prefix + selector, variants))
+        self.scalar_paths = tuple(scalar_paths)
+        if len(scalar_indexes) == 1:
+            self.scalar_values = lambda values, index=scalar_indexes[0]: (values[index],)
+        elif scalar_indexes:
+            self.scalar_values = itemgetter(*scalar_indexes)
+        else:
+            self.scalar_values = lambda values: ()
+
+    def _union(self, union, selector):
+        offset, ctype, prefix, selector_path, variants = union
+        variant = variants.get(selector)
+        if variant is None:
+            # Unknown selector, fall back to the member covering the whole union
+            return _compile(ctype, prefix)
+        return _compile(variant[0], variant[1])
+
+    def to_dict(self, buffer, offset):
+        values = self.struct.unpack_from(buffer, offset)
+        result = dict(zip(self.scalar_paths, self.scalar_values(values)))
+        for path, start, stop in self.arrays:
+            result[path] = list(values[start:stop])
+        for path, index, shift, mask, sign in self.bitfields:
+            value = (values[index] >> shift) & mask
+            if value & sign:
+                value -= mask + 1
+            result[path] = value
+        for path, structure_offset, ctype, count, element_size in self.structures:
+            element = _compile(ctype)
+            start = offset + structure_offset
+            result[path] = [element.to_dict(buffer, start + i * element_size) for i in range(count)]
+        for union in self.unions:
+            member = self._union(union, result[union[3]])
+            result.update(member.to_dict(buffer, offset + union[0]))
+        return result
+
+    def update(self, buffer, offset, data):
+        values = list(self.struct.unpack_from(buffer, offset))
+        structures = []
+        leftover = {}
+        for path, value in data.items():
+            field = self.fields.get(path)
+            if field is None:
+                leftover[path] = value
+                continue
+            kind = field[0]
+            if kind == "scalar":
+                values[field[1]] = value
+            elif kind == "bits":
+                index, shift, mask = field[1], field[2], field[3]
+                values[index] = (values[index] & ~(mask << shift)) | ((value & mask) << shift)
+            elif kind == "array":
+                start, stop = field[1], field[2]
+                if len(value) != stop - start:
+                    raise ValueError(f"{path} expects {stop - start} values, got {len(value)}")
+                values[start:stop] = value
+            else:
+                structure = self.structures[field[1]]
+                if len(value) != structure[3]:
+                    raise ValueError(f"{path} expects {structure[3]} elements, got {len(value)}")
+                structures.append((structure, value))
+        unions = []
+        for union in self.unions:
+            selector_path = union[3]
+            if selector_path in data:
+                selector = data[selector_path]
+            else:
+                selector = values[self.fields[selector_path][1]]
+            member = self._union(union, selector)
+            paths = member.paths
+            member_data = {path: leftover.pop(path) for path in list(leftover) if path in paths}
+            unions.append((union[0], member, member_data))
+        if leftover:
+            raise KeyError(next(iter(leftover)))
+        self.struct.pack_into(buffer, offset, *values)
+        for (path, structure_offset, ctype, count, element_size), elements in structures:
+            element = _compile(ctype)
+            start = offset + structure_offset
+            for i, element_data in enumerate(elements):
+                element.update(buffer, start + i * element_size, element_data)
+        for union_offset, member, member_data in unions:
+            if member_data:
+                member.update(buffer, offset + union_offset, member_data)
+
+    @property
+    def paths(self):
+        """Every path this layout accepts, including the ones of its selected union members."""
+        paths = getattr(self, "_paths", None)
+        if paths is None:
+            paths = set(self.fields)
+            for union in self.unions:
+                for ctype, prefix in union[4].values():
+                    paths |= _compile(ctype, prefix).paths
+                paths |= _compile(union[1], union[2]).paths
+            self._paths = paths
+        return paths
@@ -0,0 +1,70 @@
+"""NumPy structured dtypes for the ics.structures types, requires numpy.
+
+Every generated structure carries a ``_dtype_layout_`` next to its ``_dict_layout_``. :func:`dtype` turns it into
+a :class:`numpy.dtype` with the same size and field offsets as the ctypes type, so raw buffers of many structures
+can be viewed without copying and processed column by column.
+
+    >>> from ics.structures.ics_spy_message import ics_spy_message
+    >>> messages = ics.struct_dtype.frombuffer(ics_spy_message, raw)
+    >>> messages["ArbIDOrHeader"][messages["NetworkID"] == ics.NETID_HSCAN]
+    >>> messages["StatusBitField3"]
+
+Nested structures are nested dtypes, arrays are subarrays and the fields of anonymous members are added to the
+structure that holds them, the same names ctypes uses. Bitfields have no NumPy equivalent, :func:`bitfields`
+extracts them into arrays of their own.
+"""
+from typing import Any, Dict
+
+import numpy
+
+
+def dtype(ctype) -> numpy.dtype:
+    """Returns the structured dtype of a generated ctypes structure or union type."""
+    cached = ctype.__dict__.get("_dtype_")
+    if cached is None:
+        layout = ctype.__dict__.get("_dtype_layout_")
+        if layout is None:
+            raise TypeError(f"{ctype.__name__} has no generated dtype layout")
+        size, fields = layout
+        names = []
+        formats = []
+        offsets = []
+        for name, offset, fmt, shape in fields:
+            if not isinstance(fmt, str):
+                fmt = dtype(fmt)
+            names.append(name)
+            formats.append((fmt, shape) if shape else fmt)
+            offsets.append(offset)
+        cached = numpy.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": size})
+        ctype._dtype_ = cached
+    return cached
+
+
+def frombuffer(ctype, buffer: Any, count: int = -1, offset: int = 0) -> numpy.ndarray:
+    """Views buffer as an array of ctype without copying, see numpy.frombuffer()."""
+    return numpy.frombuffer(buffer, dtype(ctype), count, offset)
+
+
+def bitfields(array: numpy.ndarray, ctype) -> Dict[str, numpy.ndarray]:
+    """Returns every bitfield of ctype in array as {path: values}, with the dotted paths of to_dict().
+
+    array is an array of dtype(ctype), or a field of a larger array that has that dtype. Bitfields inside arrays
+    of structures and inside the selected union of s_device_settings are not included, pass those fields with
+    their own type instead.
+    """
+    if array.dtype.itemsize != ctype._dict_layout_[0]:
+        raise ValueError(f"Expected an array of {ctype.__name__}, got {array.dtype}")
+    result = {}
+    for path, offset, fmt, count, extra in ctype._dict_layout_[1]:
+        if not isinstance(fmt, str) or not extra:
+            continue
+        shift, width = extra
+        unit_type = numpy.dtype(fmt)
+        unit = array.getfield(unit_type, offset)
+        if unit_type.kind == "i":
+            # Sign extend by moving the field to the top of the unit and back
+            unused = unit_type.itemsize * 8 - width
+            result[path] = (unit << (unused - shift)) >> unused
+        else:
+            result[path] = (unit >> shift) & ((1 << width) - 1)
+    return result
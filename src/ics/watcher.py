@@ -0,0 +1,53 @@
+"""Hot-plug notifications and a cached device list.
+
+    >>> import ics
+    >>> def changed(added, removed):
+    ...     for device in added:
+    ...         print("added", device)
+    ...     for device in removed:
+    ...         print("removed", device)
+    >>> watcher = ics.DeviceWatcher(1.0, changed)
+    >>> devices = ics.find_devices(cached=True)
+    >>> watcher.stop()
+"""
+import weakref
+from typing import Callable, Optional, Tuple
+
+import ics
+
+DeviceCallback = Callable[[Tuple["ics.PyNeoDeviceEx", ...], Tuple["ics.PyNeoDeviceEx", ...]], None]
+
+
+class DeviceWatcher:
+    """Enumerates devices every interval seconds on a native thread, see :func:`ics.start_device_watcher`.
+
+    callback(added, removed) runs on that thread whenever devices were connected or disconnected, the first
+    scan reports every connected device as added. While a watcher runs, ``ics.find_devices(cached=True)``
+    returns the devices of its last scan instead of searching.
+    """
+
+    def __init__(self, interval: float = 1.0, callback: Optional[DeviceCallback] = None):
+        self._id = ics.start_device_watcher(interval, callback)
+        # Stop the native thread when the watcher is garbage collected or the interpreter exits
+        self._finalizer = weakref.finalize(self, ics.stop_device_watcher, self._id)
+
+    @property
+    def running(self) -> bool:
+        return self._finalizer.alive
+
+    @property
+    def devices(self) -> Optional[Tuple["ics.PyNeoDeviceEx", ...]]:
+        """Devices found by the last scan, None before the first scan completed or after stop()."""
+        if not self.running:
+            return None
+        return ics.device_watcher_devices(self._id)
+
+    def stop(self) -> None:
+        """Stops the watcher, waiting for a scan in progress."""
+        self._finalizer()
+
+    def __enter__(self) -> "DeviceWatcher":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
@@ -0,0 +1,678 @@
+#include "isotp.h"
+#include "worker.h"
+
+#include <algorithm>
+#include <cstring>
+#include <map>
+
+// Consecutive frames sent back to back with an STmin of 0 before the other sessions get their turn
+static const int ISOTP_MAX_BURST = 64;
+// Never allocate more than this up front for a reception, the buffer grows with the consecutive frames
+static const size_t ISOTP_MAX_RESERVE = 1 << 20;
+// Padding of frames that have to be longer than their data without a padding byte configured
+static const uint8_t ISOTP_DEFAULT_PADDING = 0xCC;
+
+// Protocol control information, upper nibble of the first byte
+enum
+{
+    ISOTP_SINGLE_FRAME = 0x0,
+    ISOTP_FIRST_FRAME = 0x1,
+    ISOTP_CONSECUTIVE_FRAME = 0x2,
+    ISOTP_FLOW_CONTROL = 0x3,
+};
+
+enum
+{
+    ISOTP_FLOW_STATUS_CONTINUE = 0x0,
+    ISOTP_FLOW_STATUS_WAIT = 0x1,
+    ISOTP_FLOW_STATUS_OVERFLOW = 0x2,
+};
+
+// Rounds a CAN FD frame length up to the next valid data length
+static size_t isotp_canfd_length(size_t length)
+{
+    static const size_t LENGTHS[] = { 0, 1, 2, 3, 4, 5, 6, 7, 8, 12, 16, 20, 24, 32, 48, 64 };
+    for (size_t valid : LENGTHS) {
+        if (length <= valid) {
+            return valid;
+        }
+    }
+    return 64;
+}
+
+bool isotp_valid_tx_dl(int length)
+{
+    return length >= 8 && length <= 64 && isotp_canfd_length((size_t)length) == (size_t)length;
+}
+
+bool isotp_valid_st_min(int value)
+{
+    return (value >= 0 && value <= 0x7F) || (value >= 0xF1 && value <= 0xF9);
+}
+
+// Separation time of a received STmin byte, reserved values are treated as the longest one (0x7F)
+static std::chrono::steady_clock::duration isotp_st_min_duration(uint8_t value)
+{
+    if (value <= 0x7F) {
+        return std::chrono::milliseconds(value);
+    }
+    if (value >= 0xF1 && value <= 0xF9) {
+        return std::chrono::microseconds((value - 0xF0) * 100);
+    }
+    return std::chrono::milliseconds(0x7F);
+}
+
+static std::chrono::steady_clock::duration isotp_timeout(const IsoTpConfig& config)
+{
+    return std::chrono::duration_cast<std::chrono::steady_clock::duration>(
+        std::chrono::duration<double>(config.timeout));
+}
+
+IsoTpEngine::IsoTpEngine(TxFunction tx)
+  : m_tx(tx)
+  , m_stop(false)
+  , m_next_id(1)
+{
+}
+
+IsoTpEngine::~IsoTpEngine()
+{
+    stop();
+}
+
+void IsoTpEngine::start()
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    if (m_thread.joinable()) {
+        return;
+    }
+    m_stop = false;
+    // The thread keeps the engine alive, a callback may drop the last reference by closing the device.
+    auto self = shared_from_this();
+    m_thread = std::thread([self] { self->run(); });
+}
+
+void IsoTpEngine::stop()
+{
+    worker_stop(m_mutex, m_stop, m_cv, m_thread);
+}
+
+int IsoTpEngine::open(const IsoTpConfig& config, Callback callback)
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    auto session = std::make_shared<Session>();
+    session->id = m_next_id++;
+    session->subscription = -1;
+    session->config = config;
+    session->callback = callback;
+    session->tx_state = TX_IDLE;
+    m_sessions[session->id] = session;
+    return session->id;
+}
+
+void IsoTpEngine::set_subscription(int id, int subscription)
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    auto it = m_sessions.find(id);
+    if (it != m_sessions.end()) {
+        it->second->subscription = subscription;
+    }
+}
+
+int IsoTpEngine::close(int id)
+{
+    std::shared_ptr<Session> removed;
+    {
+        std::lock_guard<std::mutex> lock(m_mutex);
+        auto it = m_sessions.find(id);
+        if (it == m_sessions.end()) {
+            return -1;
+        }
+        removed = it->second;
+        m_sessions.erase(it);
+    }
+    const int subscription = removed->subscription;
+    // Releasing the callback may need the GIL, never do it while holding the lock.
+    removed.reset();
+    return subscription;
+}
+
+bool IsoTpEngine::empty()
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    return m_sessions.empty();
+}
+
+void IsoTpEngine::close_all()
+{
+    std::vector<Event> events;
+    {
+        std::lock_guard<std::mutex> lock(m_mutex);
+        for (auto& item : m_sessions) {
+            events.push_back({ item.second, ISOTP_CLOSED, {}, std::string() });
+        }
+        m_sessions.clear();
+    }
+    dispatch(events);
+}
+
+bool IsoTpEngine::send(int id, std::vector<uint8_t> payload)
+{
+    {
+        std::lock_guard<std::mutex> lock(m_mutex);
+        auto it = m_sessions.find(id);
+        if (it == m_sessions.end()) {
+            return false;
+        }
+        it->second->tx_queue.push_back(std::move(payload));
+    }
+    m_cv.notify_all();
+    return true;
+}
+
+void IsoTpEngine::process(int id, std::vector<OwnedMessage>& frames, size_t dropped)
+{
+    std::vector<Transmit> transmits;
+    std::vector<Event> events;
+    {
+        std::lock_guard<std::mutex> lock(m_mutex);
+        auto it = m_sessions.find(id);
+        if (it == m_sessions.end()) {
+            return;
+        }
+        auto session = it->second;
+        const IsoTpConfig& config = session->config;
+        if (dropped && session->rx_active) {
+            abort_receive(session, "Frames of the message were dropped, the receive dispatcher fell behind", events);
+        }
+        for (auto& frame : frames) {
+            const icsSpyMessage& msg = frame.msg;
+            // Our own TX echoes, and frames with the same id of the other identifier type
+            if ((msg.StatusBitField & SPY_STATUS_TX_MSG) ||
+                ((msg.StatusBitField & SPY_STATUS_XTD_FRAME) != 0) != config.extended_id) {
+                continue;
+            }
+            const uint8_t* data = msg.Data;
+            size_t length = (std::min)((size_t)msg.NumberBytesData, sizeof(msg.Data));
+            if (!frame.payload.empty()) {
+                data = frame.payload.data();
+                length = frame.payload.size();
+            }
+            if (config.rx_address >= 0) {
+                if (!length || data[0] != (uint8_t)config.rx_address) {
+                    continue;
+                }
+                ++data;
+                --length;
+            }
+            receive_frame(session, data, length, transmits, events);
+        }
+    }
+    flush(transmits, events);
+    // A flow control frame may have made consecutive frames due
+    m_cv.notify_all();
+    dispatch(events);
+}
+
+void IsoTpEngine::run()
+{
+    std::vector<Transmit> transmits;
+    std::vector<Event> events;
+    std::unique_lock<std::mutex> lock(m_mutex);
+    while (!m_stop) {
+        const auto now = clock::now();
+        auto next = now + std::chrono::seconds(1);
+        for (auto& item : m_sessions) {
+            next = (std::min)(next, service(item.second, now, transmits, events));
+        }
+        if (!transmits.empty() || !events.empty()) {
+            lock.unlock();
+            flush(transmits, events);
+            dispatch(events);
+            lock.lock();
+            continue;
+        }
+        if (next > now) {
+            m_cv.wait_until(lock, next);
+        }
+    }
+}
+
+IsoTpEngine::clock::time_point IsoTpEngine::service(std::shared_ptr<Session>& session,
+                                                    clock::time_point now,
+                                                    std::vector<Transmit>& transmits,
+                                                    std::vector<Event>& events)
+{
+    Session& s = *session;
+    // A transmit that ends in this pass can still fail in flush(), the next one waits for the next pass
+    const bool idle = s.tx_state == TX_IDLE;
+    if (s.rx_active && now >= s.rx_deadline) {
+        abort_receive(session, "Timed out waiting for a consecutive frame", events);
+    }
+    if (s.tx_state == TX_FAILED) {
+        fail_transmit(session, std::string(s.tx_error), events);
+    }
+    if (s.tx_state == TX_WAIT_FLOW_CONTROL && now >= s.tx_deadline) {
+        fail_transmit(session, "Timed out waiting for a flow control frame", events);
+    }
+    if (s.tx_state == TX_SENDING && now >= s.tx_deadline) {
+        send_consecutive_frames(session, transmits);
+    }
+    if (idle && !s.tx_queue.empty()) {
+        start_transmit(session, now, transmits);
+    }
+
+    auto next = clock::time_point::max();
+    if (s.rx_active) {
+        next = s.rx_deadline;
+    }
+    if (s.tx_state != TX_IDLE) {
+        next = (std::min)(next, s.tx_deadline);
+    } else if (!s.tx_queue.empty()) {
+        next = now;
+    }
+    return next;
+}
+
+void IsoTpEngine::start_transmit(std::shared_ptr<Session>& session, clock::time_point now, std::vector<Transmit>& transmits)
+{
+    Session& s = *session;
+    s.tx_payload = std::move(s.tx_queue.front());
+    s.tx_queue.pop_front();
+    const size_t length = s.tx_payload.size();
+    const size_t capacity = frame_capacity(s);
+    const size_t address = s.config.tx_address >= 0 ? 1 : 0;
+
+    std::vector<uint8_t> frame;
+    frame.reserve(capacity);
+    if (length + 1 + address <= 8) {
+        frame.push_back((uint8_t)((ISOTP_SINGLE_FRAME << 4) | length));
+        frame.insert(frame.end(), s.tx_payload.begin(), s.tx_payload.end());
+    } else if (s.config.fd && length + 2 <= capacity) {
+        // Single frames longer than 8 bytes escape the length into the second byte
+        frame.push_back(ISOTP_SINGLE_FRAME << 4);
+        frame.push_back((uint8_t)length);
+        frame.insert(frame.end(), s.tx_payload.begin(), s.tx_payload.end());
+    }
+    if (!frame.empty()) {
+        s.tx_payload = std::vector<uint8_t>();
+        transmits.push_back({ session, std::move(frame), false, "Failed to transmit a single frame", true, {}, {} });
+        return;
+    }
+
+    if (length <= 0xFFF) {
+        frame.push_back((uint8_t)((ISOTP_FIRST_FRAME << 4) | (length >> 8)));
+        frame.push_back((uint8_t)(length & 0xFF));
+    } else {
+        // Messages longer than 4095 bytes escape the length into the next four bytes
+        frame.push_back(ISOTP_FIRST_FRAME << 4);
+        frame.push_back(0);
+        for (int shift = 24; shift >= 0; shift -= 8) {
+            frame.push_back((uint8_t)((length >> shift) & 0xFF));
+        }
+    }
+    const size_t first = capacity - frame.size();
+    frame.insert(frame.end(), s.tx_payload.begin(), s.tx_payload.begin() + first);
+    s.tx_offset = first;
+    s.tx_sequence = 1;
+    s.tx_wait_frames = 0;
+    s.tx_state = TX_WAIT_FLOW_CONTROL;
+    s.tx_deadline = now + isotp_timeout(s.config);
+    transmits.push_back({ session,
+                          std::move(frame),
+                          false,
+                          "Failed to transmit a first frame",
+                          false,
+                          s.tx_deadline,
+                          isotp_timeout(s.config) });
+}
+
+void IsoTpEngine::send_consecutive_frames(std::shared_ptr<Session>& session, std::vector<Transmit>& transmits)
+{
+    Session& s = *session;
+    const size_t capacity = frame_capacity(s) - 1;
+    for (int burst = 0; burst < ISOTP_MAX_BURST; ++burst) {
+        const size_t count = (std::min)(capacity, s.tx_payload.size() - s.tx_offset);
+        std::vector<uint8_t> frame;
+        frame.reserve(capacity + 1);
+        frame.push_back((uint8_t)((ISOTP_CONSECUTIVE_FRAME << 4) | s.tx_sequence));
+        frame.insert(frame.end(), s.tx_payload.begin() + s.tx_offset, s.tx_payload.begin() + s.tx_offset + count);
+        transmits.push_back({ session, std::move(frame), false, "Failed to transmit a consecutive frame", false, {}, {} });
+        Transmit& item = transmits.back();
+        s.tx_offset += count;
+        s.tx_sequence = (s.tx_sequence + 1) & 0x0F;
+        if (s.tx_offset >= s.tx_payload.size()) {
+            s.tx_state = TX_IDLE;
+            s.tx_payload = std::vector<uint8_t>();
+            item.last = true;
+            return;
+        }
+        if (s.tx_block_remaining > 0 && --s.tx_block_remaining == 0) {
+            s.tx_state = TX_WAIT_FLOW_CONTROL;
+            item.wait = isotp_timeout(s.config);
+            item.deadline = s.tx_deadline = clock::now() + item.wait;
+            return;
+        }
+        if (s.tx_st_min.count() > 0) {
+            // Measured from the transmit by flush(), the separation time is a minimum
+            item.wait = s.tx_st_min;
+            item.deadline = s.tx_deadline = clock::now() + item.wait;
+            return;
+        }
+    }
+    // Let the other sessions transmit before the rest of the block
+    s.tx_deadline = clock::now();
+}
+
+void IsoTpEngine::receive_frame(std::shared_ptr<Session>& session,
+                                const uint8_t* data,
+                                size_t length,
+                                std::vector<Transmit>& transmits,
+                                std::vector<Event>& events)
+{
+    Session& s = *session;
+    if (!length) {
+        return;
+    }
+    const auto now = clock::now();
+    switch (data[0] >> 4) {
+        case ISOTP_SINGLE_FRAME: {
+            size_t size = data[0] & 0x0F;
+            size_t offset = 1;
+            if (!size) {
+                if (length < 2) {
+                    return;
+                }
+                size = data[1];
+                offset = 2;
+            }
+            // Invalid lengths are ignored
+            if (!size || offset + size > length) {
+                return;
+            }
+            if (s.rx_active) {
+                abort_receive(session, "A single frame interrupted the reception of a message", events);
+            }
+            events.push_back({ session, ISOTP_RECEIVED, std::vector<uint8_t>(data + offset, data + offset + size), std::string() });
+            break;
+        }
+        case ISOTP_FIRST_FRAME: {
+            if (length < 2) {
+                return;
+            }
+            size_t size = ((data[0] & 0x0F) << 8) | data[1];
+            size_t offset = 2;
+            if (!size) {
+                if (length < 6) {
+                    return;
+                }
+                size = ((size_t)data[2] << 24) | ((size_t)data[3] << 16) | ((size_t)data[4] << 8) | data[5];
+                offset = 6;
+            }
+            if (offset >= length || size <= length - offset) {
+                return;
+            }
+            if (s.rx_active) {
+                abort_receive(session, "A first frame interrupted the reception of a message", events);
+            }
+            if (size > s.config.max_length) {
+                queue_flow_control(session, ISOTP_FLOW_STATUS_OVERFLOW, std::string(), transmits);
+                events.push_back({ session,
+                                   ISOTP_RECEIVE_ERROR,
+                                   {},
+                                   "Refused a message of " + std::to_string(size) + " bytes, longer than max_length" });
+                return;
+            }
+            s.rx_payload.clear();
+            s.rx_payload.reserve((std::min)(size, ISOTP_MAX_RESERVE));
+            s.rx_payload.insert(s.rx_payload.end(), data + offset, data + length);
+            s.rx_length = size;
+            s.rx_sequence = 1;
+            s.rx_block_remaining = s.config.block_size;
+            s.rx_active = true;
+            s.rx_deadline = now + isotp_timeout(s.config);
+            queue_flow_control(session, ISOTP_FLOW_STATUS_CONTINUE, "Failed to transmit a flow control frame", transmits);
+            break;
+        }
+        case ISOTP_CONSECUTIVE_FRAME: {
+            // Consecutive frames without a first frame are ignored
+            if (!s.rx_active) {
+                return;
+            }
+            if ((data[0] & 0x0F) != s.rx_sequence) {
+                abort_receive(session,
+                              "Expected consecutive frame " + std::to_string(s.rx_sequence) + ", received " +
+                                  std::to_string(data[0] & 0x0F),
+                              events);
+                return;
+            }
+            s.rx_sequence = (s.rx_sequence + 1) & 0x0F;
+            const size_t count = (std::min)(length - 1, s.rx_length - s.rx_payload.size());
+            s.rx_payload.insert(s.rx_payload.end(), data + 1, data + 1 + count);
+            if (s.rx_payload.size() >= s.rx_length) {
+                s.rx_active = false;
+                events.push_back({ session, ISOTP_RECEIVED, std::move(s.rx_payload), std::string() });
+                s.rx_payload = std::vector<uint8_t>();
+                return;
+            }
+            s.rx_deadline = now + isotp_timeout(s.config);
+            if (s.rx_block_remaining > 0 && --s.rx_block_remaining == 0) {
+                s.rx_block_remaining = s.config.block_size;
+                queue_flow_control(
+                    session, ISOTP_FLOW_STATUS_CONTINUE, "Failed to transmit a flow control frame", transmits);
+            }
+            break;
+        }
+        case ISOTP_FLOW_CONTROL:
+            flow_control(s, data, length);
+            break;
+        default:
+            break;
+    }
+}
+
+void IsoTpEngine::flow_control(Session& s, const uint8_t* data, size_t length)
+{
+    // Flow control frames nobody waits for are ignored
+    if (s.tx_state != TX_WAIT_FLOW_CONTROL || length < 3) {
+        return;
+    }
+    // Consecutive frames and errors are left to the engine thread, it reports the transmits in order
+    s.tx_deadline = clock::now();
+    switch (data[0] & 0x0F) {
+        case ISOTP_FLOW_STATUS_CONTINUE:
+            s.tx_block_remaining = data[1];
+            s.tx_st_min = isotp_st_min_duration(data[2]);
+            s.tx_wait_frames = 0;
+            s.tx_state = TX_SENDING;
+            break;
+        case ISOTP_FLOW_STATUS_WAIT:
+            if (++s.tx_wait_frames > s.config.max_wait_frames) {
+                s.tx_state = TX_FAILED;
+                s.tx_error = "The receiver sent too many flow control WAIT frames";
+                break;
+            }
+            s.tx_deadline += isotp_timeout(s.config);
+            break;
+        case ISOTP_FLOW_STATUS_OVERFLOW:
+            s.tx_state = TX_FAILED;
+            s.tx_error = "The receiver can't take a message of " + std::to_string(s.tx_payload.size()) + " bytes";
+            break;
+        default:
+            s.tx_state = TX_FAILED;
+            s.tx_error = "Received an invalid flow status " + std::to_string(data[0] & 0x0F);
+            break;
+    }
+}
+
+void IsoTpEngine::fail_transmit(std::shared_ptr<Session>& session, const std::string& error, std::vector<Event>& events)
+{
+    session->tx_state = TX_IDLE;
+    session->tx_payload = std::vector<uint8_t>();
+    events.push_back({ session, ISOTP_SEND_ERROR, {}, error });
+}
+
+void IsoTpEngine::abort_receive(std::shared_ptr<Session>& session, const std::string& error, std::vector<Event>& events)
+{
+    session->rx_active = false;
+    session->rx_payload = std::vector<uint8_t>();
+    events.push_back({ session, ISOTP_RECEIVE_ERROR, {}, error });
+}
+
+bool IsoTpEngine::transmit(const Session& session, const std::vector<uint8_t>& frame)
+{
+    const IsoTpConfig& config = session.config;
+    uint8_t bytes[64];
+    size_t length = 0;
+    if (config.tx_address >= 0) {
+        bytes[length++] = (uint8_t)config.tx_address;
+    }
+    memcpy(bytes + length, frame.data(), frame.size());
+    length += frame.size();
+    // CAN FD frames can only have the valid data lengths, pad up to the next one even without a padding byte
+    size_t padded = length;
+    if (config.padding >= 0) {
+        padded = (std::max)(padded, (size_t)8);
+    }
+    if (config.fd) {
+        padded = isotp_canfd_length(padded);
+    }
+    memset(bytes + length, config.padding >= 0 ? config.padding : ISOTP_DEFAULT_PADDING, padded - length);
+
+    icsSpyMessage msg;
+    memset(&msg, 0, sizeof(msg));
+    msg.ArbIDOrHeader = config.tx_id;
+    msg.NetworkID = (unsigned char)(config.network_id & 0xFF);
+    msg.NetworkID2 = (unsigned char)(config.network_id >> 8);
+    msg.NumberBytesData = (unsigned char)padded;
+    if (config.extended_id) {
+        msg.StatusBitField |= SPY_STATUS_XTD_FRAME;
+    }
+    if (config.fd) {
+        msg.Protocol = SPY_PROTOCOL_CANFD;
+        msg.StatusBitField |= SPY_STATUS_CANFD;
+        if (config.brs) {
+            msg.StatusBitField3 |= SPY_STATUS3_CANFD_BRS;
+        }
+    } else {
+        msg.Protocol = SPY_PROTOCOL_CAN;
+    }
+    memcpy(msg.Data, bytes, (std::min)(padded, sizeof(msg.Data)));
+    if (padded > sizeof(msg.Data)) {
+        msg.ExtraDataPtr = bytes;
+        msg.ExtraDataPtrEnabled = 1;
+    }
+    return m_tx(&msg, config.network_id);
+}
+
+void IsoTpEngine::queue_flow_control(std::shared_ptr<Session>& session,
+                                     uint8_t status,
+                                     const std::string& error,
+                                     std::vector<Transmit>& transmits)
+{
+    std::vector<uint8_t> frame = {
+        (uint8_t)((ISOTP_FLOW_CONTROL << 4) | status), session->config.block_size, session->config.st_min
+    };
+    transmits.push_back({ session, std::move(frame), true, error, false, {}, {} });
+}
+
+void IsoTpEngine::flush(std::vector<Transmit>& transmits, std::vector<Event>& events)
+{
+    if (transmits.empty()) {
+        return;
+    }
+    // Sends and received frames of the other sessions aren't held up by the driver meanwhile
+    const Session* failed = nullptr;
+    for (auto& item : transmits) {
+        // The frames of a transmit are next to each other, service() handles one session at a time
+        if (!item.receive && item.session.get() == failed) {
+            // The rest of a failed transmit, the failure is reported once
+            item.error.clear();
+            continue;
+        }
+        item.sent = transmit(*item.session, item.frame);
+        item.time = clock::now();
+        if (!item.sent && !item.receive) {
+            failed = item.session.get();
+        }
+    }
+    std::lock_guard<std::mutex> lock(m_mutex);
+    for (auto& item : transmits) {
+        Session& s = *item.session;
+        auto it = m_sessions.find(s.id);
+        if (it == m_sessions.end() || it->second != item.session) {
+            // Closed meanwhile
+            continue;
+        }
+        if (!item.sent) {
+            if (item.error.empty()) {
+                continue;
+            }
+            if (!item.receive) {
+                fail_transmit(item.session, item.error, events);
+            } else if (s.rx_active) {
+                abort_receive(item.session, item.error, events);
+            }
+            continue;
+        }
+        if (item.last) {
+            events.push_back({ item.session, ISOTP_SENT, {}, std::string() });
+        }
+        if (item.wait.count() > 0 && s.tx_deadline == item.deadline) {
+            s.tx_deadline = item.time + item.wait;
+        }
+    }
+    transmits.clear();
+}
+
+size_t IsoTpEngine::frame_capacity(const Session& session) const
+{
+    const size_t length = session.config.fd ? (size_t)session.config.tx_dl : 8;
+    return length - (session.config.tx_address >= 0 ? 1 : 0);
+}
+
+void IsoTpEngine::dispatch(std::vector<Event>& events)
+{
+    for (auto& event : events) {
+        event.session->callback(event.event, event.payload, event.error);
+    }
+    // Release the callbacks before locking again, releasing them may need the GIL.
+    events.clear();
+}
+
+static std::mutex isotp_registry_mutex;
+static std::map<void*, std::shared_ptr<IsoTpEngine>> isotp_registry;
+
+std::shared_ptr<IsoTpEngine> isotp_get(void* handle)
+{
+    std::lock_guard<std::mutex> lock(isotp_registry_mutex);
+    auto it = isotp_registry.find(handle);
+    if (it == isotp_registry.end()) {
+        return nullptr;
+    }
+    return it->second;
+}
+
+void isotp_set(void* handle, std::shared_ptr<IsoTpEngine> engine)
+{
+    std::lock_guard<std::mutex> lock(isotp_registry_mutex);
+    isotp_registry[handle] = engine;
+}
+
+std::shared_ptr<IsoTpEngine> isotp_remove(void* handle)
+{
+    std::shared_ptr<IsoTpEngine> engine;
+    {
+        std::lock_guard<std::mutex> lock(isotp_registry_mutex);
+        auto it = isotp_registry.find(handle);
+        if (it == isotp_registry.end()) {
+            return nullptr;
+        }
+        engine = it->second;
+        isotp_registry.erase(it);
+    }
+    engine->stop();
+    // Sessions waiting for a message or a transmit would otherwise never hear from the engine again
+    engine->close_all();
+    return engine;
+}
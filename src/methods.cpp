@@ -12,8 +12,18 @@
 #include <datetime.h>
 #include "object_spy_message.h"
 #include "setup_module_auto_defines.h"
-
+#include "replay.h"
+#include "decode.h"
+#include "receive.h"
+#include "health.h"
+#include "watcher.h"
+#include "isotp.h"
+#include "worker.h"
+
+#include <algorithm>
 #include <memory>
+#include <map>
+#include <tuple>
 
 extern PyTypeObject spy_message_object_type;
 // __func__, __FUNCTION__ and __PRETTY_FUNCTION__ are not preprocessor macros.
@@ -238,6 +248,23 @@ PyObject* _getPythonModuleObject(const char* module_name, const char* module_obj
     return object;
 }
 
+// Returns a new module_name.object_name ctypes structure holding a copy of data.
+static PyObject* _struct_from_bytes(const char* module_name, const char* object_name, const void* data, size_t size)
+{
+    PyObject* object = _getPythonModuleObject(module_name, object_name);
+    if (!object) {
+        return NULL;
+    }
+    Py_buffer buffer = {};
+    if (PyObject_GetBuffer(object, &buffer, PyBUF_CONTIG) != 0) {
+        Py_DECREF(object);
+        return NULL;
+    }
+    memcpy(buffer.buf, data, (std::min)(size, (size_t)buffer.len));
+    PyBuffer_Release(&buffer);
+    return object;
+}
+
 // Returns same as PyObject_IsInstance()
 int _isPythonModuleObject_IsInstance(PyObject* object, const char* module_name, const char* module_object_name)
 {
@@ -349,7 +376,7 @@ void __destroy_PyNeoDeviceEx_Handle(PyObject* handle)
 // Returns false on error and exception is set. Returns true on success.
 bool PyNeoDeviceEx_GetHandle(PyObject* object, void** handle)
 {
-    if (!object && !handle && !*handle) {
+    if (!object || !handle) {
         set_ics_exception(exception_runtime_error(), "Object is not valid");
         return false;
     }
@@ -362,9 +389,12 @@ bool PyNeoDeviceEx_GetHandle(PyObject* object, void** handle)
         return false;
     }
     if (!PyCapsule_CheckExact(_handle)) {
+        Py_DECREF(_handle);
         return true;
     }
+    // The capsule only carries the driver handle, it doesn't need to outlive this call
     void* ptr = PyCapsule_GetPointer(_handle, NULL);
+    Py_DECREF(_handle);
     if (!ptr) {
         return false;
     }
@@ -389,24 +419,18 @@ bool PyNeoDeviceEx_SetHandle(PyObject* object, void* handle)
     if (!_handle) {
         return false;
     }
+    bool success = true;
     if (!PyCapsule_CheckExact(_handle) && handle) {
         PyObject* capsule = PyCapsule_New(handle, NULL, __destroy_PyNeoDeviceEx_Handle);
-        if (!capsule) {
-            return false;
-        }
-        if (PyObject_SetAttrString(object, "_handle", capsule) != 0) {
-            return false;
-        }
+        success = capsule && PyObject_SetAttrString(object, "_handle", capsule) == 0;
+        Py_XDECREF(capsule);
     } else if (handle) {
-        if (!PyCapsule_SetPointer(_handle, handle)) {
-            return NULL;
-        }
+        success = PyCapsule_SetPointer(_handle, handle) == 0;
     } else {
-        if (PyObject_SetAttrString(object, "_handle", Py_None) != 0) {
-            return false;
-        }
+        success = PyObject_SetAttrString(object, "_handle", Py_None) == 0;
     }
-    return true;
+    Py_DECREF(_handle);
+    return success;
 }
 
 // Get the _name attribute of PyNeoDeviceEx.
@@ -447,13 +471,58 @@ bool PyNeoDeviceEx_SetName(PyObject* object, PyObject* name)
 }
 
 
+// Returns a new PyNeoDeviceEx holding a copy of device, or NULL with an exception set.
+static PyObject* _createPyNeoDeviceEx(const NeoDeviceEx* device)
+{
+    PyObject* obj = _getPythonModuleObject("ics.py_neo_device_ex", "PyNeoDeviceEx");
+    if (!obj) {
+        return NULL;
+    }
+    // Copy the NeoDeviceEx struct into our python NeoDevice object
+    if (!PyNeoDeviceEx_SetNeoDeviceEx(obj, (NeoDeviceEx*)device)) {
+        Py_DECREF(obj);
+        return NULL;
+    }
+    PyObject* name = PyUnicode_FromString(neodevice_to_string(device->neoDevice.DeviceType));
+    if (!name) {
+        Py_DECREF(obj);
+        return NULL;
+    }
+    bool success = PyNeoDeviceEx_SetName(obj, name);
+    // The attribute holds its own reference
+    Py_DECREF(name);
+    if (!success) {
+        Py_DECREF(obj);
+        return NULL;
+    }
+    return obj;
+}
+
+static PyObject* _createPyNeoDeviceExTuple(const NeoDeviceEx* devices, int count)
+{
+    PyObject* tuple = PyTuple_New(count);
+    if (!tuple) {
+        return NULL;
+    }
+    for (int i = 0; i < count; ++i) {
+        PyObject* obj = _createPyNeoDeviceEx(&devices[i]);
+        if (!obj) {
+            Py_DECREF(tuple);
+            return NULL;
+        }
+        PyTuple_SET_ITEM(tuple, i, obj);
+    }
+    return tuple;
+}
+
 PyObject* meth_find_devices(PyObject* self, PyObject* args, PyObject* keywords)
 {
     PyObject* device_types = NULL;
     int network_id = -1;
-    char* kwords[] = { "device_types", "network_id", NULL };
+    int cached = 0;
+    char* kwords[] = { "device_types", "network_id", "cached", NULL };
     if (!PyArg_ParseTupleAndKeywords(
-            args, keywords, arg_parse("|Oi:", __FUNCTION__), kwords, &device_types, &network_id)) {
+            args, keywords, arg_parse("|Oip:", __FUNCTION__), kwords, &device_types, &network_id, &cached)) {
         return NULL;
     }
 
@@ -472,10 +541,28 @@ PyObject* meth_find_devices(PyObject* self, PyObject* args, PyObject* keywords)
         if (!_convertListOrTupleToArray(device_types, &device_type_vector))
             return NULL;
         device_types_list_size = static_cast<unsigned int>(device_type_vector.size());
-        device_types_list.reset((new unsigned int(device_types_list_size)));
+        device_types_list.reset(new unsigned int[device_types_list_size]);
         for (unsigned int i = 0; i < device_types_list_size; ++i)
             device_types_list[i] = (unsigned int)PyLong_AsLong(device_type_vector[i]);
     }
+    // The watchers enumerate every device type without options, a network_id needs a real search.
+    std::vector<NeoDeviceEx> cached_devices;
+    if (cached && network_id == -1 && device_watcher_cached(cached_devices)) {
+        if (device_types_list_size) {
+            auto types_begin = device_types_list.get();
+            auto types_end = types_begin + device_types_list_size;
+            cached_devices.erase(std::remove_if(cached_devices.begin(),
+                                                cached_devices.end(),
+                                                [types_begin, types_end](const NeoDeviceEx& device) {
+                                                    return std::find(types_begin,
+                                                                     types_end,
+                                                                     (unsigned int)device.neoDevice.DeviceType) ==
+                                                           types_end;
+                                                }),
+                                 cached_devices.end());
+        }
+        return _createPyNeoDeviceExTuple(cached_devices.data(), (int)cached_devices.size());
+    }
     // Lets finally call the icsneo40 function
     try {
         /*
@@ -510,35 +597,129 @@ PyObject* meth_find_devices(PyObject* self, PyObject* args, PyObject* keywords)
         }
         Py_END_ALLOW_THREADS;
 
-        PyObject* tuple = PyTuple_New(count);
-        if (!tuple) {
-            return NULL;
-        }
-        for (int i = 0; i < count; ++i) {
-            PyObject* obj = _getPythonModuleObject("ics.py_neo_device_ex", "PyNeoDeviceEx");
-            if (!obj) {
-                return set_ics_exception(exception_runtime_error(), "Failed to allocate PyNeoDeviceEx");
-            }
-            // Copy the NeoDeviceEx struct into our python NeoDevice object
-            if (!PyNeoDeviceEx_SetNeoDeviceEx(obj, &devices[i])) {
-                return NULL;
-            }
-            if (!PyNeoDeviceEx_SetName(obj, 
-                PyUnicode_FromString(
-                    neodevice_to_string(devices[i].neoDevice.DeviceType)
-                ))
-            ) {
-                return NULL;
-            }
-            PyTuple_SetItem(tuple, i, obj);
-        }
-        return tuple;
+        return _createPyNeoDeviceExTuple(devices, count);
     } catch (ice::Exception& ex) {
         return set_ics_exception(exception_runtime_error(), (char*)ex.what());
     }
     return set_ics_exception(exception_runtime_error(), "This is a bug!");
 }
 
+// Hash and size of the last script loaded per (device handle, location), for coremini_load(skip_if_unchanged=True).
+// Only accessed with the GIL held. Anything that can change the script on the device has to forget it.
+struct ScriptRecord
+{
+    uint64_t hash;
+    size_t size;
+};
+static std::map<std::pair<void*, int>, ScriptRecord> script_records;
+
+// FNV-1a, only used to tell scripts apart
+static uint64_t _script_hash(const unsigned char* data, size_t size)
+{
+    uint64_t hash = 14695981039346656037ULL;
+    for (size_t i = 0; i < size; ++i) {
+        hash = (hash ^ data[i]) * 1099511628211ULL;
+    }
+    return hash;
+}
+
+// Last known content of the CoreMini message tables, used by the diff mode of the bulk table writes. Keyed by
+// (handle, table), holds the raw bytes of each entry: the message for the tx table, message and mask for rx.
+enum
+{
+    SCRIPT_TABLE_TX = 0,
+    SCRIPT_TABLE_RX = 1,
+};
+static std::map<std::pair<void*, int>, std::map<unsigned int, std::vector<uint8_t>>> script_tables;
+
+// Forgets the known content of a message table entry, index -1 forgets the whole table.
+static void _script_tables_forget(void* handle, int table, long long index = -1)
+{
+    auto it = script_tables.find(std::make_pair(handle, table));
+    if (it == script_tables.end()) {
+        return;
+    }
+    if (index == -1) {
+        script_tables.erase(it);
+    } else {
+        it->second.erase((unsigned int)index);
+    }
+}
+
+// Forgets the scripts loaded on handle, location -1 forgets every location.
+static void _script_records_forget(void* handle, int location = -1)
+{
+    // The message tables belong to whatever script is loaded
+    _script_tables_forget(handle, SCRIPT_TABLE_TX);
+    _script_tables_forget(handle, SCRIPT_TABLE_RX);
+    for (auto it = script_records.begin(); it != script_records.end();) {
+        if (it->first.first == handle && (location == -1 || it->first.second == location)) {
+            it = script_records.erase(it);
+        } else {
+            ++it;
+        }
+    }
+}
+
+// Last settings read from or written to the device per (device handle, vnet slot), so set_device_settings() can
+// skip writes that change nothing. Only accessed with the GIL held. Anything that can change the settings on the
+// device has to forget them.
+struct SettingsShadow
+{
+    // Settings the device is running with, empty if unknown
+    std::vector<uint8_t> active;
+    // Settings this module saved to EEPROM, empty if unknown. Reading the settings doesn't tell what is saved.
+    std::vector<uint8_t> saved;
+};
+static std::map<std::pair<void*, int>, SettingsShadow> settings_shadows;
+
+struct SettingsStats
+{
+    uint64_t writes;
+    uint64_t skipped;
+    uint64_t eeprom_writes;
+    uint64_t eeprom_skipped;
+    uint64_t cache_hits;
+    uint64_t cache_misses;
+};
+static std::map<void*, SettingsStats> settings_stats;
+
+// Settings snapshots returned by get_device_settings(cached=True), keyed by serial number, firmware version
+// (major, minor), vnet slot and device_type override. Only accessed with the GIL held. An entry is only valid for
+// the handle that read it and is dropped whenever the shadows of that handle are.
+typedef std::tuple<int, uint32_t, uint32_t, int, long> SettingsCacheKey;
+struct SettingsCacheEntry
+{
+    void* handle;
+    std::vector<uint8_t> settings;
+};
+static std::map<SettingsCacheKey, SettingsCacheEntry> settings_cache;
+
+// Drops the cached settings snapshots of handle.
+static void _settings_cache_forget(void* handle)
+{
+    for (auto it = settings_cache.begin(); it != settings_cache.end();) {
+        if (it->second.handle == handle) {
+            it = settings_cache.erase(it);
+        } else {
+            ++it;
+        }
+    }
+}
+
+// Forgets the known settings of every vnet slot of handle.
+static void _settings_shadows_forget(void* handle)
+{
+    for (auto it = settings_shadows.begin(); it != settings_shadows.end();) {
+        if (it->first.first == handle) {
+            it = settings_shadows.erase(it);
+        } else {
+            ++it;
+        }
+    }
+    _settings_cache_forget(handle);
+}
+
 PyObject* meth_open_device(PyObject* self, PyObject* args, PyObject* keywords)
 {
     unsigned long serial_number = 0;
@@ -579,7 +760,7 @@ PyObject* meth_open_device(PyObject* self, PyObject* args, PyObject* keywords)
         if (!_convertListOrTupleToArray(network_ids, &network_ids_vector))
             return NULL;
         network_ids_list_size = static_cast<unsigned int>(network_ids_vector.size());
-        network_ids_list.reset((new unsigned char(network_ids_list_size)));
+        network_ids_list.reset(new unsigned char[network_ids_list_size]);
         for (unsigned int i = 0; i < network_ids_list_size; ++i)
             network_ids_list[i] = (unsigned char)PyLong_AsLong(network_ids_vector[i]);
         use_network_ids = true;
@@ -656,20 +837,10 @@ PyObject* meth_open_device(PyObject* self, PyObject* args, PyObject* keywords)
                     // return set_ics_exception(exception_runtime_error(), "Found device, but its already open!");
                 }
                 // We matched a neoDevice, lets allocate it here.
-                device = _getPythonModuleObject("ics.py_neo_device_ex", "PyNeoDeviceEx");
+                device = _createPyNeoDeviceEx(&devices[i]);
                 if (!device) {
                     return NULL;
                 }
-                if (!PyNeoDeviceEx_SetNeoDeviceEx(device, &devices[i])) {
-                    return NULL;
-                }
-                if (!PyNeoDeviceEx_SetName(device, 
-                    PyUnicode_FromString(
-                        neodevice_to_string(devices[i].neoDevice.DeviceType)
-                    ))
-                ) {
-                    return NULL;
-                }
                 break;
             }
             if (!device || !PyNeoDeviceEx_CheckExact(device)) {
@@ -724,6 +895,10 @@ PyObject* meth_open_device(PyObject* self, PyObject* args, PyObject* keywords)
         }
         Py_END_ALLOW_THREADS;
         PyBuffer_Release(&buffer);
+        // Nothing is known about the scripts or settings of a freshly opened device
+        _script_records_forget(handle);
+        _settings_shadows_forget(handle);
+        settings_stats.erase(handle);
         if (!PyNeoDeviceEx_SetHandle(device, handle)) {
             return NULL;
         }
@@ -769,12 +944,22 @@ PyObject* meth_close_device(PyObject* self, PyObject* args)
             return Py_BuildValue("i", error_count);
         }
         Py_BEGIN_ALLOW_THREADS;
+        // Background workers can't outlive the handle
+        replay_remove(handle);
+        isotp_remove(handle);
+        rx_pump_remove(handle);
+        health_remove(handle);
+        error_reporter_remove(handle);
+        error_queue_remove(handle);
         if (!icsneoClosePort(handle, &error_count)) {
             Py_BLOCK_THREADS;
             return set_ics_exception(exception_runtime_error(), "icsneoClosePort() Failed");
         }
         icsneoFreeObject(handle);
         Py_END_ALLOW_THREADS;
+        _script_records_forget(handle);
+        _settings_shadows_forget(handle);
+        settings_stats.erase(handle);
         if (!PyNeoDeviceEx_SetHandle(obj, NULL)) {
             return NULL;
         }
@@ -942,13 +1127,100 @@ PyObject* meth_set_rtc(PyObject* self, PyObject* args)
     return set_ics_exception(exception_runtime_error(), "This is a bug!");
 }
 
-PyObject* meth_coremini_load(PyObject* self, PyObject* args)
+// Memory maps the file at path read-only, errors are reported as coming from func_name. Returns a new mmap.mmap
+// reference or NULL with an exception set.
+static PyObject* _map_file(PyObject* path, const char* description, const char* func_name)
+{
+    PyObject* file = PyObject_CallFunction(PyDict_GetItemString(PyEval_GetBuiltins(), "open"), "Os", path, "rb");
+    if (!file) {
+        PyErr_Clear();
+        PyObject* path_str = PyObject_Str(path);
+        std::stringstream ss;
+        ss << "Failed to open " << description << ": '" << (path_str ? PyUnicode_AsUTF8(path_str) : "")
+           << "'. Please make sure path exists";
+        Py_XDECREF(path_str);
+        PyErr_Clear();
+        return _set_ics_exception(exception_runtime_error(), (char*)ss.str().c_str(), func_name);
+    }
+    PyObject* mapped = NULL;
+    PyObject* mmap_module = PyImport_ImportModule("mmap");
+    PyObject* fileno = PyObject_CallMethod(file, "fileno", NULL);
+    if (mmap_module && fileno) {
+        PyObject* mmap_type = PyObject_GetAttrString(mmap_module, "mmap");
+        PyObject* mmap_args = Py_BuildValue("(Oi)", fileno, 0);
+        PyObject* mmap_kwargs = Py_BuildValue("{sN}", "access", PyObject_GetAttrString(mmap_module, "ACCESS_READ"));
+        if (mmap_type && mmap_args && mmap_kwargs) {
+            // mmap keeps its own handle to the file
+            mapped = PyObject_Call(mmap_type, mmap_args, mmap_kwargs);
+        }
+        Py_XDECREF(mmap_type);
+        Py_XDECREF(mmap_args);
+        Py_XDECREF(mmap_kwargs);
+    }
+    Py_XDECREF(fileno);
+    Py_XDECREF(mmap_module);
+    // A failed mapping is reported below instead, close() mustn't run with its exception set
+    PyErr_Clear();
+    PyObject* result = PyObject_CallMethod(file, "close", NULL);
+    if (!result) {
+        // Nothing was written and the mapping has its own handle, a failed close() loses nothing
+        PyErr_Clear();
+    }
+    Py_XDECREF(result);
+    Py_DECREF(file);
+    if (!mapped) {
+        std::stringstream ss;
+        ss << "Failed to map " << description << ", empty files can't be loaded";
+        return _set_ics_exception(exception_runtime_error(), (char*)ss.str().c_str(), func_name);
+    }
+    return mapped;
+}
+
+// Gets a read-only view of CoreMini or readbin data for the icsneoScriptLoad*() functions. data may be a file
+// path, which is memory mapped, any buffer object or a tuple of ints. buffer must be released with
+// PyBuffer_Release() on success. Returns false with an exception set on failure.
+static bool _get_script_data(PyObject* data, Py_buffer* buffer, const char* description, const char* func_name)
+{
+    PyObject* source = NULL;
+    if (PyUnicode_Check(data) || (!PyObject_CheckBuffer(data) && PyObject_HasAttrString(data, "__fspath__"))) {
+        source = _map_file(data, description, func_name);
+    } else if (PyTuple_CheckExact(data)) {
+        source = PyBytes_FromObject(data);
+        if (!source) {
+            PyErr_Clear();
+            _set_ics_exception(
+                exception_runtime_error(), "Failed to convert tuple data. Tuple data must be integer type", func_name);
+        }
+    } else if (PyObject_CheckBuffer(data)) {
+        Py_INCREF(data);
+        source = data;
+    } else {
+        _set_ics_exception(exception_runtime_error(), "Argument must be filepath, buffer or tuple", func_name);
+    }
+    if (!source) {
+        return false;
+    }
+    // The buffer holds its own reference to source
+    const bool success = PyObject_GetBuffer(source, buffer, PyBUF_C_CONTIGUOUS) == 0;
+    Py_DECREF(source);
+    return success;
+}
+
+PyObject* meth_coremini_load(PyObject* self, PyObject* args, PyObject* keywords)
 {
     PyObject* arg_data = NULL;
     int location;
     PyObject* obj = NULL;
-    bool isFileData = false;
-    if (!PyArg_ParseTuple(args, arg_parse("OOi:", __FUNCTION__), &obj, &arg_data, &location)) {
+    int skip_if_unchanged = 0;
+    char* kwords[] = { "device", "coremini", "location", "skip_if_unchanged", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args,
+                                     keywords,
+                                     arg_parse("OOi|p:", __FUNCTION__),
+                                     kwords,
+                                     &obj,
+                                     &arg_data,
+                                     &location,
+                                     &skip_if_unchanged)) {
         return NULL;
     }
     if (!PyNeoDeviceEx_CheckExact(obj)) {
@@ -959,68 +1231,44 @@ PyObject* meth_coremini_load(PyObject* self, PyObject* args)
     if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
         return NULL;
     }
-    long fsize;
-    unsigned char* data = NULL;
-    int data_size = 0;
-#if PY_MAJOR_VERSION >= 3
-    if (PyUnicode_CheckExact(arg_data)) {
-        char* file_name = PyUniStr_AsStrOrUTF8(arg_data);
-#else
-    if (PyString_Check(arg_data)) {
-        char* file_name = PyUniStr_AsStrOrUTF8(arg_data);
-#endif
-        if (!file_name) {
-            return set_ics_exception(exception_runtime_error(), "Failed to convert file path to string");
-        }
-        FILE* f;
-        f = fopen(file_name, "rb");
-        if (!f) {
-            std::stringstream ss;
-            ss << "Failed to open CoreMini script file: '" << file_name << "'. Please make sure path exists";
-            return set_ics_exception(exception_runtime_error(), (char*)ss.str().c_str());
-        }
-        fseek(f, 0, SEEK_END);
-        fsize = ftell(f);
-        rewind(f);
-        data = (unsigned char*)malloc(sizeof(char) * fsize);
-        data_size = (int)fread(data, 1, fsize, f);
-        fclose(f);
-        if (fsize != data_size) {
-            return set_ics_exception(exception_runtime_error(), "CoreMini binary file size mismatch");
-        }
-    } else if (PyTuple_CheckExact(arg_data)) {
-        Py_ssize_t tuple_size = PyTuple_Size(arg_data);
-        data = (unsigned char*)malloc(sizeof(char) * tuple_size);
-        // Move tuple data into array
-        for (int i = 0; i < tuple_size; ++i) {
-            PyObject* value = PyTuple_GET_ITEM(arg_data, i);
-            if (!PyLong_CheckExact(value)) {
-                return set_ics_exception(
-                    exception_runtime_error(), "Failed to convert tuple data. Tuple data must be integer type");
-            }
-            data[i] = (unsigned char)PyLong_AsLong(PyTuple_GET_ITEM(arg_data, i));
-        }
-        fsize = static_cast<long>(tuple_size);
-        data_size = fsize;
-    } else {
-        return set_ics_exception(exception_runtime_error(), "Argument must be filepath or tuple");
+    Py_buffer buffer = {};
+    if (!_get_script_data(arg_data, &buffer, "CoreMini script file", __FUNCTION__)) {
+        return NULL;
     }
     try {
         ice::Library* lib = dll_get_library();
         if (!lib) {
-            char buffer[512];
-            return set_ics_exception(exception_runtime_error(), dll_get_error(buffer));
+            PyBuffer_Release(&buffer);
+            char error[512];
+            return set_ics_exception(exception_runtime_error(), dll_get_error(error));
         }
         ice::Function<int __stdcall(void*, const unsigned char*, unsigned long, int)> icsneoScriptLoad(
             lib, "icsneoScriptLoad");
+        const auto key = std::make_pair(handle, location);
+        ScriptRecord record = { 0, (size_t)buffer.len };
+        Py_BEGIN_ALLOW_THREADS;
+        record.hash = _script_hash((const unsigned char*)buffer.buf, record.size);
+        Py_END_ALLOW_THREADS;
+        auto it = script_records.find(key);
+        if (skip_if_unchanged && it != script_records.end() && it->second.hash == record.hash &&
+            it->second.size == record.size) {
+            PyBuffer_Release(&buffer);
+            Py_RETURN_NONE;
+        }
+        // A failed load can leave anything behind
+        _script_records_forget(handle, location);
         Py_BEGIN_ALLOW_THREADS;
-        if (!icsneoScriptLoad(handle, data, data_size, location)) {
+        if (!icsneoScriptLoad(handle, (const unsigned char*)buffer.buf, (unsigned long)buffer.len, location)) {
             Py_BLOCK_THREADS;
+            PyBuffer_Release(&buffer);
             return set_ics_exception(exception_runtime_error(), "icsneoScriptLoad() Failed");
         }
         Py_END_ALLOW_THREADS;
+        PyBuffer_Release(&buffer);
+        script_records[key] = record;
         Py_RETURN_NONE;
     } catch (ice::Exception& ex) {
+        PyBuffer_Release(&buffer);
         return set_ics_exception(exception_runtime_error(), (char*)ex.what());
     }
     return set_ics_exception(exception_runtime_error(), "This is a bug!");
@@ -1118,6 +1366,7 @@ PyObject* meth_coremini_clear(PyObject* self, PyObject* args)
             return set_ics_exception(exception_runtime_error(), dll_get_error(buffer));
         }
         ice::Function<int __stdcall(void*, int)> icsneoScriptClear(lib, "icsneoScriptClear");
+        _script_records_forget(handle, location);
         Py_BEGIN_ALLOW_THREADS;
         if (!icsneoScriptClear(handle, location)) {
             Py_BLOCK_THREADS;
@@ -1245,6 +1494,59 @@ PyObject* meth_transmit_messages(PyObject* self, PyObject* args)
     return set_ics_exception(exception_runtime_error(), "This is a bug!");
 }
 
+// Creates a SpyMessage (or SpyMessageJ1850) that owns a copy of the message payload.
+static PyObject* _spy_message_from_owned(const OwnedMessage& owned, bool use_j1850)
+{
+    PyObject* obj = PyObject_CallObject(
+        use_j1850 ? (PyObject*)&spy_message_j1850_object_type : (PyObject*)&spy_message_object_type, NULL);
+    if (!obj) {
+        return NULL;
+    }
+    // Both objects share the same layout
+    spy_message_object* msg = (spy_message_object*)obj;
+    memcpy(&msg->msg, &owned.msg, sizeof(msg->msg));
+    msg->msg.ExtraDataPtr = NULL;
+    if (!owned.payload.empty()) {
+        unsigned char* payload = new unsigned char[owned.payload.size()];
+        memcpy(payload, owned.payload.data(), owned.payload.size());
+        msg->msg.ExtraDataPtr = payload;
+    }
+    msg->noExtraDataPtrCleanup = false;
+    return obj;
+}
+
+// Returns the receive pump for handle, creating and starting it if needed. Throws ice::Exception.
+static std::shared_ptr<RxPump> _rx_pump_acquire(ice::Library* lib, void* handle)
+{
+    auto pump = rx_pump_get(handle);
+    if (pump) {
+        // Restarts a pump released with frames still queued
+        pump->start();
+        return pump;
+    }
+    auto icsneoWaitForRxMessagesWithTimeOut = std::make_shared<ice::Function<int __stdcall(void*, unsigned int)>>(
+        lib, "icsneoWaitForRxMessagesWithTimeOut");
+    auto icsneoGetMessages =
+        std::make_shared<ice::Function<int __stdcall(void*, icsSpyMessage*, int*, int*)>>(lib, "icsneoGetMessages");
+    RxPump::RxFunction rx = [handle, icsneoWaitForRxMessagesWithTimeOut, icsneoGetMessages](
+                                icsSpyMessage* msgs, int* count, int* errors, unsigned int timeout) {
+        try {
+            if (!(*icsneoWaitForRxMessagesWithTimeOut)(handle, timeout)) {
+                *count = 0;
+                *errors = 0;
+                return true;
+            }
+            return (*icsneoGetMessages)(handle, msgs, count, errors) != 0;
+        } catch (ice::Exception&) {
+            return false;
+        }
+    };
+    pump = std::make_shared<RxPump>(rx);
+    rx_pump_set(handle, pump);
+    pump->start();
+    return pump;
+}
+
 PyObject* meth_get_messages(PyObject* self, PyObject* args)
 {
     // Py_RETURN_NONE;
@@ -1262,6 +1564,40 @@ PyObject* meth_get_messages(PyObject* self, PyObject* args)
     if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
         return NULL;
     }
+    // The receive pump owns the driver queue while it is running
+    auto pump = rx_pump_get(handle);
+    if (pump && pump->drained()) {
+        // Released and every frame it queued was returned, read the driver again
+        rx_pump_remove(handle);
+        pump = nullptr;
+    }
+    if (pump) {
+        std::vector<OwnedMessage> messages;
+        int errors = 0;
+        Py_BEGIN_ALLOW_THREADS;
+        pump->take(messages, 20000, &errors, timeout);
+        Py_END_ALLOW_THREADS;
+        const unsigned long long overflows = pump->take_overflows();
+        if (overflows && PyErr_WarnFormat(PyExc_RuntimeWarning,
+                                          1,
+                                          "Receive buffer overflowed, the driver lost %llu messages",
+                                          overflows) != 0) {
+            return NULL;
+        }
+        PyObject* tuple = PyTuple_New(messages.size());
+        if (!tuple) {
+            return NULL;
+        }
+        for (size_t i = 0; i < messages.size(); ++i) {
+            PyObject* msg = _spy_message_from_owned(messages[i], use_j1850 != 0);
+            if (!msg) {
+                Py_DECREF(tuple);
+                return NULL;
+            }
+            PyTuple_SET_ITEM(tuple, i, msg);
+        }
+        return Py_BuildValue("(N,i)", tuple, errors);
+    }
     // Convert timeout to ms
     timeout *= 1000;
     try {
@@ -1299,6 +1635,10 @@ PyObject* meth_get_messages(PyObject* self, PyObject* args)
         }
         Py_END_ALLOW_THREADS;
         PyObject* tuple = PyTuple_New(count);
+        if (!tuple) {
+            PyMem_Free(msgs);
+            return NULL;
+        }
         for (int i = 0; i < count; ++i) {
             PyObject* obj = NULL;
             if (use_j1850) {
@@ -1309,6 +1649,8 @@ PyObject* meth_get_messages(PyObject* self, PyObject* args)
             if (!obj) {
                 // This should only happen if we run out of memory (malloc failure)?
                 PyErr_Print();
+                Py_DECREF(tuple);
+                PyMem_Free(msgs);
                 return set_ics_exception(
                     exception_runtime_error(), "Failed to allocate " SPY_MESSAGE_OBJECT_NAME);
             }
@@ -1325,12 +1667,9 @@ PyObject* meth_get_messages(PyObject* self, PyObject* args)
             }
             PyTuple_SetItem(tuple, i, obj);
         }
-        PyObject* result = Py_BuildValue("(O,i)", tuple, errors);
-        // We have to decrement the ref counter here because BuildValue increases it and
-        // the tuple and its objects will never get freed causing a memory leak.
-        Py_XDECREF(tuple);
-        PyMem_Del(msgs);
-        return result;
+        PyMem_Free(msgs);
+        // The result steals the tuple, it's freed with it even if building the result fails
+        return Py_BuildValue("(N,i)", tuple, errors);
     } catch (ice::Exception& ex) {
         return set_ics_exception(exception_runtime_error(), (char*)ex.what());
     }
@@ -1373,18 +1712,75 @@ PyObject* meth_get_script_status(PyObject* self, PyObject* args)
         return set_ics_exception(exception_runtime_error(), (char*)ex.what());
     }
     PyObject* list_object = PyList_New(0);
-    for (unsigned long i = 0; i < parameters_count; ++i) {
+    for (unsigned long i = 0; list_object && i < parameters_count; ++i) {
         PyObject* obj = Py_BuildValue("i", parameters[i]);
-        PyList_Append(list_object, obj);
+        if (!obj || PyList_Append(list_object, obj) != 0) {
+            Py_CLEAR(list_object);
+        }
+        Py_XDECREF(obj);
     }
     return list_object;
 }
 
-PyObject* meth_get_error_messages(PyObject* self, PyObject* args)
+typedef ice::Function<int __stdcall(int, char*, char*, int*, int*, int*, int*)> GetErrorInfoFunction;
+
+// icsneoGetErrorInfo() through the process wide memo, see error_info_lookup().
+static bool _get_error_info(GetErrorInfoFunction& icsneoGetErrorInfo, int code, HealthError& info)
+{
+    return error_info_lookup(code, info, [&icsneoGetErrorInfo](int code, HealthError& info) {
+        char description_short[255] = { 0 };
+        char description_long[255] = { 0 };
+        int description_short_length = 255;
+        int description_long_length = 255;
+        info.code = code;
+        if (!icsneoGetErrorInfo(code,
+                                description_short,
+                                description_long,
+                                &description_short_length,
+                                &description_long_length,
+                                &info.severity,
+                                &info.restart_needed)) {
+            return false;
+        }
+        info.description_short = description_short;
+        info.description_long = description_long;
+        return true;
+    });
+}
+
+// Returns the shared error queue of handle, creating it if needed. Throws ice::Exception.
+static std::shared_ptr<ErrorQueue> _error_queue_acquire(ice::Library* lib, void* handle)
+{
+    auto queue = error_queue_get(handle);
+    if (queue) {
+        return queue;
+    }
+    auto icsneoGetErrorMessages =
+        std::make_shared<ice::Function<int __stdcall(void*, int*, int*)>>(lib, "icsneoGetErrorMessages");
+    ErrorQueue::PollFunction poll = [handle, icsneoGetErrorMessages](std::vector<int>& codes) {
+        try {
+            int errors[600] = { 0 };
+            int count = 600;
+            if (!(*icsneoGetErrorMessages)(handle, errors, &count)) {
+                return false;
+            }
+            codes.assign(errors, errors + count);
+            return true;
+        } catch (ice::Exception&) {
+            return false;
+        }
+    };
+    queue = std::make_shared<ErrorQueue>(poll);
+    error_queue_set(handle, queue);
+    return queue;
+}
+
+PyObject* meth_get_error_messages(PyObject* self, PyObject* args, PyObject* keywords)
 {
-    // return PyList_New(0);
     PyObject* obj = NULL;
-    if (!PyArg_ParseTuple(args, arg_parse("O:", __FUNCTION__), &obj)) {
+    int compact = 0;
+    char* kwords[] = { "device", "compact", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, keywords, arg_parse("O|p:", __FUNCTION__), kwords, &obj, &compact)) {
         return NULL;
     }
     if (!PyNeoDeviceEx_CheckExact(obj)) {
@@ -1405,36 +1801,61 @@ PyObject* meth_get_error_messages(PyObject* self, PyObject* args)
             return set_ics_exception(exception_runtime_error(), dll_get_error(buffer));
         }
         ice::Function<int __stdcall(void*, int*, int*)> icsneoGetErrorMessages(lib, "icsneoGetErrorMessages");
+        // Drained in the background by the health monitor or on_error(), the queue kept the codes for us
+        auto queue = error_queue_get(handle);
         Py_BEGIN_ALLOW_THREADS;
-        if (!icsneoGetErrorMessages(handle, errors, &error_count)) {
+        if (queue) {
+            std::vector<int> codes;
+            if (!queue->read(0, codes)) {
+                Py_BLOCK_THREADS return set_ics_exception(exception_runtime_error(),
+                                                            "icsneoGetErrorMessages() Failed");
+            }
+            error_count = (int)(std::min)(codes.size(), (size_t)error_count);
+            std::copy(codes.begin(), codes.begin() + error_count, errors);
+        } else if (!icsneoGetErrorMessages(handle, errors, &error_count)) {
             Py_BLOCK_THREADS return set_ics_exception(exception_runtime_error(),
                                                         "icsneoGetErrorMessages() Failed");
         }
         Py_END_ALLOW_THREADS;
-        ice::Function<int __stdcall(int, char*, char*, int*, int*, int*, int*)> icsneoGetErrorInfo(
-            lib, "icsneoGetErrorInfo");
+        if (compact) {
+            // (code, count) in the order the codes first occurred
+            std::vector<std::pair<int, int>> counts;
+            for (int i = 0; i < error_count; ++i) {
+                auto it = std::find_if(counts.begin(), counts.end(), [&errors, i](const std::pair<int, int>& count) {
+                    return count.first == errors[i];
+                });
+                if (it == counts.end()) {
+                    counts.push_back(std::make_pair(errors[i], 1));
+                } else {
+                    it->second += 1;
+                }
+            }
+            PyObject* list = PyList_New((Py_ssize_t)counts.size());
+            for (size_t i = 0; list && i < counts.size(); ++i) {
+                PyObject* tuple = Py_BuildValue("(i, i)", counts[i].first, counts[i].second);
+                if (!tuple) {
+                    Py_CLEAR(list);
+                    break;
+                }
+                PyList_SET_ITEM(list, (Py_ssize_t)i, tuple);
+            }
+            return list;
+        }
+        GetErrorInfoFunction icsneoGetErrorInfo(lib, "icsneoGetErrorInfo");
         PyObject* list = PyList_New(0);
         for (int i = 0; i < error_count; ++i) {
-            char description_short[255] = { 0 };
-            char description_long[255] = { 0 };
-            int description_short_length = 255;
-            int description_long_length = 255;
-            int severity = 0, restart_needed = 0;
-            Py_BEGIN_ALLOW_THREADS;
-            if (!icsneoGetErrorInfo(errors[i],
-                                    description_short,
-                                    description_long,
-                                    &description_short_length,
-                                    &description_long_length,
-                                    &severity,
-                                    &restart_needed)) {
-                Py_BLOCK_THREADS;
+            // The descriptions are a table lookup in the driver, not worth releasing the GIL for.
+            HealthError info;
+            if (!_get_error_info(icsneoGetErrorInfo, errors[i], info)) {
                 Py_XDECREF(list);
                 return set_ics_exception(exception_runtime_error(), "icsneoGetErrorInfo() Failed");
             }
-            Py_END_ALLOW_THREADS;
-            PyObject* tuple = Py_BuildValue(
-                "i, s, s, i, i", errors[i], description_short, description_long, severity, restart_needed);
+            PyObject* tuple = Py_BuildValue("i, s, s, i, i",
+                                            errors[i],
+                                            info.description_short.c_str(),
+                                            info.description_long.c_str(),
+                                            info.severity,
+                                            info.restart_needed);
 
             PyList_Append(list, tuple);
             Py_XDECREF(tuple);
@@ -1527,6 +1948,11 @@ PyObject* meth_flash_devices(PyObject* self, PyObject* args)
                                     unsigned long,
                                     void (*MessageCallback)(const char* message, bool success))>
             FlashDevice2(lib, "FlashDevice2");
+        // Reflashing can wipe the scripts and settings of any device
+        script_records.clear();
+        script_tables.clear();
+        settings_shadows.clear();
+        settings_cache.clear();
         Py_BEGIN_ALLOW_THREADS;
         if (!FlashDevice2(0x3835C256, &nde->neoDevice, rc, reflash_count, 0, 0, 0, &message_callback)) {
             Py_BLOCK_THREADS;
@@ -1599,14 +2025,54 @@ PyObject* meth_set_reflash_callback(PyObject* self, PyObject* args)
     return set_ics_exception(exception_runtime_error(), "This is a bug!");
 }
 
-PyObject* meth_get_device_settings(PyObject* self, PyObject* args)
+PyObject* meth_get_device_settings(PyObject* self, PyObject* args, PyObject* keywords)
 {
     PyObject* obj = NULL;
     long device_type_override = -1;
-    EPlasmaIonVnetChannel_t vnet_slot = (EPlasmaIonVnetChannel_t)PlasmaIonVnetChannelMain;
-    if (!PyArg_ParseTuple(args, arg_parse("O|lk:", __FUNCTION__), &obj, &device_type_override, &vnet_slot)) {
+    // "k" stores an unsigned long, which is wider than the enum on most platforms
+    unsigned long vnet_slot_value = PlasmaIonVnetChannelMain;
+    int cached = 0;
+    char* kwords[] = { "device", "device_type", "vnet_slot", "cached", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args,
+                                     keywords,
+                                     arg_parse("O|lkp:", __FUNCTION__),
+                                     kwords,
+                                     &obj,
+                                     &device_type_override,
+                                     &vnet_slot_value,
+                                     &cached)) {
         return NULL;
     }
+    EPlasmaIonVnetChannel_t vnet_slot = (EPlasmaIonVnetChannel_t)vnet_slot_value;
+
+    // Look the snapshot up before creating the structure
+    SettingsCacheKey cache_key;
+    if (cached) {
+        void* handle = NULL;
+        Py_buffer device_buffer = {};
+        NeoDeviceEx* nde = NULL;
+        if (!PyNeoDeviceEx_CheckExact(obj)) {
+            return set_ics_exception(exception_runtime_error(),
+                                     "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+        }
+        if (!PyNeoDeviceEx_GetHandle(obj, &handle) || !PyNeoDeviceEx_GetNeoDeviceEx(obj, &device_buffer, &nde)) {
+            return NULL;
+        }
+        cache_key = std::make_tuple(nde->neoDevice.SerialNumber,
+                                    nde->FirmwareMajor,
+                                    nde->FirmwareMinor,
+                                    (int)vnet_slot,
+                                    device_type_override);
+        PyBuffer_Release(&device_buffer);
+        auto entry = settings_cache.find(cache_key);
+        if (handle && entry != settings_cache.end() && entry->second.handle == handle) {
+            // Every call returns its own full copy, changing it never changes the snapshot
+            settings_stats[handle].cache_hits++;
+            const std::vector<uint8_t>& snapshot = entry->second.settings;
+            return _struct_from_bytes(
+                "ics.structures.s_device_settings", "s_device_settings", snapshot.data(), snapshot.size());
+        }
+    }
 
     // Before we do anything, we need to grab the python s_device_settings ctype.Structure.
     PyObject* settings = _getPythonModuleObject("ics.structures.s_device_settings", "s_device_settings");
@@ -1626,6 +2092,8 @@ PyObject* meth_get_device_settings(PyObject* self, PyObject* args)
     }
     void* handle = NULL;
     if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        PyBuffer_Release(&settings_buffer);
+        Py_DECREF(settings);
         return NULL;
     }
     try {
@@ -1662,6 +2130,14 @@ PyObject* meth_get_device_settings(PyObject* self, PyObject* args)
             return set_ics_exception(exception_runtime_error(), "icsneoGetDeviceSettings() Failed");
         }
         Py_END_ALLOW_THREADS;
+        const uint8_t* bytes = (const uint8_t*)settings_buffer.buf;
+        settings_shadows[std::make_pair(handle, (int)vnet_slot)].active.assign(bytes, bytes + settings_buffer.len);
+        if (cached) {
+            auto& entry = settings_cache[cache_key];
+            entry.handle = handle;
+            entry.settings.assign(bytes, bytes + settings_buffer.len);
+            settings_stats[handle].cache_misses++;
+        }
         PyBuffer_Release(&settings_buffer);
         return settings;
     } catch (ice::Exception& ex) {
@@ -1671,15 +2147,27 @@ PyObject* meth_get_device_settings(PyObject* self, PyObject* args)
     return set_ics_exception(exception_runtime_error(), "This is a bug!");
 }
 
-PyObject* meth_set_device_settings(PyObject* self, PyObject* args)
+PyObject* meth_set_device_settings(PyObject* self, PyObject* args, PyObject* keywords)
 {
     PyObject* obj = NULL;
     PyObject* settings = NULL;
     int save_to_eeprom = 1;
-    EPlasmaIonVnetChannel_t vnet_slot = PlasmaIonVnetChannelMain;
-    if (!PyArg_ParseTuple(args, arg_parse("OO|ik:", __FUNCTION__), &obj, &settings, &save_to_eeprom, &vnet_slot)) {
+    unsigned long vnet_slot_value = PlasmaIonVnetChannelMain;
+    int force = 0;
+    char* kwords[] = { "device", "settings", "save_to_eeprom", "vnet_slot", "force", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args,
+                                     keywords,
+                                     arg_parse("OO|ikp:", __FUNCTION__),
+                                     kwords,
+                                     &obj,
+                                     &settings,
+                                     &save_to_eeprom,
+                                     &vnet_slot_value,
+                                     &force)) {
         return NULL;
     }
+    // "k" stores an unsigned long, which is wider than the enum on most platforms
+    EPlasmaIonVnetChannel_t vnet_slot = (EPlasmaIonVnetChannel_t)vnet_slot_value;
     if (!PyNeoDeviceEx_CheckExact(obj)) {
         return set_ics_exception(exception_runtime_error(),
                                  "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
@@ -1701,15 +2189,58 @@ PyObject* meth_set_device_settings(PyObject* self, PyObject* args)
         ice::Function<int __stdcall(void*, SDeviceSettings*, int, int, EPlasmaIonVnetChannel_t)>
             icsneoSetDeviceSettings(lib, "icsneoSetDeviceSettings");
         Py_buffer settings_buffer = {};
-        PyObject_GetBuffer(settings, &settings_buffer, PyBUF_CONTIG);
+        if (PyObject_GetBuffer(settings, &settings_buffer, PyBUF_CONTIG) != 0) {
+            return NULL;
+        }
+        // The driver only takes the whole structure, compare it against what the device already has to decide
+        // whether to write it at all and whether it has to be saved again.
+        const auto key = std::make_pair(handle, (int)vnet_slot);
+        const uint8_t* bytes = (const uint8_t*)settings_buffer.buf;
+        const size_t size = (size_t)settings_buffer.len;
+        bool active_same = false;
+        bool saved_same = false;
+        auto shadow = settings_shadows.find(key);
+        if (!force && size && shadow != settings_shadows.end()) {
+            const auto& active = shadow->second.active;
+            const auto& saved = shadow->second.saved;
+            active_same = active.size() == size && std::equal(active.begin(), active.end(), bytes);
+            saved_same = saved.size() == size && std::equal(saved.begin(), saved.end(), bytes);
+        }
+        auto& stats = settings_stats[handle];
+        if (active_same && (!save_to_eeprom || saved_same)) {
+            PyBuffer_Release(&settings_buffer);
+            stats.skipped++;
+            if (save_to_eeprom) {
+                stats.eeprom_skipped++;
+            }
+            Py_RETURN_NONE;
+        }
+        const bool save = save_to_eeprom && !saved_same;
         Py_BEGIN_ALLOW_THREADS;
         if (!icsneoSetDeviceSettings(
-                handle, (SDeviceSettings*)settings_buffer.buf, static_cast<int>(settings_buffer.len), save_to_eeprom, vnet_slot)) {
+                handle, (SDeviceSettings*)settings_buffer.buf, static_cast<int>(settings_buffer.len), save, vnet_slot)) {
             Py_BLOCK_THREADS;
             PyBuffer_Release(&settings_buffer);
+            // A partial write leaves the settings unknown
+            settings_shadows.erase(key);
+            _settings_cache_forget(handle);
             return set_ics_exception(exception_runtime_error(), "icsneoSetDeviceSettings() Failed");
         }
         Py_END_ALLOW_THREADS;
+        _settings_cache_forget(handle);
+        // Look everything up again, other threads could have changed the maps while the GIL was released
+        auto& shadow_after = settings_shadows[key];
+        shadow_after.active.assign(bytes, bytes + size);
+        if (save) {
+            shadow_after.saved = shadow_after.active;
+        }
+        auto& stats_after = settings_stats[handle];
+        stats_after.writes++;
+        if (save) {
+            stats_after.eeprom_writes++;
+        } else if (save_to_eeprom) {
+            stats_after.eeprom_skipped++;
+        }
         PyBuffer_Release(&settings_buffer);
         Py_RETURN_NONE;
     } catch (ice::Exception& ex) {
@@ -1732,9 +2263,6 @@ PyObject* meth_load_default_settings(PyObject* self, PyObject* args) // icsneoLo
     if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
         return NULL;
     }
-    int errors[600] = { 0 };
-    int error_count = 600;
-    PyObject* list = PyList_New(0);
     try {
         ice::Library* lib = dll_get_library();
         if (!lib) {
@@ -1742,10 +2270,7 @@ PyObject* meth_load_default_settings(PyObject* self, PyObject* args) // icsneoLo
             return set_ics_exception(exception_runtime_error(), dll_get_error(buffer));
         }
         ice::Function<int __stdcall(void*)> icsneoLoadDefaultSettings(lib, "icsneoLoadDefaultSettings");
-        void* handle = NULL;
-    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
-        return NULL;
-    }
+        _settings_shadows_forget(handle);
         Py_BEGIN_ALLOW_THREADS;
         if (!icsneoLoadDefaultSettings(handle)) {
             Py_BLOCK_THREADS;
@@ -1759,49 +2284,85 @@ PyObject* meth_load_default_settings(PyObject* self, PyObject* args) // icsneoLo
     return set_ics_exception(exception_runtime_error(), "This is a bug!");
 }
 
+// Size of a SD card sector, icsneoReadSDCard() and icsneoWriteSDCard() transfer one sector per call
+#define SDCARD_SECTOR_SIZE 512
+
+typedef ice::Function<int __stdcall(void*, unsigned long, unsigned char*, unsigned long*)> ReadSDCardFunction;
+typedef ice::Function<int __stdcall(void*, unsigned long, unsigned char*)> WriteSDCardFunction;
+
+// Reads length bytes starting at sector index into data, one sector per driver call. Must be called without the
+// GIL. Returns false on a driver error, bytes_read is the number of bytes copied into data either way.
+static bool _read_sdcard_sectors(ReadSDCardFunction& read,
+                                 void* handle,
+                                 unsigned long index,
+                                 unsigned char* data,
+                                 size_t length,
+                                 size_t* bytes_read)
+{
+    // The driver may write more than a sector, never let it write into the caller's buffer directly.
+    // We only read 512 bytes internally, x4 for future compatibility?
+    unsigned char sector[SDCARD_SECTOR_SIZE * 4];
+    *bytes_read = 0;
+    while (*bytes_read < length) {
+        const size_t remaining = length - *bytes_read;
+        unsigned long size = SDCARD_SECTOR_SIZE;
+        if (!read(handle, index, sector, &size)) {
+            return false;
+        }
+        size = (std::min)(size, (unsigned long)SDCARD_SECTOR_SIZE);
+        const size_t copied = (std::min)((size_t)size, remaining);
+        memcpy(data + *bytes_read, sector, copied);
+        *bytes_read += copied;
+        if (size < SDCARD_SECTOR_SIZE) {
+            break;
+        }
+        ++index;
+    }
+    return true;
+}
+
 PyObject* meth_read_sdcard(PyObject* self,
                            PyObject* args) // icsneoReadSDCard(int hObject,unsigned long iSectorIndex,unsigned char
                                            // *data, unsigned long *bytesRead)
 {
     PyObject* obj = NULL;
     unsigned long index = 0;
-    unsigned long size = 0;
-    if (!PyArg_ParseTuple(args, arg_parse("Ok:", __FUNCTION__), &obj, &index, &size)) {
+    if (!PyArg_ParseTuple(args, arg_parse("Ok:", __FUNCTION__), &obj, &index)) {
         return NULL;
     }
     if (!PyNeoDeviceEx_CheckExact(obj)) {
         return set_ics_exception(exception_runtime_error(),
                                  "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
     }
-    // We only read 512 bytes internally, x4 for future compatibility?
-    unsigned char data[2048] = { 0 };
     try {
         ice::Library* lib = dll_get_library();
         if (!lib) {
             char buffer[512];
             return set_ics_exception(exception_runtime_error(), dll_get_error(buffer));
         }
-        ice::Function<int __stdcall(void*, unsigned long, unsigned char*, unsigned long*)> icsneoReadSDCard(
-            lib, "icsneoReadSDCard");
+        ReadSDCardFunction icsneoReadSDCard(lib, "icsneoReadSDCard");
         void* handle = NULL;
-    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
-        return NULL;
-    }
+        if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+            return NULL;
+        }
+        PyObject* byte_array = PyByteArray_FromStringAndSize(NULL, SDCARD_SECTOR_SIZE);
+        if (!byte_array) {
+            return NULL;
+        }
+        unsigned char* data = (unsigned char*)PyByteArray_AsString(byte_array);
+        size_t size = 0;
+        bool success = false;
         Py_BEGIN_ALLOW_THREADS;
-        if (!icsneoReadSDCard(handle, index, data, &size)) {
-            Py_BLOCK_THREADS;
+        success = _read_sdcard_sectors(icsneoReadSDCard, handle, index, data, SDCARD_SECTOR_SIZE, &size);
+        Py_END_ALLOW_THREADS;
+        if (!success) {
+            Py_DECREF(byte_array);
             return set_ics_exception(exception_runtime_error(), "icsneoReadSDCard() Failed");
         }
-        Py_END_ALLOW_THREADS;
-        PyObject* tuple = PyTuple_New(size);
-        if (!tuple) {
+        if (size != SDCARD_SECTOR_SIZE && PyByteArray_Resize(byte_array, size) != 0) {
+            Py_DECREF(byte_array);
             return NULL;
         }
-        for (unsigned long i = 0; i < size; ++i) {
-            PyTuple_SetItem(tuple, i, PyLong_FromLong(data[i]));
-        }
-        PyObject* byte_array = PyByteArray_FromObject(tuple);
-        Py_DECREF(tuple);
         return byte_array;
     } catch (ice::Exception& ex) {
         return set_ics_exception(exception_runtime_error(), (char*)ex.what());
@@ -1809,9 +2370,55 @@ PyObject* meth_read_sdcard(PyObject* self,
     return set_ics_exception(exception_runtime_error(), "This is a bug!");
 }
 
-PyObject* meth_write_sdcard(
-    PyObject* self,
-    PyObject* args) // icsneoWriteSDCard(int hObject,unsigned long iSectorIndex,const unsigned char *data)
+PyObject* meth_read_sdcard_into(PyObject* self, PyObject* args)
+{
+    PyObject* obj = NULL;
+    unsigned long index = 0;
+    PyObject* buffer_obj = NULL;
+    if (!PyArg_ParseTuple(args, arg_parse("OkO:", __FUNCTION__), &obj, &index, &buffer_obj)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    Py_buffer buffer = {};
+    if (PyObject_GetBuffer(buffer_obj, &buffer, PyBUF_WRITABLE | PyBUF_C_CONTIGUOUS) != 0) {
+        return NULL;
+    }
+    try {
+        ice::Library* lib = dll_get_library();
+        if (!lib) {
+            PyBuffer_Release(&buffer);
+            char error[512];
+            return set_ics_exception(exception_runtime_error(), dll_get_error(error));
+        }
+        ReadSDCardFunction icsneoReadSDCard(lib, "icsneoReadSDCard");
+        void* handle = NULL;
+        if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+            PyBuffer_Release(&buffer);
+            return NULL;
+        }
+        size_t size = 0;
+        bool success = false;
+        Py_BEGIN_ALLOW_THREADS;
+        success =
+            _read_sdcard_sectors(icsneoReadSDCard, handle, index, (unsigned char*)buffer.buf, buffer.len, &size);
+        Py_END_ALLOW_THREADS;
+        PyBuffer_Release(&buffer);
+        if (!success) {
+            return set_ics_exception(exception_runtime_error(), "icsneoReadSDCard() Failed");
+        }
+        return PyLong_FromSize_t(size);
+    } catch (ice::Exception& ex) {
+        PyBuffer_Release(&buffer);
+        return set_ics_exception(exception_runtime_error(), (char*)ex.what());
+    }
+    return set_ics_exception(exception_runtime_error(), "This is a bug!");
+}
+
+PyObject* meth_write_sdcard(
+    PyObject* self,
+    PyObject* args) // icsneoWriteSDCard(int hObject,unsigned long iSectorIndex,const unsigned char *data)
 {
     PyObject* obj = NULL;
     unsigned long index = 0;
@@ -1823,33 +2430,156 @@ PyObject* meth_write_sdcard(
         return set_ics_exception(exception_runtime_error(),
                                  "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
     }
-    if (!PyByteArray_CheckExact(ba_obj)) {
-        return set_ics_exception(exception_runtime_error(), "Argument must be a bytearray");
+    if (!PyObject_CheckBuffer(ba_obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be a bytes-like object");
+    }
+    Py_buffer buffer = {};
+    if (PyObject_GetBuffer(ba_obj, &buffer, PyBUF_C_CONTIGUOUS) != 0) {
+        return NULL;
     }
-    if (PyByteArray_Size(ba_obj) != 512) {
-        return set_ics_exception(exception_runtime_error(), "bytearray must be 512 in length");
+    if (buffer.len != SDCARD_SECTOR_SIZE) {
+        PyBuffer_Release(&buffer);
+        return set_ics_exception(exception_runtime_error(), "data must be 512 bytes in length");
     }
-    // We only read 512 bytes internally, x4 for future compatibility?
     try {
         ice::Library* lib = dll_get_library();
         if (!lib) {
-            char buffer[512];
-            return set_ics_exception(exception_runtime_error(), dll_get_error(buffer));
+            PyBuffer_Release(&buffer);
+            char error[512];
+            return set_ics_exception(exception_runtime_error(), dll_get_error(error));
         }
-        ice::Function<int __stdcall(void*, unsigned long, unsigned char*)> icsneoWriteSDCard(lib,
-                                                                                                  "icsneoWriteSDCard");
+        WriteSDCardFunction icsneoWriteSDCard(lib, "icsneoWriteSDCard");
         void* handle = NULL;
-    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
-        return NULL;
-    }
+        if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+            PyBuffer_Release(&buffer);
+            return NULL;
+        }
+        // Raw writes can overwrite a script stored on the SD card
+        _script_records_forget(handle, SCRIPT_LOCATION_SDCARD);
         Py_BEGIN_ALLOW_THREADS;
-        if (!icsneoWriteSDCard(handle, index, (unsigned char*)PyByteArray_AsString(ba_obj))) {
+        if (!icsneoWriteSDCard(handle, index, (unsigned char*)buffer.buf)) {
             Py_BLOCK_THREADS;
+            PyBuffer_Release(&buffer);
             return set_ics_exception(exception_runtime_error(), "icsneoWriteSDCard() Failed");
         }
         Py_END_ALLOW_THREADS;
+        PyBuffer_Release(&buffer);
         Py_RETURN_NONE;
     } catch (ice::Exception& ex) {
+        PyBuffer_Release(&buffer);
+        return set_ics_exception(exception_runtime_error(), (char*)ex.what());
+    }
+    return set_ics_exception(exception_runtime_error(), "This is a bug!");
+}
+
+PyObject* meth_write_sdcard_from(PyObject* self, PyObject* args, PyObject* keywords)
+{
+    PyObject* obj = NULL;
+    unsigned long index = 0;
+    PyObject* buffer_obj = NULL;
+    PyObject* progress = NULL;
+    unsigned long long granularity = 1024 * 1024;
+    int verify = 0;
+    char* kwords[] = { "device", "start_sector", "buffer", "progress", "granularity", "verify", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args,
+                                     keywords,
+                                     arg_parse("OkO|OKp:", __FUNCTION__),
+                                     kwords,
+                                     &obj,
+                                     &index,
+                                     &buffer_obj,
+                                     &progress,
+                                     &granularity,
+                                     &verify)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    if (progress == Py_None) {
+        progress = NULL;
+    }
+    if (progress && !PyCallable_Check(progress)) {
+        return set_ics_exception(exception_argument_error(), "progress must be callable");
+    }
+    // Report at least once per sector
+    granularity = (std::max)(granularity, (unsigned long long)SDCARD_SECTOR_SIZE);
+    Py_buffer buffer = {};
+    if (PyObject_GetBuffer(buffer_obj, &buffer, PyBUF_C_CONTIGUOUS) != 0) {
+        return NULL;
+    }
+    try {
+        ice::Library* lib = dll_get_library();
+        if (!lib) {
+            PyBuffer_Release(&buffer);
+            char error[512];
+            return set_ics_exception(exception_runtime_error(), dll_get_error(error));
+        }
+        WriteSDCardFunction icsneoWriteSDCard(lib, "icsneoWriteSDCard");
+        ReadSDCardFunction icsneoReadSDCard(lib, "icsneoReadSDCard");
+        void* handle = NULL;
+        if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+            PyBuffer_Release(&buffer);
+            return NULL;
+        }
+        _script_records_forget(handle, SCRIPT_LOCATION_SDCARD);
+        const unsigned char* data = (const unsigned char*)buffer.buf;
+        const size_t length = (size_t)buffer.len;
+        size_t written = 0;
+        unsigned long long next_report = granularity;
+        unsigned long sector = index;
+        char error[128] = { 0 };
+        Py_BEGIN_ALLOW_THREADS;
+        while (written < length) {
+            // We only read 512 bytes internally, x4 for future compatibility?
+            unsigned char block[SDCARD_SECTOR_SIZE * 4] = { 0 };
+            const unsigned char* source = data + written;
+            const size_t count = (std::min)(length - written, (size_t)SDCARD_SECTOR_SIZE);
+            size_t size = 0;
+            if (count < SDCARD_SECTOR_SIZE) {
+                // Keep the rest of a partially written last sector
+                if (!_read_sdcard_sectors(icsneoReadSDCard, handle, sector, block, SDCARD_SECTOR_SIZE, &size)) {
+                    snprintf(error, sizeof(error), "icsneoReadSDCard() Failed on sector %lu", sector);
+                    break;
+                }
+                memcpy(block, source, count);
+                source = block;
+            }
+            if (!icsneoWriteSDCard(handle, sector, (unsigned char*)source)) {
+                snprintf(error, sizeof(error), "icsneoWriteSDCard() Failed on sector %lu", sector);
+                break;
+            }
+            if (verify) {
+                unsigned char check[SDCARD_SECTOR_SIZE * 4] = { 0 };
+                if (!_read_sdcard_sectors(icsneoReadSDCard, handle, sector, check, SDCARD_SECTOR_SIZE, &size) ||
+                    size != SDCARD_SECTOR_SIZE || memcmp(check, source, SDCARD_SECTOR_SIZE) != 0) {
+                    snprintf(error, sizeof(error), "Verifying sector %lu Failed", sector);
+                    break;
+                }
+            }
+            written += count;
+            ++sector;
+            if (progress && (written >= next_report || written == length)) {
+                Py_BLOCK_THREADS;
+                PyObject* result =
+                    PyObject_CallFunction(progress, "KK", (unsigned long long)written, (unsigned long long)length);
+                if (!result) {
+                    PyBuffer_Release(&buffer);
+                    return NULL;
+                }
+                Py_DECREF(result);
+                Py_UNBLOCK_THREADS;
+                next_report = written + granularity;
+            }
+        }
+        Py_END_ALLOW_THREADS;
+        PyBuffer_Release(&buffer);
+        if (error[0]) {
+            return set_ics_exception(exception_runtime_error(), error);
+        }
+        return PyLong_FromSize_t(written);
+    } catch (ice::Exception& ex) {
+        PyBuffer_Release(&buffer);
         return set_ics_exception(exception_runtime_error(), (char*)ex.what());
     }
     return set_ics_exception(exception_runtime_error(), "This is a bug!");
@@ -2124,11 +2854,12 @@ PyObject* meth_coremini_read_tx_message(PyObject* self, PyObject* args) // Scrip
             Py_BEGIN_ALLOW_THREADS;
             if (!icsneoScriptReadTxMessage(handle, index, &PySpyMessageJ1850_GetObject(msg)->msg)) {
                 Py_BLOCK_THREADS;
+                Py_DECREF(msg);
                 return set_ics_exception(exception_runtime_error(), "icsneoScriptReadTxMessage() Failed");
             }
             Py_END_ALLOW_THREADS;
         } else {
-            PyObject* msg = PyObject_CallObject((PyObject*)&spy_message_object_type, NULL);
+            msg = PyObject_CallObject((PyObject*)&spy_message_object_type, NULL);
             if (!msg) {
                 // This should only happen if we run out of memory (malloc failure)?
                 PyErr_Print();
@@ -2137,6 +2868,7 @@ PyObject* meth_coremini_read_tx_message(PyObject* self, PyObject* args) // Scrip
             Py_BEGIN_ALLOW_THREADS;
             if (!icsneoScriptReadTxMessage(handle, index, &PySpyMessage_GetObject(msg)->msg)) {
                 Py_BLOCK_THREADS;
+                Py_DECREF(msg);
                 return set_ics_exception(exception_runtime_error(), "icsneoScriptReadTxMessage() Failed");
             }
             Py_END_ALLOW_THREADS;
@@ -2186,40 +2918,46 @@ PyObject* meth_coremini_read_rx_message(PyObject* self, PyObject* args) // Scrip
             if (!msg_mask) {
                 // This should only happen if we run out of memory (malloc failure)?
                 PyErr_Print();
+                Py_DECREF(msg);
                 return set_ics_exception(exception_runtime_error(),
                                          "Failed to allocate " SPY_MESSAGE_J1850_OBJECT_NAME);
             }
             Py_BEGIN_ALLOW_THREADS;
             if (!icsneoScriptReadRxMessage(handle,
                                            index,
-                                           &PySpyMessageJ1850_GetObject(msg_mask)->msg,
+                                           &PySpyMessageJ1850_GetObject(msg)->msg,
                                            &PySpyMessageJ1850_GetObject(msg_mask)->msg)) {
                 Py_BLOCK_THREADS;
+                Py_DECREF(msg);
+                Py_DECREF(msg_mask);
                 return set_ics_exception(exception_runtime_error(), "icsneoScriptReadRxMessage() Failed");
             }
             Py_END_ALLOW_THREADS;
         } else {
-            PyObject* msg = PyObject_CallObject((PyObject*)&spy_message_object_type, NULL);
+            msg = PyObject_CallObject((PyObject*)&spy_message_object_type, NULL);
             if (!msg) {
                 // This should only happen if we run out of memory (malloc failure)?
                 PyErr_Print();
                 return set_ics_exception(exception_runtime_error(), "Failed to allocate " SPY_MESSAGE_OBJECT_NAME);
             }
-            PyObject* msg_mask = PyObject_CallObject((PyObject*)&spy_message_object_type, NULL);
+            msg_mask = PyObject_CallObject((PyObject*)&spy_message_object_type, NULL);
             if (!msg_mask) {
                 // This should only happen if we run out of memory (malloc failure)?
                 PyErr_Print();
+                Py_DECREF(msg);
                 return set_ics_exception(exception_runtime_error(), "Failed to allocate " SPY_MESSAGE_OBJECT_NAME);
             }
             Py_BEGIN_ALLOW_THREADS;
             if (!icsneoScriptReadRxMessage(
                     handle, index, &PySpyMessage_GetObject(msg)->msg, &PySpyMessage_GetObject(msg_mask)->msg)) {
                 Py_BLOCK_THREADS;
+                Py_DECREF(msg);
+                Py_DECREF(msg_mask);
                 return set_ics_exception(exception_runtime_error(), "icsneoScriptReadRxMessage() Failed");
             }
             Py_END_ALLOW_THREADS;
         }
-        return Py_BuildValue("(O,O)", msg, msg_mask);
+        return Py_BuildValue("(N,N)", msg, msg_mask);
     } catch (ice::Exception& ex) {
         return set_ics_exception(exception_runtime_error(), (char*)ex.what());
     }
@@ -2260,6 +2998,7 @@ PyObject* meth_coremini_write_tx_message(PyObject* self, PyObject* args) // icsn
         }
         msg = (void*)&PySpyMessage_GetObject(msg_obj)->msg;
     }
+    _script_tables_forget(handle, SCRIPT_TABLE_TX, index);
     try {
         ice::Library* lib = dll_get_library();
         if (!lib) {
@@ -2301,6 +3040,9 @@ PyObject* meth_coremini_write_rx_message(PyObject* self, PyObject* args) // icsn
     }
     void* msg = NULL;
     void* msg_mask = NULL;
+    // Empty mask used when msg_mask isn't a message
+    icsSpyMessageJ1850 empty_mask_j1850 = {};
+    icsSpyMessage empty_mask = {};
     if (j1850) {
         // We are going to use icsSpyMessageJ1850 objects here.
         if (!PySpyMessageJ1850_CheckExact(msg_obj)) {
@@ -2309,8 +3051,7 @@ PyObject* meth_coremini_write_rx_message(PyObject* self, PyObject* args) // icsn
         }
         msg = (void*)&PySpyMessageJ1850_GetObject(msg_obj)->msg;
         if (!PySpyMessageJ1850_CheckExact(msg_mask_obj)) {
-            msg_mask = (void*)new icsSpyMessageJ1850();
-            memset(msg_mask, 0, sizeof(icsSpyMessageJ1850));
+            msg_mask = (void*)&empty_mask_j1850;
         } else {
             msg_mask = (void*)&PySpyMessageJ1850_GetObject(msg_mask_obj)->msg;
         }
@@ -2322,12 +3063,12 @@ PyObject* meth_coremini_write_rx_message(PyObject* self, PyObject* args) // icsn
         }
         msg = (void*)&PySpyMessage_GetObject(msg_obj)->msg;
         if (!PySpyMessage_CheckExact(msg_mask_obj)) {
-            msg_mask = (void*)new icsSpyMessage();
-            memset(msg_mask, 0, sizeof(icsSpyMessage));
+            msg_mask = (void*)&empty_mask;
         } else {
             msg_mask = (void*)&PySpyMessage_GetObject(msg_mask_obj)->msg;
         }
     }
+    _script_tables_forget(handle, SCRIPT_TABLE_RX, index);
     try {
         ice::Library* lib = dll_get_library();
         if (!lib) {
@@ -2336,9 +3077,12 @@ PyObject* meth_coremini_write_rx_message(PyObject* self, PyObject* args) // icsn
         }
         ice::Function<int __stdcall(void*, unsigned int, void*, void*)> icsneoScriptWriteRxMessage(
             lib, "icsneoScriptWriteRxMessage");
+        Py_BEGIN_ALLOW_THREADS;
         if (!icsneoScriptWriteRxMessage(handle, index, msg, msg_mask)) {
+            Py_BLOCK_THREADS;
             return set_ics_exception(exception_runtime_error(), "icsneoScriptWriteRxMessage() Failed");
         }
+        Py_END_ALLOW_THREADS;
         Py_RETURN_NONE;
     } catch (ice::Exception& ex) {
         return set_ics_exception(exception_runtime_error(), (char*)ex.what());
@@ -2700,6 +3444,8 @@ PyObject* meth_force_firmware_update(PyObject* self, PyObject* args)
             return set_ics_exception(exception_runtime_error(), dll_get_error(buffer));
         }
         ice::Function<int __stdcall(void*)> icsneoForceFirmwareUpdate(lib, "icsneoForceFirmwareUpdate");
+        _script_records_forget(handle);
+        _settings_shadows_forget(handle);
         Py_BEGIN_ALLOW_THREADS;
         if (!icsneoForceFirmwareUpdate(handle)) {
             Py_BLOCK_THREADS;
@@ -2902,7 +3648,6 @@ PyObject* meth_load_readbin(PyObject* self, PyObject* args)
     PyObject* arg_data = NULL;
     int location;
     PyObject* obj = NULL;
-    bool isFileData = false;
     if (!PyArg_ParseTuple(args, arg_parse("OOi:", __FUNCTION__), &obj, &arg_data, &location)) {
         return NULL;
     }
@@ -2914,68 +3659,31 @@ PyObject* meth_load_readbin(PyObject* self, PyObject* args)
     if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
         return NULL;
     }
-    long fsize;
-    unsigned char* data = NULL;
-    int data_size = 0;
-#if PY_MAJOR_VERSION >= 3
-    if (PyUnicode_CheckExact(arg_data)) {
-        char* file_name = PyUniStr_AsStrOrUTF8(arg_data);
-#else
-    if (PyString_Check(arg_data)) {
-        char* file_name = PyUniStr_AsStrOrUTF8(arg_data);
-#endif
-        if (!file_name) {
-            return set_ics_exception(exception_runtime_error(), "Failed to convert file path to string");
-        }
-        FILE* f;
-        f = fopen(file_name, "rb");
-        if (!f) {
-            std::stringstream ss;
-            ss << "Failed to open Readbin: '" << file_name << "'. Please make sure path exists";
-            return set_ics_exception(exception_runtime_error(), (char*)ss.str().c_str());
-        }
-        fseek(f, 0, SEEK_END);
-        fsize = ftell(f);
-        rewind(f);
-        data = (unsigned char*)malloc(sizeof(char) * fsize);
-        data_size = (int)fread(data, 1, fsize, f);
-        fclose(f);
-        if (fsize != data_size) {
-            return set_ics_exception(exception_runtime_error(), "Readbin file size mismatch");
-        }
-    } else if (PyTuple_CheckExact(arg_data)) {
-        Py_ssize_t tuple_size = PyTuple_Size(arg_data);
-        data = (unsigned char*)malloc(sizeof(char) * tuple_size);
-        // Move tuple data into array
-        for (int i = 0; i < tuple_size; ++i) {
-            PyObject* value = PyTuple_GET_ITEM(arg_data, i);
-            if (!PyLong_CheckExact(value)) {
-                return set_ics_exception(
-                    exception_runtime_error(), "Failed to convert tuple data. Tuple data must be integer type");
-            }
-            data[i] = (unsigned char)PyLong_AsLong(PyTuple_GET_ITEM(arg_data, i));
-        }
-        fsize = static_cast<long>(tuple_size);
-        data_size = fsize;
-    } else {
-        return set_ics_exception(exception_runtime_error(), "Argument must be filepath or tuple");
+    Py_buffer buffer = {};
+    if (!_get_script_data(arg_data, &buffer, "Readbin", __FUNCTION__)) {
+        return NULL;
     }
     try {
         ice::Library* lib = dll_get_library();
         if (!lib) {
-            char buffer[512];
-            return set_ics_exception(exception_runtime_error(), dll_get_error(buffer));
+            PyBuffer_Release(&buffer);
+            char error[512];
+            return set_ics_exception(exception_runtime_error(), dll_get_error(error));
         }
         ice::Function<int __stdcall(void*, const unsigned char*, unsigned long, int)> icsneoScriptLoadReadBin(
             lib, "icsneoScriptLoadReadBin");
+        _script_records_forget(handle, location);
         Py_BEGIN_ALLOW_THREADS;
-        if (!icsneoScriptLoadReadBin(handle, data, data_size, location)) {
+        if (!icsneoScriptLoadReadBin(handle, (const unsigned char*)buffer.buf, (unsigned long)buffer.len, location)) {
             Py_BLOCK_THREADS;
+            PyBuffer_Release(&buffer);
             return set_ics_exception(exception_runtime_error(), "icsneoScriptLoadReadBin() Failed");
         }
         Py_END_ALLOW_THREADS;
+        PyBuffer_Release(&buffer);
         Py_RETURN_NONE;
     } catch (ice::Exception& ex) {
+        PyBuffer_Release(&buffer);
         return set_ics_exception(exception_runtime_error(), (char*)ex.what());
     }
     return set_ics_exception(exception_runtime_error(), "This is a bug!");
@@ -3000,17 +3708,19 @@ PyObject* meth_iso15765_transmit_message(PyObject* self, PyObject* args)
             obj_tx_msg, "ics.structures.st_cm_iso157652_tx_message", "st_cm_iso157652_tx_message") != 1) {
         return NULL;
     }
-    Py_buffer obj_tx_msg_buffer = {};
-    PyObject_GetBuffer(obj_tx_msg, &obj_tx_msg_buffer, PyBUF_CONTIG);
-
     void* handle = NULL;
     if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
         return NULL;
     }
+    Py_buffer obj_tx_msg_buffer = {};
+    if (PyObject_GetBuffer(obj_tx_msg, &obj_tx_msg_buffer, PyBUF_CONTIG) != 0) {
+        return NULL;
+    }
     try {
         ice::Library* lib = dll_get_library();
         if (!lib) {
             char buffer[512];
+            PyBuffer_Release(&obj_tx_msg_buffer);
             return set_ics_exception(exception_runtime_error(), dll_get_error(buffer));
         }
         ice::Function<int __stdcall(void*, unsigned long, stCM_ISO157652_TxMessage*, unsigned long)>
@@ -3026,6 +3736,7 @@ PyObject* meth_iso15765_transmit_message(PyObject* self, PyObject* args)
         PyBuffer_Release(&obj_tx_msg_buffer);
         return Py_BuildValue("b", true);
     } catch (ice::Exception& ex) {
+        PyBuffer_Release(&obj_tx_msg_buffer);
         return set_ics_exception(exception_runtime_error(), (char*)ex.what());
     }
     return set_ics_exception(exception_runtime_error(), "This is a bug!");
@@ -3048,13 +3759,14 @@ PyObject* meth_iso15765_receive_message(PyObject* self, PyObject* args)
             obj_rx_msg, "ics.structures.st_cm_iso157652_rx_message", "st_cm_iso157652_rx_message") != 1) {
         return NULL;
     }
-    Py_buffer obj_rx_msg_buffer = {};
-    PyObject_GetBuffer(obj_rx_msg, &obj_rx_msg_buffer, PyBUF_CONTIG);
-
     void* handle = NULL;
     if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
         return NULL;
     }
+    Py_buffer obj_rx_msg_buffer = {};
+    if (PyObject_GetBuffer(obj_rx_msg, &obj_rx_msg_buffer, PyBUF_CONTIG) != 0) {
+        return NULL;
+    }
     try {
         ice::Library* lib = dll_get_library();
         if (!lib) {
@@ -3247,6 +3959,7 @@ PyObject* meth_set_bit_rate(PyObject* self, PyObject* args)
             return set_ics_exception(exception_runtime_error(), dll_get_error(buffer));
         }
         ice::Function<int __stdcall(void*, int, int)> icsneoSetBitRate(lib, "icsneoSetBitRate");
+        _settings_shadows_forget(handle);
         Py_BEGIN_ALLOW_THREADS;
         if (!icsneoSetBitRate(handle, bitrate, net_id)) {
             Py_BLOCK_THREADS;
@@ -3283,6 +3996,7 @@ PyObject* meth_set_fd_bit_rate(PyObject* self, PyObject* args)
             return set_ics_exception(exception_runtime_error(), dll_get_error(buffer));
         }
         ice::Function<int __stdcall(void*, int, int)> icsneoSetFDBitRate(lib, "icsneoSetFDBitRate");
+        _settings_shadows_forget(handle);
         Py_BEGIN_ALLOW_THREADS;
         if (!icsneoSetFDBitRate(handle, bitrate, net_id)) {
             Py_BLOCK_THREADS;
@@ -3320,6 +4034,7 @@ PyObject* meth_set_bit_rate_ex(PyObject* self, PyObject* args)
             return set_ics_exception(exception_runtime_error(), dll_get_error(buffer));
         }
         ice::Function<int __stdcall(void*, int, int, int)> icsneoSetBitRateEx(lib, "icsneoSetBitRateEx");
+        _settings_shadows_forget(handle);
         Py_BEGIN_ALLOW_THREADS;
         if (!icsneoSetBitRateEx(handle, bitrate, net_id, options)) {
             Py_BLOCK_THREADS;
@@ -4020,6 +4735,7 @@ PyObject* meth_disk_format(PyObject* self, PyObject* args)
         Py_buffer details_buffer = {};
         PyObject_GetBuffer(details, &details_buffer, PyBUF_CONTIG);
         ice::Function<int __stdcall(void*, SDiskDetails*)> icsneoRequestDiskFormat(lib, "icsneoRequestDiskFormat");
+        _script_records_forget(handle, SCRIPT_LOCATION_SDCARD);
 
         Py_BEGIN_ALLOW_THREADS;
         if (!icsneoRequestDiskFormat(handle, (SDiskDetails*)details_buffer.buf)) {
@@ -4915,3 +5631,2092 @@ PyObject* meth_get_all_chip_versions(PyObject* self, PyObject* args)
     }
     return set_ics_exception(exception_runtime_error(), "This is a bug!");
 }
+
+static PyObject* _replay_stats_to_dict(const ReplayStats& stats)
+{
+    return Py_BuildValue("{s:O,s:K,s:K,s:K,s:K,s:d,s:d}",
+                         "running",
+                         stats.running ? Py_True : Py_False,
+                         "frames",
+                         (unsigned long long)stats.frames,
+                         "batches",
+                         (unsigned long long)stats.batches,
+                         "loops",
+                         (unsigned long long)stats.loops,
+                         "tx_failures",
+                         (unsigned long long)stats.tx_failures,
+                         "mean_error",
+                         stats.mean_error,
+                         "max_error",
+                         stats.max_error);
+}
+
+// Packed records only carry the inline Data bytes, ExtraDataPtr is meaningless outside the process that recorded it.
+static void _replay_strip_extra_data(icsSpyMessage* msg)
+{
+    if (!spy_message_extra_data_length(msg)) {
+        return;
+    }
+    msg->ExtraDataPtr = NULL;
+    msg->ExtraDataPtrEnabled = 0;
+    if (msg->NumberBytesData > sizeof(msg->Data)) {
+        msg->NumberBytesData = sizeof(msg->Data);
+    }
+}
+
+// Fills messages (and extra_data for SpyMessage sequences) from source. Returns false with an exception set on error.
+static bool _replay_load_source(PyObject* source,
+                                std::vector<icsSpyMessage>& messages,
+                                std::vector<std::vector<uint8_t>>& extra_data)
+{
+    PyObject* mapped = NULL;
+    if (PyUnicode_Check(source) || PyObject_HasAttrString(source, "__fspath__")) {
+        // Mapped instead of read, captures of multi-hour bus logs are easily larger than 2 GB
+        mapped = _map_file(source, "replay file", __FUNCTION__);
+        if (!mapped) {
+            return false;
+        }
+        source = mapped;
+    }
+    if (PyObject_CheckBuffer(source)) {
+        Py_buffer buffer = {};
+        if (PyObject_GetBuffer(source, &buffer, PyBUF_SIMPLE) != 0) {
+            Py_XDECREF(mapped);
+            return false;
+        }
+        if (buffer.len % sizeof(icsSpyMessage) != 0) {
+            set_ics_exception(exception_argument_error(),
+                              (char*)(mapped ? "Replay file size isn't a multiple of sizeof(icsSpyMessage)"
+                                             : "Buffer length isn't a multiple of sizeof(icsSpyMessage)"));
+            PyBuffer_Release(&buffer);
+            Py_XDECREF(mapped);
+            return false;
+        }
+        // The exported buffer can't be resized or closed until it is released
+        Py_BEGIN_ALLOW_THREADS;
+        messages.resize(buffer.len / sizeof(icsSpyMessage));
+        if (buffer.len) {
+            memcpy(messages.data(), buffer.buf, buffer.len);
+        }
+        for (auto& msg : messages) {
+            _replay_strip_extra_data(&msg);
+        }
+        Py_END_ALLOW_THREADS;
+        PyBuffer_Release(&buffer);
+        Py_XDECREF(mapped);
+        return true;
+    }
+    PyObject* sequence = PySequence_Fast(source, "source must be a path, buffer or sequence of " MODULE_NAME
+                                                 "." SPY_MESSAGE_OBJECT_NAME);
+    if (!sequence) {
+        return false;
+    }
+    const Py_ssize_t count = PySequence_Fast_GET_SIZE(sequence);
+    messages.resize(count);
+    extra_data.resize(count);
+    for (Py_ssize_t i = 0; i < count; ++i) {
+        PyObject* item = PySequence_Fast_GET_ITEM(sequence, i);
+        if (!PySpyMessage_CheckExact(item) && !PySpyMessageJ1850_CheckExact(item)) {
+            Py_DECREF(sequence);
+            set_ics_exception(exception_argument_error(),
+                              "source items must be of type " MODULE_NAME "." SPY_MESSAGE_OBJECT_NAME);
+            return false;
+        }
+        icsSpyMessage* msg = &PySpyMessage_GetObject(item)->msg;
+        memcpy(&messages[i], msg, sizeof(messages[i]));
+        int length = spy_message_extra_data_length(msg);
+        if (length) {
+            const uint8_t* data = (const uint8_t*)msg->ExtraDataPtr;
+            extra_data[i].assign(data, data + length);
+        }
+    }
+    Py_DECREF(sequence);
+    return true;
+}
+
+// Rewrites or drops (mapped to None) network ids. Returns false with an exception set on error.
+static bool _replay_apply_network_map(PyObject* network_map,
+                                      std::vector<icsSpyMessage>& messages,
+                                      std::vector<std::vector<uint8_t>>& extra_data)
+{
+    if (!network_map || network_map == Py_None) {
+        return true;
+    }
+    if (!PyDict_Check(network_map)) {
+        set_ics_exception(exception_argument_error(), "network_map must be of type dict");
+        return false;
+    }
+    std::map<int, int> mapping;
+    PyObject* key = NULL;
+    PyObject* value = NULL;
+    Py_ssize_t pos = 0;
+    while (PyDict_Next(network_map, &pos, &key, &value)) {
+        int from = (int)PyLong_AsLong(key);
+        int to = value == Py_None ? -1 : (int)PyLong_AsLong(value);
+        if (PyErr_Occurred()) {
+            return false;
+        }
+        mapping[from] = to;
+    }
+    size_t kept = 0;
+    for (size_t i = 0; i < messages.size(); ++i) {
+        icsSpyMessage& msg = messages[i];
+        auto it = mapping.find((msg.NetworkID2 << 8) | msg.NetworkID);
+        if (it != mapping.end()) {
+            if (it->second < 0) {
+                continue;
+            }
+            msg.NetworkID = it->second & 0xFF;
+            msg.NetworkID2 = (it->second >> 8) & 0xFF;
+        }
+        messages[kept] = msg;
+        if (!extra_data.empty()) {
+            extra_data[kept].swap(extra_data[i]);
+        }
+        ++kept;
+    }
+    messages.resize(kept);
+    if (!extra_data.empty()) {
+        extra_data.resize(kept);
+    }
+    return true;
+}
+
+PyObject* meth_replay(PyObject* self, PyObject* args, PyObject* keywords)
+{
+    PyObject* obj = NULL;
+    PyObject* source = NULL;
+    double speed = 1.0;
+    int loop = 0;
+    PyObject* network_map = NULL;
+    double quantum = 0.001;
+    int block = 1;
+    char* kwords[] = { "device", "source", "speed", "loop", "network_map", "quantum", "block", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args,
+                                     keywords,
+                                     arg_parse("OO|dpOdp:", __FUNCTION__),
+                                     kwords,
+                                     &obj,
+                                     &source,
+                                     &speed,
+                                     &loop,
+                                     &network_map,
+                                     &quantum,
+                                     &block)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    if (speed <= 0) {
+        return set_ics_exception(exception_argument_error(), "speed must be greater than 0");
+    }
+    if (quantum < 0) {
+        return set_ics_exception(exception_argument_error(), "quantum can't be negative");
+    }
+    std::vector<icsSpyMessage> messages;
+    std::vector<std::vector<uint8_t>> extra_data;
+    if (!_replay_load_source(source, messages, extra_data)) {
+        return NULL;
+    }
+    if (!_replay_apply_network_map(network_map, messages, extra_data)) {
+        return NULL;
+    }
+    try {
+        ice::Library* lib = dll_get_library();
+        if (!lib) {
+            char buffer[512];
+            return set_ics_exception(exception_runtime_error(), dll_get_error(buffer));
+        }
+        auto icsneoTxMessages =
+            std::make_shared<ice::Function<int __stdcall(void*, icsSpyMessage*, int, int)>>(lib, "icsneoTxMessages");
+        ReplayEngine::TxFunction tx = [handle, icsneoTxMessages](icsSpyMessage* msgs, int network_id, int count) {
+            try {
+                return (*icsneoTxMessages)(handle, msgs, network_id, count) != 0;
+            } catch (ice::Exception&) {
+                return false;
+            }
+        };
+        auto engine = std::make_shared<ReplayEngine>(
+            std::move(messages), std::move(extra_data), speed, loop != 0, quantum, tx);
+        Py_BEGIN_ALLOW_THREADS;
+        // Only one replay per device
+        replay_remove(handle);
+        replay_set(handle, engine);
+        engine->start();
+        Py_END_ALLOW_THREADS;
+        if (!block) {
+            Py_RETURN_NONE;
+        }
+        bool finished = false;
+        while (!finished) {
+            Py_BEGIN_ALLOW_THREADS;
+            finished = engine->wait(0.1);
+            Py_END_ALLOW_THREADS;
+            // Let KeyboardInterrupt stop a long (or looping) replay
+            if (!finished && PyErr_CheckSignals() != 0) {
+                Py_BEGIN_ALLOW_THREADS;
+                replay_remove(handle);
+                Py_END_ALLOW_THREADS;
+                return NULL;
+            }
+        }
+        if (replay_get(handle) == engine) {
+            replay_remove(handle);
+        }
+        return _replay_stats_to_dict(engine->stats());
+    } catch (ice::Exception& ex) {
+        return set_ics_exception(exception_runtime_error(), (char*)ex.what());
+    }
+    return set_ics_exception(exception_runtime_error(), "This is a bug!");
+}
+
+PyObject* meth_replay_status(PyObject* self, PyObject* args)
+{
+    PyObject* obj = NULL;
+    if (!PyArg_ParseTuple(args, arg_parse("O:", __FUNCTION__), &obj)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    auto engine = replay_get(handle);
+    if (!engine) {
+        Py_RETURN_NONE;
+    }
+    return _replay_stats_to_dict(engine->stats());
+}
+
+PyObject* meth_replay_stop(PyObject* self, PyObject* args)
+{
+    PyObject* obj = NULL;
+    if (!PyArg_ParseTuple(args, arg_parse("O:", __FUNCTION__), &obj)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    std::shared_ptr<ReplayEngine> engine;
+    Py_BEGIN_ALLOW_THREADS;
+    engine = replay_remove(handle);
+    Py_END_ALLOW_THREADS;
+    if (!engine) {
+        Py_RETURN_NONE;
+    }
+    return _replay_stats_to_dict(engine->stats());
+}
+
+PyObject* meth_decode_signals(PyObject* self, PyObject* args)
+{
+    PyObject* messages = NULL;
+    Py_buffer table = {};
+    if (!PyArg_ParseTuple(args, arg_parse("Oy*:", __FUNCTION__), &messages, &table)) {
+        return NULL;
+    }
+    std::vector<SignalDefinition> signals;
+    bool valid_table = decode_parse_table((const uint8_t*)table.buf, (size_t)table.len, signals);
+    PyBuffer_Release(&table);
+    if (!valid_table) {
+        return set_ics_exception(exception_argument_error(), "Signal table is malformed");
+    }
+    PyObject* sequence =
+        PySequence_Fast(messages, "messages must be a sequence of " MODULE_NAME "." SPY_MESSAGE_OBJECT_NAME);
+    if (!sequence) {
+        return NULL;
+    }
+    const Py_ssize_t count = PySequence_Fast_GET_SIZE(sequence);
+    std::vector<const icsSpyMessage*> msgs(count);
+    for (Py_ssize_t i = 0; i < count; ++i) {
+        PyObject* item = PySequence_Fast_GET_ITEM(sequence, i);
+        if (!PySpyMessage_CheckExact(item)) {
+            Py_DECREF(sequence);
+            return set_ics_exception(exception_argument_error(),
+                                     "messages items must be of type " MODULE_NAME "." SPY_MESSAGE_OBJECT_NAME);
+        }
+        msgs[i] = &PySpyMessage_GetObject(item)->msg;
+    }
+    std::vector<std::vector<uint32_t>> rows(signals.size());
+    std::vector<std::vector<double>> values(signals.size());
+    // The GIL stays held, the pass is short and pure CPU. Without it another thread could remove the messages from a
+    // list and free them, or replace their ExtraDataPtr, while msgs still points into them.
+    for (Py_ssize_t i = 0; i < count; ++i) {
+        const icsSpyMessage* msg = msgs[i];
+        size_t index = decode_find_first(signals, msg->ArbIDOrHeader);
+        if (index == signals.size()) {
+            continue;
+        }
+        const uint8_t* payload = msg->Data;
+        size_t length = msg->NumberBytesData < sizeof(msg->Data) ? msg->NumberBytesData : sizeof(msg->Data);
+        int extra_length = spy_message_extra_data_length(msg);
+        if (extra_length) {
+            payload = (const uint8_t*)msg->ExtraDataPtr;
+            length = (size_t)extra_length;
+        }
+        const int network_id = (msg->NetworkID2 << 8) | msg->NetworkID;
+        for (; index < signals.size() && signals[index].arbid == msg->ArbIDOrHeader; ++index) {
+            const SignalDefinition& signal = signals[index];
+            if (signal.network_id != -1 && signal.network_id != network_id) {
+                continue;
+            }
+            double value = 0;
+            if (decode_signal(signal, payload, length, &value)) {
+                rows[index].push_back((uint32_t)i);
+                values[index].push_back(value);
+            }
+        }
+    }
+    Py_DECREF(sequence);
+
+    PyObject* result = PyTuple_New(signals.size());
+    if (!result) {
+        return NULL;
+    }
+    for (size_t i = 0; i < signals.size(); ++i) {
+        PyObject* column = Py_BuildValue("(NN)",
+                                         PyByteArray_FromStringAndSize((const char*)rows[i].data(),
+                                                                       rows[i].size() * sizeof(uint32_t)),
+                                         PyByteArray_FromStringAndSize((const char*)values[i].data(),
+                                                                       values[i].size() * sizeof(double)));
+        if (!column) {
+            Py_DECREF(result);
+            return NULL;
+        }
+        PyTuple_SET_ITEM(result, i, column);
+    }
+    return result;
+}
+
+PyObject* meth_enable_last_value_cache(PyObject* self, PyObject* args, PyObject* keywords)
+{
+    PyObject* obj = NULL;
+    PyObject* ids = NULL;
+    char* kwords[] = { "device", "ids", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, keywords, arg_parse("O|O:", __FUNCTION__), kwords, &obj, &ids)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    if (!handle) {
+        return set_ics_exception(exception_runtime_error(), "Device must be open");
+    }
+    std::vector<uint64_t> keys;
+    if (ids && ids != Py_None) {
+        PyObject* sequence = PySequence_Fast(ids, "ids must be a sequence of (netid, arbid) tuples");
+        if (!sequence) {
+            return NULL;
+        }
+        for (Py_ssize_t i = 0; i < PySequence_Fast_GET_SIZE(sequence); ++i) {
+            int network_id = 0;
+            unsigned long arbid = 0;
+            if (!PyArg_ParseTuple(PySequence_Fast_GET_ITEM(sequence, i), "ik", &network_id, &arbid)) {
+                Py_DECREF(sequence);
+                return NULL;
+            }
+            keys.push_back(receive_key(network_id, (uint32_t)arbid));
+        }
+        Py_DECREF(sequence);
+    }
+    try {
+        ice::Library* lib = dll_get_library();
+        if (!lib) {
+            char buffer[512];
+            return set_ics_exception(exception_runtime_error(), dll_get_error(buffer));
+        }
+        auto pump = _rx_pump_acquire(lib, handle);
+        pump->set_last_value_cache(std::make_shared<LastValueCache>(keys));
+        Py_RETURN_NONE;
+    } catch (ice::Exception& ex) {
+        return set_ics_exception(exception_runtime_error(), (char*)ex.what());
+    }
+    return set_ics_exception(exception_runtime_error(), "This is a bug!");
+}
+
+PyObject* meth_disable_last_value_cache(PyObject* self, PyObject* args)
+{
+    PyObject* obj = NULL;
+    if (!PyArg_ParseTuple(args, arg_parse("O:", __FUNCTION__), &obj)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    auto pump = rx_pump_get(handle);
+    if (pump) {
+        pump->set_last_value_cache(nullptr);
+        Py_BEGIN_ALLOW_THREADS;
+        rx_pump_release(handle);
+        Py_END_ALLOW_THREADS;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject* _last_value_to_tuple(const LastValue& value)
+{
+    PyObject* msg = _spy_message_from_owned(value.frame, false);
+    if (!msg) {
+        return NULL;
+    }
+    return Py_BuildValue("(NKdd)",
+                         msg,
+                         (unsigned long long)value.count,
+                         value.timestamp,
+                         value.interval > 0 ? 1.0 / value.interval : 0.0);
+}
+
+// Returns the last value cache of the device or NULL with an exception set.
+static std::shared_ptr<LastValueCache> _get_last_value_cache(PyObject* obj)
+{
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+        return nullptr;
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return nullptr;
+    }
+    auto pump = rx_pump_get(handle);
+    auto cache = pump ? pump->last_value_cache() : nullptr;
+    if (!cache) {
+        set_ics_exception(exception_runtime_error(), "Last value cache isn't enabled, see enable_last_value_cache()");
+    }
+    return cache;
+}
+
+PyObject* meth_last_value(PyObject* self, PyObject* args)
+{
+    PyObject* obj = NULL;
+    int network_id = 0;
+    unsigned long arbid = 0;
+    if (!PyArg_ParseTuple(args, arg_parse("Oik:", __FUNCTION__), &obj, &network_id, &arbid)) {
+        return NULL;
+    }
+    auto cache = _get_last_value_cache(obj);
+    if (!cache) {
+        return NULL;
+    }
+    LastValue value;
+    if (!cache->get(receive_key(network_id, (uint32_t)arbid), value)) {
+        Py_RETURN_NONE;
+    }
+    return _last_value_to_tuple(value);
+}
+
+PyObject* meth_last_value_snapshot(PyObject* self, PyObject* args)
+{
+    PyObject* obj = NULL;
+    if (!PyArg_ParseTuple(args, arg_parse("O:", __FUNCTION__), &obj)) {
+        return NULL;
+    }
+    auto cache = _get_last_value_cache(obj);
+    if (!cache) {
+        return NULL;
+    }
+    auto values = cache->snapshot();
+    PyObject* dict = PyDict_New();
+    if (!dict) {
+        return NULL;
+    }
+    for (const auto& item : values) {
+        PyObject* key = Py_BuildValue("(ik)", (int)(item.first >> 32), (unsigned long)(item.first & 0xFFFFFFFF));
+        PyObject* value = _last_value_to_tuple(item.second);
+        if (!key || !value || PyDict_SetItem(dict, key, value) != 0) {
+            Py_XDECREF(key);
+            Py_XDECREF(value);
+            Py_DECREF(dict);
+            return NULL;
+        }
+        Py_DECREF(key);
+        Py_DECREF(value);
+    }
+    return dict;
+}
+
+// Parses an optional integer argument, None keeps the default. Returns false with an exception set on error.
+static bool _optional_unsigned_long(PyObject* obj, unsigned long* value)
+{
+    if (!obj || obj == Py_None) {
+        return true;
+    }
+    *value = PyLong_AsUnsignedLongMask(obj);
+    return !PyErr_Occurred();
+}
+
+PyObject* meth_on_message(PyObject* self, PyObject* args, PyObject* keywords)
+{
+    PyObject* obj = NULL;
+    PyObject* callback = NULL;
+    PyObject* netid_obj = NULL;
+    PyObject* arbid_obj = NULL;
+    PyObject* mask_obj = NULL;
+    char* kwords[] = { "device", "callback", "netid", "arbid", "mask", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args,
+                                     keywords,
+                                     arg_parse("OO|OOO:", __FUNCTION__),
+                                     kwords,
+                                     &obj,
+                                     &callback,
+                                     &netid_obj,
+                                     &arbid_obj,
+                                     &mask_obj)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    if (!PyCallable_Check(callback)) {
+        return set_ics_exception(exception_argument_error(), "callback must be callable");
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    if (!handle) {
+        return set_ics_exception(exception_runtime_error(), "Device must be open");
+    }
+    unsigned long netid = (unsigned long)-1;
+    unsigned long arbid = 0;
+    unsigned long mask = 0;
+    if (!_optional_unsigned_long(netid_obj, &netid) || !_optional_unsigned_long(arbid_obj, &arbid)) {
+        return NULL;
+    }
+    if (arbid_obj && arbid_obj != Py_None) {
+        mask = 0xFFFFFFFF;
+    }
+    if (!_optional_unsigned_long(mask_obj, &mask)) {
+        return NULL;
+    }
+    std::shared_ptr<PyObject> function = worker_reference(callback);
+    MessageDispatcher::Callback dispatch = [function](std::vector<OwnedMessage>& frames, size_t dropped) {
+        PyGILState_STATE state = PyGILState_Ensure();
+        if (dropped && PyErr_WarnFormat(PyExc_RuntimeWarning,
+                                        1,
+                                        "Message callback is falling behind, dropped %zu messages",
+                                        dropped) != 0) {
+            PyErr_WriteUnraisable(function.get());
+        }
+        PyObject* list = PyList_New((Py_ssize_t)frames.size());
+        for (size_t i = 0; list && i < frames.size(); ++i) {
+            PyObject* msg = _spy_message_from_owned(frames[i], false);
+            if (!msg) {
+                Py_CLEAR(list);
+                break;
+            }
+            PyList_SET_ITEM(list, (Py_ssize_t)i, msg);
+        }
+        PyObject* result = list ? PyObject_CallFunctionObjArgs(function.get(), list, NULL) : NULL;
+        if (!result) {
+            // There is nobody to raise to on the dispatch thread
+            PyErr_WriteUnraisable(function.get());
+        }
+        Py_XDECREF(result);
+        Py_XDECREF(list);
+        PyGILState_Release(state);
+    };
+    try {
+        ice::Library* lib = dll_get_library();
+        if (!lib) {
+            char buffer[512];
+            return set_ics_exception(exception_runtime_error(), dll_get_error(buffer));
+        }
+        auto pump = _rx_pump_acquire(lib, handle);
+        int id = pump->dispatcher()->subscribe((int)netid, (uint32_t)arbid, (uint32_t)mask, dispatch);
+        return Py_BuildValue("i", id);
+    } catch (ice::Exception& ex) {
+        return set_ics_exception(exception_runtime_error(), (char*)ex.what());
+    }
+    return set_ics_exception(exception_runtime_error(), "This is a bug!");
+}
+
+PyObject* meth_remove_message_callback(PyObject* self, PyObject* args)
+{
+    PyObject* obj = NULL;
+    int id = 0;
+    if (!PyArg_ParseTuple(args, arg_parse("Oi:", __FUNCTION__), &obj, &id)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    auto pump = rx_pump_get(handle);
+    auto dispatcher = pump ? pump->dispatcher(false) : nullptr;
+    if (!dispatcher || !dispatcher->unsubscribe(id)) {
+        Py_RETURN_FALSE;
+    }
+    Py_BEGIN_ALLOW_THREADS;
+    rx_pump_release(handle);
+    Py_END_ALLOW_THREADS;
+    Py_RETURN_TRUE;
+}
+
+PyObject* meth_coremini_read_app_signals(PyObject* self, PyObject* args)
+{
+    PyObject* obj = NULL;
+    PyObject* indices_obj = NULL;
+    if (!PyArg_ParseTuple(args, arg_parse("OO:", __FUNCTION__), &obj, &indices_obj)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    PyObject* sequence = PySequence_Fast(indices_obj, "indices must be a sequence of integers");
+    if (!sequence) {
+        return NULL;
+    }
+    const Py_ssize_t count = PySequence_Fast_GET_SIZE(sequence);
+    std::vector<unsigned int> indices(count);
+    for (Py_ssize_t i = 0; i < count; ++i) {
+        indices[i] = (unsigned int)PyLong_AsUnsignedLong(PySequence_Fast_GET_ITEM(sequence, i));
+        if (PyErr_Occurred()) {
+            Py_DECREF(sequence);
+            return NULL;
+        }
+    }
+    Py_DECREF(sequence);
+    try {
+        ice::Library* lib = dll_get_library();
+        if (!lib) {
+            char buffer[512];
+            return set_ics_exception(exception_runtime_error(), dll_get_error(buffer));
+        }
+        ice::Function<int __stdcall(void*, unsigned int, double*)> icsneoScriptReadAppSignal(
+            lib, "icsneoScriptReadAppSignal");
+        std::vector<double> values(count, 0);
+        std::vector<char> success(count, 0);
+        Py_BEGIN_ALLOW_THREADS;
+        for (Py_ssize_t i = 0; i < count; ++i) {
+            success[i] = icsneoScriptReadAppSignal(handle, indices[i], &values[i]) != 0;
+            if (!success[i]) {
+                values[i] = Py_NAN;
+            }
+        }
+        Py_END_ALLOW_THREADS;
+        PyObject* value_list = PyList_New(count);
+        PyObject* success_list = PyList_New(count);
+        if (!value_list || !success_list) {
+            Py_XDECREF(value_list);
+            Py_XDECREF(success_list);
+            return NULL;
+        }
+        for (Py_ssize_t i = 0; i < count; ++i) {
+            PyList_SET_ITEM(value_list, i, PyFloat_FromDouble(values[i]));
+            PyList_SET_ITEM(success_list, i, PyBool_FromLong(success[i]));
+        }
+        return Py_BuildValue("(NN)", value_list, success_list);
+    } catch (ice::Exception& ex) {
+        return set_ics_exception(exception_runtime_error(), (char*)ex.what());
+    }
+    return set_ics_exception(exception_runtime_error(), "This is a bug!");
+}
+
+PyObject* meth_coremini_write_app_signals(PyObject* self, PyObject* args)
+{
+    PyObject* obj = NULL;
+    PyObject* mapping = NULL;
+    if (!PyArg_ParseTuple(args, arg_parse("OO:", __FUNCTION__), &obj, &mapping)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    // Accept a dict or anything that iterates (index, value) pairs
+    PyObject* items = PyDict_Check(mapping) ? PyDict_Items(mapping) : PySequence_List(mapping);
+    if (!items) {
+        return NULL;
+    }
+    const Py_ssize_t count = PyList_GET_SIZE(items);
+    std::vector<unsigned int> indices(count);
+    std::vector<double> values(count);
+    for (Py_ssize_t i = 0; i < count; ++i) {
+        PyObject* item = PyList_GET_ITEM(items, i);
+        if (!PyTuple_Check(item)) {
+            Py_DECREF(items);
+            return set_ics_exception(exception_argument_error(), "mapping items must be (index, value) pairs");
+        }
+        if (!PyArg_ParseTuple(item, "Id", &indices[i], &values[i])) {
+            Py_DECREF(items);
+            return NULL;
+        }
+    }
+    Py_DECREF(items);
+    try {
+        ice::Library* lib = dll_get_library();
+        if (!lib) {
+            char buffer[512];
+            return set_ics_exception(exception_runtime_error(), dll_get_error(buffer));
+        }
+        ice::Function<int __stdcall(void*, unsigned int, double)> icsneoScriptWriteAppSignal(
+            lib, "icsneoScriptWriteAppSignal");
+        std::vector<char> success(count, 0);
+        Py_BEGIN_ALLOW_THREADS;
+        for (Py_ssize_t i = 0; i < count; ++i) {
+            success[i] = icsneoScriptWriteAppSignal(handle, indices[i], values[i]) != 0;
+        }
+        Py_END_ALLOW_THREADS;
+        PyObject* results = PyDict_New();
+        if (!results) {
+            return NULL;
+        }
+        for (Py_ssize_t i = 0; i < count; ++i) {
+            PyObject* index = PyLong_FromUnsignedLong(indices[i]);
+            if (!index || PyDict_SetItem(results, index, success[i] ? Py_True : Py_False) != 0) {
+                Py_XDECREF(index);
+                Py_DECREF(results);
+                return NULL;
+            }
+            Py_DECREF(index);
+        }
+        return results;
+    } catch (ice::Exception& ex) {
+        return set_ics_exception(exception_runtime_error(), (char*)ex.what());
+    }
+    return set_ics_exception(exception_runtime_error(), "This is a bug!");
+}
+
+// Reads count entries of a CoreMini message table starting at start. Returns a list of messages for the tx table
+// and a list of (message, mask) tuples for the rx table.
+static PyObject* _coremini_read_table(void* handle,
+                                      int table,
+                                      unsigned int start,
+                                      unsigned int count,
+                                      bool j1850,
+                                      const char* func_name)
+{
+    const size_t entry_size = j1850 ? sizeof(icsSpyMessageJ1850) : sizeof(icsSpyMessage);
+    PyTypeObject* type = j1850 ? &spy_message_j1850_object_type : &spy_message_object_type;
+    try {
+        ice::Library* lib = dll_get_library();
+        if (!lib) {
+            char buffer[512];
+            return _set_ics_exception(exception_runtime_error(), dll_get_error(buffer), func_name);
+        }
+        ice::Function<int __stdcall(void*, unsigned int, void*)> icsneoScriptReadTxMessage(
+            lib, "icsneoScriptReadTxMessage");
+        ice::Function<int __stdcall(void*, unsigned int, void*, void*)> icsneoScriptReadRxMessage(
+            lib, "icsneoScriptReadRxMessage");
+        // Messages of every entry first, followed by the masks of every entry for the rx table
+        std::vector<uint8_t> buffer(entry_size * count * (table == SCRIPT_TABLE_RX ? 2 : 1));
+        uint8_t* masks = buffer.data() + entry_size * count;
+        unsigned int read = 0;
+        Py_BEGIN_ALLOW_THREADS;
+        for (; read < count; ++read) {
+            uint8_t* msg = buffer.data() + entry_size * read;
+            int success = table == SCRIPT_TABLE_TX
+                              ? icsneoScriptReadTxMessage(handle, start + read, msg)
+                              : icsneoScriptReadRxMessage(handle, start + read, msg, masks + entry_size * read);
+            if (!success) {
+                break;
+            }
+        }
+        Py_END_ALLOW_THREADS;
+        if (read != count) {
+            std::stringstream ss;
+            ss << (table == SCRIPT_TABLE_TX ? "icsneoScriptReadTxMessage()" : "icsneoScriptReadRxMessage()")
+               << " Failed at index " << start + read;
+            return _set_ics_exception(exception_runtime_error(), (char*)ss.str().c_str(), func_name);
+        }
+        auto& shadow = script_tables[std::make_pair(handle, table)];
+        PyObject* list = PyList_New(count);
+        if (!list) {
+            return NULL;
+        }
+        for (unsigned int i = 0; i < count; ++i) {
+            const uint8_t* entry[2] = { buffer.data() + entry_size * i, masks + entry_size * i };
+            PyObject* objects[2] = { NULL, NULL };
+            const int parts = table == SCRIPT_TABLE_RX ? 2 : 1;
+            for (int part = 0; part < parts; ++part) {
+                objects[part] = PyObject_CallObject((PyObject*)type, NULL);
+                if (!objects[part]) {
+                    Py_XDECREF(objects[0]);
+                    Py_DECREF(list);
+                    return NULL;
+                }
+                if (j1850) {
+                    memcpy(&PySpyMessageJ1850_GetObject(objects[part])->msg, entry[part], entry_size);
+                } else {
+                    memcpy(&PySpyMessage_GetObject(objects[part])->msg, entry[part], entry_size);
+                }
+            }
+            PyObject* item = parts == 1 ? objects[0] : Py_BuildValue("(NN)", objects[0], objects[1]);
+            if (!item) {
+                Py_DECREF(list);
+                return NULL;
+            }
+            PyList_SET_ITEM(list, i, item);
+            auto& known = shadow[start + i];
+            known.assign(entry[0], entry[0] + entry_size);
+            if (parts == 2) {
+                known.insert(known.end(), entry[1], entry[1] + entry_size);
+            }
+        }
+        return list;
+    } catch (ice::Exception& ex) {
+        return _set_ics_exception(exception_runtime_error(), (char*)ex.what(), func_name);
+    }
+    return _set_ics_exception(exception_runtime_error(), "This is a bug!", func_name);
+}
+
+// Copies the message object obj into entry, returns false with an exception set if obj isn't the right type.
+static bool _coremini_table_entry(PyObject* obj, bool j1850, uint8_t* entry, const char* func_name)
+{
+    if (j1850) {
+        if (!PySpyMessageJ1850_CheckExact(obj)) {
+            _set_ics_exception(exception_argument_error(),
+                               "Messages must be of type " MODULE_NAME "." SPY_MESSAGE_J1850_OBJECT_NAME,
+                               func_name);
+            return false;
+        }
+        memcpy(entry, &PySpyMessageJ1850_GetObject(obj)->msg, sizeof(icsSpyMessageJ1850));
+    } else {
+        if (!PySpyMessage_CheckExact(obj)) {
+            _set_ics_exception(
+                exception_argument_error(), "Messages must be of type " MODULE_NAME "." SPY_MESSAGE_OBJECT_NAME, func_name);
+            return false;
+        }
+        memcpy(entry, &PySpyMessage_GetObject(obj)->msg, sizeof(icsSpyMessage));
+    }
+    return true;
+}
+
+// Writes messages to a CoreMini message table starting at start. Entries of the rx table are a message or a
+// (message, mask) tuple, a missing mask is all zeros. With diff, entries known to already hold the same content
+// are skipped. Returns the number of entries written.
+static PyObject* _coremini_write_table(void* handle,
+                                       int table,
+                                       unsigned int start,
+                                       PyObject* messages,
+                                       bool j1850,
+                                       bool diff,
+                                       const char* func_name)
+{
+    const size_t entry_size = j1850 ? sizeof(icsSpyMessageJ1850) : sizeof(icsSpyMessage);
+    const int parts = table == SCRIPT_TABLE_RX ? 2 : 1;
+    PyObject* sequence = PySequence_Fast(messages, "messages must be a sequence");
+    if (!sequence) {
+        return NULL;
+    }
+    const Py_ssize_t count = PySequence_Fast_GET_SIZE(sequence);
+    // Message and mask of each entry next to each other, the same layout as the diff shadow
+    std::vector<uint8_t> buffer(entry_size * parts * count, 0);
+    for (Py_ssize_t i = 0; i < count; ++i) {
+        PyObject* item = PySequence_Fast_GET_ITEM(sequence, i);
+        uint8_t* entry = buffer.data() + entry_size * parts * i;
+        bool success = false;
+        if (table == SCRIPT_TABLE_RX && PyTuple_Check(item)) {
+            if (PyTuple_GET_SIZE(item) != 2) {
+                _set_ics_exception(exception_argument_error(), "rx entries must be (message, mask) tuples", func_name);
+            } else {
+                success = _coremini_table_entry(PyTuple_GET_ITEM(item, 0), j1850, entry, func_name) &&
+                          _coremini_table_entry(PyTuple_GET_ITEM(item, 1), j1850, entry + entry_size, func_name);
+            }
+        } else {
+            success = _coremini_table_entry(item, j1850, entry, func_name);
+        }
+        if (!success) {
+            Py_DECREF(sequence);
+            return NULL;
+        }
+    }
+    Py_DECREF(sequence);
+    const auto key = std::make_pair(handle, table);
+    std::vector<unsigned int> pending;
+    pending.reserve(count);
+    auto& known = script_tables[key];
+    for (Py_ssize_t i = 0; i < count; ++i) {
+        const uint8_t* entry = buffer.data() + entry_size * parts * i;
+        auto it = known.find(start + (unsigned int)i);
+        if (diff && it != known.end() && it->second.size() == entry_size * parts &&
+            memcmp(it->second.data(), entry, entry_size * parts) == 0) {
+            continue;
+        }
+        pending.push_back((unsigned int)i);
+    }
+    try {
+        ice::Library* lib = dll_get_library();
+        if (!lib) {
+            char buffer[512];
+            return _set_ics_exception(exception_runtime_error(), dll_get_error(buffer), func_name);
+        }
+        ice::Function<int __stdcall(void*, unsigned int, void*)> icsneoScriptWriteTxMessage(
+            lib, "icsneoScriptWriteTxMessage");
+        ice::Function<int __stdcall(void*, unsigned int, void*, void*)> icsneoScriptWriteRxMessage(
+            lib, "icsneoScriptWriteRxMessage");
+        size_t written = 0;
+        Py_BEGIN_ALLOW_THREADS;
+        for (; written < pending.size(); ++written) {
+            uint8_t* entry = buffer.data() + entry_size * parts * pending[written];
+            const unsigned int index = start + pending[written];
+            int success = table == SCRIPT_TABLE_TX ? icsneoScriptWriteTxMessage(handle, index, entry)
+                                                   : icsneoScriptWriteRxMessage(handle, index, entry, entry + entry_size);
+            if (!success) {
+                break;
+            }
+        }
+        Py_END_ALLOW_THREADS;
+        // Looked up again, the device could have been closed while the GIL was released
+        auto& shadow = script_tables[key];
+        for (size_t i = 0; i < written; ++i) {
+            const uint8_t* entry = buffer.data() + entry_size * parts * pending[i];
+            shadow[start + pending[i]].assign(entry, entry + entry_size * parts);
+        }
+        if (written != pending.size()) {
+            // A failed write leaves the entry in an unknown state
+            shadow.erase(start + pending[written]);
+            std::stringstream ss;
+            ss << (table == SCRIPT_TABLE_TX ? "icsneoScriptWriteTxMessage()" : "icsneoScriptWriteRxMessage()")
+               << " Failed at index " << start + pending[written];
+            return _set_ics_exception(exception_runtime_error(), (char*)ss.str().c_str(), func_name);
+        }
+        return PyLong_FromSize_t(written);
+    } catch (ice::Exception& ex) {
+        return _set_ics_exception(exception_runtime_error(), (char*)ex.what(), func_name);
+    }
+    return _set_ics_exception(exception_runtime_error(), "This is a bug!", func_name);
+}
+
+PyObject* meth_coremini_read_tx_messages(PyObject* self, PyObject* args, PyObject* keywords)
+{
+    PyObject* obj = NULL;
+    unsigned int start = 0;
+    unsigned int count = 0;
+    int j1850 = 0;
+    char* kwords[] = { "device", "start", "count", "j1850", NULL };
+    if (!PyArg_ParseTupleAndKeywords(
+            args, keywords, arg_parse("OII|p:", __FUNCTION__), kwords, &obj, &start, &count, &j1850)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    return _coremini_read_table(handle, SCRIPT_TABLE_TX, start, count, j1850, __FUNCTION__);
+}
+
+PyObject* meth_coremini_read_rx_messages(PyObject* self, PyObject* args, PyObject* keywords)
+{
+    PyObject* obj = NULL;
+    unsigned int start = 0;
+    unsigned int count = 0;
+    int j1850 = 0;
+    char* kwords[] = { "device", "start", "count", "j1850", NULL };
+    if (!PyArg_ParseTupleAndKeywords(
+            args, keywords, arg_parse("OII|p:", __FUNCTION__), kwords, &obj, &start, &count, &j1850)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    return _coremini_read_table(handle, SCRIPT_TABLE_RX, start, count, j1850, __FUNCTION__);
+}
+
+PyObject* meth_coremini_write_tx_messages(PyObject* self, PyObject* args, PyObject* keywords)
+{
+    PyObject* obj = NULL;
+    unsigned int start = 0;
+    PyObject* messages = NULL;
+    int j1850 = 0;
+    int diff = 0;
+    char* kwords[] = { "device", "start", "messages", "j1850", "diff", NULL };
+    if (!PyArg_ParseTupleAndKeywords(
+            args, keywords, arg_parse("OIO|pp:", __FUNCTION__), kwords, &obj, &start, &messages, &j1850, &diff)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    return _coremini_write_table(handle, SCRIPT_TABLE_TX, start, messages, j1850, diff, __FUNCTION__);
+}
+
+PyObject* meth_coremini_write_rx_messages(PyObject* self, PyObject* args, PyObject* keywords)
+{
+    PyObject* obj = NULL;
+    unsigned int start = 0;
+    PyObject* messages = NULL;
+    int j1850 = 0;
+    int diff = 0;
+    char* kwords[] = { "device", "start", "messages", "j1850", "diff", NULL };
+    if (!PyArg_ParseTupleAndKeywords(
+            args, keywords, arg_parse("OIO|pp:", __FUNCTION__), kwords, &obj, &start, &messages, &j1850, &diff)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    return _coremini_write_table(handle, SCRIPT_TABLE_RX, start, messages, j1850, diff, __FUNCTION__);
+}
+
+PyObject* meth_start_health_monitor(PyObject* self, PyObject* args, PyObject* keywords)
+{
+    PyObject* obj = NULL;
+    double period = 1.0;
+    PyObject* items_obj = NULL;
+    char* kwords[] = { "device", "period", "items", NULL };
+    if (!PyArg_ParseTupleAndKeywords(
+            args, keywords, arg_parse("O|dO:", __FUNCTION__), kwords, &obj, &period, &items_obj)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    if (period <= 0) {
+        return set_ics_exception(exception_argument_error(), "period must be greater than 0");
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    if (!handle) {
+        return set_ics_exception(exception_runtime_error(), "Device must be open");
+    }
+    static const struct
+    {
+        const char* name;
+        unsigned int item;
+    } item_names[] = {
+        { "status", HEALTH_STATUS },
+        { "bus_voltage", HEALTH_BUS_VOLTAGE },
+        { "performance", HEALTH_PERFORMANCE },
+        { "gptp", HEALTH_GPTP },
+        { "errors", HEALTH_ERRORS },
+    };
+    unsigned int items = HEALTH_STATUS | HEALTH_BUS_VOLTAGE | HEALTH_PERFORMANCE | HEALTH_GPTP | HEALTH_ERRORS;
+    if (items_obj && items_obj != Py_None) {
+        PyObject* sequence = PySequence_Fast(items_obj, "items must be a sequence of strings");
+        if (!sequence) {
+            return NULL;
+        }
+        items = 0;
+        for (Py_ssize_t i = 0; i < PySequence_Fast_GET_SIZE(sequence); ++i) {
+            const char* name = PyUnicode_AsUTF8(PySequence_Fast_GET_ITEM(sequence, i));
+            if (!name) {
+                Py_DECREF(sequence);
+                return NULL;
+            }
+            unsigned int item = 0;
+            for (const auto& entry : item_names) {
+                if (strcmp(entry.name, name) == 0) {
+                    item = entry.item;
+                }
+            }
+            if (!item) {
+                Py_DECREF(sequence);
+                std::stringstream ss;
+                ss << "Unknown health item '" << name << "'";
+                return set_ics_exception(exception_argument_error(), (char*)ss.str().c_str());
+            }
+            items |= item;
+        }
+        Py_DECREF(sequence);
+    }
+    try {
+        ice::Library* lib = dll_get_library();
+        if (!lib) {
+            char buffer[512];
+            return set_ics_exception(exception_runtime_error(), dll_get_error(buffer));
+        }
+        auto icsneoGetDeviceStatus = std::make_shared<ice::Function<int __stdcall(void*, icsDeviceStatus*, size_t*)>>(
+            lib, "icsneoGetDeviceStatus");
+        auto icsneoGetBusVoltage = std::make_shared<ice::Function<int __stdcall(void*, unsigned long*, unsigned int)>>(
+            lib, "icsneoGetBusVoltage");
+        auto icsneoGetPerformanceParameters =
+            std::make_shared<ice::Function<int __stdcall(void*, int*, int*, int*, int*, int*, int*, int*, int*)>>(
+                lib, "icsneoGetPerformanceParameters");
+        auto icsneoGetGPTPStatus =
+            std::make_shared<ice::Function<int __stdcall(void*, GPTPStatus*)>>(lib, "icsneoGetGPTPStatus");
+        auto icsneoGetErrorInfo = std::make_shared<GetErrorInfoFunction>(lib, "icsneoGetErrorInfo");
+        // Shares the error queue with get_error_messages() and on_error()
+        std::shared_ptr<ErrorQueueReader> error_reader;
+        if (items & HEALTH_ERRORS) {
+            error_reader = std::make_shared<ErrorQueueReader>(_error_queue_acquire(lib, handle));
+        }
+        // Runs on the monitor thread, a driver call that throws is a failed read.
+        HealthMonitor::Functions functions;
+        functions.status = [handle, icsneoGetDeviceStatus](icsDeviceStatus* status) {
+            try {
+                size_t size = sizeof(*status);
+                return (*icsneoGetDeviceStatus)(handle, status, &size) != 0;
+            } catch (ice::Exception&) {
+                return false;
+            }
+        };
+        functions.bus_voltage = [handle, icsneoGetBusVoltage](unsigned long* mV) {
+            try {
+                return (*icsneoGetBusVoltage)(handle, mV, 0) != 0;
+            } catch (ice::Exception&) {
+                return false;
+            }
+        };
+        functions.performance = [handle, icsneoGetPerformanceParameters](int* values) {
+            try {
+                return (*icsneoGetPerformanceParameters)(
+                           handle, &values[0], &values[1], &values[2], &values[3], &values[4], &values[5], &values[6],
+                           &values[7]) != 0;
+            } catch (ice::Exception&) {
+                return false;
+            }
+        };
+        functions.gptp = [handle, icsneoGetGPTPStatus](GPTPStatus* status) {
+            try {
+                return (*icsneoGetGPTPStatus)(handle, status) != 0;
+            } catch (ice::Exception&) {
+                return false;
+            }
+        };
+        functions.errors = [error_reader, icsneoGetErrorInfo](std::vector<HealthError>& errors) {
+            try {
+                std::vector<int> codes;
+                const bool success = error_reader->read(codes);
+                for (int code : codes) {
+                    HealthError error = { code, "", "", 0, 0 };
+                    _get_error_info(*icsneoGetErrorInfo, code, error);
+                    errors.push_back(error);
+                }
+                return success;
+            } catch (ice::Exception&) {
+                return false;
+            }
+        };
+        auto monitor = std::make_shared<HealthMonitor>(functions, items, period);
+        Py_BEGIN_ALLOW_THREADS;
+        // Starting again replaces the running monitor and its callbacks
+        health_remove(handle);
+        health_set(handle, monitor);
+        monitor->start();
+        Py_END_ALLOW_THREADS;
+        Py_RETURN_NONE;
+    } catch (ice::Exception& ex) {
+        return set_ics_exception(exception_runtime_error(), (char*)ex.what());
+    }
+    return set_ics_exception(exception_runtime_error(), "This is a bug!");
+}
+
+PyObject* meth_stop_health_monitor(PyObject* self, PyObject* args)
+{
+    PyObject* obj = NULL;
+    if (!PyArg_ParseTuple(args, arg_parse("O:", __FUNCTION__), &obj)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    std::shared_ptr<HealthMonitor> monitor;
+    Py_BEGIN_ALLOW_THREADS;
+    monitor = health_remove(handle);
+    Py_END_ALLOW_THREADS;
+    if (!monitor) {
+        Py_RETURN_FALSE;
+    }
+    // Dropping the monitor releases the Python callbacks, which takes the GIL.
+    Py_BEGIN_ALLOW_THREADS;
+    monitor.reset();
+    Py_END_ALLOW_THREADS;
+    Py_RETURN_TRUE;
+}
+
+PyObject* meth_health(PyObject* self, PyObject* args)
+{
+    PyObject* obj = NULL;
+    if (!PyArg_ParseTuple(args, arg_parse("O:", __FUNCTION__), &obj)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    auto monitor = health_get(handle);
+    if (!monitor) {
+        Py_RETURN_NONE;
+    }
+    const HealthReading reading = monitor->reading();
+    PyObject* status = Py_None;
+    PyObject* gptp = Py_None;
+    PyObject* performance = Py_None;
+    PyObject* bus_voltage = Py_None;
+    Py_INCREF(Py_None);
+    Py_INCREF(Py_None);
+    Py_INCREF(Py_None);
+    Py_INCREF(Py_None);
+    PyObject* errors = PyList_New((Py_ssize_t)reading.errors.size());
+    bool success = errors != NULL;
+    for (size_t i = 0; success && i < reading.errors.size(); ++i) {
+        const HealthError& error = reading.errors[i];
+        PyObject* tuple = Py_BuildValue("(i, s, s, i, i)",
+                                        error.code,
+                                        error.description_short.c_str(),
+                                        error.description_long.c_str(),
+                                        error.severity,
+                                        error.restart_needed);
+        success = tuple != NULL;
+        if (success) {
+            PyList_SET_ITEM(errors, (Py_ssize_t)i, tuple);
+        }
+    }
+    if (success && reading.status_valid) {
+        Py_SETREF(status,
+                  _struct_from_bytes(
+                      "ics.structures.ics_device_status", "ics_device_status", &reading.status, sizeof(reading.status)));
+        success = status != NULL;
+    }
+    if (success && reading.gptp_valid) {
+        Py_SETREF(gptp,
+                  _struct_from_bytes("ics.structures.gptp_status", "gptp_status", &reading.gptp, sizeof(reading.gptp)));
+        success = gptp != NULL;
+    }
+    if (success && reading.performance_valid) {
+        const int* values = reading.performance;
+        Py_SETREF(performance,
+                  Py_BuildValue("(i,i,i,i,i,i,i,i)",
+                                values[0],
+                                values[1],
+                                values[2],
+                                values[3],
+                                values[4],
+                                values[5],
+                                values[6],
+                                values[7]));
+        success = performance != NULL;
+    }
+    if (success && reading.bus_voltage_valid) {
+        Py_SETREF(bus_voltage, PyLong_FromUnsignedLong(reading.bus_voltage));
+        success = bus_voltage != NULL;
+    }
+    if (!success) {
+        Py_XDECREF(status);
+        Py_XDECREF(gptp);
+        Py_XDECREF(performance);
+        Py_XDECREF(bus_voltage);
+        Py_XDECREF(errors);
+        return NULL;
+    }
+    return Py_BuildValue("{s:K, s:d, s:N, s:N, s:N, s:N, s:N, s:K}",
+                         "polls",
+                         (unsigned long long)reading.polls,
+                         "timestamp",
+                         reading.timestamp,
+                         "status",
+                         status,
+                         "bus_voltage",
+                         bus_voltage,
+                         "performance",
+                         performance,
+                         "gptp",
+                         gptp,
+                         "errors",
+                         errors,
+                         "error_count",
+                         (unsigned long long)reading.error_count);
+}
+
+PyObject* meth_on_health(PyObject* self, PyObject* args, PyObject* keywords)
+{
+    PyObject* obj = NULL;
+    const char* field_name = NULL;
+    PyObject* callback = NULL;
+    PyObject* threshold_obj = NULL;
+    int below = 0;
+    char* kwords[] = { "device", "field", "callback", "threshold", "below", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args,
+                                     keywords,
+                                     arg_parse("OsO|Op:", __FUNCTION__),
+                                     kwords,
+                                     &obj,
+                                     &field_name,
+                                     &callback,
+                                     &threshold_obj,
+                                     &below)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    if (!PyCallable_Check(callback)) {
+        return set_ics_exception(exception_argument_error(), "callback must be callable");
+    }
+    HealthField field;
+    if (!health_field_from_name(field_name, &field)) {
+        std::stringstream ss;
+        ss << "Unknown health field '" << field_name << "'";
+        return set_ics_exception(exception_argument_error(), (char*)ss.str().c_str());
+    }
+    double threshold = 0;
+    const bool has_threshold = threshold_obj && threshold_obj != Py_None;
+    if (has_threshold) {
+        threshold = PyFloat_AsDouble(threshold_obj);
+        if (PyErr_Occurred()) {
+            return NULL;
+        }
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    auto monitor = health_get(handle);
+    if (!monitor) {
+        return set_ics_exception(exception_runtime_error(), "Health monitor isn't running, call start_health_monitor()");
+    }
+    std::shared_ptr<PyObject> function = worker_reference(callback);
+    HealthMonitor::Callback notify = [function](HealthField field, double value, double previous) {
+        PyGILState_STATE state = PyGILState_Ensure();
+        PyObject* result = PyObject_CallFunction(function.get(), "sdd", health_field_name(field), value, previous);
+        if (!result) {
+            // There is nobody to raise to on the monitor thread
+            PyErr_WriteUnraisable(function.get());
+        }
+        Py_XDECREF(result);
+        PyGILState_Release(state);
+    };
+    int id = monitor->add_callback(field, has_threshold, threshold, below != 0, notify);
+    return Py_BuildValue("i", id);
+}
+
+PyObject* meth_remove_health_callback(PyObject* self, PyObject* args)
+{
+    PyObject* obj = NULL;
+    int id = 0;
+    if (!PyArg_ParseTuple(args, arg_parse("Oi:", __FUNCTION__), &obj, &id)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    auto monitor = health_get(handle);
+    if (!monitor || !monitor->remove_callback(id)) {
+        Py_RETURN_FALSE;
+    }
+    Py_RETURN_TRUE;
+}
+
+struct _OverflowNotice
+{
+    std::shared_ptr<PyObject> callback;
+    unsigned long long lost;
+    unsigned long long total;
+};
+
+// Runs the on_overflow callback of enable_adaptive_receive() in the main thread, see Py_AddPendingCall().
+static int _notify_overflow(void* arg)
+{
+    std::unique_ptr<_OverflowNotice> notice((_OverflowNotice*)arg);
+    PyObject* result = PyObject_CallFunction(notice->callback.get(), "KK", notice->lost, notice->total);
+    if (!result) {
+        // Raising from a pending call would surface in whatever code happens to be running
+        PyErr_WriteUnraisable(notice->callback.get());
+    }
+    Py_XDECREF(result);
+    return 0;
+}
+
+PyObject* meth_enable_adaptive_receive(PyObject* self, PyObject* args, PyObject* keywords)
+{
+    PyObject* obj = NULL;
+    double target_latency = 0.01;
+    PyObject* cpu_budget_obj = NULL;
+    PyObject* callback = NULL;
+    char* kwords[] = { "device", "target_latency", "cpu_budget", "on_overflow", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args,
+                                     keywords,
+                                     arg_parse("O|dOO:", __FUNCTION__),
+                                     kwords,
+                                     &obj,
+                                     &target_latency,
+                                     &cpu_budget_obj,
+                                     &callback)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    if (target_latency < 0) {
+        return set_ics_exception(exception_argument_error(), "target_latency can't be negative");
+    }
+    double cpu_budget = 0;
+    if (cpu_budget_obj && cpu_budget_obj != Py_None) {
+        cpu_budget = PyFloat_AsDouble(cpu_budget_obj);
+        if (PyErr_Occurred()) {
+            return NULL;
+        }
+        if (cpu_budget <= 0 || cpu_budget > 1) {
+            return set_ics_exception(exception_argument_error(), "cpu_budget must be greater than 0 and at most 1");
+        }
+    }
+    if (callback == Py_None) {
+        callback = NULL;
+    }
+    if (callback && !PyCallable_Check(callback)) {
+        return set_ics_exception(exception_argument_error(), "on_overflow must be callable");
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    if (!handle) {
+        return set_ics_exception(exception_runtime_error(), "Device must be open");
+    }
+    RxPump::OverflowCallback on_overflow;
+    if (callback) {
+        std::shared_ptr<PyObject> function = worker_reference(callback);
+        // The receive thread must never wait on the GIL, hand the notice to the interpreter instead.
+        on_overflow = [function](uint64_t lost, uint64_t total) {
+            auto notice = new _OverflowNotice { function, lost, total };
+            if (Py_AddPendingCall(_notify_overflow, notice) != 0) {
+                delete notice;
+            }
+        };
+    }
+    try {
+        ice::Library* lib = dll_get_library();
+        if (!lib) {
+            char buffer[512];
+            return set_ics_exception(exception_runtime_error(), dll_get_error(buffer));
+        }
+        auto icsneoGetPerformanceParameters =
+            std::make_shared<ice::Function<int __stdcall(void*, int*, int*, int*, int*, int*, int*, int*, int*)>>(
+                lib, "icsneoGetPerformanceParameters");
+        RxPump::PerformanceFunction performance = [handle, icsneoGetPerformanceParameters](
+                                                      int* buffer_count, int* buffer_max, int* overflow_count) {
+            int reserved[5] = { 0 };
+            try {
+                return (*icsneoGetPerformanceParameters)(handle,
+                                                         buffer_count,
+                                                         buffer_max,
+                                                         overflow_count,
+                                                         &reserved[0],
+                                                         &reserved[1],
+                                                         &reserved[2],
+                                                         &reserved[3],
+                                                         &reserved[4]) != 0;
+            } catch (ice::Exception&) {
+                return false;
+            }
+        };
+        auto pump = _rx_pump_acquire(lib, handle);
+        auto policy = std::make_shared<AdaptiveReceivePolicy>(target_latency, cpu_budget);
+        Py_BEGIN_ALLOW_THREADS;
+        pump->set_adaptive(policy, performance, on_overflow);
+        Py_END_ALLOW_THREADS;
+        Py_RETURN_NONE;
+    } catch (ice::Exception& ex) {
+        return set_ics_exception(exception_runtime_error(), (char*)ex.what());
+    }
+    return set_ics_exception(exception_runtime_error(), "This is a bug!");
+}
+
+PyObject* meth_disable_adaptive_receive(PyObject* self, PyObject* args)
+{
+    PyObject* obj = NULL;
+    if (!PyArg_ParseTuple(args, arg_parse("O:", __FUNCTION__), &obj)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    auto pump = rx_pump_get(handle);
+    if (pump) {
+        // Frames already queued stay available to get_messages()
+        Py_BEGIN_ALLOW_THREADS;
+        pump->set_adaptive(nullptr, nullptr, nullptr);
+        rx_pump_release(handle);
+        Py_END_ALLOW_THREADS;
+    }
+    Py_RETURN_NONE;
+}
+
+PyObject* meth_receive_stats(PyObject* self, PyObject* args)
+{
+    PyObject* obj = NULL;
+    if (!PyArg_ParseTuple(args, arg_parse("O:", __FUNCTION__), &obj)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    auto pump = rx_pump_get(handle);
+    if (!pump) {
+        Py_RETURN_NONE;
+    }
+    const ReceiveStats stats = pump->stats();
+    return Py_BuildValue("{s:O, s:K, s:K, s:d, s:d, s:K, s:K}",
+                         "adaptive",
+                         stats.adaptive ? Py_True : Py_False,
+                         "drains",
+                         (unsigned long long)stats.drains,
+                         "frames",
+                         (unsigned long long)stats.frames,
+                         "peak_occupancy",
+                         stats.peak_occupancy,
+                         "interval",
+                         stats.interval,
+                         "overflows",
+                         (unsigned long long)stats.overflows,
+                         "overflow_events",
+                         (unsigned long long)stats.overflow_events);
+}
+
+PyObject* meth_on_error(PyObject* self, PyObject* args, PyObject* keywords)
+{
+    PyObject* obj = NULL;
+    PyObject* callback = NULL;
+    double interval = 1.0;
+    char* kwords[] = { "device", "callback", "interval", NULL };
+    if (!PyArg_ParseTupleAndKeywords(
+            args, keywords, arg_parse("OO|d:", __FUNCTION__), kwords, &obj, &callback, &interval)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    if (!PyCallable_Check(callback)) {
+        return set_ics_exception(exception_argument_error(), "callback must be callable");
+    }
+    if (interval <= 0) {
+        return set_ics_exception(exception_argument_error(), "interval must be greater than 0");
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    if (!handle) {
+        return set_ics_exception(exception_runtime_error(), "Device must be open");
+    }
+    std::shared_ptr<PyObject> function = worker_reference(callback);
+    ErrorReporter::Callback report = [function](const ErrorReporter::Counts& counts) {
+        PyGILState_STATE state = PyGILState_Ensure();
+        PyObject* list = PyList_New((Py_ssize_t)counts.size());
+        for (size_t i = 0; list && i < counts.size(); ++i) {
+            PyObject* tuple = Py_BuildValue("(i, K)", counts[i].first, (unsigned long long)counts[i].second);
+            if (!tuple) {
+                Py_CLEAR(list);
+                break;
+            }
+            PyList_SET_ITEM(list, (Py_ssize_t)i, tuple);
+        }
+        PyObject* result = list ? PyObject_CallFunctionObjArgs(function.get(), list, NULL) : NULL;
+        if (!result) {
+            // There is nobody to raise to on the reporter thread
+            PyErr_WriteUnraisable(function.get());
+        }
+        Py_XDECREF(result);
+        Py_XDECREF(list);
+        PyGILState_Release(state);
+    };
+    try {
+        ice::Library* lib = dll_get_library();
+        if (!lib) {
+            char buffer[512];
+            return set_ics_exception(exception_runtime_error(), dll_get_error(buffer));
+        }
+        auto reporter = error_reporter_get(handle);
+        if (!reporter) {
+            // Shares the error queue with get_error_messages() and the health monitor
+            auto reader = std::make_shared<ErrorQueueReader>(_error_queue_acquire(lib, handle));
+            ErrorReporter::PollFunction poll = [reader](std::vector<int>& codes) { return reader->read(codes); };
+            reporter = std::make_shared<ErrorReporter>(poll);
+            error_reporter_set(handle, reporter);
+            reporter->start();
+        }
+        int id = reporter->subscribe(interval, report);
+        return Py_BuildValue("i", id);
+    } catch (ice::Exception& ex) {
+        return set_ics_exception(exception_runtime_error(), (char*)ex.what());
+    }
+    return set_ics_exception(exception_runtime_error(), "This is a bug!");
+}
+
+PyObject* meth_remove_error_callback(PyObject* self, PyObject* args)
+{
+    PyObject* obj = NULL;
+    int id = 0;
+    if (!PyArg_ParseTuple(args, arg_parse("Oi:", __FUNCTION__), &obj, &id)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    auto reporter = error_reporter_get(handle);
+    if (!reporter || !reporter->unsubscribe(id)) {
+        Py_RETURN_FALSE;
+    }
+    if (reporter->empty()) {
+        // Stop reading the error queue, its share of the errors is dropped with it
+        Py_BEGIN_ALLOW_THREADS;
+        error_reporter_remove(handle);
+        Py_END_ALLOW_THREADS;
+    }
+    Py_RETURN_TRUE;
+}
+
+PyObject* meth_start_device_watcher(PyObject* self, PyObject* args, PyObject* keywords)
+{
+    double interval = 1.0;
+    PyObject* callback = Py_None;
+    char* kwords[] = { "interval", "callback", NULL };
+    if (!PyArg_ParseTupleAndKeywords(
+            args, keywords, arg_parse("|dO:", __FUNCTION__), kwords, &interval, &callback)) {
+        return NULL;
+    }
+    if (callback != Py_None && !PyCallable_Check(callback)) {
+        return set_ics_exception(exception_argument_error(), "callback must be callable");
+    }
+    if (interval <= 0) {
+        return set_ics_exception(exception_argument_error(), "interval must be greater than 0");
+    }
+    DeviceWatcher::Callback changed;
+    if (callback != Py_None) {
+        std::shared_ptr<PyObject> function = worker_reference(callback);
+        changed = [function](const std::vector<NeoDeviceEx>& added, const std::vector<NeoDeviceEx>& removed) {
+            PyGILState_STATE state = PyGILState_Ensure();
+            PyObject* added_tuple = _createPyNeoDeviceExTuple(added.data(), (int)added.size());
+            PyObject* removed_tuple =
+                added_tuple ? _createPyNeoDeviceExTuple(removed.data(), (int)removed.size()) : NULL;
+            PyObject* result =
+                removed_tuple ? PyObject_CallFunctionObjArgs(function.get(), added_tuple, removed_tuple, NULL) : NULL;
+            if (!result) {
+                // There is nobody to raise to on the watcher thread
+                PyErr_WriteUnraisable(function.get());
+            }
+            Py_XDECREF(result);
+            Py_XDECREF(removed_tuple);
+            Py_XDECREF(added_tuple);
+            PyGILState_Release(state);
+        };
+    }
+    try {
+        ice::Library* lib = dll_get_library();
+        if (!lib) {
+            char buffer[512];
+            return set_ics_exception(exception_runtime_error(), dll_get_error(buffer));
+        }
+        typedef ice::Function<int __stdcall(
+            NeoDeviceEx*, int*, unsigned int*, unsigned int, POptionsFindNeoEx*, unsigned long)>
+            FindDevicesFunction;
+        auto icsneoFindDevices = std::make_shared<FindDevicesFunction>(lib, "icsneoFindDevices");
+        DeviceWatcher::FindFunction find = [icsneoFindDevices](std::vector<NeoDeviceEx>& devices) {
+            try {
+                devices.assign(255, NeoDeviceEx());
+                int count = (int)devices.size();
+                if (!(*icsneoFindDevices)(devices.data(), &count, NULL, 0, NULL, 0)) {
+                    return false;
+                }
+                devices.resize(count);
+                return true;
+            } catch (ice::Exception&) {
+                return false;
+            }
+        };
+        auto watcher = std::make_shared<DeviceWatcher>(find, interval, changed);
+        int id = device_watcher_add(watcher);
+        watcher->start();
+        return Py_BuildValue("i", id);
+    } catch (ice::Exception& ex) {
+        return set_ics_exception(exception_runtime_error(), (char*)ex.what());
+    }
+    return set_ics_exception(exception_runtime_error(), "This is a bug!");
+}
+
+PyObject* meth_stop_device_watcher(PyObject* self, PyObject* args)
+{
+    int id = 0;
+    if (!PyArg_ParseTuple(args, arg_parse("i:", __FUNCTION__), &id)) {
+        return NULL;
+    }
+    std::shared_ptr<DeviceWatcher> watcher;
+    // Waits for a scan or callback in progress, which needs the GIL
+    Py_BEGIN_ALLOW_THREADS;
+    watcher = device_watcher_remove(id);
+    Py_END_ALLOW_THREADS;
+    if (!watcher) {
+        Py_RETURN_FALSE;
+    }
+    Py_RETURN_TRUE;
+}
+
+PyObject* meth_device_watcher_devices(PyObject* self, PyObject* args)
+{
+    int id = 0;
+    if (!PyArg_ParseTuple(args, arg_parse("i:", __FUNCTION__), &id)) {
+        return NULL;
+    }
+    auto watcher = device_watcher_get(id);
+    if (!watcher) {
+        return set_ics_exception(exception_argument_error(), "No device watcher with this id");
+    }
+    std::vector<NeoDeviceEx> devices;
+    if (!watcher->devices(devices)) {
+        Py_RETURN_NONE;
+    }
+    return _createPyNeoDeviceExTuple(devices.data(), (int)devices.size());
+}
+
+PyObject* meth_device_settings_stats(PyObject* self, PyObject* args)
+{
+    PyObject* obj = NULL;
+    if (!PyArg_ParseTuple(args, arg_parse("O:", __FUNCTION__), &obj)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    SettingsStats stats = {};
+    auto it = settings_stats.find(handle);
+    if (handle && it != settings_stats.end()) {
+        stats = it->second;
+    }
+    return Py_BuildValue("{s:K, s:K, s:K, s:K, s:K, s:K}",
+                         "writes",
+                         (unsigned long long)stats.writes,
+                         "skipped",
+                         (unsigned long long)stats.skipped,
+                         "eeprom_writes",
+                         (unsigned long long)stats.eeprom_writes,
+                         "eeprom_skipped",
+                         (unsigned long long)stats.eeprom_skipped,
+                         "cache_hits",
+                         (unsigned long long)stats.cache_hits,
+                         "cache_misses",
+                         (unsigned long long)stats.cache_misses);
+}
+
+// Returns the ISO-TP engine for handle, creating and starting it if needed. Throws ice::Exception.
+static std::shared_ptr<IsoTpEngine> _isotp_acquire(ice::Library* lib, void* handle)
+{
+    auto engine = isotp_get(handle);
+    if (engine) {
+        return engine;
+    }
+    auto icsneoTxMessages =
+        std::make_shared<ice::Function<int __stdcall(void*, icsSpyMessage*, int, int)>>(lib, "icsneoTxMessages");
+    IsoTpEngine::TxFunction tx = [handle, icsneoTxMessages](icsSpyMessage* msg, int network_id) {
+        try {
+            return (*icsneoTxMessages)(handle, msg, network_id, 1) != 0;
+        } catch (ice::Exception&) {
+            return false;
+        }
+    };
+    engine = std::make_shared<IsoTpEngine>(tx);
+    isotp_set(handle, engine);
+    engine->start();
+    return engine;
+}
+
+// Parses an optional byte argument, None keeps the default. Returns false with an exception set on error.
+static bool _optional_byte(PyObject* obj, const char* name, int* value)
+{
+    if (!obj || obj == Py_None) {
+        return true;
+    }
+    long result = PyLong_AsLong(obj);
+    if (PyErr_Occurred()) {
+        return false;
+    }
+    if (result < 0 || result > 0xFF) {
+        PyErr_Format(exception_argument_error(), "%s must be between 0 and 255, got %ld", name, result);
+        return false;
+    }
+    *value = (int)result;
+    return true;
+}
+
+PyObject* meth_isotp_open(PyObject* self, PyObject* args, PyObject* keywords)
+{
+    PyObject* obj = NULL;
+    PyObject* callback = NULL;
+    int netid = 0;
+    unsigned long tx_id = 0;
+    unsigned long rx_id = 0;
+    PyObject* extended_id_obj = NULL;
+    int fd = 0;
+    int brs = 1;
+    int tx_dl = 0;
+    PyObject* padding_obj = NULL;
+    PyObject* tx_address_obj = NULL;
+    PyObject* rx_address_obj = NULL;
+    int block_size = 0;
+    int st_min = 0;
+    double timeout = 1.0;
+    int max_wait_frames = 10;
+    unsigned long long max_length = 0xFFFFFFFF;
+    char* kwords[] = { "device",     "callback",   "netid",      "tx_id",   "rx_id",
+                       "extended_id", "fd",         "brs",        "tx_dl",   "padding",
+                       "tx_address", "rx_address", "block_size", "st_min",  "timeout",
+                       "max_wait_frames", "max_length", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args,
+                                     keywords,
+                                     arg_parse("OOikk|OppiOOOiidiK:", __FUNCTION__),
+                                     kwords,
+                                     &obj,
+                                     &callback,
+                                     &netid,
+                                     &tx_id,
+                                     &rx_id,
+                                     &extended_id_obj,
+                                     &fd,
+                                     &brs,
+                                     &tx_dl,
+                                     &padding_obj,
+                                     &tx_address_obj,
+                                     &rx_address_obj,
+                                     &block_size,
+                                     &st_min,
+                                     &timeout,
+                                     &max_wait_frames,
+                                     &max_length)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    if (!PyCallable_Check(callback)) {
+        return set_ics_exception(exception_argument_error(), "callback must be callable");
+    }
+    IsoTpConfig config = {};
+    config.network_id = netid;
+    config.tx_id = (uint32_t)tx_id;
+    config.rx_id = (uint32_t)rx_id;
+    config.extended_id = tx_id > 0x7FF || rx_id > 0x7FF;
+    if (extended_id_obj && extended_id_obj != Py_None) {
+        int extended_id = PyObject_IsTrue(extended_id_obj);
+        if (extended_id < 0) {
+            return NULL;
+        }
+        config.extended_id = extended_id != 0;
+    }
+    if (tx_id > 0x1FFFFFFF || rx_id > 0x1FFFFFFF || (!config.extended_id && (tx_id > 0x7FF || rx_id > 0x7FF))) {
+        return set_ics_exception(exception_argument_error(), "tx_id and rx_id must be valid CAN identifiers");
+    }
+    config.fd = fd != 0;
+    config.brs = brs != 0;
+    config.tx_dl = tx_dl ? tx_dl : (config.fd ? 64 : 8);
+    if (!config.fd && config.tx_dl != 8) {
+        return set_ics_exception(exception_argument_error(), "tx_dl must be 8 for classic CAN");
+    }
+    if (!isotp_valid_tx_dl(config.tx_dl)) {
+        return set_ics_exception(exception_argument_error(), "tx_dl must be 8, 12, 16, 20, 24, 32, 48 or 64");
+    }
+    config.padding = -1;
+    config.tx_address = -1;
+    config.rx_address = -1;
+    if (!_optional_byte(padding_obj, "padding", &config.padding) ||
+        !_optional_byte(tx_address_obj, "tx_address", &config.tx_address) ||
+        !_optional_byte(rx_address_obj, "rx_address", &config.rx_address)) {
+        return NULL;
+    }
+    if (block_size < 0 || block_size > 0xFF) {
+        return set_ics_exception(exception_argument_error(), "block_size must be between 0 and 255");
+    }
+    if (!isotp_valid_st_min(st_min)) {
+        return set_ics_exception(exception_argument_error(), "st_min must be 0x00-0x7F (ms) or 0xF1-0xF9 (100 us)");
+    }
+    if (timeout <= 0) {
+        return set_ics_exception(exception_argument_error(), "timeout must be greater than 0");
+    }
+    if (max_wait_frames < 0) {
+        return set_ics_exception(exception_argument_error(), "max_wait_frames can't be negative");
+    }
+    if (max_length > 0xFFFFFFFF) {
+        return set_ics_exception(exception_argument_error(), "max_length can't be more than 0xFFFFFFFF");
+    }
+    config.block_size = (uint8_t)block_size;
+    config.st_min = (uint8_t)st_min;
+    config.timeout = timeout;
+    config.max_wait_frames = max_wait_frames;
+    config.max_length = (uint32_t)max_length;
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    if (!handle) {
+        return set_ics_exception(exception_runtime_error(), "Device must be open");
+    }
+    std::shared_ptr<PyObject> function = worker_reference(callback);
+    IsoTpEngine::Callback notify = [function](IsoTpEvent event, std::vector<uint8_t>& payload, const std::string& error) {
+        PyGILState_STATE state = PyGILState_Ensure();
+        PyObject* result = NULL;
+        switch (event) {
+            case ISOTP_RECEIVED: {
+                PyObject* bytes = PyBytes_FromStringAndSize((const char*)payload.data(), (Py_ssize_t)payload.size());
+                result = bytes ? PyObject_CallFunction(function.get(), "sN", "received", bytes) : NULL;
+                break;
+            }
+            case ISOTP_SENT:
+                result = PyObject_CallFunction(function.get(), "sO", "sent", Py_None);
+                break;
+            case ISOTP_SEND_ERROR:
+                result = PyObject_CallFunction(function.get(), "ss", "send_error", error.c_str());
+                break;
+            case ISOTP_RECEIVE_ERROR:
+                result = PyObject_CallFunction(function.get(), "ss", "receive_error", error.c_str());
+                break;
+            case ISOTP_CLOSED:
+                result = PyObject_CallFunction(function.get(), "sO", "closed", Py_None);
+                break;
+        }
+        if (!result) {
+            // There is nobody to raise to on the engine or dispatch thread
+            PyErr_WriteUnraisable(function.get());
+        }
+        Py_XDECREF(result);
+        PyGILState_Release(state);
+    };
+    try {
+        ice::Library* lib = dll_get_library();
+        if (!lib) {
+            char buffer[512];
+            return set_ics_exception(exception_runtime_error(), dll_get_error(buffer));
+        }
+        // Nothing after open() throws, the session can't be left without its subscription
+        auto pump = _rx_pump_acquire(lib, handle);
+        auto engine = _isotp_acquire(lib, handle);
+        const int id = engine->open(config, notify);
+        std::weak_ptr<IsoTpEngine> weak_engine = engine;
+        MessageDispatcher::Callback dispatch = [weak_engine, id](std::vector<OwnedMessage>& frames, size_t dropped) {
+            auto engine = weak_engine.lock();
+            if (engine) {
+                engine->process(id, frames, dropped);
+            }
+        };
+        engine->set_subscription(id, pump->dispatcher()->subscribe(netid, config.rx_id, 0xFFFFFFFF, dispatch));
+        return Py_BuildValue("i", id);
+    } catch (ice::Exception& ex) {
+        return set_ics_exception(exception_runtime_error(), (char*)ex.what());
+    }
+    return set_ics_exception(exception_runtime_error(), "This is a bug!");
+}
+
+PyObject* meth_isotp_send(PyObject* self, PyObject* args)
+{
+    PyObject* obj = NULL;
+    int id = 0;
+    Py_buffer payload = {};
+    if (!PyArg_ParseTuple(args, arg_parse("Oiy*:", __FUNCTION__), &obj, &id, &payload)) {
+        return NULL;
+    }
+    // Copied before anything else, so every path below releases the buffer
+    std::vector<uint8_t> data((const uint8_t*)payload.buf, (const uint8_t*)payload.buf + payload.len);
+    PyBuffer_Release(&payload);
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    if (data.empty() || data.size() > 0xFFFFFFFF) {
+        return set_ics_exception(exception_argument_error(), "payload must be 1 to 0xFFFFFFFF bytes long");
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    auto engine = isotp_get(handle);
+    if (!engine || !engine->send(id, std::move(data))) {
+        Py_RETURN_FALSE;
+    }
+    Py_RETURN_TRUE;
+}
+
+PyObject* meth_isotp_close(PyObject* self, PyObject* args)
+{
+    PyObject* obj = NULL;
+    int id = 0;
+    if (!PyArg_ParseTuple(args, arg_parse("Oi:", __FUNCTION__), &obj, &id)) {
+        return NULL;
+    }
+    if (!PyNeoDeviceEx_CheckExact(obj)) {
+        return set_ics_exception(exception_runtime_error(), "Argument must be of type " MODULE_NAME ".PyNeoDeviceEx");
+    }
+    void* handle = NULL;
+    if (!PyNeoDeviceEx_GetHandle(obj, &handle)) {
+        return NULL;
+    }
+    auto engine = isotp_get(handle);
+    if (!engine) {
+        Py_RETURN_FALSE;
+    }
+    const int subscription = engine->close(id);
+    if (subscription < 0) {
+        Py_RETURN_FALSE;
+    }
+    auto pump = rx_pump_get(handle);
+    auto dispatcher = pump ? pump->dispatcher(false) : nullptr;
+    if (dispatcher) {
+        dispatcher->unsubscribe(subscription);
+    }
+    // Joining the threads may wait for a callback that needs the GIL
+    Py_BEGIN_ALLOW_THREADS;
+    if (engine->empty()) {
+        isotp_remove(handle);
+    }
+    rx_pump_release(handle);
+    Py_END_ALLOW_THREADS;
+    Py_RETURN_TRUE;
+}
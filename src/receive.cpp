@@ -0,0 +1,596 @@
+#include "receive.h"
+#include "object_spy_message.h"
+#include "worker.h"
+
+#include <algorithm>
+#include <map>
+
+// Number of messages requested from the driver per receive call, same as get_messages()
+static const int RX_PUMP_BATCH_SIZE = 20000;
+// How long a receive call waits before checking if the pump should stop
+static const unsigned int RX_PUMP_TIMEOUT_MS = 100;
+// Frames queued for get_messages() or for message callbacks before the oldest are dropped
+static const size_t RX_PUMP_QUEUE_LIMIT = 100000;
+// Adaptive receive drains right away once a drain returns this much of the driver buffer
+static const double RX_ADAPTIVE_HIGH_WATER = 0.5;
+
+void receive_copy_message(const icsSpyMessage& msg, OwnedMessage& owned)
+{
+    memcpy(&owned.msg, &msg, sizeof(owned.msg));
+    const int length = spy_message_extra_data_length(&msg);
+    if (length) {
+        const uint8_t* data = (const uint8_t*)msg.ExtraDataPtr;
+        owned.payload.assign(data, data + length);
+    } else {
+        owned.payload.clear();
+    }
+    owned.msg.ExtraDataPtr = NULL;
+}
+
+LastValueCache::LastValueCache(const std::vector<uint64_t>& ids)
+  : m_ids(ids.begin(), ids.end())
+{
+}
+
+void LastValueCache::process(const icsSpyMessage* msgs, int count)
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    for (int i = 0; i < count; ++i) {
+        const icsSpyMessage& msg = msgs[i];
+        const uint64_t key = receive_key(msg);
+        if (!m_ids.empty() && m_ids.find(key) == m_ids.end()) {
+            continue;
+        }
+        LastValue& value = m_values[key];
+        const double timestamp = spy_message_hardware_timestamp(&msg);
+        if (value.count) {
+            const double interval = timestamp - value.timestamp;
+            if (interval > 0) {
+                // Exponential moving average, weight of 1/8 for the newest interval
+                value.interval = value.interval > 0 ? value.interval + (interval - value.interval) / 8 : interval;
+            }
+        } else {
+            value.interval = 0;
+        }
+        value.count += 1;
+        value.timestamp = timestamp;
+        receive_copy_message(msg, value.frame);
+    }
+}
+
+bool LastValueCache::get(uint64_t key, LastValue& value)
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    auto it = m_values.find(key);
+    if (it == m_values.end()) {
+        return false;
+    }
+    value = it->second;
+    return true;
+}
+
+std::vector<std::pair<uint64_t, LastValue>> LastValueCache::snapshot()
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    return std::vector<std::pair<uint64_t, LastValue>>(m_values.begin(), m_values.end());
+}
+
+MessageDispatcher::MessageDispatcher()
+  : m_stop(false)
+  , m_next_id(1)
+  , m_pending_frames(0)
+{
+}
+
+MessageDispatcher::~MessageDispatcher()
+{
+    stop();
+}
+
+void MessageDispatcher::start()
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    if (m_thread.joinable()) {
+        return;
+    }
+    m_stop = false;
+    // The thread keeps the dispatcher alive, a callback may drop the last reference by closing the device.
+    auto self = shared_from_this();
+    m_thread = std::thread([self] { self->run(); });
+}
+
+void MessageDispatcher::stop()
+{
+    worker_stop(m_mutex, m_stop, m_cv, m_thread);
+}
+
+int MessageDispatcher::subscribe(int network_id, uint32_t arbid, uint32_t mask, Callback callback)
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    auto subscription = std::make_shared<Subscription>();
+    subscription->id = m_next_id++;
+    subscription->network_id = network_id;
+    subscription->arbid = arbid & mask;
+    subscription->mask = mask;
+    subscription->callback = callback;
+    subscription->dropped = 0;
+    m_subscriptions[subscription->id] = subscription;
+    if (mask != 0xFFFFFFFF) {
+        m_masked.push_back(subscription);
+    } else if (network_id < 0) {
+        m_exact_any_network[arbid].push_back(subscription->id);
+    } else {
+        m_exact[receive_key(network_id, arbid)].push_back(subscription->id);
+    }
+    return subscription->id;
+}
+
+static void dispatcher_remove_id(std::vector<int>& ids, int id)
+{
+    ids.erase(std::remove(ids.begin(), ids.end(), id), ids.end());
+}
+
+bool MessageDispatcher::unsubscribe(int id)
+{
+    std::shared_ptr<Subscription> subscription;
+    {
+        std::lock_guard<std::mutex> lock(m_mutex);
+        auto it = m_subscriptions.find(id);
+        if (it == m_subscriptions.end()) {
+            return false;
+        }
+        subscription = it->second;
+        m_subscriptions.erase(it);
+        if (subscription->mask != 0xFFFFFFFF) {
+            m_masked.erase(std::remove(m_masked.begin(), m_masked.end(), subscription), m_masked.end());
+        } else if (subscription->network_id < 0) {
+            auto& ids = m_exact_any_network[subscription->arbid];
+            dispatcher_remove_id(ids, id);
+            if (ids.empty()) {
+                m_exact_any_network.erase(subscription->arbid);
+            }
+        } else {
+            const uint64_t key = receive_key(subscription->network_id, subscription->arbid);
+            auto& ids = m_exact[key];
+            dispatcher_remove_id(ids, id);
+            if (ids.empty()) {
+                m_exact.erase(key);
+            }
+        }
+    }
+    // The callback is released outside of the lock, releasing it may need the GIL.
+    subscription.reset();
+    return true;
+}
+
+bool MessageDispatcher::empty()
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    return m_subscriptions.empty();
+}
+
+void MessageDispatcher::match(const icsSpyMessage& msg, std::vector<int>& ids)
+{
+    const int network_id = (msg.NetworkID2 << 8) | msg.NetworkID;
+    const uint32_t arbid = msg.ArbIDOrHeader;
+    if (!m_exact.empty()) {
+        auto it = m_exact.find(receive_key(network_id, arbid));
+        if (it != m_exact.end()) {
+            ids.insert(ids.end(), it->second.begin(), it->second.end());
+        }
+    }
+    if (!m_exact_any_network.empty()) {
+        auto it = m_exact_any_network.find(arbid);
+        if (it != m_exact_any_network.end()) {
+            ids.insert(ids.end(), it->second.begin(), it->second.end());
+        }
+    }
+    for (const auto& subscription : m_masked) {
+        if ((subscription->network_id < 0 || subscription->network_id == network_id) &&
+            (arbid & subscription->mask) == subscription->arbid) {
+            ids.push_back(subscription->id);
+        }
+    }
+}
+
+void MessageDispatcher::process(const icsSpyMessage* msgs, int count)
+{
+    std::unordered_map<int, std::vector<OwnedMessage>> batches;
+    // Subscription ids in the order they first matched so callbacks run in receive order
+    std::vector<int> order;
+    std::vector<int> ids;
+    {
+        std::lock_guard<std::mutex> lock(m_mutex);
+        if (m_subscriptions.empty()) {
+            return;
+        }
+        for (int i = 0; i < count; ++i) {
+            ids.clear();
+            match(msgs[i], ids);
+            for (int id : ids) {
+                auto& batch = batches[id];
+                if (batch.empty()) {
+                    order.push_back(id);
+                }
+                batch.emplace_back();
+                receive_copy_message(msgs[i], batch.back());
+            }
+        }
+        for (int id : order) {
+            m_pending_frames += batches[id].size();
+            m_pending.emplace_back(id, std::move(batches[id]));
+        }
+        while (m_pending_frames > RX_PUMP_QUEUE_LIMIT && m_pending.size() > 1) {
+            // The callbacks aren't keeping up, drop the oldest batch and let the callback know
+            auto& oldest = m_pending.front();
+            auto it = m_subscriptions.find(oldest.first);
+            if (it != m_subscriptions.end()) {
+                it->second->dropped += oldest.second.size();
+            }
+            m_pending_frames -= oldest.second.size();
+            m_pending.pop_front();
+        }
+    }
+    if (!order.empty()) {
+        m_cv.notify_all();
+    }
+}
+
+void MessageDispatcher::run()
+{
+    std::unique_lock<std::mutex> lock(m_mutex);
+    while (true) {
+        m_cv.wait(lock, [this] { return m_stop || !m_pending.empty(); });
+        if (m_stop) {
+            break;
+        }
+        auto batch = std::move(m_pending.front());
+        m_pending.pop_front();
+        m_pending_frames -= batch.second.size();
+        auto it = m_subscriptions.find(batch.first);
+        if (it == m_subscriptions.end()) {
+            // Unsubscribed while the batch was pending
+            continue;
+        }
+        auto subscription = it->second;
+        const size_t dropped = subscription->dropped;
+        subscription->dropped = 0;
+        lock.unlock();
+        subscription->callback(batch.second, dropped);
+        // Release the callback before locking again, releasing it may need the GIL.
+        subscription.reset();
+        lock.lock();
+    }
+}
+
+AdaptiveReceivePolicy::AdaptiveReceivePolicy(double target_latency, double cpu_budget)
+  : m_target_latency(target_latency)
+  , m_cpu_budget(cpu_budget)
+  , m_interval(0)
+{
+}
+
+double AdaptiveReceivePolicy::next_interval(int frames, int buffer_max, double drain_time)
+{
+    double interval = m_target_latency;
+    if (m_cpu_budget > 0) {
+        // Wait long enough that draining takes cpu_budget of the time
+        interval = drain_time / m_cpu_budget - drain_time;
+    }
+    if (frames <= 0) {
+        // Idle, the driver wait blocks until frames arrive
+        interval = 0;
+    } else if (buffer_max > 0) {
+        if ((double)frames / buffer_max >= RX_ADAPTIVE_HIGH_WATER) {
+            interval = 0;
+        } else {
+            // Don't wait long enough for the current rate to fill the buffer past the high water mark
+            const double rate = frames / (std::max)(m_interval + drain_time, 1e-6);
+            interval = (std::min)(interval, RX_ADAPTIVE_HIGH_WATER * buffer_max / rate / 2);
+        }
+    }
+    m_interval = (std::max)(0.0, (std::min)(interval, RX_PUMP_TIMEOUT_MS / 1000.0));
+    return m_interval;
+}
+
+RxPump::RxPump(RxFunction rx)
+  : m_rx(rx)
+  , m_stop(false)
+  , m_errors(0)
+  , m_stats()
+  , m_last_overflow_count(-1)
+  , m_unreported_overflows(0)
+{
+}
+
+RxPump::~RxPump()
+{
+    stop();
+}
+
+void RxPump::start()
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    if (m_thread.joinable()) {
+        return;
+    }
+    m_stop = false;
+    m_thread = std::thread(&RxPump::run, this);
+}
+
+void RxPump::stop()
+{
+    std::shared_ptr<MessageDispatcher> dispatcher;
+    {
+        std::lock_guard<std::mutex> lock(m_mutex);
+        m_stop = true;
+        // A restarted pump starts a dispatcher of its own
+        dispatcher = std::move(m_dispatcher);
+    }
+    m_cv.notify_all();
+    if (m_thread.joinable() && m_thread.get_id() != std::this_thread::get_id()) {
+        m_thread.join();
+    }
+    if (dispatcher) {
+        dispatcher->stop();
+    }
+}
+
+void RxPump::set_last_value_cache(std::shared_ptr<LastValueCache> cache)
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    m_last_value_cache = cache;
+}
+
+std::shared_ptr<LastValueCache> RxPump::last_value_cache()
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    return m_last_value_cache;
+}
+
+std::shared_ptr<MessageDispatcher> RxPump::dispatcher(bool create)
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    if (!m_dispatcher && create) {
+        m_dispatcher = std::make_shared<MessageDispatcher>();
+        m_dispatcher->start();
+    }
+    return m_dispatcher;
+}
+
+bool RxPump::idle()
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    return !m_last_value_cache && !m_policy && (!m_dispatcher || m_dispatcher->empty());
+}
+
+bool RxPump::drained()
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    return m_stop && m_queue.empty() && !m_errors;
+}
+
+void RxPump::take(std::vector<OwnedMessage>& messages, size_t max, int* errors, double timeout)
+{
+    std::unique_lock<std::mutex> lock(m_mutex);
+    if (timeout > 0) {
+        m_cv.wait_for(lock, std::chrono::duration<double>(timeout), [this] { return !m_queue.empty() || m_stop; });
+    }
+    const size_t count = m_queue.size() < max ? m_queue.size() : max;
+    messages.reserve(messages.size() + count);
+    for (size_t i = 0; i < count; ++i) {
+        messages.push_back(std::move(m_queue.front()));
+        m_queue.pop_front();
+    }
+    *errors = m_errors;
+    m_errors = 0;
+}
+
+void RxPump::set_adaptive(std::shared_ptr<AdaptiveReceivePolicy> policy,
+                          PerformanceFunction performance,
+                          OverflowCallback on_overflow)
+{
+    PerformanceFunction old_performance;
+    OverflowCallback old_on_overflow;
+    {
+        std::lock_guard<std::mutex> lock(m_mutex);
+        m_policy = policy;
+        // Released outside the lock, releasing a Python callback needs the GIL.
+        old_performance = std::move(m_performance);
+        old_on_overflow = std::move(m_on_overflow);
+        m_performance = policy ? performance : nullptr;
+        m_on_overflow = policy ? on_overflow : nullptr;
+        m_stats = ReceiveStats();
+        m_stats.adaptive = policy != nullptr;
+        m_last_overflow_count = -1;
+        m_unreported_overflows = 0;
+    }
+    // Cut a long wait between drains short
+    m_cv.notify_all();
+}
+
+ReceiveStats RxPump::stats()
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    return m_stats;
+}
+
+uint64_t RxPump::take_overflows()
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    const uint64_t overflows = m_unreported_overflows;
+    m_unreported_overflows = 0;
+    return overflows;
+}
+
+int RxPump::check_overflows()
+{
+    PerformanceFunction performance;
+    {
+        std::lock_guard<std::mutex> lock(m_mutex);
+        performance = m_performance;
+    }
+    int buffer_count = 0;
+    int buffer_max = 0;
+    int overflow_count = 0;
+    if (!performance || !performance(&buffer_count, &buffer_max, &overflow_count)) {
+        return 0;
+    }
+    uint64_t lost = 0;
+    uint64_t total = 0;
+    OverflowCallback on_overflow;
+    {
+        std::lock_guard<std::mutex> lock(m_mutex);
+        // The count only goes down if the driver reset it, start over from there.
+        if (m_last_overflow_count >= 0 && overflow_count > m_last_overflow_count) {
+            lost = overflow_count - m_last_overflow_count;
+        }
+        m_last_overflow_count = overflow_count;
+        if (lost) {
+            m_stats.overflows += lost;
+            m_stats.overflow_events += 1;
+            if (!m_on_overflow) {
+                m_unreported_overflows += lost;
+            }
+        }
+        total = m_stats.overflows;
+        on_overflow = m_on_overflow;
+    }
+    if (lost && on_overflow) {
+        on_overflow(lost, total);
+    }
+    return buffer_max;
+}
+
+void RxPump::run()
+{
+    std::vector<icsSpyMessage> buffer(RX_PUMP_BATCH_SIZE);
+    while (true) {
+        {
+            std::lock_guard<std::mutex> lock(m_mutex);
+            if (m_stop) {
+                break;
+            }
+        }
+        int count = (int)buffer.size();
+        int errors = 0;
+        const bool success = m_rx(buffer.data(), &count, &errors, RX_PUMP_TIMEOUT_MS);
+        const auto drained = std::chrono::steady_clock::now();
+        if (!success) {
+            // Don't spin on a device that went away, the owner will stop us.
+            std::unique_lock<std::mutex> lock(m_mutex);
+            m_cv.wait_for(lock, std::chrono::milliseconds(RX_PUMP_TIMEOUT_MS), [this] { return m_stop; });
+            continue;
+        }
+        std::shared_ptr<AdaptiveReceivePolicy> policy;
+        {
+            std::lock_guard<std::mutex> lock(m_mutex);
+            policy = m_policy;
+        }
+        if (!count && !errors && !policy) {
+            continue;
+        }
+        std::shared_ptr<LastValueCache> cache;
+        std::shared_ptr<MessageDispatcher> dispatcher;
+        {
+            std::lock_guard<std::mutex> lock(m_mutex);
+            cache = m_last_value_cache;
+            dispatcher = m_dispatcher;
+            m_stats.drains += count ? 1 : 0;
+            m_stats.frames += count;
+            m_errors += errors;
+            // The pump owns the driver queue, get_messages() only sees what is queued here
+            for (int i = 0; i < count; ++i) {
+                if (m_queue.size() >= RX_PUMP_QUEUE_LIMIT) {
+                    // Nobody is keeping up, drop the oldest and report it as an error
+                    m_queue.pop_front();
+                    m_errors += 1;
+                }
+                m_queue.emplace_back();
+                receive_copy_message(buffer[i], m_queue.back());
+            }
+        }
+        // ExtraDataPtr is only valid until the next receive call so every consumer runs before it.
+        if (cache) {
+            cache->process(buffer.data(), count);
+        }
+        if (dispatcher) {
+            dispatcher->process(buffer.data(), count);
+        }
+        m_cv.notify_all();
+        if (!policy) {
+            continue;
+        }
+        const int buffer_max = check_overflows();
+        if (buffer_max > (int)buffer.size()) {
+            // Drain the whole driver buffer in one call
+            buffer.resize(buffer_max);
+        }
+        const double drain_time =
+            std::chrono::duration<double>(std::chrono::steady_clock::now() - drained).count();
+        const double interval = policy->next_interval(count, buffer_max, drain_time);
+        std::unique_lock<std::mutex> lock(m_mutex);
+        if (buffer_max > 0) {
+            m_stats.peak_occupancy = (std::max)(m_stats.peak_occupancy, (double)count / buffer_max);
+        }
+        m_stats.interval = interval;
+        if (interval > 0) {
+            // Let frames accumulate in the driver, set_adaptive() and stop() cut this short.
+            m_cv.wait_for(lock, std::chrono::duration<double>(interval), [this, &policy] {
+                return m_stop || m_policy != policy;
+            });
+        }
+    }
+}
+
+static std::mutex rx_pump_registry_mutex;
+static std::map<void*, std::shared_ptr<RxPump>> rx_pump_registry;
+
+std::shared_ptr<RxPump> rx_pump_get(void* handle)
+{
+    std::lock_guard<std::mutex> lock(rx_pump_registry_mutex);
+    auto it = rx_pump_registry.find(handle);
+    if (it == rx_pump_registry.end()) {
+        return nullptr;
+    }
+    return it->second;
+}
+
+void rx_pump_set(void* handle, std::shared_ptr<RxPump> pump)
+{
+    std::lock_guard<std::mutex> lock(rx_pump_registry_mutex);
+    rx_pump_registry[handle] = pump;
+}
+
+std::shared_ptr<RxPump> rx_pump_remove(void* handle)
+{
+    std::shared_ptr<RxPump> pump;
+    {
+        std::lock_guard<std::mutex> lock(rx_pump_registry_mutex);
+        auto it = rx_pump_registry.find(handle);
+        if (it == rx_pump_registry.end()) {
+            return nullptr;
+        }
+        pump = it->second;
+        rx_pump_registry.erase(it);
+    }
+    pump->stop();
+    return pump;
+}
+
+bool rx_pump_release(void* handle)
+{
+    auto pump = rx_pump_get(handle);
+    if (!pump || !pump->idle()) {
+        return false;
+    }
+    pump->stop();
+    if (pump->drained()) {
+        std::lock_guard<std::mutex> lock(rx_pump_registry_mutex);
+        auto it = rx_pump_registry.find(handle);
+        if (it != rx_pump_registry.end() && it->second == pump) {
+            rx_pump_registry.erase(it);
+        }
+    }
+    return true;
+}
@@ -0,0 +1,206 @@
+#include "replay.h"
+#include "object_spy_message.h"
+
+#include <algorithm>
+#include <cmath>
+#include <cstring>
+#include <map>
+
+// Upper bound on the number of frames handed to a single transmit call
+static const size_t REPLAY_MAX_BATCH = 256;
+// Sleep on the condition variable until this close to the deadline, then spin.
+static const std::chrono::microseconds REPLAY_SPIN_WINDOW(1500);
+
+static int replay_network_id(const icsSpyMessage& msg)
+{
+    return (msg.NetworkID2 << 8) | msg.NetworkID;
+}
+
+ReplayEngine::ReplayEngine(std::vector<icsSpyMessage> messages,
+                           std::vector<std::vector<uint8_t>> extra_data,
+                           double speed,
+                           bool loop,
+                           double quantum,
+                           TxFunction tx)
+  : m_messages(std::move(messages))
+  , m_extra_data(std::move(extra_data))
+  , m_speed(speed)
+  , m_loop(loop)
+  , m_quantum(quantum)
+  , m_tx(tx)
+  , m_stop(false)
+  , m_running(false)
+  , m_stats()
+  , m_error_sum(0)
+{
+    // Point ExtraDataPtr at the buffers we own now that they won't move anymore.
+    for (size_t i = 0; i < m_extra_data.size() && i < m_messages.size(); ++i) {
+        if (m_extra_data[i].empty()) {
+            continue;
+        }
+        m_messages[i].ExtraDataPtr = m_extra_data[i].data();
+        m_messages[i].ExtraDataPtrEnabled = 1;
+    }
+    // Recorded captures aren't guaranteed to be sorted, never schedule backwards.
+    m_offsets.reserve(m_messages.size());
+    double first = m_messages.empty() ? 0 : spy_message_hardware_timestamp(&m_messages[0]);
+    double last = 0;
+    for (const auto& msg : m_messages) {
+        last = (std::max)(last, spy_message_hardware_timestamp(&msg) - first);
+        m_offsets.push_back(last);
+    }
+}
+
+ReplayEngine::~ReplayEngine()
+{
+    stop();
+}
+
+void ReplayEngine::start()
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    if (m_running || m_thread.joinable()) {
+        return;
+    }
+    m_stop = false;
+    m_running = true;
+    m_thread = std::thread(&ReplayEngine::run, this);
+}
+
+void ReplayEngine::stop()
+{
+    {
+        std::lock_guard<std::mutex> lock(m_mutex);
+        m_stop = true;
+    }
+    m_cv.notify_all();
+    if (m_thread.joinable() && m_thread.get_id() != std::this_thread::get_id()) {
+        m_thread.join();
+    }
+}
+
+bool ReplayEngine::wait(double timeout)
+{
+    std::unique_lock<std::mutex> lock(m_mutex);
+    return m_cv.wait_for(lock, std::chrono::duration<double>(timeout), [this] { return !m_running; });
+}
+
+ReplayStats ReplayEngine::stats()
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    ReplayStats stats = m_stats;
+    stats.running = m_running;
+    stats.mean_error = stats.frames ? m_error_sum / stats.frames : 0;
+    return stats;
+}
+
+bool ReplayEngine::sleep_until(std::chrono::steady_clock::time_point when)
+{
+    {
+        std::unique_lock<std::mutex> lock(m_mutex);
+        if (m_cv.wait_until(lock, when - REPLAY_SPIN_WINDOW, [this] { return m_stop; })) {
+            return false;
+        }
+    }
+    // The condition variable wake up is too coarse for sub-millisecond accuracy.
+    while (std::chrono::steady_clock::now() < when) {
+        std::this_thread::yield();
+    }
+    std::lock_guard<std::mutex> lock(m_mutex);
+    return !m_stop;
+}
+
+void ReplayEngine::run()
+{
+    using clock = std::chrono::steady_clock;
+    const size_t count = m_messages.size();
+    // Keep the average frame spacing between the end of one pass and the start of the next.
+    double pass_length = 0;
+    if (count > 1) {
+        pass_length = m_offsets.back() + m_offsets.back() / (count - 1);
+    }
+    pass_length = (std::max)(pass_length, m_quantum);
+
+    const auto start = clock::now();
+    double pass_offset = 0;
+    bool stopped = count == 0;
+    while (!stopped) {
+        size_t i = 0;
+        while (i < count) {
+            const auto due = start + std::chrono::duration_cast<clock::duration>(
+                                         std::chrono::duration<double>((pass_offset + m_offsets[i]) / m_speed));
+            if (!sleep_until(due)) {
+                stopped = true;
+                break;
+            }
+            const int network_id = replay_network_id(m_messages[i]);
+            size_t end = i + 1;
+            while (end < count && end - i < REPLAY_MAX_BATCH && replay_network_id(m_messages[end]) == network_id &&
+                   (m_offsets[end] - m_offsets[i]) / m_speed <= m_quantum) {
+                ++end;
+            }
+            bool success = m_tx(&m_messages[i], network_id, (int)(end - i));
+            const double sent = std::chrono::duration<double>(clock::now() - start).count();
+
+            std::lock_guard<std::mutex> lock(m_mutex);
+            if (!success) {
+                m_stats.tx_failures += 1;
+            }
+            for (size_t j = i; j < end; ++j) {
+                const double error = std::fabs(sent - (pass_offset + m_offsets[j]) / m_speed);
+                m_error_sum += error;
+                m_stats.max_error = (std::max)(m_stats.max_error, error);
+            }
+            m_stats.frames += end - i;
+            m_stats.batches += 1;
+            i = end;
+        }
+        if (stopped) {
+            break;
+        }
+        std::lock_guard<std::mutex> lock(m_mutex);
+        m_stats.loops += 1;
+        stopped = !m_loop || m_stop;
+        pass_offset += pass_length;
+    }
+    {
+        std::lock_guard<std::mutex> lock(m_mutex);
+        m_running = false;
+    }
+    m_cv.notify_all();
+}
+
+static std::mutex replay_registry_mutex;
+static std::map<void*, std::shared_ptr<ReplayEngine>> replay_registry;
+
+std::shared_ptr<ReplayEngine> replay_get(void* handle)
+{
+    std::lock_guard<std::mutex> lock(replay_registry_mutex);
+    auto it = replay_registry.find(handle);
+    if (it == replay_registry.end()) {
+        return nullptr;
+    }
+    return it->second;
+}
+
+void replay_set(void* handle, std::shared_ptr<ReplayEngine> engine)
+{
+    std::lock_guard<std::mutex> lock(replay_registry_mutex);
+    replay_registry[handle] = engine;
+}
+
+std::shared_ptr<ReplayEngine> replay_remove(void* handle)
+{
+    std::shared_ptr<ReplayEngine> engine;
+    {
+        std::lock_guard<std::mutex> lock(replay_registry_mutex);
+        auto it = replay_registry.find(handle);
+        if (it == replay_registry.end()) {
+            return nullptr;
+        }
+        engine = it->second;
+        replay_registry.erase(it);
+    }
+    engine->stop();
+    return engine;
+}
@@ -0,0 +1,1191 @@
+// Simulated icsneolegacy backend, see ics/simulator.py for the Python side.
+//
+// Implements the part of the icsneo API the extension uses against in-memory virtual devices so everything runs
+// without Intrepid hardware: ics.override_library_name() loads this library instead of icsneolegacy/icsneo40.
+// Received traffic is generated on demand from the configured rate and protocol mix, transmitted messages come back
+// as TX echoes and, on a shared bus, are received by the other open devices. The icsneosim_* functions configure the simulation, they are not part of the icsneo API.
+//
+// It is built as the ics.icsneosim extension module so it is compiled and installed with the ics extension, the
+// module itself is empty.
+#include <Python.h>
+#include <icsnVC40.h>
+
+#include <algorithm>
+#include <array>
+#include <chrono>
+#include <condition_variable>
+#include <cstdint>
+#include <cstdio>
+#include <cstring>
+#include <deque>
+#include <map>
+#include <memory>
+#include <mutex>
+#include <set>
+#include <unordered_map>
+#include <vector>
+
+#if (defined(_WIN32) || defined(__WIN32__))
+#define SIM_API extern "C" __declspec(dllexport)
+#else
+#define SIM_API extern "C" __attribute__((visibility("default")))
+#endif
+
+// __stdcall is a windows calling convention
+#ifndef __stdcall
+#define __stdcall
+#endif
+
+namespace
+{
+// Size of the message buffer the extension passes to icsneoGetMessages(), like the driver the receive queue of a
+// device doesn't grow past it and drops the newest messages instead.
+const size_t RX_QUEUE_LIMIT = 20000;
+const size_t SD_SECTOR_SIZE = 512;
+const unsigned long SD_SECTOR_COUNT = 1UL << 24;
+const unsigned int SCRIPT_MESSAGE_COUNT = 128;
+const unsigned int SCRIPT_APP_SIGNAL_COUNT = 256;
+const int DEFAULT_SERIAL_BASE = 500000;
+const unsigned long BUS_VOLTAGE_MV = 12000;
+// Size of the driver's error queue, the oldest errors are dropped past it
+const size_t ERROR_QUEUE_LIMIT = 600;
+
+// Keep in sync with COUNTERS in ics/simulator.py
+enum Counter
+{
+    COUNTER_TX_MESSAGES,
+    COUNTER_RX_MESSAGES,
+    COUNTER_GENERATED,
+    COUNTER_DROPPED,
+    COUNTER_SETTINGS_READS,
+    COUNTER_SETTINGS_WRITES,
+    COUNTER_EEPROM_WRITES,
+    COUNTER_SCRIPT_LOADS,
+    COUNTER_SD_READS,
+    COUNTER_SD_WRITES,
+    COUNTER_ISO15765_TX,
+    COUNTER_COUNT
+};
+
+// Keep in sync with PROTOCOLS in ics/simulator.py
+enum Protocol
+{
+    PROTOCOL_CAN,
+    PROTOCOL_CANFD,
+    PROTOCOL_LIN,
+    PROTOCOL_ETHERNET,
+    PROTOCOL_COUNT
+};
+
+struct Message
+{
+    icsSpyMessage msg;
+    std::vector<uint8_t> payload;
+};
+
+struct VirtualDevice
+{
+    NeoDeviceEx info;
+    bool open;
+    // Handle of the current open, never reused so stale handles of closed or replaced devices stay invalid
+    uintptr_t handle;
+    // Message timestamps are seconds since the device was opened
+    std::chrono::steady_clock::time_point opened;
+    // Device time up to which traffic was generated
+    double generated_until;
+    std::deque<Message> rx;
+    // Messages the receive queue dropped since the device was opened, the overflow count of the driver
+    uint64_t overflows;
+    // Payloads of the last icsneoGetMessages(), the ExtraDataPtr of the messages point in here
+    std::vector<std::vector<uint8_t>> delivered;
+    std::vector<uint8_t> settings;
+    std::vector<uint8_t> script;
+    bool script_running;
+    std::set<unsigned int> running_function_blocks;
+    std::array<double, SCRIPT_APP_SIGNAL_COUNT> app_signals;
+    std::array<icsSpyMessage, SCRIPT_MESSAGE_COUNT> script_tx_messages;
+    std::array<icsSpyMessage, SCRIPT_MESSAGE_COUNT> script_rx_messages;
+    std::array<icsSpyMessage, SCRIPT_MESSAGE_COUNT> script_rx_masks;
+    std::unordered_map<unsigned long, std::array<uint8_t, SD_SECTOR_SIZE>> sd_sectors;
+    unsigned long iso15765_networks;
+    std::map<unsigned int, stCM_ISO157652_RxMessage> iso15765_rx;
+    bool bus_voltage_monitor;
+    // Error codes icsneoGetErrorMessages() hasn't returned yet, added by icsneosim_add_errors()
+    std::deque<int> errors;
+};
+
+struct Config
+{
+    int device_count = 1;
+    unsigned int device_type = NEODEVICE_FIRE3;
+    int serial_base = DEFAULT_SERIAL_BASE;
+    // Generated messages per second and device, 0 disables traffic generation
+    double rate = 0;
+    int weights[PROTOCOL_COUNT] = { 1, 0, 0, 0 };
+    int payload_min = 8;
+    int payload_max = 8;
+    bool loopback = true;
+    // Transmitted messages are received by every other open device, as if their networks were wired together
+    bool shared_bus = false;
+    uint64_t seed = 1;
+};
+
+std::mutex sim_mutex;
+std::condition_variable sim_rx_ready;
+Config sim_config;
+std::vector<std::unique_ptr<VirtualDevice>> sim_devices;
+uintptr_t sim_next_handle = 1;
+uint64_t sim_counters[COUNTER_COUNT];
+uint64_t sim_random_state = 1;
+
+// xorshift64*, fast and good enough for traffic
+uint64_t _random()
+{
+    sim_random_state ^= sim_random_state >> 12;
+    sim_random_state ^= sim_random_state << 25;
+    sim_random_state ^= sim_random_state >> 27;
+    return sim_random_state * 2685821657736338717ULL;
+}
+
+int _random_between(int low, int high)
+{
+    if (high <= low) {
+        return low;
+    }
+    return low + (int)(_random() % (uint64_t)(high - low + 1));
+}
+
+double _device_time(const VirtualDevice& device)
+{
+    return std::chrono::duration<double>(std::chrono::steady_clock::now() - device.opened).count();
+}
+
+EDeviceSettingsType _settings_type(unsigned int device_type)
+{
+    switch (device_type) {
+        case NEODEVICE_FIRE3:
+            return DeviceFire3SettingsType;
+        case NEODEVICE_FIRE2:
+            return DeviceFire2SettingsType;
+        case NEODEVICE_VCAN42:
+            return DeviceVCAN412SettingsType;
+        case NEODEVICE_RADMOON2:
+            return DeviceRADMoon2SettingsType;
+        default:
+            return DeviceSettingsNone;
+    }
+}
+
+void _load_default_settings(VirtualDevice& device)
+{
+    device.settings.assign(sizeof(SDeviceSettings), 0);
+    SDeviceSettings* settings = (SDeviceSettings*)device.settings.data();
+    settings->DeviceSettingType = _settings_type(device.info.neoDevice.DeviceType);
+}
+
+void _create_devices()
+{
+    sim_devices.clear();
+    for (int i = 0; i < sim_config.device_count; ++i) {
+        std::unique_ptr<VirtualDevice> device(new VirtualDevice());
+        memset(&device->info, 0, sizeof(device->info));
+        device->info.neoDevice.DeviceType = sim_config.device_type;
+        device->info.neoDevice.SerialNumber = sim_config.serial_base + i;
+        device->info.neoDevice.Handle = i + 1;
+        device->info.FirmwareMajor = 1;
+        device->open = false;
+        device->handle = 0;
+        device->generated_until = 0;
+        device->overflows = 0;
+        device->script_running = false;
+        device->app_signals.fill(0);
+        memset(device->script_tx_messages.data(), 0, sizeof(device->script_tx_messages));
+        memset(device->script_rx_messages.data(), 0, sizeof(device->script_rx_messages));
+        memset(device->script_rx_masks.data(), 0, sizeof(device->script_rx_masks));
+        device->iso15765_networks = 0;
+        device->bus_voltage_monitor = false;
+        _load_default_settings(*device);
+        sim_devices.push_back(std::move(device));
+    }
+}
+
+void _ensure_devices()
+{
+    if (sim_devices.empty()) {
+        _create_devices();
+    }
+}
+
+// Returns the open device of a handle or nullptr, handles of closed devices and of devices that were
+// replaced by icsneosim_set_devices() are invalid.
+VirtualDevice* _device(void* handle)
+{
+    for (auto& device : sim_devices) {
+        if (device->open && device->handle == (uintptr_t)handle) {
+            return device.get();
+        }
+    }
+    return nullptr;
+}
+
+void _set_timestamp(icsSpyMessage& msg, double seconds)
+{
+    msg.TimeStampHardwareID = HARDWARE_TIMESTAMP_ID_DOUBLE_SEC;
+    memcpy(&msg.TimeHardware, &seconds, sizeof(seconds));
+}
+
+// Same as spy_message_extra_data_length() of the extension
+int _extra_data_length(const icsSpyMessage& msg)
+{
+    const bool reversed = msg.Protocol == SPY_PROTOCOL_ETHERNET || msg.Protocol == SPY_PROTOCOL_SPI ||
+                          msg.Protocol == SPY_PROTOCOL_WBMS;
+    if (!msg.ExtraDataPtr || (!msg.ExtraDataPtrEnabled && !reversed)) {
+        return 0;
+    }
+    if (reversed || msg.Protocol == SPY_PROTOCOL_A2B) {
+        return (msg.NumberBytesHeader << 8) | msg.NumberBytesData;
+    }
+    return msg.NumberBytesData;
+}
+
+// Rounds a CAN FD payload length up to the next valid data length
+int _canfd_length(int length)
+{
+    static const int LENGTHS[] = { 0, 1, 2, 3, 4, 5, 6, 7, 8, 12, 16, 20, 24, 32, 48, 64 };
+    for (int valid : LENGTHS) {
+        if (length <= valid) {
+            return valid;
+        }
+    }
+    return 64;
+}
+
+// Queues a message for icsneoGetMessages(), returns false when the queue is full and the message was dropped
+bool _queue(VirtualDevice& device, Message&& message)
+{
+    if (device.rx.size() >= RX_QUEUE_LIMIT) {
+        sim_counters[COUNTER_DROPPED]++;
+        device.overflows++;
+        return false;
+    }
+    device.rx.push_back(std::move(message));
+    return true;
+}
+
+void _fill_random(uint8_t* data, size_t length)
+{
+    for (size_t i = 0; i < length; i += sizeof(uint64_t)) {
+        const uint64_t value = _random();
+        memcpy(data + i, &value, std::min(sizeof(value), length - i));
+    }
+}
+
+Message _generate_message(double timestamp)
+{
+    int total = 0;
+    for (int weight : sim_config.weights) {
+        total += weight;
+    }
+    int pick = _random_between(0, total - 1);
+    int protocol = 0;
+    while (pick >= sim_config.weights[protocol]) {
+        pick -= sim_config.weights[protocol++];
+    }
+    int length = _random_between(sim_config.payload_min, sim_config.payload_max);
+    Message message;
+    icsSpyMessage& msg = message.msg;
+    memset(&msg, 0, sizeof(msg));
+    msg.StatusBitField = SPY_STATUS_NETWORK_MESSAGE_TYPE;
+    _set_timestamp(msg, timestamp);
+    switch (protocol) {
+        case PROTOCOL_CAN:
+            length = std::min(length, 8);
+            msg.Protocol = SPY_PROTOCOL_CAN;
+            msg.NetworkID = NETID_HSCAN;
+            msg.ArbIDOrHeader = 0x100 + (uint32_t)(_random() % 0x100);
+            break;
+        case PROTOCOL_CANFD:
+            length = _canfd_length(length);
+            msg.Protocol = SPY_PROTOCOL_CANFD;
+            msg.NetworkID = NETID_HSCAN;
+            msg.ArbIDOrHeader = 0x200 + (uint32_t)(_random() % 0x100);
+            msg.StatusBitField3 = SPY_STATUS3_CANFD_FDF | SPY_STATUS3_CANFD_BRS;
+            break;
+        case PROTOCOL_LIN:
+            length = std::min(length, 8);
+            msg.Protocol = SPY_PROTOCOL_LIN;
+            msg.NetworkID = NETID_LIN;
+            msg.ArbIDOrHeader = (uint32_t)(_random() % 0x40);
+            break;
+        default:
+            length = std::min(std::max(length, 14), 1518);
+            msg.Protocol = SPY_PROTOCOL_ETHERNET;
+            msg.NetworkID = NETID_ETHERNET;
+            break;
+    }
+    if (protocol == PROTOCOL_ETHERNET) {
+        // Ethernet uses ExtraDataPtrEnabled reversed and has the upper length byte in NumberBytesHeader
+        message.payload.resize(length);
+        _fill_random(message.payload.data(), message.payload.size());
+        msg.NumberBytesHeader = (uint8_t)(length >> 8);
+        msg.NumberBytesData = (uint8_t)(length & 0xFF);
+    } else if (length > 8) {
+        message.payload.resize(length);
+        _fill_random(message.payload.data(), message.payload.size());
+        memcpy(msg.Data, message.payload.data(), sizeof(msg.Data));
+        msg.ExtraDataPtrEnabled = 1;
+        msg.NumberBytesData = (uint8_t)length;
+    } else {
+        _fill_random(msg.Data, length);
+        msg.NumberBytesData = (uint8_t)length;
+    }
+    return message;
+}
+
+// Generates the traffic of the device up to now
+void _generate(VirtualDevice& device)
+{
+    const double now = _device_time(device);
+    int total = 0;
+    for (int weight : sim_config.weights) {
+        total += weight;
+    }
+    if (sim_config.rate <= 0 || total <= 0) {
+        device.generated_until = now;
+        return;
+    }
+    const double interval = 1.0 / sim_config.rate;
+    uint64_t due = (uint64_t)((now - device.generated_until) * sim_config.rate);
+    // Don't build messages that would be dropped anyway, a long pause at a high rate would take forever
+    const uint64_t room = RX_QUEUE_LIMIT - std::min(device.rx.size(), RX_QUEUE_LIMIT);
+    if (due > room) {
+        sim_counters[COUNTER_DROPPED] += due - room;
+        device.overflows += due - room;
+        device.generated_until += (double)(due - room) * interval;
+        due = room;
+    }
+    for (uint64_t i = 0; i < due; ++i) {
+        device.generated_until += interval;
+        _queue(device, _generate_message(device.generated_until));
+        sim_counters[COUNTER_GENERATED]++;
+    }
+}
+
+// Queues a transmitted message on device, as its TX echo or as received from another device on the shared bus
+void _deliver(VirtualDevice& device, const icsSpyMessage& msg, int network, bool echo)
+{
+    Message message;
+    message.msg = msg;
+    const int length = _extra_data_length(msg);
+    if (length) {
+        const uint8_t* data = (const uint8_t*)msg.ExtraDataPtr;
+        message.payload.assign(data, data + length);
+    }
+    message.msg.ExtraDataPtr = nullptr;
+    message.msg.NetworkID = (uint8_t)(network & 0xFF);
+    message.msg.NetworkID2 = (uint8_t)(network >> 8);
+    if (echo) {
+        message.msg.StatusBitField |= SPY_STATUS_TX_MSG;
+    } else {
+        message.msg.StatusBitField &= ~SPY_STATUS_TX_MSG;
+    }
+    _set_timestamp(message.msg, _device_time(device));
+    _queue(device, std::move(message));
+}
+
+// Queues the CAN frames of an ISO15765 transmit as TX echoes: a single frame, or a first frame and consecutive
+// frames. The flow control of the receiver isn't simulated.
+void _loopback_iso15765(VirtualDevice& device, const stCM_ISO157652_TxMessage& tx, int network)
+{
+    const bool fd = tx.iscanFD != 0;
+    const int frame_length = fd ? _canfd_length(tx.tx_dl ? std::min((int)tx.tx_dl, 64) : 64) : 8;
+    const int address_length = tx.ext_address_enable ? 1 : 0;
+    const uint32_t length = std::min(tx.num_bytes, (uint32_t)sizeof(tx.data));
+    std::vector<std::vector<uint8_t>> frames;
+    std::vector<uint8_t> frame;
+    uint32_t offset = 0;
+    // Single frames longer than a classic CAN frame need the escaped length
+    if ((int)length <= std::min(frame_length, 8) - address_length - 1) {
+        frame = { (uint8_t)length };
+    } else if (frame_length > 8 && (int)length <= frame_length - address_length - 2) {
+        frame = { 0x00, (uint8_t)length };
+    } else if (length <= 0xFFF) {
+        frame = { (uint8_t)(0x10 | (length >> 8)), (uint8_t)(length & 0xFF) };
+    } else {
+        frame = { 0x10, 0x00, (uint8_t)(length >> 24), (uint8_t)(length >> 16), (uint8_t)(length >> 8),
+                  (uint8_t)length };
+    }
+    uint8_t sequence = 1;
+    while (true) {
+        if (address_length) {
+            frame.insert(frame.begin(), tx.extendedAddress);
+        }
+        const uint32_t count = std::min(length - offset, (uint32_t)(frame_length - frame.size()));
+        frame.insert(frame.end(), tx.data + offset, tx.data + offset + count);
+        offset += count;
+        if (tx.paddingEnable || fd) {
+            const int padded = tx.paddingEnable ? frame_length : _canfd_length((int)frame.size());
+            frame.resize(std::max((int)frame.size(), padded), tx.padding);
+        }
+        frames.push_back(frame);
+        if (offset >= length) {
+            break;
+        }
+        frame = { (uint8_t)(0x20 | (sequence++ & 0x0F)) };
+    }
+    for (const auto& data : frames) {
+        Message message;
+        icsSpyMessage& msg = message.msg;
+        memset(&msg, 0, sizeof(msg));
+        msg.StatusBitField = SPY_STATUS_NETWORK_MESSAGE_TYPE | SPY_STATUS_TX_MSG;
+        if (tx.id_29_bit_enable) {
+            msg.StatusBitField |= SPY_STATUS_XTD_FRAME;
+        }
+        msg.Protocol = fd ? SPY_PROTOCOL_CANFD : SPY_PROTOCOL_CAN;
+        if (fd) {
+            msg.StatusBitField3 = SPY_STATUS3_CANFD_FDF | (tx.isBRSEnabled ? SPY_STATUS3_CANFD_BRS : 0);
+        }
+        msg.NetworkID = (uint8_t)(network & 0xFF);
+        msg.NetworkID2 = (uint8_t)(network >> 8);
+        msg.ArbIDOrHeader = tx.id;
+        msg.NumberBytesData = (uint8_t)data.size();
+        memcpy(msg.Data, data.data(), std::min(data.size(), sizeof(msg.Data)));
+        if (data.size() > sizeof(msg.Data)) {
+            message.payload = data;
+            msg.ExtraDataPtrEnabled = 1;
+        }
+        _set_timestamp(msg, _device_time(device));
+        _queue(device, std::move(message));
+    }
+}
+} // namespace
+
+// Simulation control, used by ics/simulator.py
+
+SIM_API void icsneosim_reset(void)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    sim_config = Config();
+    memset(sim_counters, 0, sizeof(sim_counters));
+    sim_random_state = sim_config.seed;
+    _create_devices();
+    sim_rx_ready.notify_all();
+}
+
+SIM_API void icsneosim_set_devices(int count, unsigned int device_type, int serial_base)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    sim_config.device_count = std::max(count, 0);
+    sim_config.device_type = device_type;
+    sim_config.serial_base = serial_base;
+    _create_devices();
+    sim_rx_ready.notify_all();
+}
+
+SIM_API int icsneosim_set_traffic(double rate, const int* weights, int payload_min, int payload_max, uint64_t seed)
+{
+    if (rate < 0 || payload_min < 0 || payload_max < payload_min) {
+        return 0;
+    }
+    for (int i = 0; i < PROTOCOL_COUNT; ++i) {
+        if (weights[i] < 0) {
+            return 0;
+        }
+    }
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    sim_config.rate = rate;
+    memcpy(sim_config.weights, weights, sizeof(sim_config.weights));
+    sim_config.payload_min = payload_min;
+    sim_config.payload_max = payload_max;
+    sim_config.seed = seed ? seed : 1;
+    sim_random_state = sim_config.seed;
+    // The new rate starts now instead of applying to the time since the last receive
+    for (auto& device : sim_devices) {
+        if (device->open) {
+            device->generated_until = _device_time(*device);
+        }
+    }
+    sim_rx_ready.notify_all();
+    return 1;
+}
+
+SIM_API void icsneosim_set_loopback(int enabled)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    sim_config.loopback = enabled != 0;
+}
+
+SIM_API void icsneosim_set_shared_bus(int enabled)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    sim_config.shared_bus = enabled != 0;
+}
+
+// Copies up to count counters in the order of the Counter enum, returns how many there are
+SIM_API int icsneosim_get_counters(uint64_t* values, int count)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    memcpy(values, sim_counters, sizeof(uint64_t) * std::min(std::max(count, 0), (int)COUNTER_COUNT));
+    return COUNTER_COUNT;
+}
+
+// Queues count error codes on every open device, for icsneoGetErrorMessages()
+SIM_API void icsneosim_add_errors(const int* codes, int count)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    for (auto& device : sim_devices) {
+        if (!device->open) {
+            continue;
+        }
+        device->errors.insert(device->errors.end(), codes, codes + std::max(count, 0));
+        while (device->errors.size() > ERROR_QUEUE_LIMIT) {
+            device->errors.pop_front();
+        }
+    }
+}
+
+// Copies up to size bytes of the CoreMini script loaded on the device with serial_number, returns the length of
+// the script or -1 if there is no such device
+SIM_API int icsneosim_get_script(int serial_number, unsigned char* data, int size)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    for (auto& device : sim_devices) {
+        if (device->info.neoDevice.SerialNumber == serial_number) {
+            memcpy(data, device->script.data(), std::min(device->script.size(), (size_t)std::max(size, 0)));
+            return (int)device->script.size();
+        }
+    }
+    return -1;
+}
+
+// Devices
+
+SIM_API int __stdcall icsneoFindDevices(NeoDeviceEx* devices,
+                                        int* count,
+                                        unsigned int* device_types,
+                                        unsigned int device_type_count,
+                                        POptionsFindNeoEx*,
+                                        unsigned long)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    _ensure_devices();
+    int found = 0;
+    for (auto& device : sim_devices) {
+        if (found >= *count) {
+            break;
+        }
+        if (device_types && device_type_count) {
+            unsigned int* end = device_types + device_type_count;
+            if (std::find(device_types, end, device->info.neoDevice.DeviceType) == end) {
+                continue;
+            }
+        }
+        devices[found++] = device->info;
+    }
+    *count = found;
+    return 1;
+}
+
+SIM_API int __stdcall icsneoOpenDevice(NeoDeviceEx* device,
+                                       void** handle,
+                                       unsigned char*,
+                                       int,
+                                       int,
+                                       OptionsFindNeoEx*,
+                                       unsigned long)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    _ensure_devices();
+    for (auto& candidate : sim_devices) {
+        if (candidate->info.neoDevice.SerialNumber != device->neoDevice.SerialNumber) {
+            continue;
+        }
+        if (candidate->open) {
+            return 0;
+        }
+        candidate->open = true;
+        candidate->handle = sim_next_handle++;
+        candidate->opened = std::chrono::steady_clock::now();
+        candidate->generated_until = 0;
+        candidate->rx.clear();
+        candidate->overflows = 0;
+        candidate->errors.clear();
+        candidate->delivered.clear();
+        candidate->info.neoDevice.NumberOfClients = 1;
+        *handle = (void*)candidate->handle;
+        return 1;
+    }
+    return 0;
+}
+
+SIM_API int __stdcall icsneoClosePort(void* handle, int* errors)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device) {
+        return 0;
+    }
+    device->open = false;
+    device->info.neoDevice.NumberOfClients = 0;
+    device->rx.clear();
+    device->delivered.clear();
+    *errors = 0;
+    sim_rx_ready.notify_all();
+    return 1;
+}
+
+SIM_API void __stdcall icsneoFreeObject(void*) {}
+
+SIM_API int __stdcall icsneoValidateHObject(void* handle)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    return _device(handle) ? 1 : 0;
+}
+
+SIM_API int __stdcall icsneoGetDLLVersion(void)
+{
+    return 1;
+}
+
+SIM_API int __stdcall icsneoGetSerialNumber(void* handle, unsigned int* serial_number)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device) {
+        return 0;
+    }
+    *serial_number = (unsigned int)device->info.neoDevice.SerialNumber;
+    return 1;
+}
+
+SIM_API int __stdcall icsneoGetLastAPIError(void* handle, int* error)
+{
+    *error = 0;
+    return 1;
+}
+
+SIM_API int __stdcall icsneoGetErrorMessages(void* handle, int* errors, int* count)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device) {
+        return 0;
+    }
+    // Like the driver, reading the errors removes them from the queue
+    size_t taken = std::min(device->errors.size(), (size_t)std::max(*count, 0));
+    std::copy(device->errors.begin(), device->errors.begin() + taken, errors);
+    device->errors.erase(device->errors.begin(), device->errors.begin() + taken);
+    *count = (int)taken;
+    return 1;
+}
+
+SIM_API int __stdcall icsneoGetErrorInfo(int error,
+                                         char* description_short,
+                                         char* description_long,
+                                         int* description_short_length,
+                                         int* description_long_length,
+                                         int* severity,
+                                         int* restart_needed)
+{
+    snprintf(description_short, *description_short_length, "Simulated error %d", error);
+    snprintf(description_long, *description_long_length, "Simulated error %d, added by icsneosim_add_errors()", error);
+    *severity = 0;
+    *restart_needed = 0;
+    return 1;
+}
+
+// Status
+
+SIM_API int __stdcall icsneoGetDeviceStatus(void* handle, icsDeviceStatus* status, size_t* size)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    if (!_device(handle)) {
+        return 0;
+    }
+    // Nothing to report, every status of a simulated device reads as zeros
+    *size = std::min(*size, sizeof(icsDeviceStatus));
+    memset(status, 0, *size);
+    return 1;
+}
+
+SIM_API int __stdcall icsneoGetPerformanceParameters(void* handle,
+                                                     int* buffer_count,
+                                                     int* buffer_max,
+                                                     int* overflow_count,
+                                                     int* reserved1,
+                                                     int* reserved2,
+                                                     int* reserved3,
+                                                     int* reserved4,
+                                                     int* reserved5)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device) {
+        return 0;
+    }
+    // The receive queue fills in real time, like the driver buffer
+    _generate(*device);
+    *buffer_count = (int)device->rx.size();
+    *buffer_max = (int)RX_QUEUE_LIMIT;
+    *overflow_count = (int)device->overflows;
+    *reserved1 = *reserved2 = *reserved3 = *reserved4 = *reserved5 = 0;
+    return 1;
+}
+
+SIM_API int __stdcall icsneoEnableBusVoltageMonitor(void* handle, unsigned int enable, unsigned int reserved)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device) {
+        return 0;
+    }
+    device->bus_voltage_monitor = enable != 0;
+    return 1;
+}
+
+SIM_API int __stdcall icsneoGetBusVoltage(void* handle, unsigned long* mV, unsigned int reserved)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    // Like the driver, the monitor has to be enabled first
+    if (!device || !device->bus_voltage_monitor) {
+        return 0;
+    }
+    *mV = BUS_VOLTAGE_MV;
+    return 1;
+}
+
+SIM_API int __stdcall icsneoGetGPTPStatus(void* handle, GPTPStatus* status)
+{
+    // Simulated devices have no gPTP clock
+    return 0;
+}
+
+// Messages
+
+SIM_API int __stdcall icsneoTxMessages(void* handle, icsSpyMessage* msgs, int network, int count)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device) {
+        return 0;
+    }
+    sim_counters[COUNTER_TX_MESSAGES] += count;
+    for (int i = 0; i < count; ++i) {
+        if (sim_config.loopback) {
+            _deliver(*device, msgs[i], network, true);
+        }
+        if (sim_config.shared_bus) {
+            for (auto& other : sim_devices) {
+                if (other->open && other.get() != device) {
+                    _deliver(*other, msgs[i], network, false);
+                }
+            }
+        }
+    }
+    sim_rx_ready.notify_all();
+    return 1;
+}
+
+SIM_API int __stdcall icsneoWaitForRxMessagesWithTimeOut(void* handle, unsigned int timeout)
+{
+    std::unique_lock<std::mutex> lock(sim_mutex);
+    const auto deadline = std::chrono::steady_clock::now() + std::chrono::milliseconds(timeout);
+    while (true) {
+        VirtualDevice* device = _device(handle);
+        if (!device) {
+            return 0;
+        }
+        _generate(*device);
+        if (!device->rx.empty()) {
+            return 1;
+        }
+        auto wake = deadline;
+        if (sim_config.rate > 0) {
+            // Wake up when the next generated message is due
+            const auto next = device->opened + std::chrono::duration_cast<std::chrono::steady_clock::duration>(
+                                                   std::chrono::duration<double>(device->generated_until +
+                                                                                 1.0 / sim_config.rate));
+            wake = std::min(wake, next);
+        }
+        if (std::chrono::steady_clock::now() >= deadline) {
+            return 0;
+        }
+        sim_rx_ready.wait_until(lock, wake);
+    }
+}
+
+SIM_API int __stdcall icsneoGetMessages(void* handle, icsSpyMessage* msgs, int* count, int* errors)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device) {
+        return 0;
+    }
+    _generate(*device);
+    const int n = (int)std::min((size_t)std::max(*count, 0), device->rx.size());
+    device->delivered.resize(n);
+    for (int i = 0; i < n; ++i) {
+        Message& message = device->rx.front();
+        msgs[i] = message.msg;
+        device->delivered[i] = std::move(message.payload);
+        if (!device->delivered[i].empty()) {
+            msgs[i].ExtraDataPtr = device->delivered[i].data();
+        }
+        device->rx.pop_front();
+    }
+    sim_counters[COUNTER_RX_MESSAGES] += n;
+    *count = n;
+    *errors = 0;
+    return 1;
+}
+
+SIM_API int __stdcall icsneoGetTimeStampForMsg(void* handle, icsSpyMessage* msg, double* timestamp)
+{
+    if (msg->TimeStampHardwareID != HARDWARE_TIMESTAMP_ID_DOUBLE_SEC) {
+        return 0;
+    }
+    memcpy(timestamp, &msg->TimeHardware, sizeof(*timestamp));
+    return 1;
+}
+
+// Settings
+
+SIM_API int __stdcall icsneoGetDeviceSettingsType(void* handle, EPlasmaIonVnetChannel_t, EDeviceSettingsType* type)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device) {
+        return 0;
+    }
+    *type = ((SDeviceSettings*)device->settings.data())->DeviceSettingType;
+    return 1;
+}
+
+SIM_API int __stdcall icsneoGetDeviceSettings(void* handle,
+                                              SDeviceSettings* settings,
+                                              int size,
+                                              EPlasmaIonVnetChannel_t)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device || size <= 0) {
+        return 0;
+    }
+    memset(settings, 0, size);
+    memcpy(settings, device->settings.data(), std::min((size_t)size, device->settings.size()));
+    sim_counters[COUNTER_SETTINGS_READS]++;
+    return 1;
+}
+
+SIM_API int __stdcall icsneoSetDeviceSettings(void* handle,
+                                              SDeviceSettings* settings,
+                                              int size,
+                                              int save_to_eeprom,
+                                              EPlasmaIonVnetChannel_t)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device || size <= 0) {
+        return 0;
+    }
+    // Like the driver, refuse the settings of another device type
+    if (settings->DeviceSettingType != ((SDeviceSettings*)device->settings.data())->DeviceSettingType) {
+        return 0;
+    }
+    memcpy(device->settings.data(), settings, std::min((size_t)size, device->settings.size()));
+    sim_counters[COUNTER_SETTINGS_WRITES]++;
+    if (save_to_eeprom) {
+        sim_counters[COUNTER_EEPROM_WRITES]++;
+    }
+    return 1;
+}
+
+SIM_API int __stdcall icsneoLoadDefaultSettings(void* handle)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device) {
+        return 0;
+    }
+    _load_default_settings(*device);
+    sim_counters[COUNTER_SETTINGS_WRITES]++;
+    return 1;
+}
+
+// CoreMini
+
+static int _script_load(void* handle, const unsigned char* data, unsigned long length)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device || !data) {
+        return 0;
+    }
+    device->script.assign(data, data + length);
+    device->script_running = false;
+    device->info.Status &= ~CANNODE_STATUS_COREMINI_IS_RUNNING;
+    sim_counters[COUNTER_SCRIPT_LOADS]++;
+    return 1;
+}
+
+SIM_API int __stdcall icsneoScriptLoad(void* handle, const unsigned char* data, unsigned long length, int location)
+{
+    return _script_load(handle, data, length);
+}
+
+SIM_API int __stdcall icsneoScriptLoadReadBin(void* handle,
+                                              const unsigned char* data,
+                                              unsigned long length,
+                                              int location)
+{
+    return _script_load(handle, data, length);
+}
+
+SIM_API int __stdcall icsneoScriptStart(void* handle, int location)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device || device->script.empty()) {
+        return 0;
+    }
+    device->script_running = true;
+    device->info.Status |= CANNODE_STATUS_COREMINI_IS_RUNNING;
+    return 1;
+}
+
+SIM_API int __stdcall icsneoScriptStop(void* handle)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device) {
+        return 0;
+    }
+    device->script_running = false;
+    device->running_function_blocks.clear();
+    device->info.Status &= ~CANNODE_STATUS_COREMINI_IS_RUNNING;
+    return 1;
+}
+
+SIM_API int __stdcall icsneoScriptClear(void* handle, int location)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device) {
+        return 0;
+    }
+    device->script.clear();
+    device->script_running = false;
+    device->running_function_blocks.clear();
+    device->info.Status &= ~CANNODE_STATUS_COREMINI_IS_RUNNING;
+    return 1;
+}
+
+SIM_API int __stdcall icsneoScriptGetScriptStatus(void* handle, int* status)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device) {
+        return 0;
+    }
+    *status = device->script_running ? 1 : 0;
+    return 1;
+}
+
+SIM_API int __stdcall icsneoScriptStartFBlock(void* handle, unsigned int index)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device || !device->script_running) {
+        return 0;
+    }
+    device->running_function_blocks.insert(index);
+    return 1;
+}
+
+SIM_API int __stdcall icsneoScriptStopFBlock(void* handle, unsigned int index)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device || !device->script_running) {
+        return 0;
+    }
+    device->running_function_blocks.erase(index);
+    return 1;
+}
+
+SIM_API int __stdcall icsneoScriptGetFBlockStatus(void* handle, unsigned int index, int* status)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device) {
+        return 0;
+    }
+    *status = device->running_function_blocks.count(index) ? 1 : 0;
+    return 1;
+}
+
+SIM_API int __stdcall icsneoScriptReadAppSignal(void* handle, unsigned int index, double* value)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device || index >= SCRIPT_APP_SIGNAL_COUNT) {
+        return 0;
+    }
+    *value = device->app_signals[index];
+    return 1;
+}
+
+SIM_API int __stdcall icsneoScriptWriteAppSignal(void* handle, unsigned int index, double value)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device || index >= SCRIPT_APP_SIGNAL_COUNT) {
+        return 0;
+    }
+    device->app_signals[index] = value;
+    return 1;
+}
+
+SIM_API int __stdcall icsneoScriptReadTxMessage(void* handle, unsigned int index, void* msg)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device || index >= SCRIPT_MESSAGE_COUNT) {
+        return 0;
+    }
+    memcpy(msg, &device->script_tx_messages[index], sizeof(icsSpyMessage));
+    return 1;
+}
+
+SIM_API int __stdcall icsneoScriptReadRxMessage(void* handle, unsigned int index, void* msg, void* mask)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device || index >= SCRIPT_MESSAGE_COUNT) {
+        return 0;
+    }
+    memcpy(msg, &device->script_rx_messages[index], sizeof(icsSpyMessage));
+    memcpy(mask, &device->script_rx_masks[index], sizeof(icsSpyMessage));
+    return 1;
+}
+
+SIM_API int __stdcall icsneoScriptWriteTxMessage(void* handle, unsigned int index, void* msg)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device || index >= SCRIPT_MESSAGE_COUNT) {
+        return 0;
+    }
+    memcpy(&device->script_tx_messages[index], msg, sizeof(icsSpyMessage));
+    return 1;
+}
+
+SIM_API int __stdcall icsneoScriptWriteRxMessage(void* handle, unsigned int index, void* msg, void* mask)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device || index >= SCRIPT_MESSAGE_COUNT) {
+        return 0;
+    }
+    memcpy(&device->script_rx_messages[index], msg, sizeof(icsSpyMessage));
+    memcpy(&device->script_rx_masks[index], mask, sizeof(icsSpyMessage));
+    return 1;
+}
+
+// SD card, sectors that were never written read as zeros
+
+SIM_API int __stdcall icsneoReadSDCard(void* handle, unsigned long sector, unsigned char* data, unsigned long* length)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device || sector >= SD_SECTOR_COUNT) {
+        return 0;
+    }
+    auto it = device->sd_sectors.find(sector);
+    if (it == device->sd_sectors.end()) {
+        memset(data, 0, SD_SECTOR_SIZE);
+    } else {
+        memcpy(data, it->second.data(), SD_SECTOR_SIZE);
+    }
+    *length = SD_SECTOR_SIZE;
+    sim_counters[COUNTER_SD_READS]++;
+    return 1;
+}
+
+SIM_API int __stdcall icsneoWriteSDCard(void* handle, unsigned long sector, unsigned char* data)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device || sector >= SD_SECTOR_COUNT) {
+        return 0;
+    }
+    memcpy(device->sd_sectors[sector].data(), data, SD_SECTOR_SIZE);
+    sim_counters[COUNTER_SD_WRITES]++;
+    return 1;
+}
+
+// ISO15765
+
+SIM_API int __stdcall icsneoISO15765_EnableNetworks(void* handle, unsigned long networks)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device) {
+        return 0;
+    }
+    device->iso15765_networks = networks;
+    return 1;
+}
+
+SIM_API int __stdcall icsneoISO15765_DisableNetworks(void* handle)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device) {
+        return 0;
+    }
+    device->iso15765_networks = 0;
+    device->iso15765_rx.clear();
+    return 1;
+}
+
+SIM_API int __stdcall icsneoISO15765_TransmitMessage(void* handle,
+                                                     unsigned long network,
+                                                     stCM_ISO157652_TxMessage* msg,
+                                                     unsigned long timeout)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    // Like the driver, ISO15765 has to be enabled first
+    if (!device || !device->iso15765_networks) {
+        return 0;
+    }
+    sim_counters[COUNTER_ISO15765_TX]++;
+    if (sim_config.loopback) {
+        _loopback_iso15765(*device, *msg, (int)network);
+        sim_rx_ready.notify_all();
+    }
+    return 1;
+}
+
+SIM_API int __stdcall icsneoISO15765_ReceiveMessage(void* handle, unsigned int index, stCM_ISO157652_RxMessage* msg)
+{
+    std::lock_guard<std::mutex> lock(sim_mutex);
+    VirtualDevice* device = _device(handle);
+    if (!device || !device->iso15765_networks) {
+        return 0;
+    }
+    device->iso15765_rx[index] = *msg;
+    return 1;
+}
+
+static PyModuleDef IcsNeoSimModule = {
+    PyModuleDef_HEAD_INIT, "icsneosim", "Simulated icsneolegacy backend, see ics.simulator.", -1, NULL, NULL, NULL,
+    NULL, NULL
+};
+
+PyMODINIT_FUNC PyInit_icsneosim(void)
+{
+    return PyModule_Create(&IcsNeoSimModule);
+}
@@ -0,0 +1,168 @@
+#include "watcher.h"
+#include "worker.h"
+
+DeviceWatcher::DeviceWatcher(FindFunction find, double interval, Callback callback)
+  : m_find(find)
+  , m_interval(interval)
+  , m_callback(callback)
+  , m_stop(false)
+  , m_ready(false)
+  , m_scans(0)
+{
+}
+
+DeviceWatcher::~DeviceWatcher()
+{
+    stop();
+}
+
+void DeviceWatcher::start()
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    if (m_thread.joinable()) {
+        return;
+    }
+    m_stop = false;
+    // The thread keeps the watcher alive, a callback may drop the last reference by stopping it.
+    auto self = shared_from_this();
+    m_thread = std::thread([self] { self->run(); });
+}
+
+void DeviceWatcher::stop()
+{
+    worker_stop(m_mutex, m_stop, m_cv, m_thread);
+}
+
+bool DeviceWatcher::devices(std::vector<NeoDeviceEx>& devices)
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    if (!m_ready) {
+        return false;
+    }
+    devices = m_devices;
+    return true;
+}
+
+std::chrono::steady_clock::time_point DeviceWatcher::last_scan()
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    return m_last_scan;
+}
+
+uint64_t DeviceWatcher::scans()
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    return m_scans;
+}
+
+void DeviceWatcher::run()
+{
+    std::unique_lock<std::mutex> lock(m_mutex);
+    while (!m_stop) {
+        lock.unlock();
+        scan();
+        lock.lock();
+        if (m_cv.wait_for(lock, m_interval, [this] { return m_stop; })) {
+            break;
+        }
+    }
+}
+
+void DeviceWatcher::scan()
+{
+    std::vector<NeoDeviceEx> devices;
+    if (!m_find(devices)) {
+        // Keep the last table, a failed enumeration doesn't mean the devices are gone
+        return;
+    }
+    std::map<int, NeoDeviceEx> table;
+    for (const auto& device : devices) {
+        table[device.neoDevice.SerialNumber] = device;
+    }
+    std::vector<NeoDeviceEx> added;
+    std::vector<NeoDeviceEx> removed;
+    {
+        std::lock_guard<std::mutex> lock(m_mutex);
+        for (const auto& device : devices) {
+            if (!m_table.count(device.neoDevice.SerialNumber)) {
+                added.push_back(device);
+            }
+        }
+        for (const auto& entry : m_table) {
+            if (!table.count(entry.first)) {
+                removed.push_back(entry.second);
+            }
+        }
+        m_devices = std::move(devices);
+        m_table = std::move(table);
+        m_ready = true;
+        m_scans++;
+        m_last_scan = std::chrono::steady_clock::now();
+        if (m_stop) {
+            return;
+        }
+    }
+    if (m_callback && (!added.empty() || !removed.empty())) {
+        m_callback(added, removed);
+    }
+}
+
+static std::mutex device_watcher_registry_mutex;
+static std::map<int, std::shared_ptr<DeviceWatcher>> device_watcher_registry;
+static int device_watcher_next_id = 1;
+
+int device_watcher_add(std::shared_ptr<DeviceWatcher> watcher)
+{
+    std::lock_guard<std::mutex> lock(device_watcher_registry_mutex);
+    int id = device_watcher_next_id++;
+    device_watcher_registry[id] = watcher;
+    return id;
+}
+
+std::shared_ptr<DeviceWatcher> device_watcher_get(int id)
+{
+    std::lock_guard<std::mutex> lock(device_watcher_registry_mutex);
+    auto it = device_watcher_registry.find(id);
+    if (it == device_watcher_registry.end()) {
+        return nullptr;
+    }
+    return it->second;
+}
+
+std::shared_ptr<DeviceWatcher> device_watcher_remove(int id)
+{
+    std::shared_ptr<DeviceWatcher> watcher;
+    {
+        std::lock_guard<std::mutex> lock(device_watcher_registry_mutex);
+        auto it = device_watcher_registry.find(id);
+        if (it == device_watcher_registry.end()) {
+            return nullptr;
+        }
+        watcher = it->second;
+        device_watcher_registry.erase(it);
+    }
+    watcher->stop();
+    return watcher;
+}
+
+bool device_watcher_cached(std::vector<NeoDeviceEx>& devices)
+{
+    std::vector<std::shared_ptr<DeviceWatcher>> watchers;
+    {
+        std::lock_guard<std::mutex> lock(device_watcher_registry_mutex);
+        for (const auto& entry : device_watcher_registry) {
+            watchers.push_back(entry.second);
+        }
+    }
+    // Every watcher sees the same devices, use whichever scanned last
+    std::shared_ptr<DeviceWatcher> newest;
+    std::chrono::steady_clock::time_point newest_scan;
+    for (const auto& watcher : watchers) {
+        auto scan = watcher->last_scan();
+        if (watcher->scans() && (!newest || scan > newest_scan)) {
+            newest = watcher;
+            newest_scan = scan;
+        }
+    }
+    return newest && newest->devices(devices);
+}
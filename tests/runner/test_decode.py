@@ -0,0 +1,78 @@
+import unittest
+import ics
+from ics.decode import SignalDatabase, MessageDefinition, Signal
+
+unittest.TestLoader.sortTestMethodsUsing = None
+
+DBC = """
+BO_ 2566844926 Extended: 8 ECU
+ SG_ Counter : 0|8@1+ (1,0) [0|255] "" Vector__XXX
+ SG_ Mode M : 8|4@1+ (1,0) [0|15] "" Vector__XXX
+ SG_ Muxed m1 : 16|8@1+ (1,0) [0|255] "" Vector__XXX
+ SG_ Angle : 39|16@0- (0.5,-1) [-16385|16382.5] "deg" Vector__XXX
+
+BO_ 256 Standard: 8 ECU
+ SG_ Speed : 7|8@0+ (1,0) [0|255] "km/h" Vector__XXX
+"""
+
+
+def create_message(arbid, data):
+    msg = ics.SpyMessage()
+    msg.ArbIDOrHeader = arbid
+    if len(data) > 8:
+        msg.Protocol = ics.SPY_PROTOCOL_CANFD
+        msg.ExtraDataPtr = tuple(data)
+    else:
+        msg.Data = tuple(data)
+    return msg
+
+
+class TestDecode(unittest.TestCase):
+    def test_little_endian(self):
+        database = SignalDatabase(
+            [MessageDefinition(0x10, "M", [Signal("A", 4, 12), Signal("B", 16, 8, signed=True, factor=2)])]
+        )
+        decoder = database.compile()
+        columns = decoder.decode([create_message(0x10, [0x30, 0x12, 0xFF]), create_message(0x11, [0, 0, 0])])
+        self.assertEqual(list(columns["M.A"].rows), [0])
+        self.assertEqual(list(columns["M.A"].values), [0x123])
+        self.assertEqual(list(columns["M.B"].values), [-2])
+
+    def test_big_endian(self):
+        database = SignalDatabase([MessageDefinition(0x10, "M", [Signal("A", 7, 16, little_endian=False)])])
+        columns = database.compile().decode([create_message(0x10, [0x12, 0x34])])
+        self.assertEqual(list(columns["M.A"].values), [0x1234])
+
+    def test_short_payload_is_skipped(self):
+        database = SignalDatabase([MessageDefinition(0x10, "M", [Signal("A", 8, 16)])])
+        columns = database.compile().decode([create_message(0x10, [1, 2]), create_message(0x10, [1, 2, 3])])
+        self.assertEqual(list(columns["M.A"].rows), [1])
+        self.assertEqual(list(columns["M.A"].values), [0x0302])
+
+    def test_extra_data_ptr(self):
+        database = SignalDatabase([MessageDefinition(0x10, "M", [Signal("A", 60 * 8, 32)])])
+        columns = database.compile().decode([create_message(0x10, list(range(64)))])
+        self.assertEqual(list(columns["M.A"].values), [0x3F3E3D3C])
+
+    def test_network_filter(self):
+        database = SignalDatabase([MessageDefinition(0x10, "M", [Signal("A", 0, 8)], ics.NETID_HSCAN2)])
+        msg = create_message(0x10, [1])
+        msg.NetworkID = ics.NETID_HSCAN
+        self.assertEqual(len(database.compile().decode([msg])["M.A"].values), 0)
+        msg.NetworkID = ics.NETID_HSCAN2
+        self.assertEqual(len(database.compile().decode([msg])["M.A"].values), 1)
+
+    def test_dbc(self):
+        database = SignalDatabase.from_dbc_string(DBC)
+        self.assertEqual([m.arbid for m in database.messages], [0x18FEF1FE, 0x100])
+        self.assertEqual([s.name for s in database.messages[0].signals], ["Counter", "Mode", "Angle"])
+        decoder = database.compile()
+        columns = decoder.decode([create_message(0x18FEF1FE, [1, 0x12, 3, 0x80, 0x01, 0, 0, 0])])
+        self.assertEqual(list(columns["Extended.Counter"].values), [1])
+        self.assertEqual(list(columns["Extended.Mode"].values), [2])
+        self.assertEqual(list(columns["Extended.Angle"].values), [127])
+        self.assertEqual(len(columns["Standard.Speed"].values), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+import asyncio
+import unittest
+
+import ics
+from ics import simulator
+from ics.isotp import IsoTpError, IsoTpSession
+
+
+async def _serve(session, respond=lambda request: request[::-1]):
+    """Answers every request received on session, like an ECU."""
+    while True:
+        try:
+            request = await session.receive()
+        except IsoTpError:
+            # Refused or broken off, wait for the next request
+            continue
+        await session.send(respond(request))
+
+
+class TestIsoTp(unittest.IsolatedAsyncioTestCase):
+    """Runs without hardware against the simulated backend, a tester and ECUs on two devices sharing a bus."""
+
+    @classmethod
+    def setUpClass(cls):
+        try:
+            cls.previous_library = simulator.use()
+        except RuntimeError as ex:
+            raise unittest.SkipTest(str(ex))
+
+    @classmethod
+    def tearDownClass(cls):
+        ics.override_library_name(cls.previous_library)
+
+    def setUp(self):
+        simulator.reset()
+        simulator.set_devices(2)
+        simulator.set_shared_bus(True)
+        self.tester = ics.open_device(simulator.DEFAULT_SERIAL_BASE)
+        self.ecu = ics.open_device(simulator.DEFAULT_SERIAL_BASE + 1)
+        self.servers = []
+
+    async def asyncTearDown(self):
+        for server in self.servers:
+            server.cancel()
+        await asyncio.gather(*self.servers, return_exceptions=True)
+
+    def tearDown(self):
+        ics.close_device(self.tester)
+        ics.close_device(self.ecu)
+
+    def _ecu(self, tx_id, rx_id, respond=lambda request: request[::-1], **options):
+        session = IsoTpSession(self.ecu, tx_id, rx_id, **options)
+        self.servers.append(asyncio.create_task(_serve(session, respond)))
+        return session
+
+    def _frames(self, count):
+        """Returns the payloads of the next count frames the ECU device received."""
+        frames = []
+        for _ in range(50):
+            for msg in ics.get_messages(self.ecu, False, 0.1)[0]:
+                frames.append(msg.ExtraDataPtr if msg.NumberBytesData > 8 else msg.Data)
+            if len(frames) >= count:
+                break
+        return frames
+
+    async def test_single_frame(self):
+        self._ecu(0x7E8, 0x7E0)
+        async with IsoTpSession(self.tester, 0x7E0, 0x7E8) as session:
+            self.assertEqual(await session.request(b"\x22\xf1\x90", timeout=1), b"\x90\xf1\x22")
+            # The TX echoes of the tester device aren't mistaken for responses
+            self.assertEqual(await session.request(bytes(range(7)), timeout=1), bytes(reversed(range(7))))
+
+    async def test_frames(self):
+        with self.tester.isotp_session(0x7E0, 0x7E8, padding=0xAA, timeout=0.2) as session:
+            await session.send(b"\x01\x02\x03")
+            with self.assertRaises(IsoTpError):
+                # Nobody answers the first frame with a flow control frame
+                await session.send(bytes(range(20)))
+        self.assertEqual(
+            self._frames(2),
+            [(0x03, 1, 2, 3, 0xAA, 0xAA, 0xAA, 0xAA), (0x10, 20, 0, 1, 2, 3, 4, 5)],
+        )
+
+    async def test_multi_frame(self):
+        # Flow control every 2 frames with 1 ms between them in both directions
+        self._ecu(0x7E8, 0x7E0, block_size=2, st_min=1, padding=0x55)
+        async with IsoTpSession(self.tester, 0x7E0, 0x7E8, block_size=3, st_min=0xF5, padding=0x55) as session:
+            request = bytes(range(256)) * 4
+            self.assertEqual(await session.request(request, timeout=2), request[::-1])
+            # Longer than 4095 bytes, the first frame escapes the length
+            request = bytes(range(256)) * 20
+            self.assertEqual(await session.request(request, timeout=2), request[::-1])
+
+    async def test_canfd(self):
+        self._ecu(0x18DAF110, 0x18DA10F1, fd=True)
+        async with IsoTpSession(self.tester, 0x18DA10F1, 0x18DAF110, fd=True, tx_dl=32) as session:
+            # Escaped single frame, then segmented into 32 byte frames
+            for length in (30, 1000):
+                request = bytes(i % 251 for i in range(length))
+                self.assertEqual(await session.request(request, timeout=2), request[::-1])
+
+    async def test_extended_addressing(self):
+        self._ecu(0x6F1, 0x6F1, tx_address=0xF1, rx_address=0x10)
+        async with IsoTpSession(self.tester, 0x6F1, 0x6F1, tx_address=0x10, rx_address=0xF1) as session:
+            request = bytes(range(100))
+            self.assertEqual(await session.request(request, timeout=2), request[::-1])
+
+    async def test_overflow(self):
+        self._ecu(0x7E8, 0x7E0, max_length=64)
+        async with IsoTpSession(self.tester, 0x7E0, 0x7E8) as session:
+            with self.assertRaises(IsoTpError):
+                await session.send(bytes(100))
+            self.assertEqual(await session.request(bytes(64), timeout=1), bytes(64))
+
+    async def test_concurrent_sessions(self):
+        count = 40
+        for i in range(count):
+            self._ecu(0x600 + i, 0x700 + i, respond=lambda request, i=i: bytes([i]) + request, padding=0xCC)
+        sessions = [IsoTpSession(self.tester, 0x700 + i, 0x600 + i, padding=0xCC) for i in range(count)]
+        try:
+            request = bytes(range(256)) * 2
+            responses = await asyncio.gather(*(session.request(request, timeout=5) for session in sessions))
+            self.assertEqual(responses, [bytes([i]) + request for i in range(count)])
+        finally:
+            for session in sessions:
+                session.close()
+
+    async def test_close(self):
+        session = IsoTpSession(self.tester, 0x7E0, 0x7E8)
+        session.close()
+        self.assertTrue(session.closed)
+        with self.assertRaises(IsoTpError):
+            await session.send(b"\x01")
+        session = IsoTpSession(self.tester, 0x7E0, 0x7E8)
+        with self.assertRaises(ics.ArgumentError):
+            await session.send(b"")
+        # Closing the device closes its sessions
+        ics.close_device(self.tester)
+        self.assertFalse(ics.isotp_send(self.tester, session._id, b"\x01"))
+        self.tester = ics.open_device(simulator.DEFAULT_SERIAL_BASE)
+
+    async def test_close_wakes_receivers(self):
+        session = IsoTpSession(self.tester, 0x7E0, 0x7E8)
+        receivers = [asyncio.create_task(session.receive()) for _ in range(2)]
+        await asyncio.sleep(0)
+        session.close()
+        for receiver in receivers:
+            with self.assertRaises(IsoTpError):
+                await asyncio.wait_for(receiver, 1)
+        # Closing the device wakes the receivers of its sessions too
+        session = IsoTpSession(self.tester, 0x7E0, 0x7E8)
+        receiver = asyncio.create_task(session.request(b"\x01"))
+        await asyncio.sleep(0.1)
+        ics.close_device(self.tester)
+        with self.assertRaises(IsoTpError):
+            await asyncio.wait_for(receiver, 1)
+        self.assertTrue(session.closed)
+        with self.assertRaises(IsoTpError):
+            await session.receive()
+        self.tester = ics.open_device(simulator.DEFAULT_SERIAL_BASE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,232 @@
+"""Calls the API in loops against the simulated backend and fails if anything grows with the calls.
+
+Every check compares before and after ITERATIONS calls: the reference counts of the arguments and of the device
+handle, the total reference count on debug builds of python, the memory traced by tracemalloc and the resident set
+size. The default keeps the run short, the soak run of the loggers uses a million calls per API:
+
+    PYTHON_ICS_LEAK_ITERATIONS=1000000 python -m unittest tests.runner.test_leaks
+
+Only the soak run has enough calls for the resident set size to show a leak of the extension's own allocations.
+"""
+import gc
+import os
+import sys
+import tracemalloc
+import unittest
+
+import ics
+from ics import simulator
+from ics.structures.st_cm_iso157652_tx_message import st_cm_iso157652_tx_message
+
+ITERATIONS = int(os.getenv("PYTHON_ICS_LEAK_ITERATIONS", "10000"))
+WARMUP = min(ITERATIONS, 1000)
+# Growth that is allowed whatever the number of calls, caches and free lists fill up on the first calls
+TRACED_SLACK = 64 * 1024
+RSS_SLACK = 4 * 1024 * 1024
+
+unittest.TestLoader.sortTestMethodsUsing = None
+
+
+def _rss():
+    """Returns the resident set size in bytes, None where it isn't available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, AttributeError, ValueError):
+        return None
+
+
+def _can_message(data=(1, 2, 3, 4, 5, 6, 7, 8)):
+    msg = ics.SpyMessage()
+    msg.NetworkID = ics.NETID_HSCAN
+    msg.ArbIDOrHeader = 0x123
+    msg.Data = data
+    return msg
+
+
+def _canfd_message(length=64):
+    msg = _can_message()
+    msg.Protocol = ics.SPY_PROTOCOL_CANFD
+    msg.StatusBitField3 = ics.SPY_STATUS3_CANFD_FDF | ics.SPY_STATUS3_CANFD_BRS
+    msg.ExtraDataPtr = tuple(range(length))
+    return msg
+
+
+class TestLeaks(unittest.TestCase):
+    """Runs without hardware against the simulated backend."""
+
+    @classmethod
+    def setUpClass(cls):
+        try:
+            cls.previous_library = simulator.use()
+        except RuntimeError as ex:
+            raise unittest.SkipTest(str(ex))
+
+    @classmethod
+    def tearDownClass(cls):
+        ics.override_library_name(cls.previous_library)
+
+    def setUp(self):
+        simulator.reset()
+        simulator.set_devices(2)
+        # Nothing piles up in the receive queue unless a test wants the echoes
+        simulator.set_loopback(False)
+        self.device = ics.open_device(simulator.DEFAULT_SERIAL_BASE)
+
+    def tearDown(self):
+        ics.close_device(self.device)
+
+    def assertNoLeaks(self, func, *args):
+        """Calls func(*args) ITERATIONS times and fails if references or memory grew with the calls."""
+        # Numbers and strings are shared with the rest of the interpreter, their counts change on their own
+        watched = [obj for obj in (*args, self.device, self.device._handle) if not isinstance(obj, (int, float, str))]
+        for _ in range(WARMUP):
+            func(*args)
+        gc.collect()
+        refcounts = [sys.getrefcount(obj) for obj in watched]
+        total_refcount = sys.gettotalrefcount() if hasattr(sys, "gettotalrefcount") else None
+        rss = _rss()
+        tracemalloc.start()
+        try:
+            traced, _ = tracemalloc.get_traced_memory()
+            for _ in range(ITERATIONS):
+                func(*args)
+            gc.collect()
+            traced_growth = tracemalloc.get_traced_memory()[0] - traced
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual([sys.getrefcount(obj) for obj in watched], refcounts, "references of the arguments leaked")
+        if total_refcount is not None:
+            self.assertLess(sys.gettotalrefcount() - total_refcount, ITERATIONS // 100, "references leaked")
+        self.assertLess(traced_growth, TRACED_SLACK + ITERATIONS, "python memory leaked")
+        if rss is not None:
+            self.assertLess(_rss() - rss, RSS_SLACK + ITERATIONS * 16, "resident set size grew")
+
+    def test_find_devices(self):
+        self.assertNoLeaks(ics.find_devices)
+        self.assertNoLeaks(ics.find_devices, [ics.NEODEVICE_FIRE3])
+
+    def test_open_close_device(self):
+        def open_close(serial):
+            ics.close_device(ics.open_device(serial))
+
+        self.assertNoLeaks(open_close, simulator.DEFAULT_SERIAL_BASE + 1)
+
+    def test_device_info(self):
+        self.assertNoLeaks(ics.get_serial_number, self.device)
+        self.assertNoLeaks(ics.validate_hobject, self.device)
+        self.assertNoLeaks(ics.get_dll_version)
+        self.assertNoLeaks(ics.get_error_messages, self.device)
+
+    def test_transmit_messages(self):
+        self.assertNoLeaks(ics.transmit_messages, self.device, _can_message())
+        self.assertNoLeaks(ics.transmit_messages, self.device, (_can_message(), _canfd_message()))
+
+    def test_get_messages(self):
+        simulator.set_loopback(True)
+        messages = (_can_message(), _canfd_message())
+
+        def transmit_receive(device):
+            ics.transmit_messages(device, messages)
+            received, _ = ics.get_messages(device, False, 0)
+            for msg in received:
+                msg.Data, msg.ExtraDataPtr
+            # Replaces the payload the driver owns with one of our own
+            received[-1].ExtraDataPtr = (1, 2, 3)
+
+        self.assertNoLeaks(transmit_receive, self.device)
+        self.assertNoLeaks(ics.get_messages, self.device, False, 0)
+        self.assertNoLeaks(ics.get_messages, self.device, True, 0)
+
+    def test_spy_message(self):
+        def create():
+            msg = _canfd_message()
+            msg.ExtraDataPtr = tuple(range(64))
+            msg.ExtraDataPtr = tuple(range(12))
+            msg.Data, msg.ExtraDataPtr
+            msg.ExtraDataPtrEnabled = 0
+
+        self.assertNoLeaks(create)
+        self.assertNoLeaks(ics.SpyMessageJ1850)
+
+    def test_get_timestamp_for_msg(self):
+        simulator.set_loopback(True)
+        ics.transmit_messages(self.device, _can_message())
+        ((msg,), _) = ics.get_messages(self.device, False, 1)
+        self.assertNoLeaks(ics.get_timestamp_for_msg, self.device, msg)
+
+    def test_settings(self):
+        settings = ics.get_device_settings(self.device)
+        self.assertNoLeaks(ics.get_device_settings, self.device)
+        self.assertNoLeaks(ics.set_device_settings, self.device, settings)
+        self.assertNoLeaks(ics.load_default_settings, self.device)
+
+    def test_sdcard(self):
+        sector = bytes(range(256)) * 2
+        buffer = bytearray(512)
+        self.assertNoLeaks(ics.write_sdcard, self.device, 1, sector)
+        self.assertNoLeaks(ics.read_sdcard, self.device, 1)
+        self.assertNoLeaks(ics.read_sdcard_into, self.device, 1, buffer)
+
+    def test_coremini(self):
+        script = bytes(range(256))
+
+        def load_start_stop(device):
+            ics.coremini_load(device, script, ics.SCRIPT_LOCATION_SDCARD)
+            ics.coremini_start(device, ics.SCRIPT_LOCATION_SDCARD)
+            ics.coremini_get_status(device)
+            ics.coremini_stop(device)
+
+        self.assertNoLeaks(load_start_stop, self.device)
+        self.assertNoLeaks(ics.coremini_load, self.device, tuple(script), ics.SCRIPT_LOCATION_SDCARD)
+        self.assertNoLeaks(ics.coremini_write_app_signal, self.device, 1, 2.5)
+        self.assertNoLeaks(ics.coremini_read_app_signal, self.device, 1)
+        self.assertNoLeaks(ics.coremini_read_tx_message, self.device, 0)
+        if hasattr(ics, "load_readbin"):
+            self.assertNoLeaks(ics.load_readbin, self.device, script, ics.SCRIPT_LOCATION_SDCARD)
+
+    def test_iso15765(self):
+        tx = st_cm_iso157652_tx_message()
+        tx.id = 0x7E0
+        tx.num_bytes = 20
+        tx.data[:20] = range(20)
+        ics.iso15765_enable_networks(self.device, ics.NETID_HSCAN)
+        self.assertNoLeaks(ics.iso15765_transmit_message, self.device, ics.NETID_HSCAN, tx, 1000)
+
+    def test_isotp(self):
+        def callback(event, value):
+            pass
+
+        def open_send_close(device, callback, payload):
+            session = ics.isotp_open(device, callback, ics.NETID_HSCAN, 0x7E0, 0x7E8, padding=0xCC)
+            ics.isotp_send(device, session, payload)
+            ics.isotp_close(device, session)
+
+        # Keeps the receive pump and the engine running, stopping them waits for the driver
+        session = ics.isotp_open(self.device, callback, ics.NETID_HSCAN, 0x7E1, 0x7E9)
+        self.assertNoLeaks(open_send_close, self.device, callback, bytes(range(6)))
+        self.assertNoLeaks(ics.isotp_send, self.device, session, bytes(range(6)))
+        ics.isotp_close(self.device, session)
+
+    def test_errors(self):
+        closed = ics.open_device(simulator.DEFAULT_SERIAL_BASE + 1)
+        ics.close_device(closed)
+
+        def fail(func, *args):
+            try:
+                func(*args)
+            except ics.RuntimeError:
+                pass
+            else:
+                self.fail(f"{func.__name__} didn't fail")
+
+        self.assertNoLeaks(fail, ics.get_messages, closed, False, 0)
+        self.assertNoLeaks(fail, ics.transmit_messages, closed, _can_message())
+        self.assertNoLeaks(fail, ics.get_device_settings, closed)
+        self.assertNoLeaks(fail, ics.read_sdcard, closed, 0)
+        self.assertNoLeaks(fail, ics.coremini_load, closed, b"\x00", ics.SCRIPT_LOCATION_SDCARD)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -102,6 +102,106 @@ class BaseTests:
                     )
 
 
+        def test_replay(self):
+            tx_msgs = []
+            for i in range(10):
+                tx_msg = ics.SpyMessage()
+                tx_msg.ArbIDOrHeader = 0x100 + i
+                tx_msg.NetworkID = self.netid
+                tx_msg.Protocol = ics.SPY_PROTOCOL_CANFD
+                tx_msg.StatusBitField = ics.SPY_STATUS_CANFD | ics.SPY_STATUS_NETWORK_MESSAGE_TYPE
+                tx_msg.ExtraDataPtr = tuple([x for x in range(16)])
+                # 10ms apart
+                tx_msg.TimeStampHardwareID = ics.HARDWARE_TIMESTAMP_ID_NEORED_10NS
+                tx_msg.TimeHardware = i * 1000000
+                tx_msgs.append(tx_msg)
+            for device in self.devices:
+                # Clear any messages in the buffer
+                _, __ = device.get_messages()
+                start = time.time()
+                stats = device.replay(tx_msgs)
+                elapsed = time.time() - start
+                self.assertGreaterEqual(elapsed, 0.09, str(device))
+                self.assertEqual(stats["frames"], len(tx_msgs), str(device))
+                self.assertEqual(stats["tx_failures"], 0, str(device))
+                self.assertFalse(stats["running"], str(device))
+                time.sleep(0.3)
+                messages, error_count = device.get_messages(False, 1)
+                self.assertEqual(error_count, 0, str(device))
+                tx_ids = [m.ArbIDOrHeader for m in messages if m.StatusBitField & ics.SPY_STATUS_TX_MSG]
+                self.assertEqual(tx_ids, [m.ArbIDOrHeader for m in tx_msgs], str(device))
+
+        def test_last_value_cache(self):
+            tx_msg = ics.SpyMessage()
+            tx_msg.ArbIDOrHeader = 0x200
+            tx_msg.NetworkID = self.netid
+            tx_msg.Protocol = ics.SPY_PROTOCOL_CAN
+            tx_msg.StatusBitField = ics.SPY_STATUS_NETWORK_MESSAGE_TYPE
+            for device in self.devices:
+                device.enable_last_value_cache([(self.netid, 0x200)])
+                self.assertIsNone(device.last_value(self.netid, 0x200), str(device))
+                for i in range(3):
+                    tx_msg.Data = (i,)
+                    device.transmit_messages(tx_msg)
+                    time.sleep(0.05)
+                time.sleep(0.3)
+                msg, count, timestamp, rate = device.last_value(self.netid, 0x200)
+                self.assertEqual(count, 3, str(device))
+                self.assertEqual(msg.Data, (2,), str(device))
+                self.assertGreater(rate, 0, str(device))
+                self.assertEqual(list(device.snapshot()), [(self.netid, 0x200)], str(device))
+                device.disable_last_value_cache()
+
+        def test_on_message(self):
+            tx_msg = ics.SpyMessage()
+            tx_msg.NetworkID = self.netid
+            tx_msg.Protocol = ics.SPY_PROTOCOL_CAN
+            tx_msg.StatusBitField = ics.SPY_STATUS_NETWORK_MESSAGE_TYPE
+            for device in self.devices:
+                received = []
+                id = device.on_message(lambda messages: received.extend(messages), self.netid, 0x300, 0x7F0)
+                for arbid in (0x300, 0x30F, 0x310):
+                    tx_msg.ArbIDOrHeader = arbid
+                    device.transmit_messages(tx_msg)
+                time.sleep(0.3)
+                self.assertTrue(device.remove_message_callback(id), str(device))
+                self.assertEqual([m.ArbIDOrHeader for m in received], [0x300, 0x30F], str(device))
+
+        def test_health_monitor(self):
+            for device in self.devices:
+                self.assertIsNone(device.health(), str(device))
+                device.start_health_monitor(0.05, items=("status", "performance", "errors"))
+                time.sleep(0.2)
+                health = device.health()
+                self.assertGreater(health["polls"], 0, str(device))
+                self.assertEqual(len(health["performance"]), 8, str(device))
+                self.assertIsNone(health["bus_voltage"], str(device))
+                self.assertTrue(device.stop_health_monitor(), str(device))
+                self.assertIsNone(device.health(), str(device))
+
+        def test_device_watcher(self):
+            serials = sorted(device.SerialNumber for device in self.devices)
+            added = []
+            with ics.DeviceWatcher(0.1, lambda a, r: added.extend(a)) as watcher:
+                time.sleep(0.5)
+                self.assertEqual(sorted(device.SerialNumber for device in added), serials)
+                self.assertEqual(sorted(device.SerialNumber for device in watcher.devices), serials)
+                cached = ics.find_devices(cached=True)
+                self.assertEqual(sorted(device.SerialNumber for device in cached), serials)
+            self.assertFalse(watcher.running)
+
+        def test_device_pool(self):
+            pool = ics.DevicePool(self.devices)
+            for result in pool.close_all():
+                self.assertTrue(result.ok, f"{result.device} {result.error}")
+            results = pool.open_all()
+            self.assertEqual([result.device for result in results], self.devices)
+            for result in results:
+                self.assertTrue(result.ok, f"{result.device} {result.error}")
+            for result in pool.load_default_settings_all():
+                self.assertTrue(result.ok, f"{result.device} {result.error}")
+
+
 class TestHSCAN1(BaseTests.TestCAN):
     @classmethod
     def setUpClass(cls):
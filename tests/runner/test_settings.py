@@ -45,6 +45,40 @@ class BaseTests:
             finally:
                 device.close()
 
+        def test_set_settings_skips_unchanged(self):
+            device = self._get_device()
+            device.open()
+            try:
+                settings = ics.get_device_settings(device)
+                ics.set_device_settings(device, settings)
+                ics.set_device_settings(device, settings)
+                ics.set_device_settings(device, settings, False)
+                stats = ics.device_settings_stats(device)
+                self.assertEqual(stats["writes"], 1)
+                self.assertEqual(stats["skipped"], 2)
+                self.assertEqual(stats["eeprom_writes"], 1)
+                ics.set_device_settings(device, settings, force=True)
+                self.assertEqual(ics.device_settings_stats(device)["writes"], 2)
+            finally:
+                device.close()
+
+        def test_cached_settings(self):
+            device = self._get_device()
+            device.open()
+            try:
+                settings = ics.get_device_settings(device, cached=True)
+                cached = ics.get_device_settings(device, cached=True)
+                self.assertEqual(bytes(settings), bytes(cached))
+                cached.DeviceSettingType = e_device_settings_type.DeviceSettingsNone
+                self.assertEqual(ics.get_device_settings(device, cached=True).DeviceSettingType, self.device_settings_type)
+                stats = ics.device_settings_stats(device)
+                self.assertEqual((stats["cache_hits"], stats["cache_misses"]), (2, 1))
+                ics.load_default_settings(device)
+                ics.get_device_settings(device, cached=True)
+                self.assertEqual(ics.device_settings_stats(device)["cache_misses"], 2)
+            finally:
+                device.close()
+
 
 class TestFire3Settings(BaseTests.TestSettings):
     @classmethod
@@ -0,0 +1,466 @@
+import io
+import math
+import mmap
+import os
+import pathlib
+import tempfile
+import time
+import unittest
+import ics
+from ics import simulator
+from ics.structures.e_device_settings_type import e_device_settings_type
+from ics.structures.ics_spy_message import ics_spy_message
+from ics.structures.st_cm_iso157652_tx_message import st_cm_iso157652_tx_message
+
+unittest.TestLoader.sortTestMethodsUsing = None
+
+
+def _message(arbid=0x7E0, data=(1, 2, 3)):
+    msg = ics.SpyMessage()
+    msg.NetworkID = ics.NETID_HSCAN
+    msg.ArbIDOrHeader = arbid
+    msg.Data = data
+    return msg
+
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class TestSimulator(unittest.TestCase):
+    """Runs without hardware against the simulated backend."""
+
+    @classmethod
+    def setUpClass(cls):
+        try:
+            cls.previous_library = simulator.use()
+        except RuntimeError as ex:
+            raise unittest.SkipTest(str(ex))
+
+    @classmethod
+    def tearDownClass(cls):
+        ics.override_library_name(cls.previous_library)
+
+    def setUp(self):
+        simulator.reset()
+        self.device = ics.open_device()
+
+    def tearDown(self):
+        ics.close_device(self.device)
+
+    def _get_messages(self, count, check=None):
+        messages = []
+        deadline = time.monotonic() + 5
+        while len(messages) < count and time.monotonic() < deadline:
+            received = ics.get_messages(self.device, False, 0.1)[0]
+            if check:
+                # ExtraDataPtr is only valid until the next receive
+                for msg in received:
+                    check(msg)
+            messages.extend(received)
+        return messages
+
+    def _check_payload(self, msg):
+        if msg.Protocol == ics.SPY_PROTOCOL_CAN:
+            self.assertLessEqual(msg.NumberBytesData, 8)
+            self.assertEqual(len(msg.Data), msg.NumberBytesData)
+        elif msg.NumberBytesData > 8:
+            self.assertLessEqual(msg.NumberBytesData, 64)
+            self.assertEqual(len(msg.ExtraDataPtr), msg.NumberBytesData)
+
+    def test_find_devices(self):
+        # set_devices() invalidates the handle of setUp()
+        ics.close_device(self.device)
+        simulator.set_devices(3, ics.NEODEVICE_FIRE2, 1000)
+        devices = ics.find_devices()
+        self.assertEqual([device.SerialNumber for device in devices], [1000, 1001, 1002])
+        self.assertEqual(devices[0].DeviceType, ics.NEODEVICE_FIRE2)
+        self.assertFalse(ics.find_devices([ics.NEODEVICE_FIRE3]))
+        device = ics.open_device(1001)
+        self.assertEqual(ics.get_device_settings(device).DeviceSettingType, e_device_settings_type.DeviceFire2SettingsType)
+        ics.close_device(device)
+        self.device = ics.open_device(1000)
+
+    def test_generated_traffic(self):
+        simulator.set_traffic(rate=20000, protocols={"can": 1, "canfd": 1}, payload_sizes=(1, 64), seed=5)
+        messages = self._get_messages(100, self._check_payload)
+        self.assertGreaterEqual(len(messages), 100)
+        protocols = {msg.Protocol for msg in messages}
+        self.assertEqual(protocols, {ics.SPY_PROTOCOL_CAN, ics.SPY_PROTOCOL_CANFD})
+        timestamps = [ics.get_timestamp_for_msg(self.device, msg) for msg in messages]
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertGreaterEqual(simulator.counters()["generated"], len(messages))
+
+    def test_loopback(self):
+        msg = _message()
+        ics.transmit_messages(self.device, msg)
+        (echo,) = self._get_messages(1)
+        self.assertTrue(echo.StatusBitField & ics.SPY_STATUS_TX_MSG)
+        self.assertEqual((echo.ArbIDOrHeader, echo.Data), (0x7E0, (1, 2, 3)))
+        simulator.set_loopback(False)
+        ics.transmit_messages(self.device, msg)
+        self.assertFalse(ics.get_messages(self.device, False, 0.05)[0])
+        self.assertEqual(simulator.counters()["tx_messages"], 2)
+
+    def test_replay_file(self):
+        records = []
+        for i in range(3):
+            record = ics_spy_message(NetworkID=ics.NETID_HSCAN, ArbIDOrHeader=0x100 + i, NumberBytesData=1)
+            record.Data[0] = i
+            records.append(bytes(record))
+        with tempfile.TemporaryDirectory() as directory:
+            path = pathlib.Path(directory, "capture.bin")
+            path.write_bytes(b"".join(records))
+            stats = ics.replay(self.device, path)
+            self.assertEqual((stats["frames"], stats["tx_failures"]), (3, 0))
+            echoes = self._get_messages(3)
+            self.assertEqual([(msg.ArbIDOrHeader, msg.Data) for msg in echoes], [(0x100 + i, (i,)) for i in range(3)])
+            path.write_bytes(records[0][:-1])
+            with self.assertRaises(ics.ArgumentError):
+                ics.replay(self.device, str(path))
+        with self.assertRaises(ics.RuntimeError):
+            ics.replay(self.device, path)
+
+    def test_last_value_cache(self):
+        self.device.enable_last_value_cache()
+        ics.transmit_messages(self.device, _message())
+        # get_messages() sees the frames the cache saw, even those received before its first call
+        self.assertTrue(_wait_for(lambda: self.device.last_value(ics.NETID_HSCAN, 0x7E0)))
+        (echo,) = self._get_messages(1)
+        self.assertEqual((echo.ArbIDOrHeader, echo.Data), (0x7E0, (1, 2, 3)))
+        msg, count, timestamp, rate = self.device.last_value(ics.NETID_HSCAN, 0x7E0)
+        self.assertEqual((msg.Data, count), ((1, 2, 3), 1))
+        self.device.disable_last_value_cache()
+        # The receive thread stops with its last consumer
+        self.assertIsNone(ics.receive_stats(self.device))
+
+        self.device.enable_last_value_cache()
+        ics.transmit_messages(self.device, _message(0x7E8))
+        self.assertTrue(_wait_for(lambda: self.device.last_value(ics.NETID_HSCAN, 0x7E8)))
+        self.device.disable_last_value_cache()
+        # Frames queued before the cache was disabled aren't lost
+        (echo,) = self._get_messages(1)
+        self.assertEqual(echo.ArbIDOrHeader, 0x7E8)
+        self.assertFalse(ics.get_messages(self.device, False, 0)[0])
+        self.assertIsNone(ics.receive_stats(self.device))
+
+    def test_on_message(self):
+        received = []
+        id = self.device.on_message(received.extend, ics.NETID_HSCAN, 0x7E0)
+        ics.transmit_messages(self.device, _message())
+        ics.transmit_messages(self.device, _message(0x7E8))
+        self.assertTrue(_wait_for(lambda: received))
+        # Frames dispatched before the first get_messages() are returned by it too
+        self.assertEqual([msg.ArbIDOrHeader for msg in self._get_messages(2)], [0x7E0, 0x7E8])
+        self.assertEqual([msg.ArbIDOrHeader for msg in received], [0x7E0])
+        self.assertTrue(self.device.remove_message_callback(id))
+        self.assertIsNone(ics.receive_stats(self.device))
+
+        # The ISO-TP engine subscribes to the dispatcher the same way
+        session = ics.isotp_open(self.device, lambda event, value: None, ics.NETID_HSCAN, 0x7E0, 0x7E8)
+        ics.transmit_messages(self.device, _message(0x100))
+        (msg,) = self._get_messages(1)
+        self.assertEqual(msg.ArbIDOrHeader, 0x100)
+        self.assertTrue(ics.isotp_close(self.device, session))
+        self.assertIsNone(ics.receive_stats(self.device))
+
+    def test_performance_parameters(self):
+        ics.transmit_messages(self.device, _message())
+        ics.transmit_messages(self.device, _message())
+        self.assertEqual(ics.get_performance_parameters(self.device)[:3], (2, 20000, 0))
+        # The receive queue overflows like the driver buffer, nobody drains it
+        simulator.set_traffic(rate=1000000)
+        self.assertTrue(_wait_for(lambda: ics.get_performance_parameters(self.device)[2] > 0))
+        buffer_count, buffer_max, overflow_count = ics.get_performance_parameters(self.device)[:3]
+        self.assertEqual(buffer_count, buffer_max)
+        self.assertEqual(overflow_count, simulator.counters()["dropped"])
+
+    def test_health_monitor(self):
+        self.device.enable_bus_voltage_monitor(1, 0)
+        ics.transmit_messages(self.device, _message())
+        ics.start_health_monitor(self.device, 0.01)
+        try:
+            self.assertTrue(_wait_for(lambda: ics.health(self.device)["polls"] >= 2))
+            health = ics.health(self.device)
+            self.assertIsNotNone(health["status"])
+            self.assertEqual(health["bus_voltage"], 12000)
+            self.assertEqual(health["performance"][:3], (1, 20000, 0))
+            # Simulated devices have no gPTP clock
+            self.assertIsNone(health["gptp"])
+            self.assertEqual(health["errors"], [])
+        finally:
+            self.assertTrue(ics.stop_health_monitor(self.device))
+        self.assertIsNone(ics.health(self.device))
+
+    def test_health_monitor_errors(self):
+        ics.start_health_monitor(self.device, 0.01, items=["errors"])
+        try:
+            simulator.add_errors([5, 7, 5])
+            self.assertTrue(_wait_for(lambda: ics.health(self.device)["error_count"] == 3))
+            self.assertEqual([error[0] for error in ics.health(self.device)["errors"]], [5, 7, 5])
+            # The monitor drained the driver, get_error_messages() still gets every error once
+            self.assertEqual(ics.get_error_messages(self.device, compact=True), [(5, 2), (7, 1)])
+            self.assertEqual(ics.get_error_messages(self.device, compact=True), [])
+        finally:
+            self.assertTrue(ics.stop_health_monitor(self.device))
+        simulator.add_errors([9])
+        self.assertEqual([error[0] for error in ics.get_error_messages(self.device)], [9])
+
+    def test_on_error(self):
+        reports = []
+        id = ics.on_error(self.device, reports.append, interval=0.01)
+        ics.start_health_monitor(self.device, 0.01, items=["errors"])
+        try:
+            simulator.add_errors([5, 7, 5])
+            self.assertTrue(_wait_for(lambda: reports and ics.health(self.device)["error_count"] == 3))
+            # Every reader of the error queue gets every error
+            self.assertEqual(reports, [[(5, 2), (7, 1)]])
+            self.assertEqual(ics.get_error_messages(self.device, compact=True), [(5, 2), (7, 1)])
+        finally:
+            self.assertTrue(ics.stop_health_monitor(self.device))
+            self.assertTrue(ics.remove_error_callback(self.device, id))
+        self.assertFalse(ics.remove_error_callback(self.device, id))
+
+    def test_adaptive_receive(self):
+        ics.enable_adaptive_receive(self.device, target_latency=0.005)
+        ics.transmit_messages(self.device, _message())
+        self.assertEqual(len(self._get_messages(1)), 1)
+        stats = ics.receive_stats(self.device)
+        self.assertTrue(stats["adaptive"])
+        self.assertEqual(stats["frames"], 1)
+        ics.disable_adaptive_receive(self.device)
+        # Back to reading the driver, the receive thread is gone
+        self.assertIsNone(ics.receive_stats(self.device))
+
+        overflows = []
+        ics.enable_adaptive_receive(self.device, on_overflow=lambda lost, total: overflows.append((lost, total)))
+        # Faster than anything can drain, the simulated driver buffer overflows
+        simulator.set_traffic(rate=100000000)
+        self.assertTrue(_wait_for(lambda: overflows))
+        simulator.set_traffic(rate=0)
+        lost, total = overflows[0]
+        self.assertGreater(lost, 0)
+        self.assertGreaterEqual(ics.receive_stats(self.device)["overflows"], total)
+
+    def test_settings(self):
+        settings = ics.get_device_settings(self.device)
+        self.assertEqual(settings.DeviceSettingType, e_device_settings_type.DeviceFire3SettingsType)
+        settings.Settings.fire3.can1.Baudrate = 7
+        ics.set_device_settings(self.device, settings)
+        self.assertEqual(ics.get_device_settings(self.device).Settings.fire3.can1.Baudrate, 7)
+        ics.load_default_settings(self.device)
+        self.assertEqual(ics.get_device_settings(self.device).Settings.fire3.can1.Baudrate, 0)
+
+    def test_cached_settings(self):
+        settings = ics.get_device_settings(self.device, cached=True)
+        reads = simulator.counters()["settings_reads"]
+        cached = ics.get_device_settings(self.device, cached=True)
+        # Served from the snapshot without reading the device
+        self.assertEqual(simulator.counters()["settings_reads"], reads)
+        self.assertEqual(bytes(settings), bytes(cached))
+        cached.Settings.fire3.can1.Baudrate = 7
+        self.assertEqual(ics.get_device_settings(self.device, cached=True).Settings.fire3.can1.Baudrate, 0)
+        stats = ics.device_settings_stats(self.device)
+        self.assertEqual((stats["cache_hits"], stats["cache_misses"]), (2, 1))
+        ics.load_default_settings(self.device)
+        ics.get_device_settings(self.device, cached=True)
+        self.assertEqual(ics.device_settings_stats(self.device)["cache_misses"], 2)
+        with self.assertRaises(ics.RuntimeError):
+            ics.get_device_settings(None, cached=True)
+
+    def test_device_pool_settings(self):
+        ics.close_device(self.device)
+        simulator.set_devices(3)
+        with ics.DevicePool(max_workers=2) as pool:
+            self.assertTrue(all(result.ok for result in pool.open_all()))
+            settings = [ics.get_device_settings(device) for device in pool]
+            for baudrate, device_settings in enumerate(settings, 5):
+                device_settings.Settings.fire3.can1.Baudrate = baudrate
+            # Each device gets the settings at its position
+            self.assertTrue(all(result.ok for result in pool.set_device_settings_all(settings)))
+            baudrates = [ics.get_device_settings(device).Settings.fire3.can1.Baudrate for device in pool]
+            self.assertEqual(baudrates, [5, 6, 7])
+            with self.assertRaises(ValueError):
+                pool.set_device_settings_all(settings[:2])
+        self.device = ics.open_device()
+
+    def test_coremini_and_sdcard(self):
+        ics.coremini_load(self.device, bytes(range(64)), ics.SCRIPT_LOCATION_SDCARD)
+        ics.coremini_start(self.device, ics.SCRIPT_LOCATION_SDCARD)
+        self.assertTrue(ics.coremini_get_status(self.device))
+        sector = bytes(range(256)) * 2
+        ics.write_sdcard(self.device, 10, sector)
+        self.assertEqual(bytes(ics.read_sdcard(self.device, 10)), sector)
+        self.assertEqual(bytes(ics.read_sdcard(self.device, 11)), bytes(512))
+
+    def test_coremini_load_sources(self):
+        script = bytes(range(256)) * 40
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "script.vs3cmb")
+            with open(path, "wb") as f:
+                f.write(script)
+            for source in (path, pathlib.Path(path), bytearray(script), memoryview(script)[256:], tuple(script[:10])):
+                ics.coremini_load(self.device, source, ics.SCRIPT_LOCATION_SDCARD)
+                expected = bytes(source) if not isinstance(source, (str, pathlib.Path)) else script
+                self.assertEqual(simulator.script(), expected)
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                ics.coremini_load(self.device, mapped, ics.SCRIPT_LOCATION_SDCARD)
+            self.assertEqual(simulator.script(), script)
+            empty = os.path.join(directory, "empty.vs3cmb")
+            open(empty, "wb").close()
+            with self.assertRaises(ics.RuntimeError):
+                ics.coremini_load(self.device, empty, ics.SCRIPT_LOCATION_SDCARD)
+        with self.assertRaises(ics.RuntimeError):
+            ics.coremini_load(self.device, path, ics.SCRIPT_LOCATION_SDCARD)
+        with self.assertRaises(ics.RuntimeError):
+            ics.coremini_load(self.device, (1, 2, 300), ics.SCRIPT_LOCATION_SDCARD)
+        self.assertEqual(simulator.counters()["script_loads"], 6)
+
+    def test_coremini_skip_if_unchanged(self):
+        script = bytes(range(64))
+
+        def load(data=script, location=ics.SCRIPT_LOCATION_SDCARD):
+            before = simulator.counters()["script_loads"]
+            self.assertIsNone(ics.coremini_load(self.device, data, location, skip_if_unchanged=True))
+            return simulator.counters()["script_loads"] > before
+
+        self.assertTrue(load())
+        self.assertFalse(load())
+        self.assertTrue(load(script[::-1]))
+        self.assertTrue(load(location=ics.SCRIPT_LOCATION_FLASH_MEM))
+        self.assertTrue(load())
+        ics.coremini_clear(self.device, ics.SCRIPT_LOCATION_SDCARD)
+        self.assertTrue(load())
+        # Writing the SD card may overwrite the script
+        ics.write_sdcard(self.device, 0, bytes(512))
+        self.assertTrue(load())
+        ics.close_device(self.device)
+        self.device = ics.open_device()
+        self.assertTrue(load())
+        self.assertFalse(load())
+
+    def test_coremini_app_signals(self):
+        # The simulator has 256 application signals
+        success = ics.coremini_write_app_signals(self.device, {1: 5.0, 2: 10.5, 300: 1.0})
+        self.assertEqual(success, {1: True, 2: True, 300: False})
+        self.assertEqual(ics.coremini_write_app_signals(self.device, [(3, -1)]), {3: True})
+        self.assertEqual(ics.coremini_read_app_signal(self.device, 2), 10.5)
+        values, success = ics.coremini_read_app_signals(self.device, range(1, 5))
+        self.assertEqual((values, success), ([5.0, 10.5, -1.0, 0.0], [True, True, True, True]))
+        values, success = ics.coremini_read_app_signals(self.device, (300, 1))
+        self.assertTrue(math.isnan(values[0]))
+        self.assertEqual((values[1], success), (5.0, [False, True]))
+        self.assertEqual(ics.coremini_read_app_signals(self.device, []), ([], []))
+        with self.assertRaises(TypeError):
+            ics.coremini_read_app_signals(self.device, 1)
+        with self.assertRaises(ics.ArgumentError):
+            ics.coremini_write_app_signals(self.device, [1, 2])
+
+    def test_coremini_message_tables(self):
+        messages = [_message(0x100 + i, (i,)) for i in range(4)]
+        self.assertEqual(ics.coremini_write_tx_messages(self.device, 2, messages), 4)
+        read = ics.coremini_read_tx_messages(self.device, 2, 4)
+        self.assertEqual([(msg.ArbIDOrHeader, msg.Data) for msg in read], [(0x100 + i, (i,)) for i in range(4)])
+        # Only the changed entry is written again
+        messages[1] = _message(0x200, (9,))
+        self.assertEqual(ics.coremini_write_tx_messages(self.device, 2, messages, diff=True), 1)
+        self.assertEqual(ics.coremini_write_tx_messages(self.device, 2, messages, diff=True), 0)
+        self.assertEqual(ics.coremini_read_tx_messages(self.device, 3, 1)[0].ArbIDOrHeader, 0x200)
+        # A single entry write makes the entry unknown again
+        ics.coremini_write_tx_message(self.device, 2, _message(0x300))
+        self.assertEqual(ics.coremini_write_tx_messages(self.device, 2, messages, diff=True), 1)
+        # rx entries are (message, mask) tuples, a bare message has an empty mask
+        mask = _message(0x7FF, ())
+        self.assertEqual(ics.coremini_write_rx_messages(self.device, 0, [(messages[0], mask), messages[1]]), 2)
+        (msg, msg_mask), (other, other_mask) = ics.coremini_read_rx_messages(self.device, 0, 2)
+        self.assertEqual((msg.ArbIDOrHeader, msg_mask.ArbIDOrHeader), (0x100, 0x7FF))
+        self.assertEqual((other.ArbIDOrHeader, other_mask.ArbIDOrHeader), (0x200, 0))
+        self.assertEqual(ics.coremini_write_rx_messages(self.device, 0, [(messages[0], mask)], diff=True), 0)
+        self.assertEqual(ics.coremini_read_tx_messages(self.device, 0, 0), [])
+        # The simulator has 128 entries per table
+        with self.assertRaisesRegex(ics.RuntimeError, "index 128"):
+            ics.coremini_read_tx_messages(self.device, 126, 4)
+        with self.assertRaisesRegex(ics.RuntimeError, "index 128"):
+            ics.coremini_write_rx_messages(self.device, 127, messages[:2])
+        with self.assertRaises(ics.ArgumentError):
+            ics.coremini_write_tx_messages(self.device, 0, [1])
+
+    def _write_sectors(self, start, data):
+        for offset in range(0, len(data), 512):
+            ics.write_sdcard(self.device, start + offset // 512, data[offset : offset + 512])
+
+    def test_read_sdcard_into(self):
+        data = bytes(range(256)) * 6
+        self._write_sectors(20, data)
+        buffer = bytearray(len(data))
+        self.assertEqual(ics.read_sdcard_into(self.device, 20, buffer), len(data))
+        self.assertEqual(buffer, data)
+        # A partial last sector, nothing past the end of the buffer is touched
+        guarded = bytearray(b"\xee" * 1100)
+        self.assertEqual(ics.read_sdcard_into(self.device, 20, memoryview(guarded)[:1000]), 1000)
+        self.assertEqual(guarded, data[:1000] + b"\xee" * 100)
+        self.assertEqual(ics.read_sdcard_into(self.device, 20, bytearray()), 0)
+        with self.assertRaises(BufferError):
+            ics.read_sdcard_into(self.device, 20, bytes(512))
+
+    def test_write_sdcard_from(self):
+        self._write_sectors(53, b"\xee" * 512)
+        data = bytes(i % 253 for i in range(512 * 3 + 100))
+        progress = []
+        written = ics.write_sdcard_from(
+            self.device, 50, memoryview(data), progress=lambda *args: progress.append(args), granularity=1024
+        )
+        self.assertEqual(written, len(data))
+        self.assertEqual(progress[-1], (len(data), len(data)))
+        self.assertEqual([done for done, _ in progress], sorted(done for done, _ in progress))
+        self.assertEqual(bytes(ics.read_sdcard(self.device, 50)), data[:512])
+        # The partial last sector keeps the rest of its contents
+        self.assertEqual(bytes(ics.read_sdcard(self.device, 53)), data[1536:] + b"\xee" * 412)
+        self.assertEqual(ics.write_sdcard_from(self.device, 60, bytearray(data[:512]), verify=True), 512)
+        self.assertEqual(bytes(ics.read_sdcard(self.device, 60)), data[:512])
+        self.assertEqual(ics.write_sdcard_from(self.device, 70, b""), 0)
+
+        def abort(done, total):
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            ics.write_sdcard_from(self.device, 80, b"\x01" * 512 * 4, progress=abort, granularity=512)
+        self.assertEqual(bytes(ics.read_sdcard(self.device, 83)), bytes(512))
+
+    def test_sdcard_reader(self):
+        data = bytes(i % 251 for i in range(512 * 8))
+        self._write_sectors(100, data)
+        with self.device.open_sdcard(size=512 * 108, read_ahead=1024) as card:
+            card.seek(100 * 512 + 3)
+            self.assertEqual(card.read(10), data[3:13])
+            # Larger than the read ahead, read straight into the caller's buffer
+            self.assertEqual(card.read(3000), data[13:3013])
+            self.assertEqual(card.read(), data[3013:])
+            self.assertEqual(card.read(), b"")
+            card.seek(-512, io.SEEK_END)
+            self.assertEqual(card.read(), data[-512:])
+
+    def test_iso15765(self):
+        tx = st_cm_iso157652_tx_message()
+        tx.id = 0x7E0
+        tx.num_bytes = 20
+        tx.data[:20] = range(20)
+        tx.paddingEnable = 1
+        tx.padding = 0xAA
+        with self.assertRaises(ics.RuntimeError):
+            ics.iso15765_transmit_message(self.device, ics.NETID_HSCAN, tx, 1000)
+        ics.iso15765_enable_networks(self.device, ics.NETID_HSCAN)
+        ics.iso15765_transmit_message(self.device, ics.NETID_HSCAN, tx, 1000)
+        frames = [msg.Data for msg in self._get_messages(3)]
+        self.assertEqual(frames[0], (0x10, 20, 0, 1, 2, 3, 4, 5))
+        self.assertEqual(frames[1], (0x21, 6, 7, 8, 9, 10, 11, 12))
+        self.assertEqual(frames[2], (0x22, 13, 14, 15, 16, 17, 18, 19))
+
+
+if __name__ == "__main__":
+    unittest.main()
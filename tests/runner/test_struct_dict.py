@@ -0,0 +1,54 @@
+import ctypes
+import json
+import unittest
+from ics.struct_dict import from_dict
+from ics.structures.e_device_settings_type import e_device_settings_type
+from ics.structures.s_device_settings import s_device_settings
+from ics.structures.s_fire3_settings import s_fire3_settings
+
+unittest.TestLoader.sortTestMethodsUsing = None
+
+
+def create_settings():
+    settings = s_device_settings()
+    settings.DeviceSettingType = e_device_settings_type.DeviceFire3SettingsType
+    settings.Settings.fire3.can1.Baudrate = 7
+    settings.Settings.fire3.lin1.Baudrate = 19200
+    settings.Settings.fire3.network_enabled_on_boot = 1
+    return settings
+
+
+class TestStructDict(unittest.TestCase):
+    def test_selected_union_member(self):
+        values = create_settings().to_dict()
+        self.assertEqual(values["DeviceSettingType"], e_device_settings_type.DeviceFire3SettingsType)
+        self.assertEqual(values["Settings.fire3.can1.Baudrate"], 7)
+        self.assertEqual(values["Settings.fire3.lin1.Baudrate"], 19200)
+        self.assertFalse([path for path in values if path.startswith("Settings.cyan.")])
+
+    def test_round_trip(self):
+        settings = create_settings()
+        values = json.loads(json.dumps(settings.to_dict()))
+        self.assertEqual(bytes(s_device_settings.from_dict(values)), bytes(settings))
+        values["Settings.fire3.can1.Baudrate"] = 9
+        self.assertEqual(s_device_settings.from_dict(values).Settings.fire3.can1.Baudrate, 9)
+
+    def test_matches_ctypes(self):
+        fire3 = s_fire3_settings()
+        ctypes.memset(ctypes.addressof(fire3), 0xA5, ctypes.sizeof(fire3))
+        values = fire3.to_dict()
+        self.assertEqual(values["can1.Baudrate"], fire3.can1.Baudrate)
+        self.assertEqual(values["text_api.can1_options.bExtended"], fire3.text_api.can1_options.bExtended)
+        self.assertEqual(values["ethernet_1.rsvd"], list(fire3.ethernet_1.rsvd))
+
+    def test_partial_update(self):
+        settings = create_settings()
+        from_dict(settings, {"Settings.fire3.can1.Baudrate": 3})
+        self.assertEqual(settings.Settings.fire3.can1.Baudrate, 3)
+        self.assertEqual(settings.Settings.fire3.lin1.Baudrate, 19200)
+        with self.assertRaises(KeyError):
+            from_dict(settings, {"Settings.fire3.does_not_exist": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import ctypes
+import importlib
+import pkgutil
+import unittest
+import ics.structures
+from ics.structures.ics_spy_message import ics_spy_message
+from ics.structures.s_device_settings import s_device_settings
+
+try:
+    import numpy
+    from ics import struct_dtype
+except ImportError:
+    numpy = None
+
+unittest.TestLoader.sortTestMethodsUsing = None
+
+
+def generated_types():
+    """Yields every structure and union type of ics.structures once."""
+    for module_info in pkgutil.iter_modules(ics.structures.__path__):
+        module = importlib.import_module(f"ics.structures.{module_info.name}")
+        for name, ctype in vars(module).items():
+            if isinstance(ctype, type) and ctype.__name__ == name and ctype.__module__ == module.__name__:
+                if issubclass(ctype, (ctypes.Structure, ctypes.Union)):
+                    yield ctype
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestStructDtype(unittest.TestCase):
+    def test_layouts_match_ctypes(self):
+        for ctype in generated_types():
+            with self.subTest(ctype=ctype.__name__):
+                dtype = struct_dtype.dtype(ctype)
+                self.assertEqual(dtype.itemsize, ctypes.sizeof(ctype))
+                for name, (field_dtype, offset) in dtype.fields.items():
+                    self.assertEqual(offset, getattr(ctype, name).offset, name)
+                    self.assertEqual(field_dtype.itemsize, getattr(ctype, name).size, name)
+
+    def test_spy_messages(self):
+        messages = (ics_spy_message * 4)()
+        messages[2].ArbIDOrHeader = 0x123
+        messages[2].StatusBitField3 = 7
+        messages[3].Data[7] = 0xAA
+        array = struct_dtype.frombuffer(ics_spy_message, messages)
+        self.assertEqual(list(array["ArbIDOrHeader"]), [0, 0, 0x123, 0])
+        self.assertEqual(list(array["StatusBitField3"]), [0, 0, 7, 0])
+        self.assertEqual(array["Data"][3, 7], 0xAA)
+        # Zero copy
+        array["NetworkID"][1] = 5
+        self.assertEqual(messages[1].NetworkID, 5)
+
+    def test_nested_and_bitfields(self):
+        settings = s_device_settings()
+        settings.Settings.fire3.can1.Baudrate = 5
+        settings.Settings.fire3.text_api.can1_options.bExtended = 1
+        array = struct_dtype.frombuffer(s_device_settings, settings)
+        fire3 = array["Settings"]["fire3"]
+        self.assertEqual(fire3["can1"]["Baudrate"][0], 5)
+        bits = struct_dtype.bitfields(fire3, type(settings.Settings.fire3))
+        self.assertEqual(bits["text_api.can1_options.bExtended"][0], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()